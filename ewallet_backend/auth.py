@@ -1,25 +1,170 @@
+from typing import Optional
 from fastapi import Depends, HTTPException
-from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select, event, inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.ext.asyncio import AsyncSession
 from utils.security import decode_token
-from database import get_db
+from database import AsyncSessionLocal, get_db, get_async_db
 from models import User
+from cache import build_cache
+from config import settings
+
+security = HTTPBearer(auto_error=False)  # Missing credentials answer 401 below, not HTTPBearer's 403
+
+# Principal cache: user id + token version -> identity columns.
+# Balance and credentials are never cached; they load from the database
+# when a route actually reads them.
+VOLATILE_FIELDS = {
+    "balance_minor", "password", "password_reset_token", "reset_token_expiry",
+    "last_login_at", "last_sync_at",
+}
+PRINCIPAL_FIELDS = [
+    attr.key for attr in sa_inspect(User).column_attrs if attr.key not in VOLATILE_FIELDS
+]
+
+principal_cache = build_cache(
+    "principal",
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL
+)
+
+
+def _principal_key(user_id: int, token_version: int) -> str:
+    return f"{user_id}:{token_version}"
+
+
+def _snapshot(user: User) -> dict:
+    return {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+
+
+def _from_snapshot(data: dict) -> User:
+    """Detached User carrying the cached columns; the rest stay unloaded"""
+    user = User(**data)
+    make_transient_to_detached(user)
+    return user
+
+
+def _decode_principal(token: Optional[HTTPAuthorizationCredentials]) -> tuple:
+    if token is None:
+        raise HTTPException(
+            status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"}
+        )
+    payload = decode_token(token.credentials)
+    user_id = payload.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=403, detail="Invalid token payload")
+    return user_id, payload.get("tv", 0)
+
+
+def _check_principal(user: User, token_version: int):
+    if (user.token_version or 0) != token_version:
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    if user.is_suspended:
+        raise HTTPException(status_code=403, detail="Account suspended")
 
-security = HTTPBearer()
 
 def get_current_user(token: str = Depends(security), db: Session = Depends(get_db)):
     try:
-        payload = decode_token(token.credentials)
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=403, detail="Invalid token payload")
-        
+        user_id, token_version = _decode_principal(token)
+        key = _principal_key(user_id, token_version)
+
+        cached = principal_cache.get(key)
+        if cached is not None:
+            return db.merge(_from_snapshot(cached), load=False)
+
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        
+        _check_principal(user, token_version)
+
+        principal_cache.set(key, _snapshot(user))
+        return user
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=403, detail=f"Invalid token: {str(e)}")
+
+
+async def get_current_user_async(token: str = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    """Same as get_current_user, but resolves the user on the request's AsyncSession"""
+    try:
+        user_id, token_version = _decode_principal(token)
+        key = _principal_key(user_id, token_version)
+
+        cached = await principal_cache.aget(key)
+        if cached is not None:
+            return await db.merge(_from_snapshot(cached), load=False)
+
+        user = await db.scalar(select(User).where(User.id == user_id))
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        _check_principal(user, token_version)
+
+        await principal_cache.aset(key, _snapshot(user))
         return user
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=403, detail=f"Invalid token: {str(e)}")
+
+
+async def verify_principal(user_id: int, token_version: int):
+    """
+    Raise like the resolvers when the user behind decoded token claims is gone,
+    suspended or has had the token revoked. For code running outside a route's
+    dependencies, such as the idempotency middleware replaying a response.
+    """
+    key = _principal_key(user_id, token_version)
+    if await principal_cache.aget(key) is not None:
+        return
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(User).where(User.id == user_id))
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        _check_principal(user, token_version)
+        await principal_cache.aset(key, _snapshot(user))
+
+
+async def load_balance(db: AsyncSession, user: User) -> User:
+    """
+    Load the current balance onto a resolved user.
+    Async sessions cannot lazy-load, so async routes that read
+    user.balance call this first.
+    """
+    await db.refresh(user, ["balance_minor"])
+    return user
+
+
+# ============= CACHE INVALIDATION =============
+# Any flushed change to a cached column (profile edit, is_admin, suspension,
+# token_version bump on password reset) drops that user's entries once the
+# transaction commits.
+
+@event.listens_for(Session, "after_flush")
+def _collect_principal_changes(session, flush_context):
+    pending = session.info.setdefault("principal_invalidations", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, User) or obj.id is None:
+            continue
+        state = sa_inspect(obj)
+        deleted = obj in session.deleted
+        if not deleted and not any(
+            state.attrs[field].history.has_changes() for field in PRINCIPAL_FIELDS
+        ):
+            continue
+        versions = {v for v in state.attrs["token_version"].history.sum() if v is not None}
+        for tv in versions or {0}:
+            pending.add(_principal_key(obj.id, tv))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_principal_invalidations(session):
+    keys = session.info.pop("principal_invalidations", None)
+    if keys:
+        principal_cache.delete(*keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_invalidations(session):
+    session.info.pop("principal_invalidations", None)
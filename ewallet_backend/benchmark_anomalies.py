@@ -0,0 +1,157 @@
+"""
+Benchmark for nightly anomaly rescoring
+Seeds users with months of ordinary card and wallet activity plus planted
+anomalies (an outsized purchase, a burst of purchases within minutes, a run of
+large round transfers), runs AnomalyService over everything and reports rows
+per second, peak memory and whether every planted anomaly was flagged.
+
+Usage:
+    python benchmark_anomalies.py                                 # throwaway SQLite DB, 1M rows
+    DATABASE_URL=postgresql://.../scratch python benchmark_anomalies.py --rows 10000000 --users 200000
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="anomalies_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'benchmark.db')}"
+
+from sqlalchemy import select
+
+from database import Base, SessionLocal, engine
+from models import AnomalyFlag, Transaction, User
+from models_cards import CardTransaction, VirtualCard
+from services.anomaly_service import CHUNK_SIZE, AnomalyService
+
+TABLES = [
+    User.__table__, Transaction.__table__, VirtualCard.__table__, CardTransaction.__table__, AnomalyFlag.__table__,
+]
+BATCH = 20000
+DAYS = 90
+
+
+def seed(users: int, rows: int, planted: int):
+    """Ordinary activity split between both sources, then planted anomalies; returns what was planted"""
+    rng = random.Random(99)
+    prefix = uuid.uuid4().hex[:8]
+    start = datetime.utcnow() - timedelta(days=DAYS)
+    with engine.begin() as conn:
+        names = [f"anomaly_{prefix}_{i}" for i in range(users)]
+        user_ids = []
+        for first in range(0, users, BATCH):
+            user_ids.extend(conn.execute(
+                User.__table__.insert().returning(User.__table__.c.id),
+                [{"username": name, "email": f"{name}@example.com", "password": "x", "balance_minor": 0}
+                 for name in names[first:first + BATCH]]
+            ).scalars())
+        typical = {user_id: rng.uniform(5, 80) for user_id in user_ids}
+
+        def ordinary(count):
+            for _ in range(count):
+                index = rng.randrange(users)
+                amount = max(int(rng.lognormvariate(0, 0.4) * typical[user_ids[index]] * 100), 1)
+                yield index, amount, start + timedelta(seconds=rng.uniform(0, DAYS * 86400))
+
+        card_rows, wallet_rows = [], []
+        for index, amount, at in ordinary(rows):
+            if rng.random() < 0.5:
+                card_rows.append({"card_id": None, "user_id": user_ids[index], "amount_minor": amount,
+                                  "status": "approved", "transaction_type": "purchase", "created_at": at})
+            else:
+                wallet_rows.append({"sender": names[index], "receiver": names[rng.randrange(users)],
+                                    "amount_minor": amount, "transaction_type": "transfer",
+                                    "status": "completed", "created_at": at})
+            if len(card_rows) >= BATCH:
+                conn.execute(CardTransaction.__table__.insert(), card_rows)
+                card_rows = []
+            if len(wallet_rows) >= BATCH:
+                conn.execute(Transaction.__table__.insert(), wallet_rows)
+                wallet_rows = []
+
+        expected = {"amount_zscore": set(), "velocity_spike": set(), "round_amount": set()}
+        for victim in rng.sample(range(users), planted):
+            user_id = user_ids[victim]
+            outsized = conn.execute(CardTransaction.__table__.insert().returning(CardTransaction.__table__.c.id), {
+                "card_id": None, "user_id": user_id, "amount_minor": int(typical[user_id] * 100 * 400),
+                "status": "approved", "transaction_type": "purchase", "created_at": start + timedelta(days=45)
+            }).scalar_one()
+            expected["amount_zscore"].add(("card_transaction", outsized))
+
+            burst_at = start + timedelta(days=60)
+            burst = conn.execute(CardTransaction.__table__.insert().returning(CardTransaction.__table__.c.id), [
+                {"card_id": None, "user_id": user_id, "amount_minor": int(typical[user_id] * 100),
+                 "status": "approved", "transaction_type": "purchase", "created_at": burst_at + timedelta(minutes=n)}
+                for n in range(12)
+            ]).scalars().all()
+            expected["velocity_spike"].add(("card_transaction", burst[-1]))
+
+            rounds = conn.execute(Transaction.__table__.insert().returning(Transaction.__table__.c.id), [
+                {"sender": names[victim], "receiver": names[(victim + 1) % users], "amount_minor": 1000_00,
+                 "transaction_type": "transfer", "status": "completed", "created_at": start + timedelta(days=30, hours=n)}
+                for n in range(60)
+            ]).scalars().all()
+            expected["round_amount"].add(("transaction", rounds[-1]))
+
+        if card_rows:
+            conn.execute(CardTransaction.__table__.insert(), card_rows)
+        if wallet_rows:
+            conn.execute(Transaction.__table__.insert(), wallet_rows)
+    return expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark nightly anomaly rescoring")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Ordinary rows across both sources")
+    parser.add_argument("--users", type=int, default=20000, help="Users")
+    parser.add_argument("--planted", type=int, default=50, help="Users given planted anomalies")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows read per query")
+    args = parser.parse_args()
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    started = time.perf_counter()
+    expected = seed(args.users, args.rows, args.planted)
+    print(f"Seeded {args.rows:,} rows for {args.users:,} users in {time.perf_counter() - started:.1f}s")
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    results = AnomalyService.run(SessionLocal, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rows = sum(totals["rows"] for totals in results.values())
+    print(f"Rescored {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s, two passes each), "
+          f"peak RSS grew {(rss_after - rss_before) / 1024:.0f} MB")
+    for source, totals in results.items():
+        print(f"  {source}: {totals}")
+
+    with engine.connect() as conn:
+        found = {
+            reason: set(conn.execute(
+                select(AnomalyFlag.source, AnomalyFlag.source_id).where(AnomalyFlag.reason == reason)
+            ).all())
+            for reason in expected
+        }
+    missed = 0
+    for reason, planted in expected.items():
+        caught = len(planted & {tuple(row) for row in found[reason]})
+        missed += len(planted) - caught
+        print(f"Planted {reason}: {caught}/{len(planted)} flagged")
+
+    # A second run must leave the same flags, not duplicates
+    AnomalyService.run(SessionLocal, chunk_size=args.chunk_size)
+    with engine.connect() as conn:
+        total = conn.execute(select(AnomalyFlag.id)).all()
+    flagged = sum(count for totals in results.values() for reason, count in totals.items() if reason != "rows")
+    print(f"Flags after rerun: {len(total):,} (first run raised {flagged:,})")
+    sys.exit(1 if missed or len(total) != flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark for POS card authorization
+Seeds cards whose owners already made --history approved purchases today,
+then authorizes --auths payments through POSService.process_pos_payment and
+reports authorizations/sec, latency, SQL statements per authorization and,
+for comparison, the cost of the per-authorization SUM over today's
+card_transactions that the daily limit check used to run. Finally checks that
+every card's card_daily_spend total matches its approved transactions and
+stays within the daily limit.
+
+Usage:
+    python benchmark_card_auth.py                                 # throwaway SQLite DB
+    DATABASE_URL=postgresql://.../scratch python benchmark_card_auth.py --auths 20000 --threads 8
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="card_auth_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'benchmark.db')}"
+
+from sqlalchemy import event, func, select
+
+from database import Base, SessionLocal, engine
+from models import User
+from models_cards import CardDailySpend, CardTransaction, POSTerminal, VirtualCard
+from services.card_services import CardService, POSService
+from services.card_spend_service import CardSpendService
+from services.card_vault import CardVault
+
+TABLES = [
+    User.__table__, VirtualCard.__table__, CardTransaction.__table__,
+    CardDailySpend.__table__, POSTerminal.__table__,
+]
+BATCH = 10000
+DAILY_LIMIT_MINOR = 100000
+
+
+def seed(cards: int, history: int):
+    """Insert card owners, cards and today's prior purchases; returns (card numbers, terminal id)"""
+    prefix = uuid.uuid4().hex[:8]
+    expiry = datetime.utcnow() + timedelta(days=365 * 3)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    with engine.begin() as conn:
+        user_ids = conn.execute(
+            User.__table__.insert().returning(User.__table__.c.id),
+            [{"username": f"card_{prefix}_{i}", "email": f"card_{prefix}_{i}@example.com",
+              "password": "x", "balance_minor": 10_000_000} for i in range(cards)]
+        ).scalars().all()
+        numbers = [CardService.generate_card_number() for _ in range(cards)]
+        card_ids = conn.execute(
+            VirtualCard.__table__.insert().returning(VirtualCard.__table__.c.id),
+            [{"user_id": user_id, **CardVault.seal_card(number, "123"), "status": "active",
+              "expiry_month": expiry.month, "expiry_year": expiry.year,
+              "daily_limit_minor": DAILY_LIMIT_MINOR, "transaction_limit_minor": 50000,
+              "total_spent_minor": 0, "last_used": today, "international_enabled": True}
+             for user_id, number in zip(user_ids, numbers)]
+        ).scalars().all()
+        rows = [
+            {"card_id": card_id, "user_id": user_id, "amount_minor": 1, "status": "approved",
+             "transaction_type": "purchase", "created_at": today + timedelta(seconds=n)}
+            for card_id, user_id in zip(card_ids, user_ids)
+            for n in range(history)
+        ]
+        for start in range(0, len(rows), BATCH):
+            conn.execute(CardTransaction.__table__.insert(), rows[start:start + BATCH])
+        terminal_id = conn.execute(
+            POSTerminal.__table__.insert().returning(POSTerminal.__table__.c.id),
+            {"merchant_id": user_ids[0], "terminal_id": f"POS-{prefix}", "status": "active"}
+        ).scalar_one()
+    db = SessionLocal()
+    try:
+        CardSpendService.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    return numbers, terminal_id
+
+
+def legacy_daily_sum_ms(samples: int) -> float:
+    """Median time of the SUM over today's approved transactions the old check ran"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    db = SessionLocal()
+    try:
+        card_ids = db.scalars(select(VirtualCard.id).limit(samples)).all()
+        timings = []
+        for card_id in card_ids:
+            started = time.perf_counter()
+            db.query(func.coalesce(func.sum(CardTransaction.amount_minor), 0)).filter(
+                CardTransaction.card_id == card_id,
+                CardTransaction.created_at >= today,
+                CardTransaction.status == "approved"
+            ).scalar()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[len(timings) // 2] * 1000
+    finally:
+        db.close()
+
+
+def authorize(card_number: str, terminal_id: int, amount: float) -> tuple:
+    db = SessionLocal()
+    try:
+        terminal = db.get(POSTerminal, terminal_id)
+        started = time.perf_counter()
+        result = POSService.process_pos_payment(
+            terminal=terminal, card_number=card_number, amount=amount,
+            entry_mode="chip", merchant_name="Benchmark Store", db=db
+        )
+        return time.perf_counter() - started, result
+    finally:
+        db.close()
+
+
+def verify() -> list:
+    """Cards whose counter disagrees with their transactions, or that went over the limit"""
+    today = datetime.utcnow().date()
+    db = SessionLocal()
+    try:
+        actual = dict(db.execute(
+            select(CardTransaction.card_id, func.sum(CardTransaction.amount_minor))
+            .where(CardTransaction.status == "approved")
+            .group_by(CardTransaction.card_id)
+        ).all())
+        counters = dict(db.execute(
+            select(CardDailySpend.card_id, CardDailySpend.spent_minor).where(CardDailySpend.day == today)
+        ).all())
+        return [
+            card_id for card_id in set(actual) | set(counters)
+            if actual.get(card_id, 0) != counters.get(card_id, 0) or counters.get(card_id, 0) > DAILY_LIMIT_MINOR
+        ]
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark POS card authorization")
+    parser.add_argument("--cards", type=int, default=200, help="Cards to spread authorizations over")
+    parser.add_argument("--history", type=int, default=200, help="Approved purchases per card earlier today")
+    parser.add_argument("--auths", type=int, default=5000, help="Authorizations to run")
+    parser.add_argument("--threads", type=int, default=1, help="Terminals authorizing at the same time")
+    args = parser.parse_args()
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    numbers, terminal_id = seed(args.cards, args.history)
+    print(f"Seeded {args.cards} cards with {args.history} purchases each today")
+
+    statements = 0
+    statements_lock = threading.Lock()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(*_):
+        nonlocal statements
+        with statements_lock:
+            statements += 1
+
+    rng = random.Random(7)
+    # Amounts large enough that the busiest cards run into the daily limit
+    work = [(rng.choice(numbers), rng.choice([4.99, 12.50, 37.25, 89.00])) for _ in range(args.auths)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda item: authorize(item[0], terminal_id, item[1]), work))
+    elapsed = time.perf_counter() - started
+    event.remove(engine, "before_cursor_execute", count)
+
+    latencies = sorted(latency for latency, _ in results)
+    approved = sum(1 for _, result in results if result["approved"])
+    declines = {}
+    for _, result in results:
+        if not result["approved"]:
+            declines[result["decline_reason"]] = declines.get(result["decline_reason"], 0) + 1
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{len(results):,} authorizations in {elapsed:.2f}s ({len(results) / elapsed:,.0f}/s, "
+          f"{args.threads} threads), p50 {p50:.2f} ms, p99 {p99:.2f} ms, "
+          f"{statements / len(results):.1f} SQL statements each")
+    print(f"Approved {approved:,}, declined {declines}")
+    print(f"Old daily-limit SUM over {args.history}+ rows: {legacy_daily_sum_ms(min(args.cards, 100)):.2f} ms median")
+
+    mismatched = verify()
+    print(f"Cards with a wrong or over-limit daily total: {len(mismatched)}")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
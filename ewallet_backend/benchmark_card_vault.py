@@ -0,0 +1,125 @@
+"""
+Benchmark for the encrypted card vault
+Seeds --cards vaulted cards and measures card lookups/sec by fingerprint (one
+index probe, what POS/ATM authorization does) against the decrypt-and-compare
+scan that encrypted PANs would need without a fingerprint, plus raw
+encrypt/decrypt/fingerprint throughput. Checks every looked-up card is the
+right one and that a ciphertext cannot be moved to another field.
+
+Usage:
+    python benchmark_card_vault.py                                # throwaway SQLite DB
+    DATABASE_URL=postgresql://.../scratch python benchmark_card_vault.py --cards 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="card_vault_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'benchmark.db')}"
+
+from sqlalchemy import select
+
+from database import Base, SessionLocal, engine
+from models import User
+from models_cards import VirtualCard
+from services.card_services import CardService
+from services.card_vault import CardVault, CardVaultError
+
+TABLES = [User.__table__, VirtualCard.__table__]
+BATCH = 10000
+
+
+def seed(cards: int) -> list:
+    """Insert cards sealed by the vault; returns [(card id, card number)]"""
+    prefix = uuid.uuid4().hex[:8]
+    expiry = datetime.utcnow() + timedelta(days=365 * 3)
+    seeded = []
+    with engine.begin() as conn:
+        user_id = conn.execute(User.__table__.insert().returning(User.__table__.c.id), {
+            "username": f"vault_{prefix}", "email": f"vault_{prefix}@example.com", "password": "x",
+            "balance_minor": 0
+        }).scalar_one()
+        for first in range(0, cards, BATCH):
+            numbers = [CardService.generate_card_number() for _ in range(min(BATCH, cards - first))]
+            ids = conn.execute(
+                VirtualCard.__table__.insert().returning(VirtualCard.__table__.c.id),
+                [{"user_id": user_id, **CardVault.seal_card(number, f"{n % 1000:03d}"), "status": "active",
+                  "expiry_month": expiry.month, "expiry_year": expiry.year}
+                 for n, number in enumerate(numbers)]
+            ).scalars().all()
+            seeded.extend(zip(ids, numbers))
+    return seeded
+
+
+def rate(fn, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the encrypted card vault")
+    parser.add_argument("--cards", type=int, default=20000, help="Vaulted cards")
+    parser.add_argument("--lookups", type=int, default=5000, help="Fingerprint lookups to time")
+    parser.add_argument("--scans", type=int, default=5, help="Decrypt-and-compare scans to time")
+    args = parser.parse_args()
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    started = time.perf_counter()
+    cards = seed(args.cards)
+    print(f"Seeded {len(cards):,} cards in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(3)
+    targets = [rng.choice(cards) for _ in range(args.lookups)]
+    wrong = 0
+    db = SessionLocal()
+    try:
+        def by_fingerprint(target):
+            nonlocal wrong
+            card = db.execute(
+                select(VirtualCard).where(VirtualCard.card_number_fingerprint == CardVault.fingerprint(target[1]))
+            ).scalar_one_or_none()
+            wrong += card is None or card.id != target[0]
+            db.expunge_all()
+
+        def by_scan(target):
+            nonlocal wrong
+            for card_id, ciphertext in db.execute(select(VirtualCard.id, VirtualCard.card_number_encrypted)):
+                if CardVault.decrypt(ciphertext, "card_number") == target[1]:
+                    wrong += card_id != target[0]
+                    return
+            wrong += 1
+
+        indexed = rate(by_fingerprint, targets)
+        scanned = rate(by_scan, targets[:args.scans])
+        print(f"Lookup by fingerprint: {indexed:,.0f}/s ({1e6 / indexed:.0f} µs each)")
+        print(f"Decrypt-and-compare scan over {len(cards):,} cards: {scanned:,.2f}/s "
+              f"({1000 / scanned:.0f} ms each, {indexed / scanned:,.0f}x slower)")
+    finally:
+        db.close()
+
+    numbers = [number for _, number in cards[:args.lookups]]
+    sealed = [CardVault.encrypt(number, "card_number") for number in numbers]
+    print(f"encrypt {rate(lambda n: CardVault.encrypt(n, 'card_number'), numbers):,.0f}/s, "
+          f"decrypt {rate(lambda c: CardVault.decrypt(c, 'card_number'), sealed):,.0f}/s, "
+          f"fingerprint {rate(CardVault.fingerprint, numbers):,.0f}/s")
+
+    try:
+        CardVault.decrypt(sealed[0], "cvv")
+        moved = True
+    except CardVaultError:
+        moved = False
+    print(f"Wrong cards found: {wrong}, PAN ciphertext accepted as CVV: {moved}")
+    sys.exit(1 if wrong or moved else 0)
+
+
+if __name__ == "__main__":
+    main()
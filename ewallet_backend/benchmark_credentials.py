@@ -0,0 +1,127 @@
+"""
+Benchmark for credential hashing
+Reports hash/verify time for each KDF at the configured cost, then runs
+--logins concurrent password verifications the old way (on the event loop)
+and through the credential pool, measuring how late a 10 ms ticker on the
+loop fires meanwhile. Finally times POS terminal secret checks with a cold
+and a warm verified-secret cache.
+
+Usage:
+    python benchmark_credentials.py
+    SCRYPT_ROUNDS=16 CREDENTIAL_HASH_WORKERS=8 python benchmark_credentials.py --logins 200
+"""
+import argparse
+import asyncio
+import secrets
+import sys
+import time
+
+from passlib.context import CryptContext
+
+from config import settings
+from utils.credentials import (
+    API_SECRET, PASSWORD, SCHEMES, hash_secret, shutdown, terminal_secret_cache, verify_secret,
+    verify_secret_async, verify_terminal_secret,
+)
+
+
+def scheme_costs():
+    for scheme in SCHEMES:
+        context = CryptContext(
+            schemes=[scheme],
+            bcrypt__rounds=settings.BCRYPT_ROUNDS,
+            scrypt__rounds=settings.SCRYPT_ROUNDS,
+            argon2__rounds=settings.ARGON2_TIME_COST,
+            argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+            argon2__parallelism=settings.ARGON2_PARALLELISM,
+        )
+        try:
+            started = time.perf_counter()
+            hashed = context.hash("correct horse battery staple")
+            hashing = time.perf_counter() - started
+        except Exception as e:
+            print(f"  {scheme:<7} unavailable ({type(e).__name__}: {e})")
+            continue
+        started = time.perf_counter()
+        context.verify("correct horse battery staple", hashed)
+        print(f"  {scheme:<7} hash {hashing * 1000:7.1f} ms, verify {(time.perf_counter() - started) * 1000:7.1f} ms")
+
+
+async def ticker(stop: asyncio.Event, lags: list):
+    """How late a 10 ms sleep wakes up; any KDF on the loop shows up here"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def logins(count: int, hashed: str, offload: bool) -> tuple:
+    stop, lags = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, lags))
+    await asyncio.sleep(0.05)
+
+    async def one():
+        if offload:
+            return (await verify_secret_async(PASSWORD, "hunter2-password", hashed))[0]
+        return verify_secret(PASSWORD, "hunter2-password", hashed)[0]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one() for _ in range(count)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    return elapsed, max(lags) * 1000, all(results)
+
+
+async def terminal_checks(requests: int) -> tuple:
+    secret = secrets.token_hex(32)
+    hashed = hash_secret(API_SECRET, secret)
+    terminal_secret_cache.clear()
+    started = time.perf_counter()
+    valid, _ = await verify_terminal_secret(secret, hashed)
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(requests):
+        valid = valid and (await verify_terminal_secret(secret, hashed))[0]
+    warm = (time.perf_counter() - started) / requests
+    wrong, _ = await verify_terminal_secret(secret[:-1] + "x", hashed)
+    return cold * 1000, warm * 1e6, valid, wrong
+
+
+async def run(args) -> bool:
+    hashed = hash_secret(PASSWORD, "hunter2-password")
+    ok = True
+    for offload in (False, True):
+        elapsed, worst_lag, valid = await logins(args.logins, hashed, offload)
+        ok = ok and valid
+        label = f"pool ({settings.CREDENTIAL_HASH_POOL}, {settings.CREDENTIAL_HASH_WORKERS} workers)" if offload \
+            else "event loop"
+        print(f"{args.logins} logins on {label}: {elapsed:.2f}s ({args.logins / elapsed:,.1f}/s), "
+              f"worst loop stall {worst_lag:,.0f} ms")
+
+    cold_ms, warm_us, valid, wrong = await terminal_checks(args.terminal_requests)
+    print(f"Terminal secret ({settings.API_SECRET_HASH_SCHEME}): cold {cold_ms:.1f} ms, cached {warm_us:.1f} µs "
+          f"over {args.terminal_requests:,} requests")
+    if not valid or wrong:
+        print("Terminal secret check returned the wrong answer")
+    return ok and valid and not wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark credential hashing")
+    parser.add_argument("--logins", type=int, default=40, help="Concurrent password verifications")
+    parser.add_argument("--terminal-requests", type=int, default=10000, help="Cached terminal secret checks")
+    args = parser.parse_args()
+
+    print(f"KDF cost (BCRYPT_ROUNDS={settings.BCRYPT_ROUNDS}, SCRYPT_ROUNDS={settings.SCRYPT_ROUNDS}, "
+          f"ARGON2_TIME_COST={settings.ARGON2_TIME_COST}, ARGON2_MEMORY_COST={settings.ARGON2_MEMORY_COST}):")
+    scheme_costs()
+    try:
+        ok = asyncio.run(run(args))
+    finally:
+        shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Offline benchmark for email/SMS delivery
+Starts the local SMTP sink (delivery_sink.py) and pushes invite emails through
+NotificationService the way job_worker.py does (N concurrent handlers), then
+compares against one SMTP connection per message, the pre-pool behaviour.
+
+Usage:
+    python benchmark_delivery.py --emails 5000 --concurrency 10
+    python benchmark_delivery.py --sms 500 --sms-latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import smtplib
+import time
+
+from delivery_sink import FakeSMTPServer
+
+SINK = FakeSMTPServer().start()
+os.environ.update({
+    "DELIVERY_SINK": "true",
+    "SMTP_HOST": "127.0.0.1",
+    "SMTP_PORT": str(SINK.port),
+})
+
+from notification_service import NotificationService  # noqa: E402
+
+
+def report(label: str, count: int, elapsed: float):
+    rate = count / elapsed * 60 if elapsed else 0
+    print(f"{label:<32} {count:>7,} in {elapsed:6.2f}s  ({rate:,.0f}/min)")
+
+
+async def pooled_emails(service: NotificationService, count: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i):
+        async with semaphore:
+            ok = await service.send_money_notification(f"friend{i}@example.com", "benchmark", 25.0, "email")
+            assert ok
+
+    await asyncio.gather(*(send(i) for i in range(count)))
+
+
+def per_message_emails(service: NotificationService, count: int):
+    for i in range(count):
+        msg = service._build_email(f"friend{i}@example.com", "benchmark", "<p>hi</p>", True)
+        with smtplib.SMTP(service.smtp_host, service.smtp_port) as server:
+            server.send_message(msg)
+
+
+async def sms(service: NotificationService, count: int):
+    results = await asyncio.gather(*(
+        service.send_sms(f"+1555000{i:04d}", "benchmark") for i in range(count)
+    ))
+    assert all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark notification delivery against a local sink")
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent job handlers")
+    parser.add_argument("--bulk", type=int, default=5000, help="Recipients in one broadcast")
+    parser.add_argument("--sms", type=int, default=400)
+    parser.add_argument("--sms-latency", type=float, default=0.1, help="Simulated Twilio API latency (s)")
+    args = parser.parse_args()
+
+    service = NotificationService()
+    service.twilio_client.latency = args.sms_latency
+
+    baseline = min(args.emails, 1000)
+    started = time.perf_counter()
+    per_message_emails(service, baseline)
+    report("connection per email", baseline, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    asyncio.run(pooled_emails(service, args.emails, args.concurrency))
+    report(f"pooled, {args.concurrency} concurrent", args.emails, time.perf_counter() - started)
+
+    recipients = [f"member{i}@example.com" for i in range(args.bulk)]
+    started = time.perf_counter()
+    failed = asyncio.run(service.send_bulk_email(recipients, "benchmark", "<p>hi</p>", html=True))
+    report("bulk broadcast", args.bulk - len(failed), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    asyncio.run(sms(service, args.sms))
+    report(f"sms, {service.sms_max_concurrency} threads", args.sms, time.perf_counter() - started)
+
+    print(f"\nSink received {SINK.messages:,} messages ({SINK.bytes / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
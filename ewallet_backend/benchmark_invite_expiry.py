@@ -0,0 +1,135 @@
+"""
+Benchmark for the invite expiry job
+Seeds expired money invites (with their held-funds transactions), runs
+InviteExpiryService over them and reports throughput, SQL statements issued
+and whether every sender got exactly their refunds back.
+
+Usage:
+    python benchmark_invite_expiry.py                               # throwaway SQLite DB, 100k invites
+    DATABASE_URL=postgresql://.../scratch python benchmark_invite_expiry.py --invites 100000
+    python benchmark_invite_expiry.py --chunk-size 1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="invite_expiry_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'benchmark.db')}"
+
+from sqlalchemy import event, func, select
+
+from database import Base, SessionLocal, engine
+from models import MoneyInvite, Notification, Transaction, User, UserActivitySummary
+from models_quick_wins import TransactionSearchDocument, TransactionTag
+from services.invite_expiry_service import InviteExpiryService
+
+TABLES = [
+    User.__table__, Transaction.__table__, MoneyInvite.__table__, Notification.__table__,
+    UserActivitySummary.__table__, TransactionSearchDocument.__table__,
+    TransactionTag.__table__,  # Read by the search reindex hook when refunds commit
+]
+BATCH = 10000
+NOW = datetime.utcnow()
+
+
+def seed(users: int, invites: int) -> dict:
+    """Insert users and expired invites; returns {user_id: expected refund in minor units}"""
+    rng = random.Random(1234)
+    expected = defaultdict(int)
+    prefix = uuid.uuid4().hex[:8]
+
+    with engine.begin() as conn:
+        user_ids = []
+        for start in range(0, users, BATCH):
+            rows = [
+                {"username": f"expiry_{prefix}_{i}", "email": f"expiry_{prefix}_{i}@example.com",
+                 "password": "x", "balance_minor": 0}
+                for i in range(start, min(users, start + BATCH))
+            ]
+            user_ids.extend(conn.execute(User.__table__.insert().returning(User.__table__.c.id), rows).scalars())
+
+        for start in range(0, invites, BATCH):
+            count = min(BATCH, invites - start)
+            held, pending = [], []
+            for _ in range(count):
+                sender_index = rng.randrange(users)
+                amount = rng.randint(100, 50000)
+                expected[user_ids[sender_index]] += amount
+                held.append({
+                    "sender": f"expiry_{prefix}_{sender_index}", "receiver": None, "amount_minor": amount,
+                    "currency": "USD", "transaction_type": "money_invite", "status": "pending",
+                    "created_at": NOW - timedelta(days=2),
+                })
+                pending.append((user_ids[sender_index], amount))
+            txn_ids = conn.execute(
+                Transaction.__table__.insert().returning(Transaction.__table__.c.id), held
+            ).scalars().all()
+            conn.execute(MoneyInvite.__table__.insert(), [
+                {
+                    "sender_id": sender_id, "recipient_method": "email",
+                    "recipient_contact": f"friend{rng.randrange(10 ** 6)}@example.com",
+                    "amount_minor": amount, "transaction_id": txn_id,
+                    "status": rng.choice(["pending", "delivered", "opened"]),
+                    "invite_token": uuid.uuid4().hex, "created_at": NOW - timedelta(days=2),
+                    "expires_at": NOW - timedelta(seconds=rng.randrange(86400)),
+                }
+                for (sender_id, amount), txn_id in zip(pending, txn_ids)
+            ])
+            print(f"  seeded {start + count:,}/{invites:,}", end="\r")
+        print()
+    return expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the invite expiry job")
+    parser.add_argument("--invites", type=int, default=100000, help="Expired invites to seed")
+    parser.add_argument("--users", type=int, default=5000, help="Distinct senders")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Invites claimed per transaction")
+    args = parser.parse_args()
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    print(f"Seeding {args.invites:,} expired invites across {args.users:,} senders...")
+    expected = seed(args.users, args.invites)
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    started = time.perf_counter()
+    totals = InviteExpiryService.run(SessionLocal, now=NOW, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - started
+    event.remove(engine, "before_cursor_execute", count_statement)
+
+    with engine.connect() as conn:
+        balances = dict(conn.execute(
+            select(User.__table__.c.id, User.__table__.c.balance_minor)
+            .where(User.__table__.c.id.in_(list(expected)))
+        ).all())
+        left_open = conn.scalar(
+            select(func.count()).select_from(MoneyInvite.__table__)
+            .where(MoneyInvite.__table__.c.status.in_(["pending", "delivered", "opened"]),
+                   MoneyInvite.__table__.c.expires_at <= NOW)
+        )
+    mismatched = [user_id for user_id, amount in expected.items() if balances.get(user_id) != amount]
+
+    print(f"\nExpired {totals['expired']:,} invites in {elapsed:.2f}s "
+          f"({totals['expired'] / elapsed if elapsed else 0:,.0f} invites/s)")
+    print(f"SQL statements: {statements:,} ({statements / max(totals['expired'], 1):.3f} per invite)")
+    print(f"Refunded: ${totals['refunded_minor'] / 100:,.2f}")
+    print(f"Still open: {left_open}, sender balances wrong: {len(mismatched)}")
+    sys.exit(1 if left_open or mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Load benchmark for the hot wallet endpoints
+Measures requests/sec and latency percentiles for /transfer and /transactions
+against a running server, so the sync and async DB layers can be compared.
+
+Usage:
+    # Against the old build, then against the new one
+    python benchmark_load.py --label before --output before.json
+    python benchmark_load.py --label after --output after.json
+    python benchmark_load.py --compare before.json after.json
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(base_url: str, username: str, password: str) -> str:
+    """Log in and return a bearer token"""
+    response = requests.post(
+        f"{base_url}/login",
+        json={"username": username, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["token"]
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of a list of latencies (ms)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_scenario(name, make_request, total_requests: int, concurrency: int) -> dict:
+    """Fire total_requests calls across concurrency threads and collect timings"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def worker(i):
+        nonlocal errors
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = make_request(local.session, i)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(total_requests)))
+    wall = time.perf_counter() - started
+
+    result = {
+        "scenario": name,
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "duration_s": round(wall, 3),
+        "requests_per_sec": round(total_requests / wall, 1) if wall else 0.0,
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else 0.0,
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+    print(
+        f"  {name:<14} {result['requests_per_sec']:>8} req/s  "
+        f"p50 {result['p50_ms']:>7} ms  p99 {result['p99_ms']:>7} ms  "
+        f"errors {errors}"
+    )
+    return result
+
+
+def run_benchmark(args) -> dict:
+    token_a = login(args.base_url, args.user_a, args.password_a)
+    token_b = login(args.base_url, args.user_b, args.password_b)
+    headers = [
+        (args.user_a, args.user_b, {"Authorization": f"Bearer {token_a}"}),
+        (args.user_b, args.user_a, {"Authorization": f"Bearer {token_b}"}),
+    ]
+
+    def transfer(session, i):
+        # Alternate direction so balances stay roughly constant
+        sender, receiver, auth = headers[i % 2]
+        return session.post(
+            f"{args.base_url}/transfer",
+            json={"sender": sender, "receiver": receiver, "amount": 0.01},
+            headers=auth
+        )
+
+    def transactions(session, i):
+        return session.get(f"{args.base_url}/transactions", headers=headers[i % 2][2])
+
+    print(f"Benchmark '{args.label}' against {args.base_url}")
+    results = {
+        "label": args.label,
+        "base_url": args.base_url,
+        "scenarios": [
+            run_scenario("/transfer", transfer, args.requests, args.concurrency),
+            run_scenario("/transactions", transactions, args.requests, args.concurrency),
+        ],
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return results
+
+
+def compare(before_path: str, after_path: str):
+    """Print a side-by-side comparison of two result files"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    after_by_name = {s["scenario"]: s for s in after["scenarios"]}
+    print(f"{'scenario':<14} {'before':>10} {'after':>10} {'speedup':>8}   p99 before/after (ms)")
+    for b in before["scenarios"]:
+        a = after_by_name.get(b["scenario"])
+        if not a:
+            continue
+        speedup = a["requests_per_sec"] / b["requests_per_sec"] if b["requests_per_sec"] else 0
+        print(
+            f"{b['scenario']:<14} {b['requests_per_sec']:>10} {a['requests_per_sec']:>10} "
+            f"{speedup:>7.2f}x   {b['p99_ms']} / {a['p99_ms']}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load benchmark for /transfer and /transactions")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--user-a", default="alice")
+    parser.add_argument("--password-a", default="alice123")
+    parser.add_argument("--user-b", default="bob")
+    parser.add_argument("--password-b", default="bob123")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run_benchmark(args)
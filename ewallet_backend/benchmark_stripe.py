@@ -0,0 +1,82 @@
+"""
+Offline benchmark for Stripe calls from async routes
+Starts the local Stripe stub (stripe_stub.py) with simulated latency and runs
+N concurrent deposits, first the old way (blocking stripe.PaymentIntent.create
+inside an async function) and then through the StripeGateway, while a ticker
+task measures how long the event loop was unable to serve anything else.
+
+Usage:
+    python benchmark_stripe.py --deposits 50 --latency 0.2
+    python benchmark_stripe.py --fail-first   # every first attempt gets a retryable 500
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from stripe_stub import StripeStubServer
+
+parser = argparse.ArgumentParser(description="Benchmark Stripe calls against a local stub")
+parser.add_argument("--deposits", type=int, default=50)
+parser.add_argument("--latency", type=float, default=0.2, help="Simulated Stripe latency (s)")
+parser.add_argument("--fail-first", action="store_true", help="Fail each request's first attempt")
+args = parser.parse_args()
+
+STUB = StripeStubServer(latency=args.latency, fail_first=args.fail_first).start()
+os.environ.update({"STRIPE_API_BASE": STUB.url, "STRIPE_SECRET_KEY": "sk_test_stub"})
+
+import stripe  # noqa: E402
+
+from services.stripe_gateway import get_stripe_gateway  # noqa: E402
+from services.stripe_service import StripePaymentService  # noqa: E402
+
+DEPOSIT = {"amount": 2500, "currency": "usd", "payment_method": "pm_card_visa", "confirm": True}
+
+
+async def blocking_deposit(i: int):
+    stripe.PaymentIntent.create(**DEPOSIT)
+
+
+async def gateway_deposit(i: int):
+    result = await StripePaymentService.process_deposit(i, 25.0, "pm_card_visa", "acct_stub")
+    assert result["status"] == "succeeded"
+
+
+async def run(deposit, count: int):
+    """Run `count` concurrent deposits; returns (elapsed, worst event loop stall)"""
+    stalls = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stalls.append(time.perf_counter() - started - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(deposit(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick
+    return elapsed, max(stalls, default=0.0)
+
+
+def report(label: str, count: int, elapsed: float, stall: float):
+    print(f"{label:<28} {count:>5} deposits in {elapsed:6.2f}s   worst loop stall {stall * 1000:8.1f} ms")
+
+
+def main():
+    stripe.api_base = STUB.url
+    stripe.max_network_retries = 2
+    get_stripe_gateway()
+
+    baseline = min(args.deposits, 20)
+    report("blocking stripe.* calls", baseline, *asyncio.run(run(blocking_deposit, baseline)))
+    before = STUB.executed
+    report("StripeGateway", args.deposits, *asyncio.run(run(gateway_deposit, args.deposits)))
+    print(f"\nStub: {STUB.requests} requests, {STUB.executed - before} gateway deposits executed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark for POS terminal authentication
+Registers a terminal, then times authenticating --requests payments three
+ways: the terminal lookup plus secret KDF every time, the lookup with the
+verified-secret cache warm, and a session token (registry cache, no KDF).
+Reports per-request cost and SQL statements, then checks that a revoked
+session, a deactivated terminal and a forged token are all rejected.
+
+Usage:
+    python benchmark_terminal_sessions.py                         # throwaway SQLite DB
+    DATABASE_URL=postgresql://.../scratch python benchmark_terminal_sessions.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="terminal_sessions_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'benchmark.db')}"
+
+from sqlalchemy import event, select
+
+from database import Base, SessionLocal, engine
+from models import User
+from models_cards import POSTerminal
+from services.card_services import POSService
+from services.terminal_session_service import TerminalSessionError, TerminalSessionService, terminal_registry
+from utils.credentials import API_SECRET, shutdown, terminal_secret_cache, verify_secret, verify_terminal_secret
+
+TABLES = [User.__table__, POSTerminal.__table__]
+
+
+def register():
+    """(terminal id, api key, api secret) of a new terminal"""
+    db = SessionLocal()
+    try:
+        name = f"merchant_{uuid.uuid4().hex[:8]}"
+        merchant = User(username=name, email=f"{name}@example.com", password="x", balance_minor=0)
+        db.add(merchant)
+        db.commit()
+        terminal, api_secret = POSService.register_terminal(merchant, "Counter 1", "Main St", "1 Main St", db)
+        return terminal.terminal_id, terminal.api_key, api_secret
+    finally:
+        db.close()
+
+
+def lookup(db, terminal_id: str, api_key: str) -> POSTerminal:
+    return db.scalar(select(POSTerminal).where(
+        POSTerminal.terminal_id == terminal_id, POSTerminal.api_key == api_key, POSTerminal.status == "active"
+    ))
+
+
+def timed(label: str, requests: int, fn) -> float:
+    statements = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    per_request = (time.perf_counter() - started) / requests
+    event.remove(engine, "before_cursor_execute", count)
+    print(f"  {label:<34} {per_request * 1e6:>10,.1f} µs  {1 / per_request:>10,.0f}/s  "
+          f"{statements / requests:.1f} SQL statements each")
+    return per_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark POS terminal authentication")
+    parser.add_argument("--requests", type=int, default=5000, help="Authentications per method")
+    parser.add_argument("--kdf-requests", type=int, default=10, help="Authentications that run the KDF")
+    args = parser.parse_args()
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    terminal_id, api_key, api_secret = register()
+    loop = asyncio.new_event_loop()
+    db = SessionLocal()
+    failures = []
+    try:
+        def with_kdf():
+            terminal = lookup(db, terminal_id, api_key)
+            assert verify_secret(API_SECRET, api_secret, terminal.api_secret)[0]
+
+        def with_secret_cache():
+            terminal = lookup(db, terminal_id, api_key)
+            assert loop.run_until_complete(verify_terminal_secret(api_secret, terminal.api_secret))[0]
+
+        terminal = lookup(db, terminal_id, api_key)
+        token, _ = TerminalSessionService.issue(terminal)
+        terminal_pk = terminal.id
+
+        def with_session():
+            assert TerminalSessionService.authenticate(token, db).id == terminal_pk
+
+        print("Per-payment terminal authentication:")
+        kdf = timed("lookup + secret KDF", args.kdf_requests, with_kdf)
+        terminal_secret_cache.clear()
+        timed("lookup + verified-secret cache", args.requests, with_secret_cache)
+        session = timed("session token + registry cache", args.requests, with_session)
+        print(f"  Session tokens are {kdf / session:,.0f}x cheaper than running the KDF")
+
+        # A revoked session is rejected; a fresh one still works
+        TerminalSessionService.revoke(token)
+        try:
+            TerminalSessionService.authenticate(token, db)
+            failures.append("revoked session accepted")
+        except TerminalSessionError:
+            pass
+        token, _ = TerminalSessionService.issue(lookup(db, terminal_id, api_key))
+        TerminalSessionService.authenticate(token, db)
+
+        # Tampering with the payload breaks the signature
+        header, payload, signature = token.split(".")
+        try:
+            TerminalSessionService.authenticate(f"{header}.{payload[:-2]}AA.{signature}", db)
+            failures.append("forged session accepted")
+        except TerminalSessionError:
+            pass
+
+        # Deactivating the terminal drops its registry entry and rejects its sessions
+        db.expire_all()
+        lookup(db, terminal_id, api_key).status = "inactive"
+        db.commit()
+        try:
+            TerminalSessionService.authenticate(token, db)
+            failures.append("session of a deactivated terminal accepted")
+        except TerminalSessionError:
+            pass
+    finally:
+        db.close()
+        loop.close()
+        shutdown()
+
+    print(f"Registry cache: {terminal_registry.stats()}")
+    print(f"Rejection checks: {'ok' if not failures else ', '.join(failures)}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
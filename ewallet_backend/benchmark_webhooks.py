@@ -0,0 +1,144 @@
+"""
+Benchmark for the Stripe webhook inbox
+Delivers synthetic events the way the webhook route does (record + commit per
+delivery, every event delivered --deliveries times to mimic a Stripe replay
+storm), then drains them with JobWorker and reports acknowledgement latency,
+processing throughput and whether each object's events ran in order.
+
+The synthetic handler sleeps --handler-ms to stand in for real handler work,
+which used to be paid inside the request before Stripe got its 200.
+
+Usage:
+    python benchmark_webhooks.py                                  # throwaway SQLite DB
+    DATABASE_URL=postgresql://.../scratch python benchmark_webhooks.py --events 20000 --concurrency 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="webhook_inbox_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'benchmark.db')}"
+
+from sqlalchemy import func, select
+
+from database import Base, SessionLocal, engine
+from models import BackgroundJob, WebhookEvent
+from services.job_queue import JobWorker
+from services.webhook_handlers import on
+from services.webhook_inbox import WebhookInbox
+
+TABLES = [WebhookEvent.__table__, BackgroundJob.__table__]
+
+seen = defaultdict(list)
+seen_lock = threading.Lock()
+handler_seconds = 0.0
+
+
+@on("benchmark.tick")
+def handle_tick(event_data: dict, db):
+    time.sleep(handler_seconds)
+    with seen_lock:
+        seen[event_data["id"]].append(event_data["seq"])
+
+
+def synthetic_events(count: int, objects: int):
+    prefix = uuid.uuid4().hex[:8]
+    sequence = defaultdict(int)
+    rng = random.Random(42)
+    for i in range(count):
+        object_id = f"obj_{prefix}_{rng.randrange(objects)}"
+        sequence[object_id] += 1
+        yield {
+            "id": f"evt_{prefix}_{i}",
+            "type": "benchmark.tick",
+            "created": i,
+            "data": {"object": {"id": object_id, "seq": sequence[object_id]}},
+        }
+
+
+def deliver(events, deliveries: int):
+    """Record each delivery in its own transaction, like the route; returns ack latencies"""
+    latencies = []
+    for event in events:
+        for _ in range(deliveries):
+            started = time.perf_counter()
+            db = SessionLocal()
+            try:
+                WebhookInbox.record(db, event)
+                db.commit()
+            finally:
+                db.close()
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def drain(worker: JobWorker):
+    while True:
+        batch = await worker.run_once()
+        if not any(batch.values()):
+            # Requeued drains (object lock busy) become due LOCK_RETRY later
+            pending = await asyncio.to_thread(_pending)
+            if not pending:
+                return
+            await asyncio.sleep(0.5)
+
+
+def _pending() -> int:
+    with engine.connect() as conn:
+        return conn.scalar(
+            select(func.count()).select_from(WebhookEvent.__table__)
+            .where(WebhookEvent.__table__.c.status.in_(["received", "failed"]))
+        )
+
+
+def main():
+    global handler_seconds
+    parser = argparse.ArgumentParser(description="Benchmark the webhook inbox")
+    parser.add_argument("--events", type=int, default=5000, help="Distinct events")
+    parser.add_argument("--objects", type=int, default=500, help="Distinct Stripe objects")
+    parser.add_argument("--deliveries", type=int, default=3, help="Times each event is delivered")
+    parser.add_argument("--handler-ms", type=float, default=5.0, help="Simulated handler work")
+    parser.add_argument("--concurrency", type=int, default=10, help="Worker jobs run at the same time")
+    args = parser.parse_args()
+    handler_seconds = args.handler_ms / 1000
+    logging.getLogger("services.job_queue").setLevel(logging.ERROR)
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    events = list(synthetic_events(args.events, args.objects))
+
+    started = time.perf_counter()
+    latencies = sorted(deliver(events, args.deliveries))
+    elapsed = time.perf_counter() - started
+    with engine.connect() as conn:
+        stored = conn.scalar(select(func.count()).select_from(WebhookEvent.__table__))
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"Ingested {len(latencies):,} deliveries in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:,.0f}/s), ack p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+    print(f"Stored {stored:,} events ({len(latencies) - stored:,} duplicates dropped)")
+
+    started = time.perf_counter()
+    asyncio.run(drain(JobWorker(concurrency=args.concurrency)))
+    elapsed = time.perf_counter() - started
+    handled = sum(len(seqs) for seqs in seen.values())
+    out_of_order = [object_id for object_id, seqs in seen.items() if seqs != sorted(seqs)]
+    duplicated = [object_id for object_id, seqs in seen.items() if len(seqs) != len(set(seqs))]
+    print(f"Processed {handled:,} events in {elapsed:.2f}s ({handled / elapsed if elapsed else 0:,.0f}/s, "
+          f"{args.concurrency} concurrent, {args.handler_ms:g} ms handler)")
+    print(f"Objects out of order: {len(out_of_order)}, handled twice: {len(duplicated)}, "
+          f"still pending: {_pending()}")
+    sys.exit(1 if out_of_order or duplicated or handled != len(events) else 0)
+
+
+if __name__ == "__main__":
+    main()
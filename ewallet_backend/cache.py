@@ -0,0 +1,221 @@
+"""
+Caching helpers
+In-process TTL/LRU cache with an optional Redis backend (REDIS_ENABLED / REDIS_URL).
+Every cache reports hits and misses to Prometheus under its name.
+
+The Redis client is synchronous: coroutines use aget/aset/adelete, which run
+Redis round trips in a thread instead of on the event loop.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache lookups by cache name and result',
+    ['cache', 'result']
+)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _json_object_hook(obj):
+    if "__datetime__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class BaseCache:
+    """Hit/miss accounting shared by the backends"""
+
+    backend = "base"
+
+    def __init__(self, name: str, ttl: int):
+        self.name = name
+        self.ttl = ttl
+        self._hits = 0
+        self._misses = 0
+
+    def _record(self, hit: bool):
+        if hit:
+            self._hits += 1
+            CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+        else:
+            self._misses += 1
+            CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+
+    # In-process lookups are cheap enough to run on the event loop
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return self.get(key, default)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.set(key, value, ttl)
+
+    async def adelete(self, *keys: str):
+        self.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "name": self.name,
+            "backend": self.backend,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "ttl_seconds": self.ttl,
+        }
+
+
+class TTLCache(BaseCache):
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    backend = "memory"
+
+    def __init__(self, name: str, maxsize: int = 10000, ttl: int = 60):
+        super().__init__(name, ttl)
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self._record(True)
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self._record(False)
+            return default
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({"size": len(self._data), "maxsize": self.maxsize})
+        return stats
+
+
+class RedisCache(BaseCache):
+    """
+    Redis-backed cache shared by every worker, so an invalidation in one
+    process is seen by all of them. Values are stored as JSON.
+    Redis errors degrade to cache misses rather than failing the request.
+    """
+
+    backend = "redis"
+
+    def __init__(self, name: str, client, ttl: int = 60):
+        super().__init__(name, ttl)
+        self._client = client
+        self._prefix = f"blackwallet:{name}:"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            raw = self._client.get(self._prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis cache '{self.name}' get failed: {e}")
+            raw = None
+        if raw is None:
+            self._record(False)
+            return default
+        self._record(True)
+        return json.loads(raw, object_hook=_json_object_hook)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        try:
+            self._client.set(
+                self._prefix + key,
+                json.dumps(value, default=_json_default),
+                ex=ttl if ttl is not None else self.ttl
+            )
+        except Exception as e:
+            logger.warning(f"Redis cache '{self.name}' set failed: {e}")
+
+    def delete(self, *keys: str):
+        if not keys:
+            return
+        try:
+            self._client.delete(*[self._prefix + key for key in keys])
+        except Exception as e:
+            logger.warning(f"Redis cache '{self.name}' delete failed: {e}")
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return await asyncio.to_thread(self.get, key, default)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[int] = None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    async def adelete(self, *keys: str):
+        await asyncio.to_thread(self.delete, *keys)
+
+    def clear(self):
+        try:
+            for key in self._client.scan_iter(match=self._prefix + "*"):
+                self._client.delete(key)
+        except Exception as e:
+            logger.warning(f"Redis cache '{self.name}' clear failed: {e}")
+
+
+_redis_client = None
+
+
+def get_redis_client():
+    """Shared Redis client, or None when Redis is disabled or unreachable"""
+    global _redis_client
+    if not settings.REDIS_ENABLED:
+        return None
+    if _redis_client is None:
+        try:
+            import redis
+            client = redis.Redis.from_url(
+                settings.REDIS_URL,
+                socket_timeout=0.25,
+                socket_connect_timeout=0.25
+            )
+            client.ping()
+            _redis_client = client
+        except Exception as e:
+            logger.warning(f"Redis unavailable, falling back to in-process caches: {e}")
+            return None
+    return _redis_client
+
+
+def build_cache(name: str, maxsize: int = 10000, ttl: int = 60):
+    """Redis-backed cache when REDIS_ENABLED, otherwise an in-process TTLCache"""
+    client = get_redis_client()
+    if client is not None:
+        return RedisCache(name, client, ttl=ttl)
+    return TTLCache(name, maxsize=maxsize, ttl=ttl)
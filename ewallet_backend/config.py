@@ -35,6 +35,28 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # Credential hashing (utils/credentials.py); schemes: argon2 (needs argon2-cffi), scrypt, bcrypt
+    PASSWORD_HASH_SCHEME: str = "bcrypt"
+    PIN_HASH_SCHEME: str = "scrypt"
+    API_SECRET_HASH_SCHEME: str = "scrypt"
+    BCRYPT_ROUNDS: int = 12  # log2 of the work factor
+    SCRYPT_ROUNDS: int = 15  # log2 of N; memory is 128 * 8 * 2**rounds bytes
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 2
+    CREDENTIAL_HASH_POOL: str = "thread"  # thread or process; hashing runs here, off the event loop
+    CREDENTIAL_HASH_WORKERS: int = 4
+    TERMINAL_SECRET_CACHE_TTL: int = 60  # Seconds a verified POS terminal secret skips the KDF
+    TERMINAL_SECRET_CACHE_SIZE: int = 10000
+    
+    # POS terminal sessions (services/terminal_session_service.py)
+    POS_REQUIRE_API_SECRET: bool = True  # False lets terminals send only X-Terminal-Id/X-Api-Key while they are updated
+    TERMINAL_SESSION_TTL: int = 900  # Seconds a terminal session token is accepted
+    TERMINAL_SESSION_SECRET: Optional[str] = None  # HMAC key for session tokens (default: derived from SECRET_KEY)
+    TERMINAL_REGISTRY_TTL: int = 60  # Cached terminal rows; bounds how long a deactivated terminal keeps working
+    TERMINAL_REGISTRY_SIZE: int = 10000
+    TERMINAL_REVOCATION_CACHE_SIZE: int = 100000  # In-process only; an evicted revocation stops applying
+    
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_PER_MINUTE: int = 60
@@ -47,6 +69,43 @@ class Settings(BaseSettings):
     # Redis (for caching and rate limiting)
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_ENABLED: bool = False  # Enable in production
+    REQUIRE_REDIS: bool = False  # Refuse to start without Redis; set when running more than one worker
+    
+    # Principal cache (JWT -> user resolution)
+    PRINCIPAL_CACHE_TTL: int = 60  # Seconds; revocation lag on other workers without Redis
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    
+    # Idempotency-Key replay for money-moving POSTs
+    IDEMPOTENCY_TTL_HOURS: int = 24  # How long a key replays its stored response
+    IDEMPOTENCY_LOCK_SECONDS: int = 60  # An unfinished claim whose heartbeat is silent this long may be taken over
+    IDEMPOTENCY_HEARTBEAT_SECONDS: int = 15  # How often a running request refreshes its claim
+    
+    # Background job queue (job_worker.py)
+    JOB_QUEUE_BACKEND: str = "database"  # database or redis
+    JOB_MAX_ATTEMPTS: int = 5  # Attempts before a job is dead-lettered
+    JOB_RETRY_BASE_SECONDS: int = 30  # First retry delay; doubles per attempt
+    JOB_RETRY_MAX_SECONDS: int = 3600
+    JOB_LEASE_SECONDS: int = 300  # A claimed job not finished within this is handed to another worker
+    JOB_WORKER_IN_PROCESS: bool = False  # Run a job worker inside each app process when no job_worker.py is deployed
+    JOB_WORKER_CONCURRENCY: int = 4  # Jobs the in-process worker runs at the same time
+    
+    # Webhook inbox (services/webhook_inbox.py)
+    WEBHOOK_MAX_ATTEMPTS: int = 8  # Handler failures before an event is left dead for replay_webhooks.py
+    WEBHOOK_RETENTION_DAYS: int = 30  # Processed events kept for dedupe (Stripe redelivers for 3 days)
+    WEBHOOK_STALE_SECONDS: int = 600  # Received events still unprocessed after this get a new drain job
+    
+    # Card authorization (services/card_spend_service.py)
+    CARD_SPEND_REDIS_TTL: int = 300  # Redis copy of a card's daily spend; only used to decline early
+    RISK_DECLINE_SCORE: float = 80  # Authorizations scoring above this are declined as high risk
+    RISK_RULES_FILE: Optional[str] = None  # JSON rule list replacing the defaults in services/risk_engine.py
+    RISK_FEATURE_BACKEND: str = "auto"  # auto, memory or redis; memory windows are per worker
+    RISK_FEATURE_STORE_SIZE: int = 200000  # Cards, users and merchants with velocity windows kept in memory
+    RISK_WARM_HOURS: int = 24  # Approved card transactions replayed into the windows at startup
+    
+    # Card vault (services/card_vault.py); required in production, derived from SECRET_KEY elsewhere
+    CARD_VAULT_KEYS: Optional[str] = None  # "key_id:base64 32-byte key,..." (AES-256-GCM); old keys stay for reads
+    CARD_VAULT_ACTIVE_KEY: Optional[str] = None  # Key id new values are sealed with (default: first)
+    CARD_FINGERPRINT_KEY: Optional[str] = None  # base64 HMAC key for card number lookups; never rotate in place
     
     # Logging
     LOG_LEVEL: str = "INFO"  # DEBUG, INFO, WARNING, ERROR, CRITICAL
@@ -95,6 +154,17 @@ class Settings(BaseSettings):
     # Stripe - Mode Selector (test or live)
     STRIPE_MODE: str = "test"
     
+    # Stripe - Client (services/stripe_gateway.py)
+    STRIPE_API_BASE: Optional[str] = None  # e.g. http://127.0.0.1:12111 for stripe_stub.py
+    STRIPE_TIMEOUT_SECONDS: float = 10.0  # Per HTTP attempt
+    STRIPE_MAX_NETWORK_RETRIES: int = 2  # Retries reuse the request's Idempotency-Key
+    STRIPE_MAX_CONCURRENCY: int = 16  # Thread pool size when httpx is not installed
+    
+    # Stripe lookup caches (services/stripe_cache.py); webhooks invalidate them early
+    STRIPE_ACCOUNT_CACHE_TTL: int = 300  # Account status
+    STRIPE_BALANCE_CACHE_TTL: int = 60
+    STRIPE_BANK_ACCOUNTS_CACHE_TTL: int = 600
+    
     # Security Headers
     HSTS_MAX_AGE: int = 31536000  # 1 year
     HSTS_INCLUDE_SUBDOMAINS: bool = True
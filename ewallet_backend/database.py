@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine, event, pool
+from sqlalchemy import create_engine, event, pool, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 import logging
 import os
+import zlib
+from contextlib import contextmanager
 
 from config import settings
 
@@ -15,6 +18,20 @@ DATABASE_URL = os.getenv('DATABASE_URL') or settings.DATABASE_URL
 if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
     DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
 
+
+def get_async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = get_async_database_url(DATABASE_URL)
+
 # Database engine with production-ready configuration
 if DATABASE_URL.startswith("sqlite"):
     # SQLite configuration (development)
@@ -42,6 +59,24 @@ else:
         f"Using PostgreSQL database with pool size {settings.DATABASE_POOL_SIZE}"
     )
 
+# Async engine used by the event-loop friendly routes (see get_async_db)
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        echo=settings.DEBUG,
+        pool_pre_ping=True,
+    )
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=True,
+        echo=settings.DEBUG,
+    )
+
 
 # Enable foreign key constraints for SQLite
 @event.listens_for(Engine, "connect")
@@ -61,6 +96,14 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+# Async session factory
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
@@ -82,6 +125,45 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Async dependency for database sessions
+    Keeps DB I/O off the event loop so one worker can serve many requests
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()  # Commit if no exceptions
+        except Exception as e:
+            await db.rollback()  # Rollback on error
+            logger.error(f"Database transaction error: {e}", exc_info=True)
+            raise
+
+
+@contextmanager
+def leader_lock(name: str):
+    """
+    Yield True in exactly one process per database while the block runs, False
+    everywhere else. Backed by a PostgreSQL session advisory lock, so every
+    uvicorn worker and standalone script can start the same background job and
+    only one of them does the work. SQLite deployments run a single writer
+    process, so the lock is always granted there.
+    """
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    key = zlib.crc32(name.encode())
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+        conn.commit()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                conn.commit()
+
+
 def get_db_stats():
     """Get database connection pool statistics"""
     if hasattr(engine.pool, 'size'):
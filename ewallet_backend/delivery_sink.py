@@ -0,0 +1,110 @@
+"""
+Local delivery sink
+A minimal SMTP server and a fake Twilio client that accept and count messages
+without sending anything, so notification throughput can be measured offline.
+
+Usage:
+    python delivery_sink.py --port 1025            # run the SMTP sink in the foreground
+    DELIVERY_SINK=true SMTP_HOST=127.0.0.1 SMTP_PORT=1025 python job_worker.py
+
+NotificationService uses FakeSMSClient when DELIVERY_SINK is set.
+"""
+import argparse
+import socketserver
+import threading
+import time
+from types import SimpleNamespace
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, MAIL, RCPT, DATA, NOOP, RSET, QUIT"""
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 blackwallet-sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.reply("250-blackwallet-sink")
+                self.reply("250 8BITMIME")
+            elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    size += len(data)
+                self.server.record(size)
+                self.reply("250 OK queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """Threaded SMTP sink; counts messages and bytes received"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _SMTPHandler)
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.bytes = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def record(self, size: int):
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+    def start(self) -> "FakeSMTPServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FakeSMSClient:
+    """Stands in for twilio.rest.Client; messages.create sleeps `latency` seconds"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.sent = 0
+        self._lock = threading.Lock()
+        self.messages = self
+
+    def create(self, body: str, from_: str, to: str):
+        time.sleep(self.latency)
+        with self._lock:
+            self.sent += 1
+            return SimpleNamespace(sid=f"SM-sink-{self.sent}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(args.host, args.port)
+    print(f"SMTP sink listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{server.messages} messages, {server.bytes} bytes received")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Delivery transports
+Connection-reusing SMTP and SMS senders used by NotificationService.
+
+- SMTPPool keeps up to `size` authenticated SMTP connections open. A connection
+  idle for longer than `keepalive` seconds is checked with NOOP before reuse,
+  and a send that fails on a dead connection is retried once on a fresh one.
+  send_many() pushes a whole batch through one connection (broadcasts).
+- SMSTransport runs the blocking Twilio client in a bounded thread pool, so at
+  most `max_concurrency` API calls are in flight and the event loop never waits.
+
+Both are blocking/thread-safe at the bottom and expose async wrappers.
+"""
+import asyncio
+import logging
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.message import Message
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _broken(error: Exception) -> bool:
+    """
+    True when the connection itself failed (drop it) rather than the server
+    refusing one message (the session is still usable after RSET).
+    SMTPException subclasses OSError, so socket errors are told apart by type.
+    """
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPPool:
+    """Pool of persistent SMTP connections"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 587,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        size: int = 4,
+        keepalive: float = 30.0,
+        timeout: float = 30.0
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.ehlo()
+        if self.starttls:
+            server.starttls()
+            server.ehlo()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _reset(server: smtplib.SMTP) -> bool:
+        try:
+            server.rset()
+            return True
+        except OSError:
+            return False
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.keepalive:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except OSError:
+                pass
+            self._close(server)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a live connection; it is returned to the pool unless it broke"""
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except Exception as e:
+                if _broken(e) or not self._reset(server):
+                    self._close(server)
+                else:
+                    self._idle.put((server, time.monotonic()))
+                raise
+            else:
+                self._idle.put((server, time.monotonic()))
+
+    def send(self, message: Message):
+        """Send one message; retried once on a fresh connection if the pooled one died"""
+        for attempt in (1, 2):
+            try:
+                with self.connection() as server:
+                    server.send_message(message)
+                return
+            except OSError as e:
+                if attempt == 2 or not _broken(e):
+                    raise
+                logger.info("SMTP connection dropped, reconnecting")
+
+    def send_many(self, messages: Iterable[Message]) -> List[Message]:
+        """
+        Send a batch over one connection (reconnecting as needed).
+        Returns the messages that could not be delivered.
+        """
+        pending = list(messages)
+        failed = []
+        reconnects = 0
+        while pending:
+            try:
+                with self.connection() as server:
+                    while pending:
+                        message = pending.pop(0)
+                        try:
+                            server.send_message(message)
+                        except OSError as e:
+                            if _broken(e):
+                                pending.insert(0, message)
+                                raise
+                            failed.append(message)
+                            server.rset()
+            except OSError as e:
+                if not _broken(e):
+                    raise
+                reconnects += 1
+                if reconnects > 2:
+                    logger.error(f"SMTP batch aborted after {reconnects} reconnects: {e}")
+                    return failed + pending
+        return failed
+
+    async def send_async(self, message: Message):
+        await asyncio.to_thread(self.send, message)
+
+    async def send_many_async(self, messages: Iterable[Message]) -> List[Message]:
+        return await asyncio.to_thread(self.send_many, list(messages))
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+
+class SMSTransport:
+    """Twilio-style client (client.messages.create) behind a bounded thread pool"""
+
+    def __init__(self, client, from_number: str, max_concurrency: int = 8):
+        self.client = client
+        self.from_number = from_number
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="sms")
+
+    def send(self, to_phone: str, body: str):
+        """Blocking send; returns the provider's message object"""
+        return self.client.messages.create(body=body, from_=self.from_number, to=to_phone)
+
+    async def send_async(self, to_phone: str, body: str):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.send, to_phone, body)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,164 @@
+"""
+Query plan audit for the hot transactions queries
+Seeds a large dataset, runs EXPLAIN for every hot query and exits non-zero
+if any of them falls back to a sequential scan of the transactions table.
+
+Usage:
+    python explain_hot_queries.py                                   # throwaway SQLite DB
+    DATABASE_URL=postgresql://.../scratch python explain_hot_queries.py --rows 500000
+    DATABASE_URL=... python explain_hot_queries.py --no-seed        # audit existing data
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="explain_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'explain.db')}"
+
+from sqlalchemy import text
+
+from database import Base, engine
+from models import Transaction
+
+USERS = 2000
+DEVICES = 5000
+HISTORY_DAYS = 1095
+BATCH = 10000
+
+NOW = datetime.utcnow()
+SAMPLE_USER = "explain_user_42"
+
+# (name, SQL mirroring the ORM query, params)
+HOT_QUERIES = [
+    (
+        "wallet /transactions history",
+        "SELECT id FROM transactions WHERE sender = :u OR receiver = :u "
+        "ORDER BY created_at DESC LIMIT 50",
+        {"u": SAMPLE_USER},
+    ),
+    (
+        "search_transactions date range",
+        "SELECT id FROM transactions WHERE (sender = :u OR receiver = :u) "
+        "AND created_at >= :start AND created_at <= :end ORDER BY created_at DESC",
+        {"u": SAMPLE_USER, "start": NOW - timedelta(days=90), "end": NOW},
+    ),
+    (
+        "offline sync idempotency lookup",
+        "SELECT idempotency_key, id FROM transactions WHERE sender = :u "
+        "AND idempotency_key IN (:k1, :k2, :k3)",
+        {"u": SAMPLE_USER, "k1": "device-42:a", "k2": "device-42:b", "k3": "device-42:c"},
+    ),
+    (
+        "offline-status pending count",
+        "SELECT count(id) FROM transactions WHERE sender = :u AND is_offline = :offline "
+        "AND status = 'queued_offline'",
+        {"u": SAMPLE_USER, "offline": True},
+    ),
+    (
+        "admin inactive accounts",
+        "SELECT sender FROM transactions WHERE created_at >= :since "
+        "UNION SELECT receiver FROM transactions WHERE created_at >= :since",
+        {"since": NOW - timedelta(days=30)},
+    ),
+    (
+        "pending invites by status/type",
+        "SELECT id FROM transactions WHERE status = 'pending' AND transaction_type = 'money_invite'",
+        {},
+    ),
+    (
+        "admin daily transaction stats",
+        "SELECT count(id), sum(amount_minor) FROM transactions WHERE created_at >= :since",
+        {"since": NOW - timedelta(days=7)},
+    ),
+]
+
+
+def seed(rows: int):
+    """Insert rows synthetic transactions spread over HISTORY_DAYS"""
+    rng = random.Random(1234)
+    statuses = ["completed"] * 95 + ["pending"] * 2 + ["failed"] * 2 + ["queued_offline"]
+    types = ["internal"] * 70 + ["deposit"] * 10 + ["withdrawal"] * 10 + ["money_invite"] * 5 + ["scheduled"] * 5
+    table = Transaction.__table__
+
+    with engine.begin() as conn:
+        for start in range(0, rows, BATCH):
+            batch = []
+            for _ in range(min(BATCH, rows - start)):
+                offline = rng.random() < 0.1
+                batch.append({
+                    "sender": f"explain_user_{rng.randrange(USERS)}",
+                    "receiver": f"explain_user_{rng.randrange(USERS)}",
+                    "amount_minor": rng.randint(1, 100000),
+                    "currency": "USD",
+                    "transaction_type": rng.choice(types),
+                    "status": rng.choice(statuses),
+                    "created_at": NOW - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400)),
+                    "is_offline": offline,
+                    "device_id": f"device-{rng.randrange(DEVICES)}" if offline else None,
+                    "idempotency_key": uuid.uuid4().hex if offline else None,
+                })
+            conn.execute(table.insert(), batch)
+            print(f"  seeded {start + len(batch):,}/{rows:,}", end="\r")
+        print()
+        conn.exec_driver_sql("ANALYZE transactions")
+
+
+def explain(conn, sql: str, params: dict):
+    """Return the plan lines for one query"""
+    if engine.dialect.name == "sqlite":
+        rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).all()
+        return [row[-1] for row in rows]
+    rows = conn.execute(text("EXPLAIN " + sql), params).all()
+    return [row[0] for row in rows]
+
+
+def is_sequential_scan(line: str) -> bool:
+    if engine.dialect.name == "sqlite":
+        # "SCAN transactions" without an index is a full table scan;
+        # "SEARCH ... USING INDEX" and "SCAN ... USING INDEX" are not
+        return bool(re.search(r"\bSCAN (TABLE )?transactions\b(?!.*USING)", line))
+    return "Seq Scan on transactions" in line
+
+
+def audit() -> int:
+    failures = 0
+    with engine.connect() as conn:
+        for name, sql, params in HOT_QUERIES:
+            plan = explain(conn, sql, params)
+            bad = [line for line in plan if is_sequential_scan(line)]
+            status = "❌ SEQ SCAN" if bad else "✅"
+            print(f"\n{status} {name}")
+            for line in plan:
+                print(f"    {line}")
+            failures += bool(bad)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the hot transactions queries")
+    parser.add_argument("--rows", type=int, default=200000, help="Transactions to seed")
+    parser.add_argument("--no-seed", action="store_true", help="Audit the existing data only")
+    args = parser.parse_args()
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+    Base.metadata.create_all(bind=engine, tables=[Transaction.__table__])
+    for index in Transaction.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+    if not args.no_seed:
+        print(f"Seeding {args.rows:,} transactions...")
+        seed(args.rows)
+
+    failures = audit()
+    print(f"\n{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} hot queries use an index")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Background Job Worker
+Run this as a separate process: python job_worker.py
+
+Runs the jobs queued by request handlers (emails, SMS, invite delivery,
+Stripe webhook events; see services/job_queue.py). Several copies can run side by side; each job is
+leased to one worker at a time.
+"""
+import argparse
+import asyncio
+import logging
+
+from services.job_queue import JobWorker
+import services.notification_jobs  # noqa: F401  (registers the notification handlers)
+import services.webhook_inbox  # noqa: F401  (registers the webhook inbox drain)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def drain(worker: JobWorker):
+    """Run batches until nothing is due"""
+    totals = {"succeeded": 0, "retried": 0, "dead": 0}
+    while True:
+        batch = await worker.run_once()
+        if not any(batch.values()):
+            break
+        for key in totals:
+            totals[key] += batch[key]
+    logger.info(
+        f"✅ {totals['succeeded']} jobs succeeded, {totals['retried']} retried, {totals['dead']} dead-lettered"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued background jobs")
+    parser.add_argument("--concurrency", type=int, default=10, help="Jobs run at the same time")
+    parser.add_argument("--once", action="store_true", help="Drain what is due now and exit")
+    args = parser.parse_args()
+    
+    worker = JobWorker(concurrency=args.concurrency)
+    try:
+        asyncio.run(drain(worker) if args.once else worker.run_forever())
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from contextlib import asynccontextmanager
 import asyncio
 import logging
 
-from routes import user, wallet, admin, payment, payment_methods, auth, card_routes, quick_wins_routes, real_payments, stripe_connect, transaction_sync, invites, webhooks
+from routes import user, wallet, admin, payment, payment_methods, auth, card_routes, quick_wins_routes, real_payments, stripe_connect, transaction_sync, invites, webhooks, notifications
 from database import Base, engine
 from config import settings
 from middleware import setup_middleware, get_rate_limiter
@@ -27,6 +27,24 @@ async def lifespan(app: FastAPI):
     logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     
+    # Principal and terminal caches are per process without Redis: an invalidation
+    # (suspension, token revocation) would reach only the worker that made it
+    from cache import get_redis_client
+    if get_redis_client() is None:
+        if settings.REQUIRE_REDIS:
+            raise RuntimeError("REQUIRE_REDIS is set but Redis is not enabled or not reachable")
+        if settings.ENVIRONMENT == "production":
+            logger.warning(
+                "Redis is not enabled: auth caches are per process, so with more than one "
+                f"uvicorn worker a revoked principal may be served for up to {settings.PRINCIPAL_CACHE_TTL}s. "
+                "Run a single worker or enable Redis (set REQUIRE_REDIS to enforce it)"
+            )
+    
+    # Card numbers and CVVs are encrypted under CARD_VAULT_KEYS; refuse to run
+    # on keys derived from SECRET_KEY in production
+    from services.card_vault import CardVault
+    CardVault.check_configuration()
+    
     # Start backup scheduler if enabled
     backup_task = None
     if settings.BACKUP_ENABLED:
@@ -36,21 +54,64 @@ async def lifespan(app: FastAPI):
     # Start invite expiry scheduler
     invite_scheduler_task = None
     try:
-        from scheduler import process_expired_invites
+        from scheduler import (
+            process_expired_invites, purge_expired_idempotency_keys, purge_finished_jobs,
+            requeue_stale_webhooks, purge_processed_webhooks
+        )
         async def run_scheduler():
             import schedule
             schedule.every(5).minutes.do(process_expired_invites)
+            schedule.every(1).hours.do(purge_expired_idempotency_keys)
+            schedule.every(1).hours.do(purge_finished_jobs)
+            schedule.every(10).minutes.do(requeue_stale_webhooks)
+            schedule.every(1).hours.do(purge_processed_webhooks)
+            # Run once immediately; jobs run in a thread so a large expiry
+            # backlog never blocks the event loop
+            await asyncio.to_thread(process_expired_invites)
             while True:
-                schedule.run_pending()
+                await asyncio.to_thread(schedule.run_pending)
                 await asyncio.sleep(60)
         
+        # Every worker starts the loop; leader_lock lets one of them do the work
         invite_scheduler_task = asyncio.create_task(run_scheduler())
-        # Run once immediately
-        process_expired_invites()
         logger.info("Invite expiry scheduler started (runs every 5 minutes)")
     except Exception as e:
         logger.error(f"Failed to start invite scheduler: {e}")
     
+    # Queued jobs normally run in job_worker.py; deployments without a separate
+    # worker process run one inside each app process instead (leases keep a job
+    # on one worker at a time)
+    job_worker_task = None
+    if settings.JOB_WORKER_IN_PROCESS:
+        from services.job_queue import JobWorker
+        import services.notification_jobs  # noqa: F401  (registers the notification handlers)
+        import services.webhook_inbox  # noqa: F401  (registers the webhook inbox drain)
+        job_worker_task = asyncio.create_task(
+            JobWorker(concurrency=settings.JOB_WORKER_CONCURRENCY).run_forever()
+        )
+        logger.info("In-process job worker started")
+    
+    # Card risk scoring starts from recent card activity rather than empty windows
+    try:
+        from database import SessionLocal
+        from services.risk_engine import get_risk_engine
+        def warm_risk_engine():
+            db = SessionLocal()
+            try:
+                return get_risk_engine().warm(db, hours=settings.RISK_WARM_HOURS)
+            finally:
+                db.close()
+        loaded = await asyncio.to_thread(warm_risk_engine)
+        if get_risk_engine().store.shared:
+            logger.info("Risk engine using shared Redis velocity windows")
+        else:
+            logger.info(f"Risk engine warmed with {loaded} card transactions")
+            if settings.ENVIRONMENT == "production":
+                logger.warning("Risk velocity windows are per process without Redis; "
+                               "run a single worker or enable Redis")
+    except Exception as e:
+        logger.error(f"Failed to warm risk engine: {e}")
+    
     # Initialize Sentry for error tracking
     if settings.SENTRY_DSN:
         import sentry_sdk
@@ -79,6 +140,15 @@ async def lifespan(app: FastAPI):
             await invite_scheduler_task
         except asyncio.CancelledError:
             pass
+    if job_worker_task is not None:
+        # An interrupted job keeps its lease and is picked up again when it expires
+        job_worker_task.cancel()
+        try:
+            await job_worker_task
+        except asyncio.CancelledError:
+            pass
+    from utils import credentials
+    credentials.shutdown()
     logger.info("Application shutdown complete")
 
 
@@ -98,7 +168,7 @@ app.add_middleware(
     allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],
     allow_headers=["*"],
-    expose_headers=["X-Request-ID"]
+    expose_headers=["X-Request-ID", "Idempotent-Replayed"]
 )
 
 # Setup all security and monitoring middleware
@@ -119,6 +189,7 @@ app.include_router(stripe_connect.router, prefix="/api", tags=["stripe-connect"]
 app.include_router(transaction_sync.router, prefix="/api", tags=["transaction-sync"])
 app.include_router(invites.router, prefix="/api/invites", tags=["money-invites"])
 app.include_router(webhooks.router, prefix="/api", tags=["webhooks"])
+app.include_router(notifications.router, prefix="/api", tags=["notifications"])
 
 
 @app.get("/")
@@ -143,10 +214,13 @@ async def health_check():
         db.execute("SELECT 1")
         db.close()
         
+        from auth import principal_cache
+        
         return {
             "status": "healthy",
             "database": "connected",
-            "version": settings.APP_VERSION
+            "version": settings.APP_VERSION,
+            "principal_cache": principal_cache.stats()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}", exc_info=True)
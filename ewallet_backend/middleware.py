@@ -1,6 +1,7 @@
 """
 Production Middleware for Security, Rate Limiting, and Monitoring
 """
+import asyncio
 import time
 import logging
 from typing import Callable
@@ -16,6 +17,9 @@ from prometheus_client import Counter, Histogram
 import secrets
 
 from config import settings
+from utils.security import decode_token
+from auth import verify_principal
+from services.idempotency_service import IdempotencyService
 
 logger = logging.getLogger(__name__)
 
@@ -146,6 +150,117 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             raise
 
 
+# Money-moving endpoints that honour the Idempotency-Key header
+IDEMPOTENT_PATHS = {
+    "/transfer",
+    "/api/payment/deposit",
+    "/api/payment/withdraw",
+    "/api/stripe-connect/deposit",
+    "/api/stripe-connect/withdraw",
+    "/api/invites/send-invite",
+    "/api/transactions/sync-offline",
+    "/api/transactions/sync-batch",
+    "/api/real-payments/topup",
+    "/api/real-payments/send",
+    "/api/real-payments/withdraw",
+    "/api/cross-wallet/send",
+    "/api/payment-links/pay",
+    "/api/wallets/transfer",
+    "/api/gift-cards/redeem",
+}
+
+# Outcomes a retry should re-run rather than replay
+NON_REPLAYABLE_STATUSES = {401, 403, 409, 429}
+
+
+def _principal(request: Request):
+    """(user id, token version) from the bearer token, or (None, 0) (the route itself will reject it)"""
+    authorization = request.headers.get("Authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None, 0
+    try:
+        payload = decode_token(authorization[7:])
+        return payload.get("user_id"), payload.get("tv", 0)
+    except Exception:
+        return None, 0
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Replay the stored response for a repeated Idempotency-Key instead of moving
+    money twice. Keys are scoped per user and expire after IDEMPOTENCY_TTL_HOURS.
+    """
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        key = request.headers.get("Idempotency-Key")
+        if request.method != "POST" or not key or request.url.path not in IDEMPOTENT_PATHS:
+            return await call_next(request)
+        
+        if len(key) > 255:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": "Idempotency-Key must be at most 255 characters"}
+            )
+        
+        user_id, token_version = _principal(request)
+        if user_id is None:
+            return await call_next(request)
+        
+        body = await request.body()
+        fingerprint = IdempotencyService.request_hash(request.method, request.url.path, body)
+        existing = await IdempotencyService.claim(user_id, key, fingerprint)
+        
+        if existing is not None:
+            # A stored response skips the route, and with it authentication: make
+            # sure the token was not revoked and the account not suspended since
+            try:
+                await verify_principal(user_id, token_version)
+            except HTTPException as e:
+                return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            if existing["request_hash"] != fingerprint:
+                return JSONResponse(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    content={"detail": "Idempotency-Key was already used for a different request"}
+                )
+            if existing["status"] != "completed":
+                return JSONResponse(
+                    status_code=status.HTTP_409_CONFLICT,
+                    content={"detail": "A request with this Idempotency-Key is still in progress"}
+                )
+            logger.info(f"Replayed idempotent {request.url.path} for user {user_id}")
+            return Response(
+                content=existing["response_body"],
+                status_code=existing["response_status"],
+                media_type=existing["content_type"],
+                headers={"Idempotent-Replayed": "true"}
+            )
+        
+        # Keep the claim alive for as long as the route runs, however slow
+        heartbeat = asyncio.create_task(IdempotencyService.keep_alive(user_id, key))
+        try:
+            try:
+                response = await call_next(request)
+            except Exception:
+                await IdempotencyService.release(user_id, key)
+                raise
+            
+            if response.status_code >= 500 or response.status_code in NON_REPLAYABLE_STATUSES:
+                await IdempotencyService.release(user_id, key)
+                return response
+            
+            response_body = b"".join([chunk async for chunk in response.body_iterator])
+            await IdempotencyService.complete(
+                user_id, key, response.status_code, response_body, response.headers.get("content-type")
+            )
+        finally:
+            heartbeat.cancel()
+        return Response(
+            content=response_body,
+            status_code=response.status_code,
+            headers=dict(response.headers)
+        )
+
+
 class IPWhitelistMiddleware(BaseHTTPMiddleware):
     """Optional IP whitelist for admin endpoints"""
     
@@ -232,6 +347,9 @@ def setup_middleware(app):
         allowed_hosts=["*"]  # Configure appropriately for production
     )
     
+    # Idempotency-Key replay (inside GZip so stored bodies are uncompressed)
+    app.add_middleware(IdempotencyMiddleware)
+    
     # GZip compression
     app.add_middleware(GZipMiddleware, minimum_size=1000)
     
@@ -0,0 +1,46 @@
+"""
+Migration to add the user_activity_summary table
+Creates the table and (re)builds the daily per-account totals from transactions.
+Safe to re-run at any time as a rebuild:
+
+    python migrate_activity_summary.py                     # full rebuild
+    python migrate_activity_summary.py --since 2025-01-01  # only days >= since
+"""
+import argparse
+from datetime import date
+from database import engine, SessionLocal
+from models import UserActivitySummary
+from services.activity_summary_service import ActivitySummaryService
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_activity_summary(since: date = None):
+    """Create user_activity_summary and rebuild it from transactions"""
+    db = SessionLocal()
+    try:
+        UserActivitySummary.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ user_activity_summary table ready")
+        
+        scope = f"days >= {since}" if since else "all days"
+        logger.info(f"ℹ️  Rebuilding activity summary ({scope})...")
+        rows = ActivitySummaryService.rebuild(db, since=since)
+        db.commit()
+        
+        logger.info(f"✅ Migration complete! {rows} account-day rows written")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build user_activity_summary from transactions")
+    parser.add_argument("--since", type=date.fromisoformat, help="Only rebuild days on or after YYYY-MM-DD")
+    args = parser.parse_args()
+    migrate_activity_summary(args.since)
@@ -0,0 +1,31 @@
+"""
+Migration for batch anomaly rescoring
+Creates the anomaly_flags table rescore_anomalies.py writes into
+"""
+from database import engine
+from models import AnomalyFlag
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_anomaly_flags():
+    """Create anomaly_flags and its indexes"""
+    try:
+        AnomalyFlag.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ anomaly_flags table ready")
+        
+        for index in AnomalyFlag.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ {index.name}")
+        
+        logger.info("✅ Migration complete! Run rescore_anomalies.py to fill it")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_anomaly_flags()
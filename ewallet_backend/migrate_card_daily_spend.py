@@ -0,0 +1,47 @@
+"""
+Migration to add the card_daily_spend table
+Creates the table and (re)builds per-card daily totals from approved
+card_transactions. Safe to re-run at any time as a rebuild:
+
+    python migrate_card_daily_spend.py                     # full rebuild
+    python migrate_card_daily_spend.py --since 2025-01-01  # only days >= since
+"""
+import argparse
+from datetime import date
+from database import engine, SessionLocal
+from models import User  # noqa: F401  (card models reference users)
+from models_cards import CardDailySpend
+from services.card_spend_service import CardSpendService
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_card_daily_spend(since: date = None):
+    """Create card_daily_spend and rebuild it from card_transactions"""
+    db = SessionLocal()
+    try:
+        CardDailySpend.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ card_daily_spend table ready")
+        
+        scope = f"days >= {since}" if since else "all days"
+        logger.info(f"ℹ️  Rebuilding card daily spend ({scope})...")
+        rows = CardSpendService.rebuild(db, since=since)
+        db.commit()
+        
+        logger.info(f"✅ Migration complete! {rows} card-day rows written")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build card_daily_spend from card_transactions")
+    parser.add_argument("--since", type=date.fromisoformat, help="Only rebuild days on or after YYYY-MM-DD")
+    args = parser.parse_args()
+    migrate_card_daily_spend(args.since)
@@ -0,0 +1,132 @@
+"""
+Migration to the encrypted card vault
+Adds the encrypted PAN/CVV, fingerprint and last-4 columns to virtual_cards,
+seals every plaintext card_number/cvv into them and clears the plaintext.
+
+Usage:
+    python migrate_card_vault.py                   # seal plaintext, keep (empty) old columns
+    python migrate_card_vault.py --drop-plaintext  # ...and drop card_number / cvv
+    python migrate_card_vault.py --rotate          # re-encrypt rows sealed under an old key
+"""
+import argparse
+
+from database import SessionLocal, engine
+from sqlalchemy import text, inspect
+import logging
+
+from services.card_vault import CardVault
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VAULT_COLUMNS = [
+    ("card_number_encrypted", "VARCHAR"),
+    ("card_number_fingerprint", "VARCHAR(64)"),
+    ("card_last4", "VARCHAR(4)"),
+    ("cvv_encrypted", "VARCHAR"),
+]
+BATCH = 1000
+
+
+def migrate_card_vault(drop_plaintext: bool = False, rotate: bool = False):
+    """Seal plaintext PAN/CVV into the vault columns"""
+    db = SessionLocal()
+    inspector = inspect(engine)
+
+    try:
+        if "virtual_cards" not in inspector.get_table_names():
+            logger.info("ℹ️  virtual_cards does not exist yet, skipping (create_all will build it)")
+            return
+
+        columns = {c["name"] for c in inspector.get_columns("virtual_cards")}
+        for column, column_type in VAULT_COLUMNS:
+            if column in columns:
+                logger.info(f"ℹ️  virtual_cards.{column} already exists")
+                continue
+            db.execute(text(f"ALTER TABLE virtual_cards ADD COLUMN {column} {column_type}"))
+            logger.info(f"✅ Added virtual_cards.{column}")
+        db.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_virtual_cards_card_number_fingerprint "
+            "ON virtual_cards (card_number_fingerprint)"
+        ))
+        db.commit()
+
+        if "card_number" in columns:
+            sealed = 0
+            while True:
+                rows = db.execute(text(
+                    "SELECT id, card_number, cvv FROM virtual_cards "
+                    "WHERE card_number IS NOT NULL AND card_number_encrypted IS NULL ORDER BY id LIMIT :batch"
+                ), {"batch": BATCH}).all()
+                if not rows:
+                    break
+                db.execute(
+                    text(
+                        "UPDATE virtual_cards SET card_number_encrypted = :card_number_encrypted, "
+                        "card_number_fingerprint = :card_number_fingerprint, card_last4 = :card_last4, "
+                        "cvv_encrypted = :cvv_encrypted, card_number = NULL, cvv = NULL WHERE id = :id"
+                    ),
+                    [{"id": row.id, **CardVault.seal_card(row.card_number, row.cvv or "")} for row in rows]
+                )
+                db.commit()
+                sealed += len(rows)
+            logger.info(f"✅ Sealed {sealed} plaintext cards")
+
+            leftover = db.execute(text(
+                "SELECT COUNT(*) FROM virtual_cards WHERE card_number IS NOT NULL OR cvv IS NOT NULL"
+            )).scalar()
+            if leftover:
+                raise RuntimeError(f"{leftover} cards still hold plaintext card_number/cvv")
+
+            if drop_plaintext:
+                db.execute(text("DROP INDEX IF EXISTS ix_virtual_cards_card_number"))
+                for column in ("card_number", "cvv"):
+                    db.execute(text(f"ALTER TABLE virtual_cards DROP COLUMN {column}"))
+                    logger.info(f"✅ Dropped virtual_cards.{column}")
+                db.commit()
+
+        if rotate:
+            rotated = 0
+            last_id = 0
+            while True:
+                rows = db.execute(text(
+                    "SELECT id, card_number_encrypted, cvv_encrypted FROM virtual_cards "
+                    "WHERE id > :last_id AND card_number_encrypted IS NOT NULL ORDER BY id LIMIT :batch"
+                ), {"last_id": last_id, "batch": BATCH}).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                stale = [row for row in rows if CardVault.needs_rotation(row.card_number_encrypted)
+                         or (row.cvv_encrypted and CardVault.needs_rotation(row.cvv_encrypted))]
+                if stale:
+                    db.execute(
+                        text("UPDATE virtual_cards SET card_number_encrypted = :pan, cvv_encrypted = :cvv "
+                             "WHERE id = :id"),
+                        [{
+                            "id": row.id,
+                            "pan": CardVault.encrypt(CardVault.decrypt(row.card_number_encrypted, "card_number"),
+                                                     "card_number"),
+                            "cvv": CardVault.encrypt(CardVault.decrypt(row.cvv_encrypted, "cvv"), "cvv")
+                            if row.cvv_encrypted else None,
+                        } for row in stale]
+                    )
+                    db.commit()
+                    rotated += len(stale)
+            logger.info(f"✅ Re-encrypted {rotated} cards under the active key")
+
+        logger.info("✅ Migration complete! Card numbers and CVVs are encrypted at rest")
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encrypt card numbers and CVVs into the card vault")
+    parser.add_argument("--drop-plaintext", action="store_true", help="Drop the plaintext card_number/cvv columns")
+    parser.add_argument("--rotate", action="store_true", help="Re-encrypt values sealed under an old key")
+    args = parser.parse_args()
+    migrate_card_vault(drop_plaintext=args.drop_plaintext, rotate=args.rotate)
@@ -0,0 +1,116 @@
+"""
+Migration to integer-cents money columns
+Converts Float money columns to BIGINT minor units (cents) and adds
+currency codes, then drops the old Float columns.
+"""
+from database import SessionLocal, engine
+from sqlalchemy import text, inspect
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (table, old float column, new minor-unit column, NOT NULL DEFAULT or None)
+MONEY_COLUMNS = [
+    ("users", "balance", "balance_minor", 0),
+    ("transactions", "amount", "amount_minor", None),
+    ("money_invites", "amount", "amount_minor", None),
+    ("virtual_cards", "daily_limit", "daily_limit_minor", 100000),
+    ("virtual_cards", "transaction_limit", "transaction_limit_minor", 50000),
+    ("virtual_cards", "total_spent", "total_spent_minor", 0),
+    ("card_transactions", "amount", "amount_minor", None),
+    ("atm_transactions", "amount", "amount_minor", None),
+    ("atm_transactions", "fee", "fee_minor", 0),
+    ("gift_cards", "initial_value", "initial_value_minor", None),
+    ("gift_cards", "current_balance", "current_balance_minor", None),
+    ("cross_wallet_transactions", "amount", "amount_minor", None),
+    ("cross_wallet_transactions", "our_fee", "our_fee_minor", 0),
+    ("cross_wallet_transactions", "external_fee", "external_fee_minor", 0),
+    ("scheduled_payments", "amount", "amount_minor", None),
+    ("payment_links", "amount", "amount_minor", None),
+    ("payment_links", "total_collected", "total_collected_minor", 0),
+    ("sub_wallets", "balance", "balance_minor", 0),
+]
+
+CURRENCY_TABLES = ["users", "transactions", "sub_wallets"]
+
+
+def migrate_integer_money():
+    """Add *_minor BIGINT columns, backfill from the Float columns, drop the Float columns"""
+    db = SessionLocal()
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+
+    try:
+        for table, old_column, new_column, default in MONEY_COLUMNS:
+            if table not in tables:
+                logger.info(f"ℹ️  {table} does not exist yet, skipping (create_all will build it)")
+                continue
+
+            columns = {c["name"] for c in inspector.get_columns(table)}
+
+            if new_column not in columns:
+                ddl = f"ALTER TABLE {table} ADD COLUMN {new_column} BIGINT"
+                if default is not None:
+                    ddl += f" NOT NULL DEFAULT {default}"
+                db.execute(text(ddl))
+                logger.info(f"✅ Added {table}.{new_column}")
+            else:
+                logger.info(f"ℹ️  {table}.{new_column} already exists")
+
+            if old_column not in columns:
+                continue
+
+            # Round half away from zero to the nearest cent
+            result = db.execute(text(
+                f"UPDATE {table} SET {new_column} = CAST(ROUND({old_column} * 100) AS BIGINT) "
+                f"WHERE {old_column} IS NOT NULL"
+            ))
+            logger.info(f"✅ Backfilled {result.rowcount} rows of {table}.{new_column}")
+
+            # Report how far the float column had drifted from whole cents
+            drift = db.execute(text(
+                f"SELECT COALESCE(SUM({old_column}), 0), COALESCE(SUM({new_column}), 0) FROM {table}"
+            )).one()
+            logger.info(
+                f"   {table}.{old_column}: float total {float(drift[0]):.6f}, "
+                f"integer total {int(drift[1]) / 100:.2f}"
+            )
+
+        for table in CURRENCY_TABLES:
+            if table not in tables:
+                continue
+            if "currency" in {c["name"] for c in inspector.get_columns(table)}:
+                logger.info(f"ℹ️  {table}.currency already exists")
+                continue
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN currency VARCHAR(3) DEFAULT 'USD'"))
+            logger.info(f"✅ Added {table}.currency")
+
+        db.commit()
+
+        # Drop the Float columns once the integer copies are committed
+        for table, old_column, new_column, default in MONEY_COLUMNS:
+            if table not in tables:
+                continue
+            if old_column not in {c["name"] for c in inspect(engine).get_columns(table)}:
+                continue
+            try:
+                db.execute(text(f"ALTER TABLE {table} DROP COLUMN {old_column}"))
+                db.commit()
+                logger.info(f"✅ Dropped {table}.{old_column}")
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"⚠️  Could not drop {table}.{old_column} (left in place, unused): {e}")
+
+        logger.info("✅ Migration complete! Money is stored as integer cents")
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate_integer_money()
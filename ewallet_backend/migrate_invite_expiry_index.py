@@ -0,0 +1,28 @@
+"""
+Migration to index the invite expiry scan
+Adds the (status, expires_at) index the invite expiry job claims from
+"""
+from database import engine
+from models import MoneyInvite
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_invite_expiry_index():
+    """Create the expiry index"""
+    try:
+        for index in MoneyInvite.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ {index.name}")
+        
+        logger.info("✅ Migration complete! Invite expiry scan indexed")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_invite_expiry_index()
@@ -0,0 +1,31 @@
+"""
+Migration for the background job queue
+Creates the background_jobs table that job_worker.py claims from
+"""
+from database import engine
+from models import BackgroundJob
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_job_queue():
+    """Create background_jobs and its indexes"""
+    try:
+        BackgroundJob.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ background_jobs table ready")
+        
+        for index in BackgroundJob.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ {index.name}")
+        
+        logger.info("✅ Migration complete! Background job queue ready")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_job_queue()
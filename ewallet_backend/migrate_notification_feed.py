@@ -0,0 +1,32 @@
+"""
+Migration for broadcast-once notifications
+Creates the broadcast read-state tables and the per-user feed index
+"""
+from database import engine
+from models import Notification, NotificationReceipt, NotificationReadCursor
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_notification_feed():
+    """Create notification_receipts, notification_read_cursors and ix_notifications_user_sent"""
+    try:
+        for table in (NotificationReceipt.__table__, NotificationReadCursor.__table__):
+            table.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ {table.name} table ready")
+        
+        for index in Notification.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ {index.name}")
+        
+        logger.info("✅ Migration complete! Broadcasts are stored once from now on")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_notification_feed()
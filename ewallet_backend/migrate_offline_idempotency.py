@@ -0,0 +1,39 @@
+"""
+Migration to add idempotency keys to transactions
+Adds transactions.idempotency_key and the unique (sender, idempotency_key) index
+used by offline batch sync to dedupe retried items in one query
+"""
+from sqlalchemy import inspect, text
+from database import engine
+from models import Transaction
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_offline_idempotency():
+    """Add idempotency_key column and unique index"""
+    try:
+        columns = {column["name"] for column in inspect(engine).get_columns("transactions")}
+        if "idempotency_key" not in columns:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE transactions ADD COLUMN idempotency_key VARCHAR"))
+            logger.info("✅ Added transactions.idempotency_key")
+        else:
+            logger.info("ℹ️  transactions.idempotency_key already exists")
+        
+        for index in Transaction.__table__.indexes:
+            if index.name == "ux_transactions_sender_idempotency":
+                index.create(bind=engine, checkfirst=True)
+                logger.info(f"✅ {index.name}")
+        
+        logger.info("✅ Migration complete! Offline sync is idempotent")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_offline_idempotency()
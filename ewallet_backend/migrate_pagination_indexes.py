@@ -0,0 +1,68 @@
+"""
+Migration to add the indexes behind keyset (cursor) pagination
+Creates the (owner, created_at, id) indexes used by the paginated listing endpoints
+and makes their sort columns NOT NULL (keyset pagination cannot page past a NULL)
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from database import engine
+from models import MoneyInvite, Notification, Transaction
+from models_cards import CardTransaction
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGINATED_TABLES = [MoneyInvite.__table__, Notification.__table__, CardTransaction.__table__]
+
+# (table, sort column, fallback column for rows where it is NULL); rows with
+# neither get the epoch and land on the last page
+SORT_COLUMNS = [
+    ("transactions", "created_at", "processed_at"),
+    ("money_invites", "created_at", None),
+    ("notifications", "sent_at", None),
+    ("card_transactions", "created_at", None),
+]
+EPOCH = datetime(1970, 1, 1)
+
+
+def backfill_sort_columns():
+    """Fill NULL sort keys and, where the database allows it, add NOT NULL"""
+    existing = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for table, column, fallback in SORT_COLUMNS:
+            if table not in existing:
+                continue
+            value = f"COALESCE({fallback}, :epoch)" if fallback else ":epoch"
+            filled = conn.execute(
+                text(f"UPDATE {table} SET {column} = {value} WHERE {column} IS NULL"),
+                {"epoch": EPOCH}
+            ).rowcount
+            if engine.dialect.name == "postgresql":
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+            logger.info(f"✅ {table}.{column}: {filled} NULL values filled")
+
+
+def migrate_pagination_indexes():
+    """Create any missing pagination indexes"""
+    try:
+        backfill_sort_columns()
+        
+        for table in PAGINATED_TABLES:
+            if not inspect(engine).has_table(table.name):
+                logger.info(f"ℹ️  {table.name} does not exist yet, skipping")
+                continue
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+                logger.info(f"✅ {index.name}")
+        
+        logger.info("✅ Migration complete! Pagination indexes created")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_pagination_indexes()
@@ -0,0 +1,28 @@
+"""
+Migration to index the scheduled payment due-queue
+Adds the (status, next_execution) index the scheduled payment engine scans and claims from
+"""
+from database import engine
+from models_quick_wins import ScheduledPayment
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_scheduled_payment_queue():
+    """Create the due-queue index"""
+    try:
+        for index in ScheduledPayment.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ {index.name}")
+        
+        logger.info("✅ Migration complete! Scheduled payment queue indexed")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_scheduled_payment_queue()
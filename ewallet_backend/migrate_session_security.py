@@ -0,0 +1,43 @@
+"""
+Migration to add token versioning and account suspension
+Adds users.token_version (bumped to revoke issued JWTs) and users.is_suspended
+"""
+from database import SessionLocal, engine
+from sqlalchemy import text, inspect
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NEW_COLUMNS = [
+    ("token_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("is_suspended", "BOOLEAN DEFAULT FALSE"),
+]
+
+
+def migrate_session_security():
+    """Add token_version and is_suspended to the users table"""
+    db = SessionLocal()
+    existing = {c["name"] for c in inspect(engine).get_columns("users")}
+    
+    try:
+        for column, ddl in NEW_COLUMNS:
+            if column in existing:
+                logger.info(f"ℹ️  users.{column} already exists")
+                continue
+            db.execute(text(f"ALTER TABLE users ADD COLUMN {column} {ddl}"))
+            logger.info(f"✅ Added users.{column}")
+        
+        db.commit()
+        logger.info("✅ Migration complete! Tokens issued from now on carry a version claim")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate_session_security()
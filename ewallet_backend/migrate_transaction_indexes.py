@@ -0,0 +1,32 @@
+"""
+Migration to add composite indexes on the transactions table
+Creates the indexes declared in Transaction.__table_args__ on existing databases
+"""
+from database import engine
+from models import Transaction
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_transaction_indexes():
+    """Create any missing transactions indexes, then refresh planner statistics"""
+    try:
+        for index in sorted(Transaction.__table__.indexes, key=lambda i: i.name):
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ {index.name} ({', '.join(str(e) for e in index.expressions)})")
+        
+        # Let the planner see the new indexes' selectivity
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE transactions")
+        
+        logger.info("✅ Migration complete! Transaction indexes created")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_transaction_indexes()
@@ -0,0 +1,117 @@
+"""
+Migration to add the transaction search index
+Creates transaction_search, the native text-search indexes for the database
+(PostgreSQL tsvector + pg_trgm GIN, SQLite FTS5) and backfills every document
+"""
+from sqlalchemy import inspect, select, text
+from database import engine, SessionLocal
+from models import Transaction
+from models_quick_wins import TransactionTag, TransactionSearchDocument
+from services.search_service import TransactionSearchIndex, FTS_TABLE
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 5000
+
+POSTGRES_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_transaction_search_tsv ON transaction_search "
+    "USING GIN (to_tsvector('simple'::regconfig, document))",
+    "CREATE INDEX IF NOT EXISTS ix_transaction_search_trgm ON transaction_search "
+    "USING GIN (document gin_trgm_ops)",
+]
+
+SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"document, content='transaction_search', content_rowid='transaction_id', prefix='2 3')",
+    f"""CREATE TRIGGER IF NOT EXISTS transaction_search_ai AFTER INSERT ON transaction_search BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.transaction_id, new.document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transaction_search_ad AFTER DELETE ON transaction_search BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.transaction_id, old.document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transaction_search_au AFTER UPDATE ON transaction_search BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.transaction_id, old.document);
+        INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.transaction_id, new.document);
+    END""",
+]
+
+
+def create_search_indexes():
+    TransactionSearchDocument.__table__.create(bind=engine, checkfirst=True)
+    for index in TransactionTag.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    logger.info("✅ transaction_search table and tag index ready")
+
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except Exception as e:
+            logger.warning(f"⚠️  Could not enable pg_trgm ({e}); substring search will not use an index")
+            statements = POSTGRES_INDEXES[:1]
+        else:
+            statements = POSTGRES_INDEXES
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+        logger.info("✅ GIN search indexes created")
+
+    elif engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            for statement in SQLITE_FTS:
+                conn.execute(text(statement))
+        logger.info(f"✅ {FTS_TABLE} (FTS5) and sync triggers created")
+
+    else:
+        logger.info(f"ℹ️  No native text search for {engine.dialect.name}; search falls back to LIKE")
+
+
+def backfill_documents():
+    """Build documents for every transaction that has none yet"""
+    documents = TransactionSearchDocument.__table__
+    total = 0
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            ids = db.scalars(
+                select(Transaction.id)
+                .outerjoin(documents, documents.c.transaction_id == Transaction.id)
+                .where(Transaction.id > last_id, documents.c.transaction_id.is_(None))
+                .order_by(Transaction.id)
+                .limit(BACKFILL_BATCH)
+            ).all()
+            if not ids:
+                break
+            TransactionSearchIndex.reindex(db, ids)
+            db.commit()
+        finally:
+            db.close()
+        last_id = ids[-1]
+        total += len(ids)
+        logger.info(f"   indexed {total} transactions")
+
+    if engine.dialect.name == "sqlite" and inspect(engine).has_table(FTS_TABLE):
+        # Picks up documents written before the sync triggers existed
+        with engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    logger.info(f"✅ Backfilled {total} search documents")
+
+
+def migrate_transaction_search():
+    try:
+        create_search_indexes()
+        backfill_documents()
+        if engine.dialect.name != "sqlite":
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE transaction_search"))
+        logger.info("✅ Migration complete! Transaction search is indexed")
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_transaction_search()
@@ -0,0 +1,31 @@
+"""
+Migration for the webhook inbox
+Creates the webhook_events table the Stripe webhook route records into
+"""
+from database import engine
+from models import WebhookEvent
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_webhook_inbox():
+    """Create webhook_events and its indexes"""
+    try:
+        WebhookEvent.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ webhook_events table ready")
+        
+        for index in WebhookEvent.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ {index.name}")
+        
+        logger.info("✅ Migration complete! Webhook inbox ready")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_webhook_inbox()
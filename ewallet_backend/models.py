@@ -1,14 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Float, Boolean, Date, DateTime, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
+from money import DEFAULT_CURRENCY, major_units
 
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True)
     password = Column(String)
-    balance = Column(Float, default=0.0)
+    balance_minor = Column(BigInteger, default=0, nullable=False)  # Integer cents
+    currency = Column(String(3), default=DEFAULT_CURRENCY)
+    balance = major_units("balance_minor")  # Dollars (float view)
     is_admin = Column(Boolean, default=False)
     stripe_customer_id = Column(String, nullable=True)  # Stripe customer ID for payments
     stripe_account_id = Column(String, nullable=True)  # Stripe Connect account ID for receiving money
@@ -45,6 +48,10 @@ class User(Base):
     password_reset_token = Column(String, nullable=True)
     reset_token_expiry = Column(DateTime, nullable=True)
     
+    # Session security
+    token_version = Column(Integer, default=0, nullable=False)  # Bumped to revoke issued tokens
+    is_suspended = Column(Boolean, default=False)
+    
     # Offline mode support
     offline_mode_enabled = Column(Boolean, default=True)
     last_sync_at = Column(DateTime, nullable=True)
@@ -58,7 +65,9 @@ class Transaction(Base):
     id = Column(Integer, primary_key=True)
     sender = Column(String)
     receiver = Column(String)
-    amount = Column(Float)
+    amount_minor = Column(BigInteger)  # Integer cents
+    currency = Column(String(3), default=DEFAULT_CURRENCY)
+    amount = major_units("amount_minor")
     transaction_type = Column(String, default="internal")  # internal, deposit, withdrawal, transfer, topup, nfc_payment, money_invite
     external_provider = Column(String, nullable=True)  # stripe, paypal, etc.
     external_transaction_id = Column(String, nullable=True)  # ID from external provider
@@ -66,10 +75,11 @@ class Transaction(Base):
     stripe_transfer_id = Column(String, nullable=True)  # Stripe Transfer ID
     stripe_payout_id = Column(String, nullable=True)  # Stripe Payout ID
     status = Column(String, default="completed")  # pending, completed, failed, queued_offline, refunded
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # Keyset pagination sort key
     processed_at = Column(DateTime, nullable=True)  # When transaction was actually processed
     is_offline = Column(Boolean, default=False)  # Created while offline
     device_id = Column(String, nullable=True)  # Device that created offline transaction
+    idempotency_key = Column(String, nullable=True)  # Client-supplied key; one transaction per (sender, key)
     
     # Invite tracking fields
     invite_id = Column(Integer, nullable=True)  # Link to MoneyInvite if this is an invite transaction
@@ -77,8 +87,122 @@ class Transaction(Base):
     invite_recipient = Column(String, nullable=True)  # Email, phone, or username
     
     extra_data = Column(JSON, nullable=True)  # Additional info (renamed from metadata)
+    
+    # History lookups filter on sender/receiver (often OR'd) and sort by recency;
+    # see migrate_transaction_indexes.py and explain_hot_queries.py
+    __table_args__ = (
+        Index("ix_transactions_sender_created", "sender", created_at.desc()),
+        Index("ix_transactions_receiver_created", "receiver", created_at.desc()),
+        Index("ix_transactions_device_sender", "device_id", "sender"),
+        Index("ix_transactions_status_type", "status", "transaction_type"),
+        Index("ix_transactions_created_at", "created_at"),
+        Index("ux_transactions_sender_idempotency", "sender", "idempotency_key", unique=True),
+    )
+
+
+
+class UserActivitySummary(Base):
+    """
+    Daily per-account totals, maintained alongside every Transaction write
+    (services/activity_summary_service.py). account is the username used in
+    Transaction.sender/receiver, so external parties like stripe_card appear too.
+    """
+    __tablename__ = "user_activity_summary"
+    account = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    sent_minor = Column(BigInteger, default=0, nullable=False)
+    received_minor = Column(BigInteger, default=0, nullable=False)
+    sent_count = Column(Integer, default=0, nullable=False)
+    received_count = Column(Integer, default=0, nullable=False)
+    fees_minor = Column(BigInteger, default=0, nullable=False)  # transaction_type == "fee", charged to the sender
+    
+    __table_args__ = (
+        Index("ix_user_activity_summary_day", "day"),
+    )
+
+
+class IdempotencyKey(Base):
+    """Stored outcome of a money-moving POST, replayed for retries with the same Idempotency-Key"""
+    __tablename__ = "idempotency_keys"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # sha256 of method, path and body
+    status = Column(String, default="in_progress")  # in_progress, completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    content_type = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)  # Claim time; refreshed by the owner's heartbeat while in_progress
+    expires_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index("ux_idempotency_keys_user_key", "user_id", "key", unique=True),
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+
+class BackgroundJob(Base):
+    """Durable job for job_worker.py (see services/job_queue.py)"""
+    __tablename__ = "background_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # Job.kind of the payload type
+    payload = Column(JSON, nullable=False)
+    status = Column(String, default="queued")  # queued, running, succeeded, dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False)  # Next attempt; lease expiry while running
+    locked_by = Column(String, nullable=True)  # Worker id holding the lease
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_background_jobs_status_run_at", "status", "run_at"),
+        Index("ix_background_jobs_finished_at", "finished_at"),
+    )
+
+class WebhookEvent(Base):
+    """Inbox of received Stripe webhook events (see services/webhook_inbox.py)"""
+    __tablename__ = "webhook_events"
+    id = Column(Integer, primary_key=True, index=True)  # Arrival order
+    event_id = Column(String, unique=True, nullable=False)  # Stripe evt_ id; a redelivery is ignored
+    event_type = Column(String, nullable=False)
+    object_id = Column(String, nullable=False)  # data.object.id; one object's events run in arrival order
+    account = Column(String, nullable=True)  # Connected account for Connect events
+    payload = Column(JSON, nullable=False)
+    status = Column(String, default="received")  # received, processed, failed, dead
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_webhook_events_object_status", "object_id", "status", "id"),
+        Index("ix_webhook_events_status_received", "status", "received_at"),
+    )
 
 
+class AnomalyFlag(Base):
+    """
+    Transactions flagged by the nightly batch rescoring (services/anomaly_service.py).
+    source is "card_transaction" or "transaction"; a rerun refreshes a row's
+    flags in place and drops the ones that no longer apply.
+    """
+    __tablename__ = "anomaly_flags"
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False)
+    source_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True, index=True)
+    reason = Column(String, nullable=False)  # amount_zscore, velocity_spike, round_amount
+    score = Column(Float, nullable=False)  # z-score, rate multiple or round share, per reason
+    run_id = Column(String, nullable=False)  # Rescoring run that last raised the flag
+    flagged_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ux_anomaly_flags_source_reason", "source", "source_id", "reason", unique=True),
+        Index("ix_anomaly_flags_source_run", "source", "run_id"),
+    )
+
 class MoneyInvite(Base):
     """Money invites sent via email or phone"""
     __tablename__ = "money_invites"
@@ -92,7 +216,8 @@ class MoneyInvite(Base):
     recipient_user_id = Column(Integer, nullable=True)  # Set when recipient accepts
     
     # Transaction details
-    amount = Column(Float)
+    amount_minor = Column(BigInteger)  # Integer cents
+    amount = major_units("amount_minor")
     message = Column(String, nullable=True)  # Optional message from sender
     transaction_id = Column(Integer, nullable=True)  # Initial transaction (funds held)
     refund_transaction_id = Column(Integer, nullable=True)  # Refund transaction if expired
@@ -102,7 +227,7 @@ class MoneyInvite(Base):
     invite_token = Column(String, unique=True)  # Unique token for invite link
     
     # Tracking timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # Keyset pagination sort key
     delivered_at = Column(DateTime, nullable=True)  # When notification was delivered
     opened_at = Column(DateTime, nullable=True)  # When recipient opened the invite
     responded_at = Column(DateTime, nullable=True)  # When recipient accepted/declined
@@ -116,6 +241,13 @@ class MoneyInvite(Base):
     sms_sent = Column(Boolean, default=False)
     
     extra_data = Column(JSON, nullable=True)  # Additional metadata
+    
+    # Keyset pagination of /invites/sent (see pagination.py) and the expiry
+    # job's claim scan (services/invite_expiry_service.py)
+    __table_args__ = (
+        Index("ix_money_invites_sender_created", "sender_id", created_at.desc(), id.desc()),
+        Index("ix_money_invites_status_expires", "status", "expires_at"),
+    )
 
 
 class PaymentMethod(Base):
@@ -134,13 +266,34 @@ class Notification(Base):
     """Push notifications sent to users"""
     __tablename__ = "notifications"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=True)  # NULL for broadcast to all users
+    user_id = Column(Integer, nullable=True)  # NULL for broadcast to all users (stored once)
     title = Column(String)
     message = Column(String)
     notification_type = Column(String, default="general")  # general, transaction, promotion, system
     is_read = Column(Boolean, default=False)
-    sent_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # Keyset pagination sort key
     extra_data = Column(JSON, nullable=True)  # Additional metadata
+    
+    __table_args__ = (
+        Index("ix_notifications_sent", sent_at.desc(), id.desc()),
+        # Per-user feed; user_id IS NULL ranges the broadcasts (see services/notification_feed_service.py)
+        Index("ix_notifications_user_sent", "user_id", sent_at.desc(), id.desc()),
+    )
+
+
+class NotificationReceipt(Base):
+    """A user has read one broadcast Notification (user_id NULL); direct ones use is_read"""
+    __tablename__ = "notification_receipts"
+    user_id = Column(Integer, primary_key=True)
+    notification_id = Column(Integer, primary_key=True)
+    read_at = Column(DateTime, default=datetime.utcnow)
+
+
+class NotificationReadCursor(Base):
+    """Broadcasts sent at or before read_until count as read ("mark all as read")"""
+    __tablename__ = "notification_read_cursors"
+    user_id = Column(Integer, primary_key=True)
+    read_until = Column(DateTime, nullable=False)
 
 
 class Advertisement(Base):
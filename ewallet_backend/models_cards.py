@@ -3,9 +3,10 @@ Virtual Card System for BlackWallet
 Generates virtual cards that work with POS, ATM, and online merchants
 Compatible with Visa/Mastercard networks through tokenization
 """
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, Date, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
+from money import major_units
 from datetime import datetime, timedelta
 import secrets
 import hashlib
@@ -18,9 +19,12 @@ class VirtualCard(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     
-    # Card details (PCI compliant storage needed in production)
-    card_number = Column(String, unique=True, index=True)  # 16 digits
-    cvv = Column(String)  # 3-4 digits (encrypted in production)
+    # Card details, encrypted by services/card_vault.py; cards are looked up
+    # by the HMAC fingerprint of the PAN, never by the PAN itself
+    card_number_encrypted = Column(String)
+    card_number_fingerprint = Column(String(64), unique=True, index=True)
+    card_last4 = Column(String(4))
+    cvv_encrypted = Column(String)
     expiry_month = Column(Integer)
     expiry_year = Column(Integer)
     
@@ -34,8 +38,10 @@ class VirtualCard(Base):
     network = Column(String, default="visa")  # visa, mastercard
     
     # Limits and controls
-    daily_limit = Column(Float, default=1000.00)
-    transaction_limit = Column(Float, default=500.00)
+    daily_limit_minor = Column(BigInteger, default=100000, nullable=False)  # $1,000.00
+    transaction_limit_minor = Column(BigInteger, default=50000, nullable=False)  # $500.00
+    daily_limit = major_units("daily_limit_minor")
+    transaction_limit = major_units("transaction_limit_minor")
     atm_enabled = Column(Boolean, default=True)
     online_enabled = Column(Boolean, default=True)
     contactless_enabled = Column(Boolean, default=True)
@@ -44,7 +50,8 @@ class VirtualCard(Base):
     # Tracking
     created_at = Column(DateTime, default=datetime.utcnow)
     last_used = Column(DateTime)
-    total_spent = Column(Float, default=0.0)
+    total_spent_minor = Column(BigInteger, default=0, nullable=False)
+    total_spent = major_units("total_spent_minor")
     
     # Relationships
     user = relationship("User", foreign_keys=[user_id])  # No back_populates - one-way relationship
@@ -60,7 +67,8 @@ class CardTransaction(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     
     # Transaction details
-    amount = Column(Float)
+    amount_minor = Column(BigInteger)  # Integer cents
+    amount = major_units("amount_minor")
     currency = Column(String, default="USD")
     merchant_name = Column(String)
     merchant_category = Column(String)  # MCC code
@@ -82,12 +90,31 @@ class CardTransaction(Base):
     zip_verified = Column(Boolean, default=False)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # Keyset pagination sort key
     settled_at = Column(DateTime, nullable=True)
     
     # Relationships
     card = relationship("VirtualCard", back_populates="transactions")
     user = relationship("User", foreign_keys=[user_id])  # One-way relationship
+    
+    # Keyset pagination of /cards/{id}/transactions (see pagination.py)
+    __table_args__ = (
+        Index("ix_card_transactions_card_created", "card_id", created_at.desc(), id.desc()),
+    )
+
+
+class CardDailySpend(Base):
+    """
+    Approved card spend per (card, UTC day), kept by services/card_spend_service.py
+    in the same transaction as the CardTransaction, so authorization checks the
+    daily limit with one row instead of summing the day's transactions.
+    """
+    __tablename__ = "card_daily_spend"
+    
+    card_id = Column(Integer, ForeignKey("virtual_cards.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    spent_minor = Column(BigInteger, default=0, nullable=False)
+    transaction_count = Column(Integer, default=0, nullable=False)
 
 
 class InteracWalletConnection(Base):
@@ -128,8 +155,10 @@ class ATMTransaction(Base):
     atm_network = Column(String)  # Plus, Cirrus, Allpoint, etc.
     
     # Transaction
-    amount = Column(Float)
-    fee = Column(Float, default=0.0)  # ATM fee
+    amount_minor = Column(BigInteger)  # Integer cents
+    fee_minor = Column(BigInteger, default=0, nullable=False)  # ATM fee
+    amount = major_units("amount_minor")
+    fee = major_units("fee_minor")
     auth_code = Column(String)
     
     # Security
@@ -189,8 +218,10 @@ class GiftCardVoucher(Base):
     card_type = Column(String)  # physical, digital, promotional
     
     # Value
-    initial_value = Column(Float)
-    current_balance = Column(Float)
+    initial_value_minor = Column(BigInteger)  # Integer cents
+    current_balance_minor = Column(BigInteger)
+    initial_value = major_units("initial_value_minor")
+    current_balance = major_units("current_balance_minor")
     currency = Column(String, default="USD")
     
     # Ownership
@@ -231,13 +262,16 @@ class WalletInteroperability(Base):
     external_transaction_id = Column(String)
     
     # Transaction
-    amount = Column(Float)
+    amount_minor = Column(BigInteger)  # Integer cents
+    amount = major_units("amount_minor")
     direction = Column(String)  # inbound, outbound
     status = Column(String)  # pending, completed, failed
     
     # Fees
-    our_fee = Column(Float, default=0.0)
-    external_fee = Column(Float, default=0.0)
+    our_fee_minor = Column(BigInteger, default=0, nullable=False)
+    external_fee_minor = Column(BigInteger, default=0, nullable=False)
+    our_fee = major_units("our_fee_minor")
+    external_fee = major_units("external_fee_minor")
     
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
@@ -1,10 +1,11 @@
 """
 Enhanced Models for Quick Win Features
 """
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, DateTime, ForeignKey, JSON, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
+from money import DEFAULT_CURRENCY, major_units
 
 
 class Favorite(Base):
@@ -31,7 +32,8 @@ class ScheduledPayment(Base):
     recipient_username = Column(String)
     recipient_type = Column(String)  # username, phone, email, bank
     recipient_identifier = Column(String)
-    amount = Column(Float)
+    amount_minor = Column(BigInteger)  # Integer cents
+    amount = major_units("amount_minor")
     note = Column(String, nullable=True)
     
     # Scheduling
@@ -48,6 +50,11 @@ class ScheduledPayment(Base):
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Due-queue scan of services/scheduled_payment_engine.py
+    __table_args__ = (
+        Index("ix_scheduled_payments_status_next", "status", "next_execution"),
+    )
 
 
 class PaymentLink(Base):
@@ -59,7 +66,8 @@ class PaymentLink(Base):
     link_code = Column(String, unique=True, index=True)  # Short code for URL
     
     # Payment details
-    amount = Column(Float, nullable=True)  # Null = variable amount
+    amount_minor = Column(BigInteger, nullable=True)  # Null = variable amount
+    amount = major_units("amount_minor")
     description = Column(String, nullable=True)
     
     # Limits
@@ -72,7 +80,8 @@ class PaymentLink(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Statistics
-    total_collected = Column(Float, default=0.0)
+    total_collected_minor = Column(BigInteger, default=0, nullable=False)
+    total_collected = major_units("total_collected_minor")
 
 
 class TransactionTag(Base):
@@ -83,6 +92,19 @@ class TransactionTag(Base):
     transaction_id = Column(Integer, ForeignKey("transactions.id"))
     tag = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_transaction_tags_txn_tag", "transaction_id", "tag"),
+    )
+
+
+class TransactionSearchDocument(Base):
+    """Search text per transaction: counterparties, their names, tags and memo"""
+    __tablename__ = "transaction_search"
+    
+    transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), primary_key=True)
+    document = Column(Text, nullable=False, default="")
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 
 class SubWallet(Base):
@@ -93,7 +115,9 @@ class SubWallet(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     name = Column(String)  # Personal, Business, Savings, etc.
     wallet_type = Column(String)  # personal, business, savings
-    balance = Column(Float, default=0.0)
+    balance_minor = Column(BigInteger, default=0, nullable=False)  # Integer cents
+    currency = Column(String(3), default=DEFAULT_CURRENCY)
+    balance = major_units("balance_minor")
     
     # Settings
     icon = Column(String, default="wallet")
@@ -0,0 +1,126 @@
+"""
+Money core
+Amounts are stored as 64-bit integer minor units (cents) plus an ISO currency
+code. Money is the value type services use for arithmetic; major_units()
+exposes a minor-unit column as the float dollar attribute the API returns.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Union
+
+from sqlalchemy.ext.hybrid import hybrid_property
+
+DEFAULT_CURRENCY = "USD"
+
+# Digits after the decimal point for each supported currency
+CURRENCY_EXPONENTS = {
+    "USD": 2,
+    "CAD": 2,
+    "EUR": 2,
+    "GBP": 2,
+    "JPY": 0,
+}
+
+# Exponent used by the float compatibility attributes on the models
+MINOR_PER_MAJOR = 10 ** CURRENCY_EXPONENTS[DEFAULT_CURRENCY]
+
+
+def _exponent(currency: str) -> int:
+    try:
+        return CURRENCY_EXPONENTS[currency]
+    except KeyError:
+        raise ValueError(f"Unsupported currency: {currency}")
+
+
+def to_minor(amount: Union["Money", Decimal, float, int, str], currency: str = DEFAULT_CURRENCY) -> int:
+    """Convert a major-unit amount (e.g. 12.345 dollars) to rounded minor units (1235)"""
+    if isinstance(amount, Money):
+        return amount.minor
+    scale = Decimal(10) ** _exponent(currency)
+    return int((Decimal(str(amount)) * scale).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+@dataclass(frozen=True)
+class Money:
+    """Immutable amount in integer minor units"""
+    minor: int
+    currency: str = DEFAULT_CURRENCY
+
+    @classmethod
+    def from_major(cls, amount: Union[Decimal, float, int, str], currency: str = DEFAULT_CURRENCY) -> "Money":
+        return cls(to_minor(amount, currency), currency)
+
+    @classmethod
+    def zero(cls, currency: str = DEFAULT_CURRENCY) -> "Money":
+        return cls(0, currency)
+
+    @property
+    def major(self) -> Decimal:
+        return Decimal(self.minor).scaleb(-_exponent(self.currency))
+
+    def to_float(self) -> float:
+        """Float dollars for JSON responses"""
+        return float(self.major)
+
+    def _check(self, other: "Money") -> "Money":
+        if not isinstance(other, Money):
+            raise TypeError(f"Expected Money, got {type(other).__name__}")
+        if other.currency != self.currency:
+            raise ValueError(f"Currency mismatch: {self.currency} vs {other.currency}")
+        return other
+
+    def __add__(self, other: "Money") -> "Money":
+        return Money(self.minor + self._check(other).minor, self.currency)
+
+    def __sub__(self, other: "Money") -> "Money":
+        return Money(self.minor - self._check(other).minor, self.currency)
+
+    def __mul__(self, factor: Union[Decimal, float, int]) -> "Money":
+        """Scale by a rate (fees, percentages), rounding half-up to the minor unit"""
+        scaled = Decimal(self.minor) * Decimal(str(factor))
+        return Money(int(scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP)), self.currency)
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> "Money":
+        return Money(-self.minor, self.currency)
+
+    def __abs__(self) -> "Money":
+        return Money(abs(self.minor), self.currency)
+
+    def __lt__(self, other: "Money") -> bool:
+        return self.minor < self._check(other).minor
+
+    def __le__(self, other: "Money") -> bool:
+        return self.minor <= self._check(other).minor
+
+    def __gt__(self, other: "Money") -> bool:
+        return self.minor > self._check(other).minor
+
+    def __ge__(self, other: "Money") -> bool:
+        return self.minor >= self._check(other).minor
+
+    def __bool__(self) -> bool:
+        return self.minor != 0
+
+    def __str__(self) -> str:
+        return f"{self.major:.{_exponent(self.currency)}f} {self.currency}"
+
+
+def major_units(minor_attr: str) -> hybrid_property:
+    """
+    Float major-unit view over an integer minor-unit column.
+    Reads return dollars, writes round half-up to cents, and in SQL the
+    attribute renders as minor / 100.0 so filters and ordering keep working.
+    """
+    def fget(self):
+        value = getattr(self, minor_attr)
+        return None if value is None else value / MINOR_PER_MAJOR
+
+    def fset(self, value):
+        setattr(self, minor_attr, None if value is None else to_minor(value))
+
+    def expr(cls):
+        return getattr(cls, minor_attr) / float(MINOR_PER_MAJOR)
+
+    return hybrid_property(fget, fset, expr=expr)
@@ -1,13 +1,18 @@
 """
 Notification Service for BlackWallet
 Handles SMS (via Twilio) and Email (via SMTP) notifications
+
+Messages go through delivery_transports: a pool of persistent SMTP
+connections and a bounded thread pool around the Twilio client, so sends
+never block the event loop and never reconnect per message.
 """
 import os
-import smtplib
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import List, Optional
+
+from delivery_transports import SMTPPool, SMSTransport
 
 logger = logging.getLogger(__name__)
 
@@ -34,15 +39,45 @@ class NotificationService:
         self.smtp_username = os.getenv("SMTP_USERNAME")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         self.smtp_from_email = os.getenv("SMTP_FROM_EMAIL", self.smtp_username)
+        self.smtp_starttls = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+        self.smtp_pool_size = int(os.getenv("SMTP_POOL_SIZE", "4"))
+        self.smtp_keepalive = float(os.getenv("SMTP_KEEPALIVE_SECONDS", "30"))
+        self.sms_max_concurrency = int(os.getenv("SMS_MAX_CONCURRENCY", "8"))
+        
+        # Local sink (delivery_sink.py) for offline throughput testing
+        self.delivery_sink = os.getenv("DELIVERY_SINK", "false").lower() == "true"
         
         # Initialize Twilio client if available and configured
         self.twilio_client = None
-        if TWILIO_AVAILABLE and self.twilio_account_sid and self.twilio_auth_token:
+        if self.delivery_sink:
+            from delivery_sink import FakeSMSClient
+            self.twilio_client = FakeSMSClient()
+            self.twilio_phone_number = self.twilio_phone_number or "+15550000000"
+        elif TWILIO_AVAILABLE and self.twilio_account_sid and self.twilio_auth_token:
             try:
                 self.twilio_client = Client(self.twilio_account_sid, self.twilio_auth_token)
                 logger.info("Twilio client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Twilio client: {e}")
+        
+        self.sms_transport = None
+        if self.twilio_client:
+            self.sms_transport = SMSTransport(
+                self.twilio_client, self.twilio_phone_number, max_concurrency=self.sms_max_concurrency
+            )
+        
+        self.smtp_pool = None
+        if (self.smtp_username and self.smtp_password) or self.delivery_sink:
+            self.smtp_from_email = self.smtp_from_email or "noreply@blackwallet.com"
+            self.smtp_pool = SMTPPool(
+                self.smtp_host,
+                self.smtp_port,
+                username=None if self.delivery_sink else self.smtp_username,
+                password=None if self.delivery_sink else self.smtp_password,
+                starttls=self.smtp_starttls and not self.delivery_sink,
+                size=self.smtp_pool_size,
+                keepalive=self.smtp_keepalive
+            )
     
     async def send_sms(self, to_phone: str, message: str) -> bool:
         """
@@ -55,7 +90,7 @@ class NotificationService:
         Returns:
             bool: True if sent successfully, False otherwise
         """
-        if not self.twilio_client:
+        if not self.sms_transport:
             logger.warning("Twilio not configured. SMS cannot be sent.")
             return False
         
@@ -64,11 +99,7 @@ class NotificationService:
             if not to_phone.startswith('+'):
                 to_phone = f'+1{to_phone}'  # Default to US country code
             
-            message_obj = self.twilio_client.messages.create(
-                body=message,
-                from_=self.twilio_phone_number,
-                to=to_phone
-            )
+            message_obj = await self.sms_transport.send_async(to_phone, message)
             
             logger.info(f"SMS sent successfully to {to_phone}. SID: {message_obj.sid}")
             return True
@@ -77,6 +108,14 @@ class NotificationService:
             logger.error(f"Failed to send SMS to {to_phone}: {e}")
             return False
     
+    def _build_email(self, to_email: str, subject: str, body: str, html: bool) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.smtp_from_email
+        msg['To'] = to_email
+        msg.attach(MIMEText(body, 'html' if html else 'plain'))
+        return msg
+    
     async def send_email(self, to_email: str, subject: str, body: str, html: bool = False) -> bool:
         """
         Send email via SMTP
@@ -90,29 +129,14 @@ class NotificationService:
         Returns:
             bool: True if sent successfully, False otherwise
         """
-        if not self.smtp_username or not self.smtp_password:
+        if not self.smtp_pool:
             logger.warning("SMTP not configured. Email cannot be sent.")
             # For development, log the email instead
             logger.info(f"[DEV MODE] Would send email to {to_email}: {subject}\n{body}")
             return True  # Return True for development
         
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.smtp_from_email
-            msg['To'] = to_email
-            
-            # Attach body
-            mime_type = 'html' if html else 'plain'
-            msg.attach(MIMEText(body, mime_type))
-            
-            # Send via SMTP
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-            
+            await self.smtp_pool.send_async(self._build_email(to_email, subject, body, html))
             logger.info(f"Email sent successfully to {to_email}")
             return True
         
@@ -120,6 +144,28 @@ class NotificationService:
             logger.error(f"Failed to send email to {to_email}: {e}")
             return False
     
+    async def send_bulk_email(self, to_emails: List[str], subject: str, body: str, html: bool = False) -> List[str]:
+        """
+        Send the same email to many recipients over one pooled connection
+        
+        Args:
+            to_emails: Recipient email addresses
+            subject: Email subject
+            body: Email body content
+            html: If True, body is HTML; if False, body is plain text
+        
+        Returns:
+            List[str]: Addresses that could not be delivered
+        """
+        if not self.smtp_pool:
+            logger.info(f"[DEV MODE] Would send email to {len(to_emails)} recipients: {subject}")
+            return []
+        
+        messages = [self._build_email(to_email, subject, body, html) for to_email in to_emails]
+        failed = await self.smtp_pool.send_many_async(messages)
+        logger.info(f"Bulk email sent to {len(to_emails) - len(failed)}/{len(to_emails)} recipients")
+        return [msg['To'] for msg in failed]
+    
     async def send_password_reset_code(self, identifier: str, code: str, method: str) -> bool:
         """
         Send password reset code via SMS or Email
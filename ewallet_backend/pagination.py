@@ -0,0 +1,77 @@
+"""
+Keyset (cursor) pagination
+Pages are addressed by an opaque cursor holding the (sort key, id) of the last
+row returned, so page 1000 costs the same index range scan as page 1.
+
+    stmt = keyset(select(Transaction).where(...), Transaction.created_at, Transaction.id, cursor, limit)
+    rows = (await db.scalars(stmt)).all()
+    rows, next_cursor = page(rows, limit, "created_at")
+
+The sort column must be NOT NULL: a NULL sort key has no place in the
+(sort key, id) order, so keyset() rejects nullable columns outright.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        payload = {"t": sort_value.isoformat(), "id": row_id}
+    else:
+        payload = {"k": sort_value, "id": row_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Inverse of encode_cursor; a malformed cursor is a 400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        row_id = int(payload["id"])
+        if "t" in payload:
+            return datetime.fromisoformat(payload["t"]), row_id
+        if payload["k"] is None:
+            raise ValueError("cursor without a sort key")
+        return payload["k"], row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset(stmt, sort_col, id_col, cursor: Optional[str], limit: int):
+    """
+    Order stmt newest-first by (sort_col, id_col) and start after cursor.
+    Fetches limit + 1 rows so page() can tell whether another page exists.
+    """
+    column = getattr(sort_col, "expression", sort_col)
+    if getattr(column, "nullable", False) is True:
+        raise ValueError(f"keyset pagination needs a NOT NULL sort column, got {column}")
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            sort_col < sort_value,
+            and_(sort_col == sort_value, id_col < row_id)
+        ))
+    return stmt.order_by(sort_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def page(rows: List[Any], limit: int, sort_attr: str, id_attr: str = "id") -> Tuple[List[Any], Optional[str]]:
+    """Trim the look-ahead row and build next_cursor (None on the last page)"""
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_attr), getattr(last, id_attr))
+
+
+def page_size(default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE):
+    """Query parameter for the page size"""
+    return Query(default, ge=1, le=maximum)
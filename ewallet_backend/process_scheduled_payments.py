@@ -1,12 +1,14 @@
 """
 Background Job Processor for Scheduled Payments
 Run this as a separate process: python process_scheduled_payments.py
+
+Several copies can run side by side; due payments are claimed with
+FOR UPDATE SKIP LOCKED (see services/scheduled_payment_engine.py).
 """
-import time
+import argparse
 import logging
-from datetime import datetime
 from database import SessionLocal
-from services.quick_wins_services import ScheduledPaymentService
+from services.scheduled_payment_engine import ScheduledPaymentEngine
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,50 +17,29 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def process_scheduled_payments():
-    """Process all pending scheduled payments"""
-    db = SessionLocal()
-    
-    try:
-        pending = ScheduledPaymentService.get_pending_payments(db)
-        
-        if pending:
-            logger.info(f"Found {len(pending)} pending payments to process")
-            
-            for payment in pending:
-                logger.info(f"Processing payment {payment.id}: ${payment.amount} to {payment.recipient_identifier}")
-                
-                result = ScheduledPaymentService.execute_payment(payment, db)
-                
-                if result["success"]:
-                    logger.info(f"✅ Payment {payment.id} executed successfully")
-                else:
-                    logger.error(f"❌ Payment {payment.id} failed: {result.get('error')}")
-        else:
-            logger.debug("No pending payments to process")
-    
-    except Exception as e:
-        logger.error(f"Error processing scheduled payments: {e}", exc_info=True)
-    
-    finally:
-        db.close()
+def process_scheduled_payments(batch_size: int = 200):
+    """Execute everything due right now, then return"""
+    engine = ScheduledPaymentEngine(SessionLocal, batch_size=batch_size)
+    totals = engine.run_once()
+    logger.info(f"✅ Executed {totals['executed']} scheduled payments, {totals['failed']} failed")
+    return totals
 
 
 def main():
-    """Main loop - check every minute"""
-    logger.info("🚀 Scheduled Payment Processor started")
-    logger.info("Checking for pending payments every 60 seconds...")
+    parser = argparse.ArgumentParser(description="Execute scheduled payments")
+    parser.add_argument("--batch-size", type=int, default=200, help="Payments claimed per transaction")
+    parser.add_argument("--once", action="store_true", help="Drain what is due now and exit")
+    args = parser.parse_args()
+    
+    if args.once:
+        process_scheduled_payments(args.batch_size)
+        return
     
-    while True:
-        try:
-            process_scheduled_payments()
-            time.sleep(60)  # Check every minute
-        except KeyboardInterrupt:
-            logger.info("Shutting down...")
-            break
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}", exc_info=True)
-            time.sleep(60)
+    engine = ScheduledPaymentEngine(SessionLocal, batch_size=args.batch_size)
+    try:
+        engine.run_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
 
 
 if __name__ == "__main__":
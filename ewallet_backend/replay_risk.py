@@ -0,0 +1,179 @@
+"""
+Replay card transactions through the risk engine
+Scores historical card_transactions (from the database or a dump) in time
+order with a fresh RiskEngine, exactly as authorization would have seen them,
+and reports the score distribution, how often each rule fired and - against
+known fraud - precision and recall at one or more decline thresholds.
+Use it to tune RISK_RULES_FILE offline before shipping new thresholds.
+
+A dump is JSON lines or CSV with card_transactions columns (id, card_id,
+user_id, amount_minor or amount, merchant_name, merchant_category, entry_mode,
+status, created_at). Transactions with status "reversed" count as fraud unless
+--fraud-ids names them explicitly.
+
+Usage:
+    python replay_risk.py --print-rules > rules.json          # start from the defaults
+    python replay_risk.py --since 2025-01-01                   # database, default rules
+    python replay_risk.py --file dump.jsonl --rules rules.json --thresholds 60 70 80 90
+"""
+import argparse
+import csv
+import json
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Set
+
+from sqlalchemy import select
+
+from config import settings
+from money import to_minor
+from services.risk_engine import DEFAULT_RULES, Authorization, RiskEngine, load_rules
+
+APPROVED_STATUSES = ("approved", "reversed")  # Authorized at the time, so part of later history
+
+
+def _parse_time(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "").replace(" ", "T"))
+
+
+def load_dump(path: str) -> Iterator[Dict]:
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def load_database(since: Optional[datetime], until: Optional[datetime]) -> Iterator[Dict]:
+    from database import SessionLocal
+    from models import User  # noqa: F401  (card models reference users)
+    from models_cards import CardTransaction
+
+    columns = [
+        CardTransaction.id, CardTransaction.card_id, CardTransaction.user_id, CardTransaction.amount_minor,
+        CardTransaction.merchant_name, CardTransaction.merchant_category, CardTransaction.entry_mode,
+        CardTransaction.status, CardTransaction.created_at,
+    ]
+    stmt = select(*columns).order_by(CardTransaction.created_at, CardTransaction.id)
+    if since:
+        stmt = stmt.where(CardTransaction.created_at >= since)
+    if until:
+        stmt = stmt.where(CardTransaction.created_at < until)
+    db = SessionLocal()
+    try:
+        for row in db.execute(stmt.execution_options(yield_per=5000)):
+            yield dict(row._mapping)
+    finally:
+        db.close()
+
+
+def to_authorization(row: Dict, first_seen: Set[int]) -> Authorization:
+    card_id = int(row["card_id"])
+    amount_minor = row.get("amount_minor")
+    amount_minor = int(amount_minor) if amount_minor not in (None, "") else to_minor(row.get("amount") or 0)
+    first_use = card_id not in first_seen
+    first_seen.add(card_id)
+    return Authorization(
+        card_id=card_id,
+        user_id=int(row["user_id"]),
+        amount_minor=amount_minor,
+        merchant_name=row.get("merchant_name"),
+        merchant_category=row.get("merchant_category"),
+        entry_mode=row.get("entry_mode"),
+        international_enabled=str(row.get("international_enabled", "")).lower() in ("1", "true"),
+        first_use=first_use,
+        at=_parse_time(row["created_at"])
+    )
+
+
+def replay(rows: Iterable[Dict], engine: RiskEngine, fraud_ids: Optional[Set[str]], thresholds):
+    """Score rows (oldest first), folding each authorized one into the history"""
+    scores_by_threshold = {threshold: Counter() for threshold in thresholds}
+    rule_hits, rule_fraud_hits = Counter(), Counter()
+    histogram = Counter()
+    first_seen: Set[int] = set()
+    scored = fraud = 0
+    scoring_seconds = 0.0
+
+    for row in rows:
+        auth = to_authorization(row, first_seen)
+        started = time.perf_counter()
+        result = engine.score(auth)
+        scoring_seconds += time.perf_counter() - started
+        scored += 1
+
+        is_fraud = str(row.get("id")) in fraud_ids if fraud_ids is not None else row.get("status") == "reversed"
+        fraud += is_fraud
+        histogram[min(int(result.score // 10) * 10, 90)] += 1
+        for name in result.reasons:
+            rule_hits[name] += 1
+            rule_fraud_hits[name] += is_fraud
+        for threshold, outcome in scores_by_threshold.items():
+            flagged = result.score > threshold
+            outcome[(flagged, is_fraud)] += 1
+
+        if row.get("status") in APPROVED_STATUSES:
+            engine.observe(auth)
+
+    return scored, fraud, scoring_seconds, histogram, rule_hits, rule_fraud_hits, scores_by_threshold
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay card transactions through the risk engine")
+    parser.add_argument("--file", help="JSON lines or CSV dump instead of the database")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Database rows created on/after (ISO date)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Database rows created before (ISO date)")
+    parser.add_argument("--rules", help="JSON rule list (default: RISK_RULES_FILE or built-in rules)")
+    parser.add_argument("--fraud-ids", help="File with one fraudulent transaction id per line")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[settings.RISK_DECLINE_SCORE],
+                        help="Decline thresholds to compare")
+    parser.add_argument("--print-rules", action="store_true", help="Print the built-in rules as JSON and exit")
+    args = parser.parse_args()
+
+    if args.print_rules:
+        print(json.dumps(DEFAULT_RULES, indent=2))
+        return
+
+    fraud_ids = None
+    if args.fraud_ids:
+        with open(args.fraud_ids) as f:
+            fraud_ids = {line.strip() for line in f if line.strip()}
+
+    if args.file:
+        # Dumps come in any order; the database query is already ordered
+        rows = sorted(load_dump(args.file), key=lambda r: (_parse_time(r["created_at"]), int(r.get("id") or 0)))
+    else:
+        rows = load_database(args.since, args.until)
+    engine = RiskEngine(load_rules(args.rules), maxsize=10 ** 7)
+    scored, fraud, seconds, histogram, rule_hits, rule_fraud_hits, outcomes = replay(
+        rows, engine, fraud_ids, args.thresholds
+    )
+    if not scored:
+        print("No transactions to replay")
+        return
+
+    print(f"Scored {scored:,} transactions ({fraud:,} fraud) at {seconds / scored * 1e6:.1f} µs each")
+    print("\nScore distribution:")
+    for bucket in range(0, 100, 10):
+        count = histogram.get(bucket, 0)
+        print(f"  {bucket:>3}-{bucket + 9 if bucket < 90 else 100:<3} {count:>10,}  {count / scored:6.1%}")
+    print("\nRules (hits, fraud among hits):")
+    for rule in engine.rules:
+        hits = rule_hits.get(rule.name, 0)
+        share = f"{rule_fraud_hits[rule.name] / hits:6.1%}" if hits else "     -"
+        print(f"  {rule.name:<28} {hits:>10,}  {share}")
+    print("\nThreshold   declined   precision   recall")
+    for threshold, outcome in outcomes.items():
+        declined = outcome[(True, True)] + outcome[(True, False)]
+        precision = outcome[(True, True)] / declined if declined else 0.0
+        recall = outcome[(True, True)] / fraud if fraud else 0.0
+        print(f"  {threshold:>7g}  {declined:>9,}   {precision:9.1%}   {recall:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
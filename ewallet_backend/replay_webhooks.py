@@ -0,0 +1,85 @@
+"""
+Replay Stripe webhook events through the inbox
+Resets events in webhook_events to received and queues drain jobs for their
+objects, or ingests events exported from Stripe (one JSON event per line, or
+a JSON list, e.g. from `stripe events list`) as if they had been delivered.
+Event ids already in the inbox are skipped on ingest.
+
+Usage:
+    python replay_webhooks.py                              # every dead event
+    python replay_webhooks.py --status failed dead --since 2024-06-01
+    python replay_webhooks.py --event-id evt_123 --event-id evt_456
+    python replay_webhooks.py --object-id pi_123 --status processed
+    python replay_webhooks.py --file events.jsonl
+"""
+import argparse
+import json
+import logging
+from datetime import datetime
+
+from database import SessionLocal
+from services.webhook_inbox import WebhookInbox
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def load_events(path: str):
+    with open(path) as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    events = [json.loads(line) for line in text.splitlines() if line.strip()]
+    # `stripe events list` prints {"data": [...]} pages
+    if len(events) == 1 and "data" in events[0] and isinstance(events[0]["data"], list):
+        return events[0]["data"]
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay Stripe webhook events")
+    parser.add_argument("--event-id", action="append", help="Replay this event (repeatable)")
+    parser.add_argument("--object-id", help="Only events for this Stripe object")
+    parser.add_argument("--status", nargs="+", default=["dead"], help="Statuses to replay (default: dead)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only events received since (ISO date)")
+    parser.add_argument("--file", help="Ingest exported Stripe events instead")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be replayed")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.file:
+            events = load_events(args.file)
+            # Oldest first, so per-object ordering follows Stripe's
+            events.sort(key=lambda event: event.get("created", 0))
+            recorded = sum(WebhookInbox.record(db, event) for event in events)
+            summary = f"{recorded} of {len(events)} events ingested ({len(events) - recorded} already in the inbox)"
+        else:
+            object_ids = WebhookInbox.replay(
+                db,
+                event_ids=args.event_id,
+                object_id=args.object_id,
+                statuses=args.status,
+                since=args.since
+            )
+            summary = f"Events for {len(object_ids)} objects queued for replay"
+
+        if args.dry_run:
+            db.rollback()
+            logger.info(f"Dry run: {summary}")
+        else:
+            db.commit()
+            logger.info(f"✅ {summary}; job_worker.py will process them")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Replay failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Nightly anomaly rescoring
+Rescores card_transactions and transactions and refreshes anomaly_flags
+(see services/anomaly_service.py). Run it from cron once a night; a run that
+starts while another is still going exits without doing anything.
+
+Usage:
+    python rescore_anomalies.py                                   # everything
+    python rescore_anomalies.py --source card_transaction --since 2025-01-01
+    python rescore_anomalies.py --chunk-size 500000
+"""
+import argparse
+import logging
+import time
+from datetime import datetime
+
+from database import SessionLocal, leader_lock
+from services.anomaly_service import CHUNK_SIZE, SOURCES, AnomalyService
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def rescore_anomalies(sources=SOURCES, since: datetime = None, chunk_size: int = CHUNK_SIZE):
+    """Rescore the given sources unless another run holds the lock"""
+    with leader_lock("rescore_anomalies") as leader:
+        if not leader:
+            logger.info("ℹ️  Anomaly rescoring already running elsewhere")
+            return None
+        started = time.perf_counter()
+        results = AnomalyService.run(SessionLocal, sources=sources, since=since, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+    rows = sum(totals["rows"] for totals in results.values())
+    flagged = sum(count for totals in results.values() for reason, count in totals.items() if reason != "rows")
+    logger.info(f"✅ Rescored {rows:,} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f}/s), "
+                f"{flagged:,} flags")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescore transactions into anomaly_flags")
+    parser.add_argument("--source", choices=SOURCES, action="append", help="Only this source (repeatable)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only rows created on/after (ISO date)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows read per query")
+    args = parser.parse_args()
+    try:
+        rescore_anomalies(args.source or SOURCES, args.since, args.chunk_size)
+    except Exception as e:
+        logger.error(f"❌ Anomaly rescoring failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
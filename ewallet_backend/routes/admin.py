@@ -3,27 +3,35 @@ Admin API Routes
 Comprehensive admin panel for managing users, balances, monitoring, and system configuration
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, desc, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime, timedelta
 import logging
 
-from database import get_db
+from database import get_async_db
 from models import (
     User, Transaction, Notification, Advertisement, 
     Promotion, CustomerMessage, PromotionUsage
 )
-from auth import get_current_user
-from utils.security import hash_password
+from auth import get_current_user_async
+from utils.security import hash_password_async
 from config import settings
+from money import MINOR_PER_MAJOR
+from pagination import keyset, page, page_size
+from services.activity_summary_service import ActivitySummaryService
+from services.analytics_service import AnalyticsService
+from services.job_queue import JobQueue
+from services.notification_feed_service import NotificationFeedService
+from services.notification_jobs import BroadcastEmail
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-def require_admin(current_user: User = Depends(get_current_user)):
+async def require_admin(current_user: User = Depends(get_current_user_async)):
     """Dependency to ensure user is an admin"""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
@@ -54,30 +62,35 @@ class StripeModeRequest(BaseModel):
 
 @router.get("/users")
 async def get_all_users(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    limit: int = page_size(100, 1000),
     search: Optional[str] = None,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get paginated list of all users with optional search"""
-    query = db.query(User)
+    """Get cursor-paginated list of all users (newest first) with optional search"""
+    query = select(User)
     
     if search:
         search_pattern = f"%{search}%"
-        query = query.filter(
+        query = query.where(
             (User.username.like(search_pattern)) |
             (User.email.like(search_pattern)) |
             (User.full_name.like(search_pattern))
         )
     
-    total = query.count()
-    users = query.offset(skip).limit(limit).all()
+    # Only the first page pays for the count
+    total = None
+    if not cursor:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    # account_created_at is NULL for pre-profile accounts, so page on id alone
+    rows = (await db.scalars(keyset(query, User.id, User.id, cursor, limit))).all()
+    users, next_cursor = page(rows, limit, "id")
     
     return {
         "total": total,
-        "skip": skip,
         "limit": limit,
+        "next_cursor": next_cursor,
         "users": [
             {
                 "id": user.id,
@@ -98,30 +111,27 @@ async def get_all_users(
 async def get_user_details(
     user_id: int,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get detailed information about a specific user"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get recent transactions
-    recent_transactions = db.query(Transaction).filter(
-        (Transaction.sender_id == user_id) | (Transaction.recipient_id == user_id)
-    ).order_by(desc(Transaction.timestamp)).limit(20).all()
-    
-    # Calculate statistics
-    total_sent = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.sender_id == user_id
-    ).scalar() or 0
-    
-    total_received = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.recipient_id == user_id
-    ).scalar() or 0
+    username = user.username
     
-    transaction_count = db.query(func.count(Transaction.id)).filter(
-        (Transaction.sender_id == user_id) | (Transaction.recipient_id == user_id)
-    ).scalar() or 0
+    # Get recent transactions
+    recent_transactions = (await db.scalars(
+        select(Transaction).where(
+            (Transaction.sender == username) | (Transaction.receiver == username)
+        ).order_by(desc(Transaction.created_at)).limit(20)
+    )).all()
+    
+    # Lifetime statistics from the daily activity summary
+    totals = await ActivitySummaryService.totals_for(db, username)
+    total_sent = totals["sent_minor"] / MINOR_PER_MAJOR
+    total_received = totals["received_minor"] / MINOR_PER_MAJOR
+    transaction_count = totals["sent_count"] + totals["received_count"]
     
     return {
         "user": {
@@ -139,15 +149,16 @@ async def get_user_details(
             "total_sent": float(total_sent),
             "total_received": float(total_received),
             "transaction_count": transaction_count,
+            "total_fees": float(totals["fees_minor"] / MINOR_PER_MAJOR),
             "net_flow": float(total_received - total_sent)
         },
         "recent_transactions": [
             {
                 "id": t.id,
-                "type": "sent" if t.sender_id == user_id else "received",
+                "type": "sent" if t.sender == username else "received",
                 "amount": t.amount,
-                "other_party": t.recipient.username if t.sender_id == user_id else t.sender.username,
-                "timestamp": t.timestamp.isoformat()
+                "other_party": t.receiver if t.sender == username else t.sender,
+                "timestamp": t.created_at.isoformat() if t.created_at else None
             }
             for t in recent_transactions
         ]
@@ -159,18 +170,20 @@ async def update_user_account(
     user_id: int,
     update_data: UserUpdateRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update user account information"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     if update_data.username:
-        existing = db.query(User).filter(
-            User.username == update_data.username,
-            User.id != user_id
-        ).first()
+        existing = await db.scalar(
+            select(User).where(
+                User.username == update_data.username,
+                User.id != user_id
+            )
+        )
         if existing:
             raise HTTPException(status_code=400, detail="Username already taken")
         user.username = update_data.username
@@ -184,8 +197,8 @@ async def update_user_account(
     if update_data.is_admin is not None:
         user.is_admin = update_data.is_admin
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     logger.info(f"Admin {admin.username} updated user {user.username} (ID: {user_id})")
     
@@ -205,10 +218,10 @@ async def update_user_balance(
     user_id: int,
     balance_update: BalanceUpdateRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Manually adjust user balance with audit trail"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -225,7 +238,7 @@ async def update_user_balance(
         status="completed"
     )
     db.add(audit_transaction)
-    db.commit()
+    await db.commit()
     
     logger.warning(
         f"Admin {admin.username} changed balance for {user.username} "
@@ -257,17 +270,17 @@ class CreateUserRequest(BaseModel):
 async def create_user(
     user_data: CreateUserRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new user account (admin only)"""
     # Check if username already exists
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    existing_user = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
     
     # Check if email already exists
     if user_data.email:
-        existing_email = db.query(User).filter(User.email == user_data.email).first()
+        existing_email = await db.scalar(select(User).where(User.email == user_data.email))
         if existing_email:
             raise HTTPException(status_code=400, detail="Email already exists")
     
@@ -275,7 +288,7 @@ async def create_user(
     new_user = User(
         username=user_data.username,
         email=user_data.email,
-        password=hash_password(user_data.password),
+        password=await hash_password_async(user_data.password),
         full_name=user_data.full_name,
         phone=user_data.phone,
         balance=user_data.initial_balance,
@@ -283,8 +296,8 @@ async def create_user(
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     # Create initial balance transaction if balance > 0
     if user_data.initial_balance > 0:
@@ -296,7 +309,7 @@ async def create_user(
             status="completed"
         )
         db.add(initial_transaction)
-        db.commit()
+        await db.commit()
     
     logger.info(
         f"Admin {admin.username} created new user: {new_user.username} "
@@ -328,10 +341,10 @@ async def delete_user(
     user_id: int,
     delete_data: DeleteUserRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a user account (admin only) with safeguards"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -355,7 +368,7 @@ async def delete_user(
             )
         
         # Transfer balance to specified user
-        recipient = db.query(User).filter(User.username == delete_data.transfer_balance_to).first()
+        recipient = await db.scalar(select(User).where(User.username == delete_data.transfer_balance_to))
         if not recipient:
             raise HTTPException(status_code=404, detail="Transfer recipient not found")
         
@@ -381,8 +394,8 @@ async def delete_user(
     deleted_balance = user.balance
     
     # Delete user (this will cascade to related records based on model definitions)
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
     
     logger.warning(
         f"Admin {admin.username} deleted user: {deleted_username} "
@@ -408,19 +421,20 @@ async def suspend_user(
     user_id: int,
     reason: str,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Suspend a user account (soft delete alternative)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     if user.id == admin.id:
         raise HTTPException(status_code=400, detail="Cannot suspend your own account")
     
-    # Add suspended flag (we need to add this field to User model)
-    # For now, we'll use a workaround by setting balance to negative
-    # In production, add a 'suspended' boolean field to User model
+    # Suspend and revoke existing sessions
+    user.is_suspended = True
+    user.token_version = (user.token_version or 0) + 1
+    await db.commit()
     
     logger.warning(
         f"Admin {admin.username} suspended user: {user.username} (ID: {user_id}). "
@@ -428,25 +442,46 @@ async def suspend_user(
     )
     
     return {
-        "message": "User suspension feature requires adding 'suspended' field to User model",
-        "note": "Use delete endpoint or add suspended field to User model for proper implementation"
+        "message": "User suspended",
+        "user": user.username,
+        "reason": reason
     }
 
 
+@router.post("/users/{user_id}/unsuspend")
+async def unsuspend_user(
+    user_id: int,
+    admin: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Lift a user suspension"""
+    user = await db.scalar(select(User).where(User.id == user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user.is_suspended = False
+    await db.commit()
+    
+    logger.warning(f"Admin {admin.username} unsuspended user: {user.username} (ID: {user_id})")
+    
+    return {"message": "User unsuspended", "user": user.username}
+
+
 @router.post("/users/{user_id}/reset-password")
 async def reset_user_password(
     user_id: int,
     new_password: str,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Reset a user's password (admin only)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user.password = hash_password(new_password)
-    db.commit()
+    user.password = await hash_password_async(new_password)
+    user.token_version = (user.token_version or 0) + 1  # Revoke existing sessions
+    await db.commit()
     
     logger.warning(
         f"Admin {admin.username} reset password for user: {user.username} (ID: {user_id})"
@@ -466,18 +501,20 @@ async def reset_user_password(
 @router.get("/stats/overview")
 async def get_system_stats(
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get comprehensive system statistics"""
-    total_users = db.query(func.count(User.id)).scalar()
-    total_transactions = db.query(func.count(Transaction.id)).scalar()
-    total_volume = db.query(func.sum(Transaction.amount)).scalar() or 0
-    average_balance = db.query(func.avg(User.balance)).scalar() or 0
-    
-    yesterday = datetime.now() - timedelta(days=1)
-    active_users_24h = db.query(func.count(func.distinct(Transaction.sender_id))).filter(
-        Transaction.timestamp >= yesterday
-    ).scalar() or 0
+    total_users = await db.scalar(select(func.count(User.id)))
+    total_transactions = await db.scalar(select(func.count(Transaction.id)))
+    total_volume = (await db.scalar(select(func.sum(Transaction.amount_minor))) or 0) / MINOR_PER_MAJOR
+    average_balance = (await db.scalar(select(func.avg(User.balance_minor))) or 0) / MINOR_PER_MAJOR
+    
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    active_users_24h = await db.scalar(
+        select(func.count(func.distinct(Transaction.sender))).where(
+            Transaction.created_at >= yesterday
+        )
+    ) or 0
     
     return {
         "total_users": total_users,
@@ -492,30 +529,67 @@ async def get_system_stats(
 @router.get("/stats/transactions")
 async def get_transaction_stats(
     days: int = Query(7, ge=1, le=365),
+    interval: str = Query("day", pattern="^(hour|day|week)$"),
+    split_by: Optional[str] = Query(None, pattern="^(type|status)$"),
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get transaction statistics for the specified time period"""
-    start_date = datetime.now() - timedelta(days=days)
+    start_date = datetime.utcnow() - timedelta(days=days)
     
-    transactions = db.query(Transaction).filter(
-        Transaction.timestamp >= start_date
-    ).all()
+    series = await AnalyticsService.series(db, start_date, interval=interval, by=split_by)
+    by_type = await AnalyticsService.breakdown(db, "type", start_date)
+    by_status = await AnalyticsService.breakdown(db, "status", start_date)
     
-    daily_volumes = {}
-    for t in transactions:
-        date_key = t.timestamp.date().isoformat()
-        daily_volumes[date_key] = daily_volumes.get(date_key, 0) + float(t.amount)
+    total_transactions = sum(point["count"] for point in series)
+    total_volume = sum(point["volume_minor"] for point in series) / MINOR_PER_MAJOR
     
     return {
         "period_days": days,
-        "total_transactions": len(transactions),
-        "total_volume": sum(float(t.amount) for t in transactions),
-        "average_transaction": sum(float(t.amount) for t in transactions) / len(transactions) if transactions else 0,
-        "daily_volumes": daily_volumes
+        "interval": interval,
+        "total_transactions": total_transactions,
+        "total_volume": total_volume,
+        "average_transaction": total_volume / total_transactions if total_transactions else 0,
+        "daily_volumes": {
+            point["bucket"]: point["volume_minor"] / MINOR_PER_MAJOR for point in series
+        } if interval == "day" and not split_by else None,
+        "series": [
+            {
+                "bucket": point["bucket"],
+                **({split_by: point[split_by]} if split_by else {}),
+                "count": point["count"],
+                "volume": point["volume_minor"] / MINOR_PER_MAJOR
+            }
+            for point in series
+        ],
+        "by_type": [
+            {"type": row["type"], "count": row["count"], "volume": row["volume_minor"] / MINOR_PER_MAJOR,
+             "average": row["average_minor"] / MINOR_PER_MAJOR}
+            for row in by_type
+        ],
+        "by_status": [
+            {"status": row["status"], "count": row["count"], "volume": row["volume_minor"] / MINOR_PER_MAJOR}
+            for row in by_status
+        ]
     }
 
 
+@router.get("/export/transactions")
+async def export_transactions(
+    start: datetime,
+    end: Optional[datetime] = None,
+    admin: User = Depends(require_admin)
+):
+    """Stream every transaction in [start, end) as CSV"""
+    logger.info(f"Admin {admin.username} exported transactions from {start} to {end or 'now'}")
+    filename = f"transactions_{start.date()}_{(end or datetime.utcnow()).date()}.csv"
+    return StreamingResponse(
+        AnalyticsService.export_csv(start, end),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/config/stripe-mode")
 async def get_stripe_mode(admin: User = Depends(require_admin)):
     """Get current Stripe mode"""
@@ -576,18 +650,19 @@ class NotificationRequest(BaseModel):
     title: str = Field(..., min_length=1)
     message: str = Field(..., min_length=1)
     notification_type: str = Field(default="general")
+    send_email: bool = False  # Also email broadcast recipients (sent by job_worker.py)
 
 
 @router.post('/notifications/send')
 async def send_notification(
     notification: NotificationRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Send notification to specific user or broadcast to all'''
     if notification.user_id:
         # Send to specific user
-        user = db.query(User).filter(User.id == notification.user_id).first()
+        user = await db.scalar(select(User).where(User.id == notification.user_id))
         if not user:
             raise HTTPException(status_code=404, detail='User not found')
         
@@ -598,49 +673,55 @@ async def send_notification(
             notification_type=notification.notification_type
         )
         db.add(new_notification)
-        db.commit()
+        await db.commit()
         
         logger.info(f'Admin {admin.username} sent notification to user {user.username}')
         return {'message': 'Notification sent', 'recipient': user.username}
     else:
-        # Broadcast to all users
-        users = db.query(User).filter(User.is_admin == False).all()
-        notifications = []
-        for user in users:
-            notif = Notification(
-                user_id=user.id,
-                title=notification.title,
-                message=notification.message,
-                notification_type=notification.notification_type
-            )
-            notifications.append(notif)
-        
-        db.bulk_save_objects(notifications)
-        db.commit()
+        # Broadcast: stored once, fanned out when users read their feed
+        broadcast = NotificationFeedService.broadcast(
+            db, notification.title, notification.message, notification.notification_type
+        )
+        await db.flush()
+        if notification.send_email:
+            JobQueue.enqueue(db, BroadcastEmail(notification_id=broadcast.id))
+        await db.commit()
         
-        logger.info(f'Admin {admin.username} broadcast notification to {len(users)} users')
-        return {'message': 'Notification broadcast', 'recipients': len(users)}
+        recipients = await db.scalar(select(func.count(User.id)).where(User.is_admin == False))
+        logger.info(f'Admin {admin.username} broadcast notification {broadcast.id} to {recipients} users')
+        return {
+            'message': 'Notification broadcast',
+            'notification_id': broadcast.id,
+            'recipients': recipients,
+            'email_queued': notification.send_email
+        }
 
 
 @router.get('/notifications')
 async def get_all_notifications(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    limit: int = page_size(50, 500),
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    '''Get all notifications with pagination'''
-    total = db.query(func.count(Notification.id)).scalar()
-    notifications = db.query(Notification).order_by(desc(Notification.sent_at)).offset(skip).limit(limit).all()
+    '''Get all notifications, newest first, with cursor pagination'''
+    total = None
+    if not cursor:
+        total = await db.scalar(select(func.count(Notification.id)))
+    rows = (await db.scalars(
+        keyset(select(Notification), Notification.sent_at, Notification.id, cursor, limit)
+    )).all()
+    notifications, next_cursor = page(rows, limit, 'sent_at')
     
     return {
         'total': total,
-        'skip': skip,
         'limit': limit,
+        'next_cursor': next_cursor,
         'notifications': [
             {
                 'id': n.id,
                 'user_id': n.user_id,
+                'broadcast': n.user_id is None,
                 'title': n.title,
                 'message': n.message,
                 'type': n.notification_type,
@@ -670,7 +751,7 @@ class AdvertisementRequest(BaseModel):
 async def create_advertisement(
     ad: AdvertisementRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Create a new advertisement'''
     new_ad = Advertisement(
@@ -684,8 +765,8 @@ async def create_advertisement(
         created_by=admin.id
     )
     db.add(new_ad)
-    db.commit()
-    db.refresh(new_ad)
+    await db.commit()
+    await db.refresh(new_ad)
     
     logger.info(f'Admin {admin.username} created advertisement: {ad.title}')
     return {'message': 'Advertisement created', 'ad_id': new_ad.id}
@@ -695,14 +776,14 @@ async def create_advertisement(
 async def get_advertisements(
     active_only: bool = Query(False),
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Get all advertisements'''
-    query = db.query(Advertisement)
+    query = select(Advertisement)
     if active_only:
-        query = query.filter(Advertisement.is_active == True)
+        query = query.where(Advertisement.is_active == True)
     
-    ads = query.order_by(desc(Advertisement.created_at)).all()
+    ads = (await db.scalars(query.order_by(desc(Advertisement.created_at)))).all()
     
     return {
         'total': len(ads),
@@ -731,10 +812,10 @@ async def update_advertisement(
     ad_id: int,
     ad_update: AdvertisementRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Update an advertisement'''
-    ad = db.query(Advertisement).filter(Advertisement.id == ad_id).first()
+    ad = await db.scalar(select(Advertisement).where(Advertisement.id == ad_id))
     if not ad:
         raise HTTPException(status_code=404, detail='Advertisement not found')
     
@@ -746,7 +827,7 @@ async def update_advertisement(
     ad.target_audience = ad_update.target_audience
     ad.end_date = ad_update.end_date
     
-    db.commit()
+    await db.commit()
     logger.info(f'Admin {admin.username} updated advertisement {ad_id}')
     return {'message': 'Advertisement updated'}
 
@@ -755,15 +836,15 @@ async def update_advertisement(
 async def delete_advertisement(
     ad_id: int,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Delete an advertisement'''
-    ad = db.query(Advertisement).filter(Advertisement.id == ad_id).first()
+    ad = await db.scalar(select(Advertisement).where(Advertisement.id == ad_id))
     if not ad:
         raise HTTPException(status_code=404, detail='Advertisement not found')
     
-    db.delete(ad)
-    db.commit()
+    await db.delete(ad)
+    await db.commit()
     logger.info(f'Admin {admin.username} deleted advertisement {ad_id}')
     return {'message': 'Advertisement deleted'}
 
@@ -789,11 +870,11 @@ class PromotionRequest(BaseModel):
 async def create_promotion(
     promo: PromotionRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Create a new promotion'''
     # Check if code already exists
-    existing = db.query(Promotion).filter(Promotion.code == promo.code.upper()).first()
+    existing = await db.scalar(select(Promotion).where(Promotion.code == promo.code.upper()))
     if existing:
         raise HTTPException(status_code=400, detail='Promotion code already exists')
     
@@ -811,8 +892,8 @@ async def create_promotion(
         created_by=admin.id
     )
     db.add(new_promo)
-    db.commit()
-    db.refresh(new_promo)
+    await db.commit()
+    await db.refresh(new_promo)
     
     logger.info(f'Admin {admin.username} created promotion: {promo.code}')
     return {'message': 'Promotion created', 'promo_id': new_promo.id, 'code': new_promo.code}
@@ -822,14 +903,14 @@ async def create_promotion(
 async def get_promotions(
     active_only: bool = Query(False),
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Get all promotions'''
-    query = db.query(Promotion)
+    query = select(Promotion)
     if active_only:
-        query = query.filter(Promotion.is_active == True)
+        query = query.where(Promotion.is_active == True)
     
-    promos = query.order_by(desc(Promotion.created_at)).all()
+    promos = (await db.scalars(query.order_by(desc(Promotion.created_at)))).all()
     
     return {
         'total': len(promos),
@@ -859,14 +940,16 @@ async def get_promotions(
 async def get_promotion_usage(
     promo_id: int,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Get promotion usage statistics'''
-    promo = db.query(Promotion).filter(Promotion.id == promo_id).first()
+    promo = await db.scalar(select(Promotion).where(Promotion.id == promo_id))
     if not promo:
         raise HTTPException(status_code=404, detail='Promotion not found')
     
-    usages = db.query(PromotionUsage).filter(PromotionUsage.promotion_id == promo_id).all()
+    usages = (await db.scalars(
+        select(PromotionUsage).where(PromotionUsage.promotion_id == promo_id)
+    )).all()
     total_saved = sum(u.amount_saved for u in usages)
     
     return {
@@ -892,15 +975,15 @@ async def get_promotion_usage(
 async def toggle_promotion(
     promo_id: int,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Activate or deactivate a promotion'''
-    promo = db.query(Promotion).filter(Promotion.id == promo_id).first()
+    promo = await db.scalar(select(Promotion).where(Promotion.id == promo_id))
     if not promo:
         raise HTTPException(status_code=404, detail='Promotion not found')
     
     promo.is_active = not promo.is_active
-    db.commit()
+    await db.commit()
     
     status = 'activated' if promo.is_active else 'deactivated'
     logger.info(f'Admin {admin.username} {status} promotion {promo.code}')
@@ -922,10 +1005,10 @@ class MessageRequest(BaseModel):
 async def send_customer_message(
     msg: MessageRequest,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Send a message to a customer'''
-    user = db.query(User).filter(User.id == msg.user_id).first()
+    user = await db.scalar(select(User).where(User.id == msg.user_id))
     if not user:
         raise HTTPException(status_code=404, detail='User not found')
     
@@ -938,8 +1021,8 @@ async def send_customer_message(
         direction='admin_to_user'
     )
     db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
+    await db.commit()
+    await db.refresh(new_message)
     
     logger.info(f'Admin {admin.username} sent message to user {user.username}')
     return {'message': 'Message sent', 'message_id': new_message.id}
@@ -949,16 +1032,18 @@ async def send_customer_message(
 async def get_user_messages(
     user_id: int,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Get all messages for a specific user'''
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail='User not found')
     
-    messages = db.query(CustomerMessage).filter(
-        CustomerMessage.user_id == user_id
-    ).order_by(desc(CustomerMessage.created_at)).all()
+    messages = (await db.scalars(
+        select(CustomerMessage).where(
+            CustomerMessage.user_id == user_id
+        ).order_by(desc(CustomerMessage.created_at))
+    )).all()
     
     return {
         'user': {
@@ -985,13 +1070,15 @@ async def get_user_messages(
 @router.get('/messages/unread')
 async def get_unread_messages(
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Get all unread messages from customers'''
-    unread = db.query(CustomerMessage).filter(
-        CustomerMessage.direction == 'user_to_admin',
-        CustomerMessage.is_read == False
-    ).order_by(desc(CustomerMessage.created_at)).all()
+    unread = (await db.scalars(
+        select(CustomerMessage).where(
+            CustomerMessage.direction == 'user_to_admin',
+            CustomerMessage.is_read == False
+        ).order_by(desc(CustomerMessage.created_at))
+    )).all()
     
     return {
         'total_unread': len(unread),
@@ -1012,15 +1099,15 @@ async def get_unread_messages(
 async def mark_message_read(
     message_id: int,
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Mark a message as read'''
-    message = db.query(CustomerMessage).filter(CustomerMessage.id == message_id).first()
+    message = await db.scalar(select(CustomerMessage).where(CustomerMessage.id == message_id))
     if not message:
         raise HTTPException(status_code=404, detail='Message not found')
     
     message.is_read = True
-    db.commit()
+    await db.commit()
     return {'message': 'Message marked as read'}
 
 
@@ -1032,18 +1119,20 @@ async def mark_message_read(
 async def get_active_accounts(
     days: int = Query(30, ge=1, le=365),
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Get active user accounts (users with transactions in specified period)'''
     start_date = datetime.utcnow() - timedelta(days=days)
     
     # Get users with transactions in the period
-    active_users = db.query(User).join(
-        Transaction,
-        (Transaction.sender == User.username) | (Transaction.receiver == User.username)
-    ).filter(
-        Transaction.created_at >= start_date
-    ).distinct().all()
+    active_users = (await db.scalars(
+        select(User).join(
+            Transaction,
+            (Transaction.sender == User.username) | (Transaction.receiver == User.username)
+        ).where(
+            Transaction.created_at >= start_date
+        ).distinct()
+    )).all()
     
     return {
         'period_days': days,
@@ -1065,22 +1154,23 @@ async def get_active_accounts(
 async def get_inactive_accounts(
     days: int = Query(30, ge=1, le=365),
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Get inactive user accounts (no transactions in specified period)'''
     start_date = datetime.utcnow() - timedelta(days=days)
     
     # Get all users
-    all_users = db.query(User).filter(User.is_admin == False).all()
+    all_users = (await db.scalars(select(User).where(User.is_admin == False))).all()
     
     # Get users with recent transactions
-    active_usernames = db.query(Transaction.sender).filter(
-        Transaction.created_at >= start_date
-    ).union(
-        db.query(Transaction.receiver).filter(Transaction.created_at >= start_date)
-    ).distinct().all()
+    active_usernames = (await db.scalars(
+        union(
+            select(Transaction.sender).where(Transaction.created_at >= start_date),
+            select(Transaction.receiver).where(Transaction.created_at >= start_date)
+        )
+    )).all()
     
-    active_usernames_set = {name[0] for name in active_usernames}
+    active_usernames_set = set(active_usernames)
     inactive_users = [u for u in all_users if u.username not in active_usernames_set]
     
     return {
@@ -1102,53 +1192,59 @@ async def get_inactive_accounts(
 @router.get('/analytics/dashboard')
 async def get_admin_dashboard(
     admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     '''Get comprehensive admin dashboard data'''
     # User stats
-    total_users = db.query(func.count(User.id)).filter(User.is_admin == False).scalar()
+    total_users = await db.scalar(select(func.count(User.id)).where(User.is_admin == False))
     
-    # Transaction stats (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_transactions = db.query(Transaction).filter(
-        Transaction.created_at >= thirty_days_ago
-    ).all()
+    # Transaction stats (last 30 days, from the daily activity summary)
+    since = (datetime.utcnow() - timedelta(days=30)).date()
+    recent_count, recent_volume_minor, recent_fees_minor, active_users = (
+        await ActivitySummaryService.totals_since(db, since)
+    )
     
     # Financial stats
-    total_volume = sum(t.amount for t in recent_transactions)
-    total_balance = db.query(func.sum(User.balance)).filter(User.is_admin == False).scalar() or 0
+    total_volume = recent_volume_minor / MINOR_PER_MAJOR
+    total_balance = (await db.scalar(
+        select(func.sum(User.balance_minor)).where(User.is_admin == False)
+    ) or 0) / MINOR_PER_MAJOR
     
     # Notification stats
-    total_notifications = db.query(func.count(Notification.id)).scalar()
-    unread_notifications = db.query(func.count(Notification.id)).filter(
-        Notification.is_read == False
-    ).scalar()
+    total_notifications = await db.scalar(select(func.count(Notification.id)))
+    unread_notifications = await db.scalar(
+        # Broadcast read state lives in notification_receipts, per user
+        select(func.count(Notification.id)).where(Notification.user_id.isnot(None), Notification.is_read == False)
+    )
     
     # Active promotions
-    active_promotions = db.query(func.count(Promotion.id)).filter(
-        Promotion.is_active == True
-    ).scalar()
+    active_promotions = await db.scalar(
+        select(func.count(Promotion.id)).where(Promotion.is_active == True)
+    )
     
     # Active advertisements
-    active_ads = db.query(func.count(Advertisement.id)).filter(
-        Advertisement.is_active == True
-    ).scalar()
+    active_ads = await db.scalar(
+        select(func.count(Advertisement.id)).where(Advertisement.is_active == True)
+    )
     
     # Unread customer messages
-    unread_messages = db.query(func.count(CustomerMessage.id)).filter(
-        CustomerMessage.direction == 'user_to_admin',
-        CustomerMessage.is_read == False
-    ).scalar()
+    unread_messages = await db.scalar(
+        select(func.count(CustomerMessage.id)).where(
+            CustomerMessage.direction == 'user_to_admin',
+            CustomerMessage.is_read == False
+        )
+    )
     
     return {
         'users': {
             'total': total_users,
-            'active_30d': len([t for t in recent_transactions])
+            'active_30d': active_users
         },
         'transactions': {
-            'count_30d': len(recent_transactions),
+            'count_30d': recent_count,
             'volume_30d': float(total_volume),
-            'average': float(total_volume / len(recent_transactions)) if recent_transactions else 0
+            'fees_30d': float(recent_fees_minor / MINOR_PER_MAJOR),
+            'average': float(total_volume / recent_count) if recent_count else 0
         },
         'financial': {
             'total_balance_in_system': float(total_balance)
@@ -11,9 +11,10 @@ import logging
 from database import SessionLocal
 from models import User, Transaction
 from schemas import ForgotPasswordRequest, VerifyResetCode, ResetPassword, SendMoneyByContact
-from utils.security import hash_password
+from utils.security import hash_password_async
 from auth import get_current_user
-from notification_service import notification_service
+from services.job_queue import JobQueue
+from services.notification_jobs import SendMoneyNotification, SendPasswordResetCode
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -90,20 +91,12 @@ async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(
         # Save reset code and expiry (15 minutes)
         user.password_reset_token = reset_code
         user.reset_token_expiry = datetime.utcnow() + timedelta(minutes=15)
-        db.commit()
-        
-        # Send reset code
-        sent = await notification_service.send_password_reset_code(
-            identifier=identifier,
-            code=reset_code,
-            method=method
-        )
         
-        if not sent:
-            logger.error(f"Failed to send reset code to {identifier}")
-            # Don't fail the request, but log it
+        # Send reset code (job_worker.py retries failed sends)
+        JobQueue.enqueue(db, SendPasswordResetCode(identifier=identifier, code=reset_code, method=method))
+        db.commit()
         
-        logger.info(f"Password reset code sent to {identifier} via {method}")
+        logger.info(f"Password reset code queued for {identifier} via {method}")
         
         return {
             "message": "If an account exists with this information, a reset code has been sent.",
@@ -200,10 +193,11 @@ async def reset_password(request: ResetPassword, db: Session = Depends(get_db)):
         if not user.reset_token_expiry or user.reset_token_expiry < datetime.utcnow():
             raise HTTPException(status_code=400, detail="Reset code has expired")
         
-        # Update password
-        user.password = hash_password(new_password)
+        # Update password and revoke previously issued tokens
+        user.password = await hash_password_async(new_password)
         user.password_reset_token = None
         user.reset_token_expiry = None
+        user.token_version = (user.token_version or 0) + 1
         db.commit()
         
         logger.info(f"Password reset successfully for user: {user.username}")
@@ -279,16 +273,16 @@ async def send_money_by_contact(
                 }
             )
             db.add(transaction)
-            db.commit()
             
             # Send notification to recipient
             method = 'email' if contact_type == 'email' else 'sms'
-            await notification_service.send_money_notification(
+            JobQueue.enqueue(db, SendMoneyNotification(
                 identifier=contact,
                 sender_name=sender.full_name or sender.username,
                 amount=amount,
                 method=method
-            )
+            ))
+            db.commit()
             
             logger.info(f"Money sent from {sender.username} to {recipient.username} via {contact_type}")
             
@@ -316,16 +310,16 @@ async def send_money_by_contact(
                 }
             )
             db.add(transaction)
-            db.commit()
             
             # Send invitation with money notification
             method = 'email' if contact_type == 'email' else 'sms'
-            await notification_service.send_money_notification(
+            JobQueue.enqueue(db, SendMoneyNotification(
                 identifier=contact,
                 sender_name=sender.full_name or sender.username,
                 amount=amount,
                 method=method
-            )
+            ))
+            db.commit()
             
             logger.info(f"Invitation sent to {contact} with ${amount:.2f} from {sender.username}")
             
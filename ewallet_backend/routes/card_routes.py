@@ -1,10 +1,16 @@
 """
 API Routes for Card Services, POS Integration, ATM, and Gift Cards
 """
-from fastapi import APIRouter, Depends, HTTPException, Header
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
+from config import settings
 from database import get_db
 from models import User, Transaction
 from models_cards import VirtualCard, POSTerminal, GiftCardVoucher
@@ -12,24 +18,16 @@ from services.card_services import (
     CardService, POSService, ATMService, 
     GiftCardService, WalletInteropService
 )
-from utils.security import decode_token
+from services.card_vault import CardVault
+from services.terminal_session_service import TerminalSessionError, TerminalSessionService
+from auth import get_current_user
+from utils.credentials import verify_terminal_secret
+from pagination import keyset, page, page_size
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
-
-
-def get_current_user(authorization: str = Header(...), db: Session = Depends(get_db)):
-    """Get current user from JWT token"""
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = decode_token(token)
-        username = payload.get("username")
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+terminal_bearer = HTTPBearer(auto_error=False)  # POS terminal session tokens
 
 
 # ==================== Virtual Card Management ====================
@@ -53,12 +51,13 @@ async def create_virtual_card(
             db=db
         )
         
+        card_number, cvv = CardVault.reveal(card)
         return {
             "message": "Card created successfully",
             "card": {
                 "id": card.id,
-                "card_number": card.card_number,
-                "cvv": card.cvv,  # Only show once in real app!
+                "card_number": card_number,
+                "cvv": cvv,  # Only show once in real app!
                 "expiry_month": card.expiry_month,
                 "expiry_year": card.expiry_year,
                 "cardholder_name": card.cardholder_name,
@@ -85,7 +84,7 @@ async def list_user_cards(
         "cards": [
             {
                 "id": card.id,
-                "last4": card.card_number[-4:],
+                "last4": card.card_last4,
                 "network": card.network,
                 "expiry": f"{card.expiry_month:02d}/{card.expiry_year}",
                 "status": card.status,
@@ -188,9 +187,75 @@ async def register_pos_terminal(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-class POSPaymentRequest(BaseModel):
+class TerminalCredentials(BaseModel):
     terminal_id: str
     api_key: str
+    api_secret: Optional[str] = None
+
+
+def terminal_credentials(
+    terminal_id: Optional[str] = Header(None, alias="X-Terminal-Id"),
+    api_key: Optional[str] = Header(None, alias="X-Api-Key"),
+    api_secret: Optional[str] = Header(None, alias="X-Api-Secret")
+) -> Optional[TerminalCredentials]:
+    """Terminal credentials from the X-Terminal-Id / X-Api-Key / X-Api-Secret headers, if sent"""
+    if not (terminal_id and api_key):
+        return None
+    return TerminalCredentials(terminal_id=terminal_id, api_key=api_key, api_secret=api_secret)
+
+
+async def _verify_terminal_credentials(credentials: TerminalCredentials, db: Session) -> POSTerminal:
+    terminal = db.query(POSTerminal).filter(
+        POSTerminal.terminal_id == credentials.terminal_id,
+        POSTerminal.api_key == credentials.api_key,
+        POSTerminal.status == "active"
+    ).first()
+    
+    if not terminal:
+        raise HTTPException(status_code=401, detail="Invalid terminal credentials")
+    
+    if credentials.api_secret is None:
+        # Transition for terminals set up before secrets were checked (POS_REQUIRE_API_SECRET)
+        if settings.POS_REQUIRE_API_SECRET:
+            raise HTTPException(status_code=401, detail="X-Api-Secret header required")
+        logger.warning(f"Terminal {terminal.terminal_id} authenticated without its API secret")
+        return terminal
+    
+    valid, new_hash = await verify_terminal_secret(credentials.api_secret, terminal.api_secret)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid terminal credentials")
+    if new_hash:
+        terminal.api_secret = new_hash  # Legacy SHA-256 secret hash
+        db.commit()
+    return terminal
+
+
+@router.post("/pos/session")
+async def start_terminal_session(
+    credentials: Optional[TerminalCredentials] = Depends(terminal_credentials),
+    db: Session = Depends(get_db)
+):
+    """Exchange terminal API credentials (headers) for a short-lived session token"""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="X-Terminal-Id and X-Api-Key headers required")
+    terminal = await _verify_terminal_credentials(credentials, db)
+    token, expires_in = await asyncio.to_thread(TerminalSessionService.issue, terminal)
+    return {"session_token": token, "token_type": "bearer", "expires_in": expires_in}
+
+
+@router.post("/pos/session/revoke")
+async def revoke_terminal_session(credentials: HTTPAuthorizationCredentials = Depends(terminal_bearer)):
+    """Revoke a terminal session token; payments carrying it are rejected until it expires"""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Terminal session required")
+    try:
+        await asyncio.to_thread(TerminalSessionService.revoke, credentials.credentials)
+    except TerminalSessionError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    return {"message": "Terminal session token revoked"}
+
+
+class POSPaymentRequest(BaseModel):
     card_number: str
     amount: float
     entry_mode: str  # chip, swipe, contactless, manual
@@ -200,19 +265,27 @@ class POSPaymentRequest(BaseModel):
 @router.post("/pos/process-payment")
 async def process_pos_payment(
     request: POSPaymentRequest,
+    session: Optional[HTTPAuthorizationCredentials] = Depends(terminal_bearer),
+    credentials: Optional[TerminalCredentials] = Depends(terminal_credentials),
     db: Session = Depends(get_db)
 ):
-    """Process a payment at POS terminal (called by merchant)"""
+    """
+    Process a payment at POS terminal (called by merchant). The terminal sends
+    a session token (Authorization: Bearer ...) or its credentials in the
+    X-Terminal-Id / X-Api-Key / X-Api-Secret headers; never in the body.
+    """
     
     # Verify terminal
-    terminal = db.query(POSTerminal).filter(
-        POSTerminal.terminal_id == request.terminal_id,
-        POSTerminal.api_key == request.api_key,
-        POSTerminal.status == "active"
-    ).first()
-    
-    if not terminal:
-        raise HTTPException(status_code=401, detail="Invalid terminal credentials")
+    if session is not None:
+        try:
+            # The registry and revocation list may be in Redis; keep the loop free
+            terminal = await asyncio.to_thread(TerminalSessionService.authenticate, session.credentials, db)
+        except TerminalSessionError as e:
+            raise HTTPException(status_code=401, detail=str(e))
+    elif credentials is not None:
+        terminal = await _verify_terminal_credentials(credentials, db)
+    else:
+        raise HTTPException(status_code=401, detail="Terminal session or credentials required")
     
     try:
         result = POSService.process_pos_payment(
@@ -316,7 +389,7 @@ class GenerateGiftCardRequest(BaseModel):
     card_type: str = "digital"
 
 @router.post("/gift-cards/generate")
-async def generate_gift_cards(
+def generate_gift_cards(
     request: GenerateGiftCardRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -351,7 +424,7 @@ class RedeemGiftCardRequest(BaseModel):
     pin: str
 
 @router.post("/gift-cards/redeem")
-async def redeem_gift_card(
+def redeem_gift_card(
     request: RedeemGiftCardRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -377,7 +450,7 @@ class UseGiftCardRequest(BaseModel):
     merchant_name: str
 
 @router.post("/gift-cards/use")
-async def use_gift_card(
+def use_gift_card(
     request: UseGiftCardRequest,
     db: Session = Depends(get_db)
 ):
@@ -466,6 +539,8 @@ async def get_supported_wallets():
 @router.get("/cards/{card_id}/transactions")
 async def get_card_transactions(
     card_id: int,
+    cursor: Optional[str] = None,
+    limit: int = page_size(100),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -482,13 +557,15 @@ async def get_card_transactions(
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
     
-    transactions = db.query(CardTransaction).filter(
-        CardTransaction.card_id == card_id
-    ).order_by(CardTransaction.created_at.desc()).limit(100).all()
+    stmt = select(CardTransaction).where(CardTransaction.card_id == card_id)
+    rows = db.scalars(
+        keyset(stmt, CardTransaction.created_at, CardTransaction.id, cursor, limit)
+    ).all()
+    transactions, next_cursor = page(rows, limit, "created_at")
     
     return {
         "card": {
-            "last4": card.card_number[-4:],
+            "last4": card.card_last4,
             "total_spent": card.total_spent
         },
         "transactions": [
@@ -503,5 +580,6 @@ async def get_card_transactions(
                 "auth_code": txn.auth_code
             }
             for txn in transactions
-        ]
+        ],
+        "next_cursor": next_cursor
     }
@@ -3,16 +3,23 @@ Money Invite System Routes
 Send money via email/phone with invite tracking
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import datetime, timedelta
 import secrets
 import re
 
-from database import get_db
+from database import get_async_db
 from models import User, Transaction, MoneyInvite, Notification
-from auth import get_current_user
+from auth import get_current_user_async, load_balance
+from money import Money
+from services.ledger_service import LedgerService, InsufficientFunds
+from services.invite_expiry_service import OPEN_STATUSES
+from pagination import keyset, page, page_size
+from services.job_queue import JobQueue
+from services.notification_jobs import DeliverInvite
 from logger import get_logger
 
 logger = get_logger(__name__)
@@ -66,67 +73,13 @@ def generate_invite_token() -> str:
     return secrets.token_urlsafe(32)
 
 
-def send_invite_notification(db: Session, invite: MoneyInvite):
-    """Send notification for money invite"""
-    try:
-        # Check if recipient already has an account
-        recipient_user = None
-        if invite.recipient_method == "username":
-            recipient_user = db.query(User).filter(User.username == invite.recipient_contact).first()
-        elif invite.recipient_method == "email":
-            recipient_user = db.query(User).filter(User.email == invite.recipient_contact).first()
-        elif invite.recipient_method == "phone":
-            recipient_user = db.query(User).filter(User.phone == invite.recipient_contact).first()
-        
-        # Create in-app notification if user exists
-        if recipient_user:
-            notification = Notification(
-                user_id=recipient_user.id,
-                title=f"💰 Money Invite from {invite.sender_username}",
-                message=f"You've received ${invite.amount:.2f}! Tap to accept.",
-                notification_type="transaction",
-                extra_data={
-                    "invite_id": invite.id,
-                    "invite_token": invite.invite_token,
-                    "amount": invite.amount,
-                    "sender": invite.sender_username
-                }
-            )
-            db.add(notification)
-            db.commit()
-            
-            invite.notification_sent = True
-            invite.delivered_at = datetime.utcnow()
-            invite.status = "delivered"
-            db.commit()
-            
-            logger.info(f"In-app notification sent for invite {invite.id} to user {recipient_user.id}")
-        
-        # TODO: Send email notification
-        if invite.recipient_method == "email":
-            # In production, integrate with email service (SendGrid, AWS SES, etc.)
-            invite.email_sent = True
-            logger.info(f"Email would be sent to {invite.recipient_contact} for invite {invite.id}")
-        
-        # TODO: Send SMS notification
-        if invite.recipient_method == "phone":
-            # In production, integrate with SMS service (Twilio, AWS SNS, etc.)
-            invite.sms_sent = True
-            logger.info(f"SMS would be sent to {invite.recipient_contact} for invite {invite.id}")
-        
-        db.commit()
-        
-    except Exception as e:
-        logger.error(f"Error sending invite notification: {e}")
-
-
 # ============= ENDPOINTS =============
 
 @router.post("/send-invite", response_model=InviteResponse)
 async def send_money_invite(
     request: SendInviteRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Send money via email, phone, or username
@@ -139,13 +92,6 @@ async def send_money_invite(
     if request.amount > 10000:
         raise HTTPException(status_code=400, detail="Maximum invite amount is $10,000")
     
-    # Check sender balance
-    if current_user.balance < request.amount:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Insufficient balance. You have ${current_user.balance:.2f}"
-        )
-    
     # Validate method and contact
     method = request.method.lower()
     contact = request.contact.strip()
@@ -160,7 +106,7 @@ async def send_money_invite(
         contact = re.sub(r'[\s\-\(\)\+]', '', contact)
     elif method == "username":
         # Check if user exists
-        recipient = db.query(User).filter(User.username == contact).first()
+        recipient = await db.scalar(select(User).where(User.username == contact))
         if not recipient:
             raise HTTPException(status_code=404, detail="User not found")
         if recipient.id == current_user.id:
@@ -169,7 +115,14 @@ async def send_money_invite(
         raise HTTPException(status_code=400, detail="Method must be 'email', 'phone', or 'username'")
     
     # Deduct funds from sender (held until accepted or refunded)
-    current_user.balance -= request.amount
+    try:
+        await LedgerService.debit_async(db, current_user.id, Money.from_major(request.amount))
+    except InsufficientFunds:
+        await load_balance(db, current_user)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient balance. You have ${current_user.balance:.2f}"
+        )
     
     # Create transaction record (pending)
     transaction = Transaction(
@@ -186,7 +139,7 @@ async def send_money_invite(
         }
     )
     db.add(transaction)
-    db.flush()  # Get transaction ID
+    await db.flush()  # Get transaction ID
     
     # Create money invite
     invite_token = generate_invite_token()
@@ -205,15 +158,13 @@ async def send_money_invite(
         status="pending"
     )
     db.add(invite)
-    db.commit()
-    db.refresh(invite)
+    await db.commit()
+    await db.refresh(invite)
     
-    # Link invite to transaction
+    # Link invite to transaction; delivery (in-app, email, SMS) runs in job_worker.py
     transaction.invite_id = invite.id
-    db.commit()
-    
-    # Send notification
-    send_invite_notification(db, invite)
+    JobQueue.enqueue(db, DeliverInvite(invite_id=invite.id))
+    await db.commit()
     
     logger.info(f"Money invite created: {invite.id} from {current_user.username} to {contact} for ${request.amount}")
     
@@ -232,13 +183,17 @@ async def send_money_invite(
 
 @router.get("/invites/sent")
 async def get_sent_invites(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    limit: int = page_size(),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    """Get all invites sent by current user"""
-    invites = db.query(MoneyInvite).filter(
-        MoneyInvite.sender_id == current_user.id
-    ).order_by(MoneyInvite.created_at.desc()).all()
+    """Get invites sent by current user, newest first"""
+    stmt = select(MoneyInvite).where(MoneyInvite.sender_id == current_user.id)
+    rows = (await db.scalars(
+        keyset(stmt, MoneyInvite.created_at, MoneyInvite.id, cursor, limit)
+    )).all()
+    invites, next_cursor = page(rows, limit, "created_at")
     
     return {
         "invites": [
@@ -257,25 +212,32 @@ async def get_sent_invites(
                 "refunded_at": inv.refunded_at
             }
             for inv in invites
-        ]
+        ],
+        "next_cursor": next_cursor
     }
 
 
 @router.get("/invites/received")
 async def get_received_invites(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    limit: int = page_size(),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    """Get all pending invites for current user"""
+    """Get pending invites for current user, newest first"""
     # Check by username, email, and phone
-    invites = db.query(MoneyInvite).filter(
+    stmt = select(MoneyInvite).where(
         MoneyInvite.status.in_(["pending", "delivered", "opened"]),
         (
             (MoneyInvite.recipient_method == "username") & (MoneyInvite.recipient_contact == current_user.username) |
             (MoneyInvite.recipient_method == "email") & (MoneyInvite.recipient_contact == current_user.email) |
             (MoneyInvite.recipient_method == "phone") & (MoneyInvite.recipient_contact == current_user.phone)
         )
-    ).order_by(MoneyInvite.created_at.desc()).all()
+    )
+    rows = (await db.scalars(
+        keyset(stmt, MoneyInvite.created_at, MoneyInvite.id, cursor, limit)
+    )).all()
+    invites, next_cursor = page(rows, limit, "created_at")
     
     return {
         "invites": [
@@ -290,18 +252,19 @@ async def get_received_invites(
                 "invite_token": inv.invite_token
             }
             for inv in invites
-        ]
+        ],
+        "next_cursor": next_cursor
     }
 
 
 @router.post("/invites/{invite_id}/open")
 async def mark_invite_opened(
     invite_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Mark invite as opened by recipient"""
-    invite = db.query(MoneyInvite).filter(MoneyInvite.id == invite_id).first()
+    invite = await db.scalar(select(MoneyInvite).where(MoneyInvite.id == invite_id))
     if not invite:
         raise HTTPException(status_code=404, detail="Invite not found")
     
@@ -319,10 +282,10 @@ async def mark_invite_opened(
     if not invite.opened_at and invite.status in ["pending", "delivered"]:
         invite.opened_at = datetime.utcnow()
         invite.status = "opened"
-        db.commit()
+        await db.commit()
         
         # Notify sender
-        sender = db.query(User).filter(User.id == invite.sender_id).first()
+        sender = await db.scalar(select(User).where(User.id == invite.sender_id))
         if sender:
             notification = Notification(
                 user_id=sender.id,
@@ -331,23 +294,46 @@ async def mark_invite_opened(
                 notification_type="transaction"
             )
             db.add(notification)
-            db.commit()
+            await db.commit()
         
         logger.info(f"Invite {invite_id} opened by {current_user.username}")
     
     return {"message": "Invite marked as opened"}
 
 
+async def _close_invite(db: AsyncSession, invite: MoneyInvite, status: str, **values) -> bool:
+    """
+    Move an open, unexpired invite to status with one conditional UPDATE.
+    False when the expiry job or another request closed it first; only the
+    winner may move money.
+    """
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(MoneyInvite)
+        .where(
+            MoneyInvite.id == invite.id,
+            MoneyInvite.status.in_(OPEN_STATUSES),
+            MoneyInvite.expires_at > now
+        )
+        .values(status=status, responded_at=now, **values)
+        .execution_options(synchronize_session="fetch")
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        return False
+    return True
+
+
 @router.post("/invites/accept")
 async def accept_money_invite(
     request: AcceptInviteRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Accept a money invite and receive funds"""
-    invite = db.query(MoneyInvite).filter(
-        MoneyInvite.invite_token == request.invite_token
-    ).first()
+    invite = await db.scalar(
+        select(MoneyInvite).where(MoneyInvite.invite_token == request.invite_token)
+    )
     
     if not invite:
         raise HTTPException(status_code=404, detail="Invite not found")
@@ -369,25 +355,24 @@ async def accept_money_invite(
     if not is_recipient:
         raise HTTPException(status_code=403, detail="This invite is not for you")
     
-    # Add funds to recipient
-    current_user.balance += invite.amount
+    # Claim the invite before moving money; loses cleanly to the expiry job or a concurrent decline
+    if not await _close_invite(db, invite, "accepted", recipient_user_id=current_user.id):
+        raise HTTPException(status_code=400, detail="Invite is no longer open")
     
-    # Update invite status
-    invite.status = "accepted"
-    invite.responded_at = datetime.utcnow()
-    invite.recipient_user_id = current_user.id
+    # Add funds to recipient
+    new_balance = await LedgerService.credit_async(db, current_user.id, Money(invite.amount_minor))
     
     # Update original transaction
-    transaction = db.query(Transaction).filter(Transaction.id == invite.transaction_id).first()
+    transaction = await db.scalar(select(Transaction).where(Transaction.id == invite.transaction_id))
     if transaction:
         transaction.status = "completed"
         transaction.receiver = current_user.username
         transaction.processed_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
     
     # Notify sender
-    sender = db.query(User).filter(User.id == invite.sender_id).first()
+    sender = await db.scalar(select(User).where(User.id == invite.sender_id))
     if sender:
         notification = Notification(
             user_id=sender.id,
@@ -396,31 +381,35 @@ async def accept_money_invite(
             notification_type="transaction"
         )
         db.add(notification)
-        db.commit()
+        await db.commit()
     
     logger.info(f"Invite {invite.id} accepted by {current_user.username}")
     
     return {
         "message": "Invite accepted successfully",
         "amount": invite.amount,
-        "new_balance": current_user.balance
+        "new_balance": new_balance.to_float()
     }
 
 
 @router.post("/invites/{invite_id}/decline")
 async def decline_money_invite(
     invite_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Decline a money invite and refund sender"""
-    invite = db.query(MoneyInvite).filter(MoneyInvite.id == invite_id).first()
+    invite = await db.scalar(select(MoneyInvite).where(MoneyInvite.id == invite_id))
     if not invite:
         raise HTTPException(status_code=404, detail="Invite not found")
     
     if invite.status not in ["pending", "delivered", "opened"]:
         raise HTTPException(status_code=400, detail=f"Invite already {invite.status}")
     
+    # Expired invites are refunded by the expiry job
+    if datetime.utcnow() > invite.expires_at:
+        raise HTTPException(status_code=400, detail="Invite has expired")
+    
     # Check if current user is recipient
     is_recipient = (
         (invite.recipient_method == "username" and invite.recipient_contact == current_user.username) or
@@ -431,10 +420,14 @@ async def decline_money_invite(
     if not is_recipient:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    # Claim the invite before refunding; loses cleanly to the expiry job or a concurrent accept
+    if not await _close_invite(db, invite, "declined"):
+        raise HTTPException(status_code=400, detail="Invite is no longer open")
+    
     # Refund sender
-    sender = db.query(User).filter(User.id == invite.sender_id).first()
+    sender = await db.scalar(select(User).where(User.id == invite.sender_id))
     if sender:
-        sender.balance += invite.amount
+        await LedgerService.credit_async(db, sender.id, Money(invite.amount_minor))
         
         # Create refund transaction
         refund_transaction = Transaction(
@@ -450,7 +443,7 @@ async def decline_money_invite(
             }
         )
         db.add(refund_transaction)
-        db.flush()
+        await db.flush()
         
         invite.refund_transaction_id = refund_transaction.id
         
@@ -463,16 +456,12 @@ async def decline_money_invite(
         )
         db.add(notification)
     
-    # Update invite status
-    invite.status = "declined"
-    invite.responded_at = datetime.utcnow()
-    
     # Update original transaction
-    transaction = db.query(Transaction).filter(Transaction.id == invite.transaction_id).first()
+    transaction = await db.scalar(select(Transaction).where(Transaction.id == invite.transaction_id))
     if transaction:
         transaction.status = "refunded"
     
-    db.commit()
+    await db.commit()
     
     logger.info(f"Invite {invite_id} declined by {current_user.username}, sender refunded")
     
@@ -482,11 +471,11 @@ async def decline_money_invite(
 @router.get("/invites/{invite_id}/status")
 async def get_invite_status(
     invite_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Get detailed status of an invite"""
-    invite = db.query(MoneyInvite).filter(MoneyInvite.id == invite_id).first()
+    invite = await db.scalar(select(MoneyInvite).where(MoneyInvite.id == invite_id))
     if not invite:
         raise HTTPException(status_code=404, detail="Invite not found")
     
@@ -0,0 +1,71 @@
+"""
+Notification Feed Routes
+A user's direct notifications and broadcasts in one newest-first feed
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from database import get_async_db
+from models import User
+from auth import get_current_user_async
+from pagination import page_size
+from services.notification_feed_service import NotificationFeedService
+
+router = APIRouter()
+
+
+class MarkReadRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+# ============= ENDPOINTS =============
+
+@router.get("/notifications")
+async def get_notifications(
+    cursor: Optional[str] = None,
+    limit: int = page_size(),
+    unread_only: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Direct and broadcast notifications, newest first, with cursor pagination"""
+    notifications, next_cursor = await NotificationFeedService.feed(
+        db, current_user, cursor, limit, unread_only=unread_only
+    )
+    return {
+        "notifications": notifications,
+        "limit": limit,
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/notifications/unread-count")
+async def get_unread_count(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    return {"unread": await NotificationFeedService.unread_count(db, current_user)}
+
+
+@router.post("/notifications/read")
+async def mark_notifications_read(
+    request: MarkReadRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Mark specific notifications (direct or broadcast) as read"""
+    marked = await NotificationFeedService.mark_read(db, current_user, request.ids)
+    await db.commit()
+    return {"marked": marked}
+
+
+@router.post("/notifications/read-all")
+async def mark_all_notifications_read(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    await NotificationFeedService.mark_all_read(db, current_user)
+    await db.commit()
+    return {"message": "All notifications marked as read"}
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import User, Transaction, PaymentMethod
-from utils.security import decode_token
+from auth import get_current_user_async
 from utils.stripe_service import StripeService
+from money import Money
+from services.ledger_service import LedgerService, InsufficientFunds
+from services.stripe_gateway import scoped_key
 from pydantic import BaseModel
 from datetime import datetime
+from decimal import Decimal
+from typing import Optional
 
 router = APIRouter()
 
@@ -25,24 +31,11 @@ class WithdrawRequest(BaseModel):
     amount: float
     instant_transfer: bool = False  # Optional instant transfer (with fee)
 
-def get_current_user(authorization: str = Header(...), db: Session = Depends(get_db)):
-    """Get current user from JWT token"""
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = decode_token(token)
-        username = payload.get("username")  # Changed from "sub" to "username"
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
 @router.post("/payment-methods/card")
 async def add_card(
     request: AddCardRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a credit/debit card to user's account"""
     try:
@@ -52,7 +45,7 @@ async def add_card(
             if not customer_id:
                 raise HTTPException(status_code=400, detail="Failed to create customer")
             current_user.stripe_customer_id = customer_id
-            db.commit()
+            await db.commit()
         
         # Attach payment method to customer
         payment_method = await StripeService.attach_payment_method(
@@ -73,7 +66,7 @@ async def add_card(
             is_default=False
         )
         db.add(db_payment_method)
-        db.commit()
+        await db.commit()
         
         return {
             "message": "Card added successfully",
@@ -91,8 +84,9 @@ async def add_card(
 @router.post("/deposit")
 async def deposit_from_card(
     request: DepositRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Deposit money from card to BlackWallet balance"""
     try:
@@ -103,26 +97,28 @@ async def deposit_from_card(
             raise HTTPException(status_code=400, detail="No payment methods found")
         
         # Convert to cents for Stripe
-        amount_cents = int(request.amount * 100)
+        amount = Money.from_major(request.amount)
+        amount_cents = amount.minor
         
         # Create payment intent
         payment_intent = await StripeService.create_payment_intent(
             amount_cents,
             current_user.stripe_customer_id,
-            request.payment_method_id
+            request.payment_method_id,
+            idempotency_key=scoped_key(current_user.id, "deposit", idempotency_key)
         )
         
         if not payment_intent or payment_intent.status != "succeeded":
             raise HTTPException(status_code=400, detail="Payment failed")
         
         # Add to user balance
-        current_user.balance += request.amount
+        new_balance = await LedgerService.credit_async(db, current_user.id, amount)
         
         # Record transaction
         transaction = Transaction(
             sender="stripe_card",
             receiver=current_user.username,
-            amount=request.amount,
+            amount_minor=amount.minor,
             transaction_type="deposit",
             external_provider="stripe",
             external_transaction_id=payment_intent.id,
@@ -130,24 +126,24 @@ async def deposit_from_card(
             created_at=datetime.utcnow()
         )
         db.add(transaction)
-        db.commit()
+        await db.commit()
         
         return {
             "message": "Deposit successful",
-            "new_balance": current_user.balance,
+            "new_balance": new_balance.to_float(),
             "transaction_id": transaction.id
         }
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/payment-methods/bank")
 async def add_bank_account(
     request: AddBankAccountRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a bank account for ACH transfers"""
     try:
@@ -167,7 +163,7 @@ async def add_bank_account(
             is_default=False
         )
         db.add(db_payment_method)
-        db.commit()
+        await db.commit()
         
         return {
             "message": "Bank account added successfully (verification required)",
@@ -185,43 +181,42 @@ async def add_bank_account(
 @router.post("/withdraw")
 async def withdraw_to_bank(
     request: WithdrawRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Withdraw money from BlackWallet to bank account"""
     try:
-        if request.amount <= 0:
+        amount = Money.from_major(request.amount)
+        if amount.minor <= 0:
             raise HTTPException(status_code=400, detail="Amount must be positive")
         
         # Calculate instant transfer fee (1.5% with $0.25 minimum)
-        instant_fee = 0.0
-        total_amount = request.amount
+        fee = Money.zero()
         
         if request.instant_transfer:
-            instant_fee = max(request.amount * 0.015, 0.25)
-            total_amount = request.amount + instant_fee
-        
-        if current_user.balance < total_amount:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient balance. Need ${total_amount:.2f} (${request.amount:.2f} + ${instant_fee:.2f} fee)"
-            )
-        
-        # Convert to cents
-        amount_cents = int(request.amount * 100)
+            fee = max(amount * Decimal("0.015"), Money.from_major("0.25"))
+        total = amount + fee
+        instant_fee = fee.to_float()
+        total_amount = total.to_float()
         
         # Create payout (in production, this requires connected account setup)
         # For now, we'll simulate the withdrawal
         
         # Deduct from balance (including fee for instant transfer)
-        current_user.balance -= total_amount
+        try:
+            new_balance = await LedgerService.debit_async(db, current_user.id, total)
+        except InsufficientFunds:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Insufficient balance. Need ${total_amount:.2f} (${request.amount:.2f} + ${instant_fee:.2f} fee)"
+            )
         
         # Record transaction
         status = "completed" if request.instant_transfer else "pending"
         transaction = Transaction(
             sender=current_user.username,
             receiver="bank_account",
-            amount=request.amount,
+            amount_minor=amount.minor,
             transaction_type="withdrawal",
             external_provider="stripe",
             external_transaction_id=f"{'instant' if request.instant_transfer else 'pending'}_{datetime.utcnow().timestamp()}",
@@ -236,11 +231,11 @@ async def withdraw_to_bank(
         db.add(transaction)
         
         # Record fee transaction if instant transfer
-        if request.instant_transfer and instant_fee > 0:
+        if request.instant_transfer and fee.minor > 0:
             fee_transaction = Transaction(
                 sender=current_user.username,
                 receiver="system_fees",
-                amount=instant_fee,
+                amount_minor=fee.minor,
                 transaction_type="fee",
                 external_provider="internal",
                 status="completed",
@@ -249,13 +244,13 @@ async def withdraw_to_bank(
             )
             db.add(fee_transaction)
         
-        db.commit()
+        await db.commit()
         
         transfer_time = "Instant (within minutes)" if request.instant_transfer else "1-3 business days"
         
         return {
             "message": f"Withdrawal initiated ({transfer_time})",
-            "new_balance": current_user.balance,
+            "new_balance": new_balance.to_float(),
             "transaction_id": transaction.id,
             "status": status,
             "instant_transfer": request.instant_transfer,
@@ -265,18 +260,18 @@ async def withdraw_to_bank(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/payment-methods")
 async def get_payment_methods(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all payment methods for current user"""
-    payment_methods = db.query(PaymentMethod).filter(
-        PaymentMethod.user_id == current_user.id
-    ).all()
+    payment_methods = (await db.scalars(
+        select(PaymentMethod).where(PaymentMethod.user_id == current_user.id)
+    )).all()
     
     return {
         "payment_methods": [
@@ -294,14 +289,16 @@ async def get_payment_methods(
 @router.delete("/payment-methods/{payment_method_id}")
 async def remove_payment_method(
     payment_method_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Remove a payment method"""
-    payment_method = db.query(PaymentMethod).filter(
-        PaymentMethod.id == payment_method_id,
-        PaymentMethod.user_id == current_user.id
-    ).first()
+    payment_method = await db.scalar(
+        select(PaymentMethod).where(
+            PaymentMethod.id == payment_method_id,
+            PaymentMethod.user_id == current_user.id
+        )
+    )
     
     if not payment_method:
         raise HTTPException(status_code=404, detail="Payment method not found")
@@ -310,7 +307,7 @@ async def remove_payment_method(
     await StripeService.detach_payment_method(payment_method.stripe_payment_method_id)
     
     # Delete from database
-    db.delete(payment_method)
-    db.commit()
+    await db.delete(payment_method)
+    await db.commit()
     
     return {"message": "Payment method removed successfully"}
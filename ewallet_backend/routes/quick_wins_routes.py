@@ -1,9 +1,9 @@
 """
 API Routes for Quick Win Features
 """
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from database import get_db
@@ -13,25 +13,12 @@ from services.quick_wins_services import (
     FavoriteService, ScheduledPaymentService, PaymentLinkService,
     TransactionSearchService, SubWalletService, QRLimitService
 )
-from utils.security import decode_token
+from auth import get_current_user
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter()
 
 
-def get_current_user(authorization: str = Header(...), db: Session = Depends(get_db)):
-    """Get current user from JWT token"""
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = decode_token(token)
-        username = payload.get("username")
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-
 # ==================== FAVORITES ====================
 
 class AddFavoriteRequest(BaseModel):
@@ -320,6 +307,8 @@ class SearchTransactionsRequest(BaseModel):
     end_date: Optional[str] = None
     transaction_type: Optional[str] = None
     tags: Optional[List[str]] = None
+    cursor: Optional[str] = None
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 
 @router.post("/transactions/search")
 async def search_transactions(
@@ -336,7 +325,7 @@ async def search_transactions(
     if request.end_date:
         end_date = datetime.fromisoformat(request.end_date.replace('Z', '+00:00'))
     
-    transactions = TransactionSearchService.search_transactions(
+    transactions, next_cursor = TransactionSearchService.search_transactions(
         user=current_user,
         query=request.query,
         min_amount=request.min_amount,
@@ -345,11 +334,14 @@ async def search_transactions(
         end_date=end_date,
         transaction_type=request.transaction_type,
         tags=request.tags,
+        cursor=request.cursor,
+        limit=request.limit,
         db=db
     )
     
     return {
         "count": len(transactions),
+        "next_cursor": next_cursor,
         "transactions": [
             {
                 "id": txn.id,
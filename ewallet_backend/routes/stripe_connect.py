@@ -2,16 +2,18 @@
 Stripe Connect Routes for Real Money Operations
 Handles account creation, onboarding, bank accounts, deposits, and withdrawals
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional, Dict
+import asyncio
 import logging
 
 from database import get_db
 from models import User
 from auth import get_current_user
 from services.stripe_service import StripePaymentService
+from services.stripe_gateway import get_stripe_gateway, scoped_key
 
 router = APIRouter(prefix="/stripe-connect", tags=["Stripe Connect"])
 logger = logging.getLogger(__name__)
@@ -216,7 +218,8 @@ async def list_bank_accounts(
 async def deposit_money(
     request: DepositRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Deposit real money from user's bank account into their wallet.
@@ -237,7 +240,8 @@ async def deposit_money(
             user_id=current_user.id,
             amount=request.amount,
             payment_method_id=request.payment_method_id,
-            stripe_account_id=current_user.stripe_account_id
+            stripe_account_id=current_user.stripe_account_id,
+            idempotency_key=scoped_key(current_user.id, "deposit", idempotency_key)
         )
         
         # Add funds to wallet balance
@@ -264,7 +268,8 @@ async def deposit_money(
 async def withdraw_money(
     request: WithdrawRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Withdraw money from wallet to user's bank account.
@@ -290,7 +295,8 @@ async def withdraw_money(
         result = await StripePaymentService.process_withdrawal(
             user_id=current_user.id,
             amount=request.amount,
-            stripe_account_id=current_user.stripe_account_id
+            stripe_account_id=current_user.stripe_account_id,
+            idempotency_key=scoped_key(current_user.id, "withdraw", idempotency_key)
         )
         
         # Deduct from wallet balance
@@ -339,6 +345,18 @@ async def get_stripe_transactions(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _create_customer(user: User, db: Session):
+    """Create the user's Stripe customer and store its id"""
+    gateway = get_stripe_gateway()
+    customer = await gateway.call(gateway.client.customers.create_async, params={
+        "email": user.email,
+        "name": user.full_name,
+        "metadata": {"user_id": str(user.id)}
+    }, idempotency_key=f"customer:{user.id}")
+    user.stripe_customer_id = customer.id
+    db.commit()
+
+
 @router.post("/setup-intent")
 async def create_setup_intent(
     current_user: User = Depends(get_current_user),
@@ -349,23 +367,17 @@ async def create_setup_intent(
     Used when users want to add cards/bank accounts for future deposits.
     """
     try:
-        import stripe
+        gateway = get_stripe_gateway()
         
         # Create or get Stripe customer
         if not current_user.stripe_customer_id:
-            customer = stripe.Customer.create(
-                email=current_user.email,
-                name=current_user.full_name,
-                metadata={"user_id": str(current_user.id)}
-            )
-            current_user.stripe_customer_id = customer.id
-            db.commit()
+            await _create_customer(current_user, db)
         
         # Create setup intent
-        setup_intent = stripe.SetupIntent.create(
-            customer=current_user.stripe_customer_id,
-            payment_method_types=["card"],
-        )
+        setup_intent = await gateway.call(gateway.client.setup_intents.create_async, params={
+            "customer": current_user.stripe_customer_id,
+            "payment_method_types": ["card"],
+        })
         
         return {
             "client_secret": setup_intent.client_secret,
@@ -388,7 +400,7 @@ async def create_deposit_intent(
     Returns client secret for Stripe payment sheet.
     """
     try:
-        import stripe
+        gateway = get_stripe_gateway()
         
         if request.amount <= 0:
             raise HTTPException(status_code=400, detail="Amount must be positive")
@@ -398,31 +410,26 @@ async def create_deposit_intent(
         
         # Create or get Stripe customer
         if not current_user.stripe_customer_id:
-            customer = stripe.Customer.create(
-                email=current_user.email,
-                name=current_user.full_name,
-                metadata={"user_id": str(current_user.id)}
-            )
-            current_user.stripe_customer_id = customer.id
-            db.commit()
+            await _create_customer(current_user, db)
         
-        # Create ephemeral key
-        ephemeral_key = stripe.EphemeralKey.create(
-            customer=current_user.stripe_customer_id,
-            stripe_version="2024-11-20.acacia",
-        )
-        
-        # Create payment intent
+        # Ephemeral key and payment intent are independent; create them concurrently
         amount_cents = int(request.amount * 100)
-        payment_intent = stripe.PaymentIntent.create(
-            amount=amount_cents,
-            currency="usd",
-            customer=current_user.stripe_customer_id,
-            automatic_payment_methods={"enabled": True},
-            metadata={
-                "user_id": str(current_user.id),
-                "type": "deposit"
-            }
+        ephemeral_key, payment_intent = await asyncio.gather(
+            gateway.call(
+                gateway.client.ephemeral_keys.create_async,
+                params={"customer": current_user.stripe_customer_id},
+                stripe_version="2024-11-20.acacia"
+            ),
+            gateway.call(gateway.client.payment_intents.create_async, params={
+                "amount": amount_cents,
+                "currency": "usd",
+                "customer": current_user.stripe_customer_id,
+                "automatic_payment_methods": {"enabled": True},
+                "metadata": {
+                    "user_id": str(current_user.id),
+                    "type": "deposit"
+                }
+            })
         )
         
         return {
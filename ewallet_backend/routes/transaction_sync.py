@@ -4,14 +4,18 @@ Handles synchronization of transactions created while offline
 """
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
 from typing import Optional, Dict, List
+from collections import defaultdict
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 
 from database import get_db
 from models import User, Transaction
 from auth import get_current_user
+from money import Money
+from services.ledger_service import LedgerService, InsufficientFunds
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"])
 logger = logging.getLogger(__name__)
@@ -25,6 +29,22 @@ class OfflineTransactionSync(BaseModel):
     device_id: str
     queued_at: str
     extra_data: Optional[Dict] = None
+    idempotency_key: Optional[str] = None  # Generated on the device; retries reuse it
+    
+    def sync_key(self) -> str:
+        """Idempotency key, derived from the queued item for clients that send none"""
+        if self.idempotency_key:
+            return self.idempotency_key
+        amount_minor = Money.from_major(self.amount).minor
+        return f"{self.device_id}:{self.queued_at}:{self.receiver}:{amount_minor}"
+
+
+def _parse_queued_at(value: str) -> datetime:
+    """Device timestamp (ISO 8601) as naive UTC, like every other stored datetime"""
+    queued_at = datetime.fromisoformat(value)
+    if queued_at.tzinfo:
+        queued_at = queued_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return queued_at
 
 
 @router.post("/sync-offline")
@@ -45,13 +65,17 @@ async def sync_offline_transaction(
                 detail="Cannot sync transaction for another user"
             )
         
+        try:
+            queued_at = _parse_queued_at(transaction.queued_at)
+            amount = Money.from_major(transaction.amount)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid offline transaction: {e}")
+        
         # Check if transaction already exists (prevent duplicates)
+        key = transaction.sync_key()
         existing = db.query(Transaction).filter(
             Transaction.sender == transaction.sender,
-            Transaction.receiver == transaction.receiver,
-            Transaction.amount == transaction.amount,
-            Transaction.device_id == transaction.device_id,
-            Transaction.created_at >= datetime.fromisoformat(transaction.queued_at)
+            Transaction.idempotency_key == key
         ).first()
         
         if existing:
@@ -62,41 +86,37 @@ async def sync_offline_transaction(
                 "transaction_id": existing.id
             }
         
-        # Validate sender has sufficient balance
-        if current_user.balance < transaction.amount:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient balance. Available: ${current_user.balance:.2f}"
-            )
-        
         # Find receiver
         receiver = db.query(User).filter(User.username == transaction.receiver).first()
         if not receiver:
             raise HTTPException(status_code=404, detail="Receiver not found")
         
-        # Process transaction
-        current_user.balance -= transaction.amount
-        receiver.balance += transaction.amount
+        # Process transaction (conditional debit validates the balance atomically)
+        try:
+            LedgerService.transfer(db, current_user.id, receiver.id, amount)
+        except InsufficientFunds:
+            db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=f"Insufficient balance. Available: ${current_user.balance:.2f}"
+            )
         
         # Create transaction record
         new_transaction = Transaction(
             sender=transaction.sender,
             receiver=transaction.receiver,
-            amount=transaction.amount,
+            amount_minor=amount.minor,
             transaction_type=transaction.transaction_type,
             status="completed",
             is_offline=True,
             device_id=transaction.device_id,
-            created_at=datetime.fromisoformat(transaction.queued_at),
+            idempotency_key=key,
+            created_at=queued_at,
             processed_at=datetime.utcnow(),
             extra_data=transaction.extra_data
         )
         
         db.add(new_transaction)
-        db.commit()
-        db.refresh(new_transaction)
-        
-        # Update user's last sync time
         current_user.last_sync_at = datetime.utcnow()
         db.commit()
         
@@ -129,114 +149,125 @@ async def sync_batch_transactions(
 ):
     """
     Sync multiple offline transactions in a batch.
-    More efficient than syncing one at a time.
+    Receivers and duplicates are looked up once for the whole batch, items are
+    applied in queue order against the locked balance, and everything commits
+    together with one debit for the sender and one credit per receiver.
     """
-    results = []
-    successful = 0
-    failed = 0
+    results: List[Optional[Dict]] = [None] * len(transactions)
+    pending = []  # (index, item, key, queued_at, amount)
     
-    for trans in transactions:
+    for index, trans in enumerate(transactions):
+        if trans.sender != current_user.username:
+            results[index] = _sync_result("failed", trans, error="Cannot sync transaction for another user")
+            continue
         try:
-            # Verify sender
-            if trans.sender != current_user.username:
-                results.append({
-                    "status": "failed",
-                    "transaction": trans.dict(),
-                    "error": "Cannot sync transaction for another user"
-                })
-                failed += 1
-                continue
-            
-            # Check for duplicates
-            existing = db.query(Transaction).filter(
-                Transaction.sender == trans.sender,
-                Transaction.receiver == trans.receiver,
-                Transaction.amount == trans.amount,
-                Transaction.device_id == trans.device_id
-            ).first()
-            
-            if existing:
-                results.append({
-                    "status": "duplicate",
-                    "transaction": trans.dict(),
-                    "transaction_id": existing.id
-                })
-                successful += 1
-                continue
-            
-            # Validate balance
-            if current_user.balance < trans.amount:
-                results.append({
-                    "status": "failed",
-                    "transaction": trans.dict(),
-                    "error": f"Insufficient balance for transaction"
-                })
-                failed += 1
-                continue
-            
-            # Find receiver
-            receiver = db.query(User).filter(User.username == trans.receiver).first()
-            if not receiver:
-                results.append({
-                    "status": "failed",
-                    "transaction": trans.dict(),
-                    "error": "Receiver not found"
-                })
-                failed += 1
-                continue
-            
-            # Process transaction
-            current_user.balance -= trans.amount
-            receiver.balance += trans.amount
-            
-            # Create record
-            new_transaction = Transaction(
-                sender=trans.sender,
-                receiver=trans.receiver,
-                amount=trans.amount,
-                transaction_type=trans.transaction_type,
-                status="completed",
-                is_offline=True,
-                device_id=trans.device_id,
-                created_at=datetime.fromisoformat(trans.queued_at),
-                processed_at=datetime.utcnow(),
-                extra_data=trans.extra_data
-            )
-            
-            db.add(new_transaction)
-            db.commit()
-            db.refresh(new_transaction)
-            
-            results.append({
-                "status": "success",
-                "transaction": trans.dict(),
-                "transaction_id": new_transaction.id
-            })
-            successful += 1
-            
-        except Exception as e:
-            logger.error(f"Error syncing transaction: {e}")
-            db.rollback()
-            results.append({
-                "status": "failed",
-                "transaction": trans.dict(),
-                "error": str(e)
-            })
-            failed += 1
+            queued_at = _parse_queued_at(trans.queued_at)
+            amount = Money.from_major(trans.amount)
+        except ValueError as e:
+            results[index] = _sync_result("failed", trans, error=str(e))
+            continue
+        if amount.minor <= 0:
+            results[index] = _sync_result("failed", trans, error="Amount must be positive")
+            continue
+        pending.append((index, trans, trans.sync_key(), queued_at, amount))
+    
+    # One query each for already-synced keys and receivers
+    keys = {key for _, _, key, _, _ in pending}
+    existing = dict(db.query(Transaction.idempotency_key, Transaction.id).filter(
+        Transaction.sender == current_user.username,
+        Transaction.idempotency_key.in_(keys)
+    ).all()) if keys else {}
+    
+    receiver_names = {trans.receiver for _, trans, _, _, _ in pending}
+    receivers = dict(db.query(User.username, User.id).filter(
+        User.username.in_(receiver_names)
+    ).all()) if receiver_names else {}
+    
+    # Plan the balance changes in queue order against the locked balances
+    balances = LedgerService.lock_balances(db, current_user.id, *receivers.values())
+    available = balances.get(current_user.id, 0)
+    debit_total = 0
+    credits = defaultdict(int)
+    accepted = []  # (index, Transaction)
+    seen_keys = {}
     
-    # Update last sync time
-    current_user.last_sync_at = datetime.utcnow()
-    db.commit()
+    for index, trans, key, queued_at, amount in sorted(pending, key=lambda p: (p[3], p[0])):
+        if key in existing:
+            results[index] = _sync_result("duplicate", trans, transaction_id=existing[key])
+            continue
+        if key in seen_keys:
+            seen_keys[key].append(index)
+            continue
+        receiver_id = receivers.get(trans.receiver)
+        if receiver_id is None:
+            results[index] = _sync_result("failed", trans, error="Receiver not found")
+            continue
+        if receiver_id == current_user.id:
+            results[index] = _sync_result("failed", trans, error="Cannot transfer to yourself")
+            continue
+        if available - debit_total < amount.minor:
+            results[index] = _sync_result("failed", trans, error="Insufficient balance for transaction")
+            continue
+        
+        debit_total += amount.minor
+        credits[receiver_id] += amount.minor
+        seen_keys[key] = []
+        accepted.append((index, Transaction(
+            sender=trans.sender,
+            receiver=trans.receiver,
+            amount_minor=amount.minor,
+            transaction_type=trans.transaction_type,
+            status="completed",
+            is_offline=True,
+            device_id=trans.device_id,
+            idempotency_key=key,
+            created_at=queued_at,
+            processed_at=datetime.utcnow(),
+            extra_data=trans.extra_data
+        )))
+    
+    try:
+        if debit_total:
+            LedgerService.debit(db, current_user.id, Money(debit_total))
+            for receiver_id in sorted(credits):
+                LedgerService.credit(db, receiver_id, Money(credits[receiver_id]))
+        db.add_all([txn for _, txn in accepted])
+        current_user.last_sync_at = datetime.utcnow()
+        db.commit()
+    except InsufficientFunds:
+        # Balance moved underneath us despite the lock (SQLite has no FOR UPDATE)
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Balance changed during sync, please retry")
+    except IntegrityError:
+        # A concurrent sync of the same items committed first
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Batch is already being synced, please retry")
+    
+    for index, txn in accepted:
+        trans = transactions[index]
+        results[index] = _sync_result("success", trans, transaction_id=txn.id)
+        for duplicate_index in seen_keys[txn.idempotency_key]:
+            results[duplicate_index] = _sync_result("duplicate", transactions[duplicate_index], transaction_id=txn.id)
+    
+    failed = sum(1 for result in results if result["status"] == "failed")
+    logger.info(
+        f"Batch sync for {current_user.username}: {len(accepted)} applied, "
+        f"{len(transactions) - len(accepted) - failed} duplicates, {failed} failed"
+    )
     
     return {
         "total": len(transactions),
-        "successful": successful,
+        "successful": len(transactions) - failed,
         "failed": failed,
         "results": results,
         "new_balance": current_user.balance
     }
 
 
+def _sync_result(status: str, trans: OfflineTransactionSync, **fields) -> Dict:
+    return {"status": status, "transaction": trans.dict(), **fields}
+
+
 @router.get("/offline-status")
 async def get_offline_status(
     current_user: User = Depends(get_current_user),
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import SessionLocal, get_async_db
 from models import User
 from schemas import UserCreate, UserLogin
-from utils.security import hash_password, verify_password, create_token
+from utils.security import hash_password_async, verify_password_async, create_token
 from services.stripe_service import StripePaymentService
 import logging
 
@@ -35,7 +37,7 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
     # Create new user with all fields
     new_user = User(
         username=user.username,
-        password=hash_password(user.password),
+        password=await hash_password_async(user.password),
         email=user.email,
         phone=user.phone,
         full_name=user.full_name
@@ -70,14 +72,23 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter_by(username=user.username).first()
-    if not db_user or not verify_password(user.password, db_user.password):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.username == user.username))
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # The KDF runs on the credential pool, not the event loop
+    valid, new_hash = await verify_password_async(user.password, db_user.password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if db_user.is_suspended:
+        raise HTTPException(status_code=403, detail="Account suspended")
+    if new_hash:
+        db_user.password = new_hash  # Stored hash used an outdated scheme or cost
     token = create_token({
         "user_id": db_user.id,
         "username": db_user.username,
-        "is_admin": db_user.is_admin
+        "is_admin": db_user.is_admin,
+        "tv": db_user.token_version or 0  # Token version, bumped to revoke sessions
     })
     return {
         "token": token,
@@ -1,35 +1,35 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import User, Transaction
 from schemas import Transfer
-from auth import get_current_user
+from auth import get_current_user_async, load_balance
+from money import Money
+from services.ledger_service import LedgerService, InsufficientFunds
+from pagination import keyset, page, page_size
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/me")
-def get_current_user_info(user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_current_user_info(user=Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    await load_balance(db, user)
     return {"username": user.username, "balance": user.balance, "is_admin": user.is_admin}
 
 @router.get("/balance")
-def get_balance(user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_balance(user=Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    await load_balance(db, user)
     return {"balance": user.balance}
 
 @router.post("/transfer")
-def transfer(data: Transfer, user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def transfer(data: Transfer, user=Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
     # Verify the sender is the authenticated user
     if data.sender != user.username:
         raise HTTPException(status_code=403, detail="Cannot transfer from another user's account")
     
-    sender = db.query(User).filter_by(username=data.sender).first()
-    receiver = db.query(User).filter_by(username=data.receiver).first()
+    sender = await db.scalar(select(User).filter_by(username=data.sender))
+    receiver = await db.scalar(select(User).filter_by(username=data.receiver))
     
     if not sender:
         raise HTTPException(status_code=404, detail="Sender not found")
@@ -37,23 +37,35 @@ def transfer(data: Transfer, user=Depends(get_current_user), db: Session = Depen
         raise HTTPException(status_code=404, detail="Receiver not found")
     if sender.username == receiver.username:
         raise HTTPException(status_code=400, detail="Cannot transfer to yourself")
-    if sender.balance < data.amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-    if data.amount <= 0:
+    amount = Money.from_major(data.amount)
+    if amount.minor <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
     
-    sender.balance -= data.amount
-    receiver.balance += data.amount
-    db.add(Transaction(sender=data.sender, receiver=data.receiver, amount=data.amount))
-    db.commit()
-    return {"msg": "Transfer complete", "new_balance": sender.balance}
+    # Conditional debit + credit in one DB transaction (safe across workers)
+    try:
+        new_balance, _ = await LedgerService.transfer_async(db, sender.id, receiver.id, amount)
+    except InsufficientFunds:
+        raise HTTPException(status_code=400, detail="Insufficient funds")
+    
+    db.add(Transaction(sender=data.sender, receiver=data.receiver, amount_minor=amount.minor))
+    await db.commit()
+    return {"msg": "Transfer complete", "new_balance": new_balance.to_float()}
 
 @router.get("/transactions")
-def get_transactions(user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_transactions(
+    cursor: Optional[str] = None,
+    limit: int = page_size(),
+    user=Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
     username = user.username
-    transactions = db.query(Transaction).filter(
+    stmt = select(Transaction).where(
         (Transaction.sender == username) | (Transaction.receiver == username)
-    ).order_by(Transaction.id.desc()).limit(50).all()
+    )
+    rows = (await db.scalars(
+        keyset(stmt, Transaction.created_at, Transaction.id, cursor, limit)
+    )).all()
+    transactions, next_cursor = page(rows, limit, "created_at")
     
     return {
         "transactions": [
@@ -62,8 +74,10 @@ def get_transactions(user=Depends(get_current_user), db: Session = Depends(get_d
                 "sender": t.sender,
                 "receiver": t.receiver,
                 "amount": t.amount,
-                "type": "sent" if t.sender == username else "received"
+                "type": "sent" if t.sender == username else "received",
+                "created_at": t.created_at
             }
             for t in transactions
-        ]
+        ],
+        "next_cursor": next_cursor
     }
@@ -4,10 +4,12 @@ Checks for expired invites every 5 minutes and processes refunds
 """
 import schedule
 import time
-from datetime import datetime
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import MoneyInvite, Transaction, User, Notification
+from database import SessionLocal, leader_lock
+from money import MINOR_PER_MAJOR
+from services.idempotency_service import IdempotencyService
+from services.invite_expiry_service import InviteExpiryService
+from services.job_queue import DatabaseJobBackend
+from services.webhook_inbox import WebhookInbox
 from logger import get_logger
 
 logger = get_logger(__name__)
@@ -15,92 +17,95 @@ logger = get_logger(__name__)
 
 def process_expired_invites():
     """
-    Check for expired invites and refund the sender
-    Runs every 5 minutes
+    Refund senders of expired invites
+    Runs every 5 minutes; only the worker holding the leader lock does the work
     """
-    db = SessionLocal()
     try:
-        # Find all pending/delivered/opened invites that have expired
-        now = datetime.utcnow()
-        expired_invites = db.query(MoneyInvite).filter(
-            MoneyInvite.status.in_(["pending", "delivered", "opened"]),
-            MoneyInvite.expires_at <= now
-        ).all()
-        
-        if not expired_invites:
+        with leader_lock("process_expired_invites") as leader:
+            if not leader:
+                logger.debug("Invite expiry already running in another worker")
+                return
+            totals = InviteExpiryService.run(SessionLocal)
+        if totals["expired"] or totals["orphaned"]:
+            logger.info(
+                f"Expired {totals['expired']} invites, refunded "
+                f"${totals['refunded_minor'] / MINOR_PER_MAJOR:.2f}"
+                + (f" ({totals['orphaned']} without a sender)" if totals["orphaned"] else "")
+            )
+        else:
             logger.debug("No expired invites to process")
-            return
-        
-        logger.info(f"Processing {len(expired_invites)} expired invites")
-        
-        for invite in expired_invites:
-            try:
-                # Get sender
-                sender = db.query(User).filter(User.id == invite.sender_id).first()
-                if not sender:
-                    logger.error(f"Sender not found for invite {invite.id}")
-                    continue
-                
-                # Refund sender
-                sender.balance += invite.amount
-                
-                # Create refund transaction
-                refund_transaction = Transaction(
-                    sender="system",
-                    receiver=sender.username,
-                    amount=invite.amount,
-                    transaction_type="money_invite",
-                    status="completed",
-                    processed_at=datetime.utcnow(),
-                    extra_data={
-                        "reason": "invite_expired",
-                        "original_invite_id": invite.id
-                    }
-                )
-                db.add(refund_transaction)
-                db.flush()
-                
-                # Update invite
-                invite.status = "expired"
-                invite.refunded_at = datetime.utcnow()
-                invite.refund_transaction_id = refund_transaction.id
-                
-                # Update original transaction
-                original_transaction = db.query(Transaction).filter(
-                    Transaction.id == invite.transaction_id
-                ).first()
-                if original_transaction:
-                    original_transaction.status = "refunded"
-                
-                # Notify sender
-                notification = Notification(
-                    user_id=sender.id,
-                    title="⏰ Invite Expired",
-                    message=f"Your ${invite.amount:.2f} invite to {invite.recipient_contact} expired. Funds refunded.",
-                    notification_type="transaction",
-                    extra_data={
-                        "invite_id": invite.id,
-                        "refund_transaction_id": refund_transaction.id
-                    }
-                )
-                db.add(notification)
-                
-                db.commit()
-                
-                logger.info(
-                    f"Expired invite {invite.id} refunded: "
-                    f"${invite.amount} returned to {sender.username}"
-                )
-                
-            except Exception as e:
-                logger.error(f"Error processing expired invite {invite.id}: {e}")
-                db.rollback()
-                continue
-        
-        logger.info(f"Completed processing {len(expired_invites)} expired invites")
-        
     except Exception as e:
         logger.error(f"Error in process_expired_invites: {e}")
+
+
+def purge_expired_idempotency_keys():
+    """
+    Delete Idempotency-Key records past their expiry
+    Runs every hour
+    """
+    db = SessionLocal()
+    try:
+        removed = IdempotencyService.purge_expired(db)
+        if removed:
+            logger.info(f"Purged {removed} expired idempotency keys")
+    except Exception as e:
+        logger.error(f"Error in purge_expired_idempotency_keys: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def purge_finished_jobs():
+    """
+    Delete background jobs that succeeded more than a week ago
+    Runs every hour
+    """
+    db = SessionLocal()
+    try:
+        removed = DatabaseJobBackend.purge_succeeded(db)
+        if removed:
+            logger.info(f"Purged {removed} finished background jobs")
+    except Exception as e:
+        logger.error(f"Error in purge_finished_jobs: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def requeue_stale_webhooks():
+    """
+    Queue drains for webhook events nobody picked up
+    Runs every 10 minutes; only the worker holding the leader lock does the work
+    """
+    db = SessionLocal()
+    try:
+        with leader_lock("requeue_stale_webhooks") as leader:
+            if not leader:
+                return
+            queued = WebhookInbox.requeue_stale(db)
+            db.commit()
+        if queued:
+            logger.info(f"Requeued webhook events for {queued} objects")
+    except Exception as e:
+        logger.error(f"Error in requeue_stale_webhooks: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def purge_processed_webhooks():
+    """
+    Delete processed webhook events past the retention window
+    Runs every hour
+    """
+    db = SessionLocal()
+    try:
+        removed = WebhookInbox.purge_processed(db)
+        if removed:
+            logger.info(f"Purged {removed} processed webhook events")
+    except Exception as e:
+        logger.error(f"Error in purge_processed_webhooks: {e}")
+        db.rollback()
     finally:
         db.close()
 
@@ -114,6 +119,10 @@ def start_scheduler():
     
     # Schedule to run every 5 minutes
     schedule.every(5).minutes.do(process_expired_invites)
+    schedule.every(1).hours.do(purge_expired_idempotency_keys)
+    schedule.every(1).hours.do(purge_finished_jobs)
+    schedule.every(10).minutes.do(requeue_stale_webhooks)
+    schedule.every(1).hours.do(purge_processed_webhooks)
     
     logger.info("Invite expiry scheduler started (runs every 5 minutes)")
     
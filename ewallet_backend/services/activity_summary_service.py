@@ -0,0 +1,206 @@
+"""
+Activity Summary Service
+Daily per-account totals (sent, received, counts, fees) in user_activity_summary.
+
+Every flushed Transaction insert, edit or delete is turned into per-(account, day)
+deltas and upserted on the same connection, so the summary commits or rolls back
+together with the ledger write. Profile and dashboard reads then scan days,
+not transactions. rebuild() recomputes the table from transactions (backfill).
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, delete, event, func, select, text, update, insert
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import User, Transaction, UserActivitySummary
+
+summary = UserActivitySummary.__table__
+
+# Delta vector layout
+COUNTERS = ("sent_minor", "received_minor", "sent_count", "received_count", "fees_minor")
+TRACKED_FIELDS = ("sender", "receiver", "amount_minor", "transaction_type", "created_at")
+UPSERT_CHUNK = 1000
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):  # func.date() on SQLite
+        return date.fromisoformat(value[:10])
+    return value
+
+
+class ActivitySummaryService:
+    """Maintain and read user_activity_summary"""
+
+    @staticmethod
+    def add_transaction(deltas: Dict, sender, receiver, amount_minor, transaction_type, created_at, sign: int = 1):
+        day = _as_date(created_at or datetime.utcnow())
+        amount = (amount_minor or 0) * sign
+        if sender:
+            row = deltas[(sender, day)]
+            row[0] += amount
+            row[2] += sign
+            if transaction_type == "fee":
+                row[4] += amount
+        if receiver:
+            row = deltas[(receiver, day)]
+            row[1] += amount
+            row[3] += sign
+
+    @staticmethod
+    def _upsert_statement(dialect: str):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            return None
+        stmt = dialect_insert(summary)
+        return stmt.on_conflict_do_update(
+            index_elements=[summary.c.account, summary.c.day],
+            set_={name: summary.c[name] + stmt.excluded[name] for name in COUNTERS}
+        )
+
+    @staticmethod
+    def apply(connection, deltas: Dict):
+        """Add deltas {(account, day): [sent, received, sent_count, received_count, fees]}"""
+        rows = [
+            {"account": account, "day": day, **dict(zip(COUNTERS, values))}
+            for (account, day), values in sorted(deltas.items())  # stable order: no upsert deadlocks
+            if any(values)
+        ]
+        if not rows:
+            return
+        upsert = ActivitySummaryService._upsert_statement(connection.dialect.name)
+        for start in range(0, len(rows), UPSERT_CHUNK):
+            chunk = rows[start:start + UPSERT_CHUNK]
+            if upsert is not None:
+                connection.execute(upsert, chunk)
+                continue
+            for row in chunk:
+                updated = connection.execute(
+                    update(summary)
+                    .where(summary.c.account == row["account"], summary.c.day == row["day"])
+                    .values({name: summary.c[name] + row[name] for name in COUNTERS})
+                )
+                if updated.rowcount == 0:
+                    connection.execute(insert(summary), row)
+
+    @staticmethod
+    def rebuild(db: Session, since: Optional[date] = None) -> int:
+        """
+        Recompute the summary from transactions (all days, or days >= since).
+        Runs in the caller's transaction; the caller commits. Returns rows written.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            # Writers block on their upsert until the rebuild commits, so every
+            # transaction is counted exactly once
+            db.execute(text("LOCK TABLE user_activity_summary IN EXCLUSIVE MODE"))
+
+        cleanup = delete(summary)
+        if since:
+            cleanup = cleanup.where(summary.c.day >= since)
+        db.execute(cleanup)
+
+        day = func.date(Transaction.created_at)
+        window = [Transaction.created_at >= datetime.combine(since, datetime.min.time())] if since else []
+        deltas = defaultdict(lambda: [0] * len(COUNTERS))
+
+        sent = db.execute(
+            select(
+                Transaction.sender, day,
+                func.sum(Transaction.amount_minor), func.count(Transaction.id),
+                func.sum(case((Transaction.transaction_type == "fee", Transaction.amount_minor), else_=0))
+            ).where(Transaction.sender.isnot(None), *window).group_by(Transaction.sender, day)
+        )
+        for account, bucket, amount, count, fees in sent:
+            row = deltas[(account, _as_date(bucket))]
+            row[0] += amount or 0
+            row[2] += count
+            row[4] += fees or 0
+
+        received = db.execute(
+            select(
+                Transaction.receiver, day,
+                func.sum(Transaction.amount_minor), func.count(Transaction.id)
+            ).where(Transaction.receiver.isnot(None), *window).group_by(Transaction.receiver, day)
+        )
+        for account, bucket, amount, count in received:
+            row = deltas[(account, _as_date(bucket))]
+            row[1] += amount or 0
+            row[3] += count
+
+        ActivitySummaryService.apply(db.connection(), deltas)
+        return len(deltas)
+
+    # ============= READS =============
+
+    @staticmethod
+    async def totals_for(db: AsyncSession, account: str) -> Dict[str, int]:
+        """Lifetime totals for one account, in minor units"""
+        row = (await db.execute(
+            select(*[func.coalesce(func.sum(summary.c[name]), 0) for name in COUNTERS])
+            .where(summary.c.account == account)
+        )).one()
+        return dict(zip(COUNTERS, row))
+
+    @staticmethod
+    async def totals_since(db: AsyncSession, since: date) -> Tuple[int, int, int, int]:
+        """
+        (transaction_count, volume_minor, fees_minor, active_users) for days >= since.
+        Every transaction has exactly one sender, so the sender side counts it once.
+        """
+        count, volume, fees = (await db.execute(
+            select(
+                func.coalesce(func.sum(summary.c.sent_count), 0),
+                func.coalesce(func.sum(summary.c.sent_minor), 0),
+                func.coalesce(func.sum(summary.c.fees_minor), 0)
+            ).where(summary.c.day >= since)
+        )).one()
+        active_users = await db.scalar(
+            select(func.count(func.distinct(summary.c.account)))
+            .join(User.__table__, User.__table__.c.username == summary.c.account)
+            .where(summary.c.day >= since)
+        ) or 0
+        return count, volume, fees, active_users
+
+
+# ============= INCREMENTAL MAINTENANCE =============
+
+def _transaction_values(obj, previous: bool) -> List:
+    """Tracked column values, as of before this flush when previous is True"""
+    state = sa_inspect(obj)
+    values = []
+    for field in TRACKED_FIELDS:
+        history = state.attrs[field].history
+        if previous and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(state.attrs[field].value)
+    return values
+
+
+@event.listens_for(Session, "after_flush")
+def _record_transaction_activity(session, flush_context):
+    deltas = defaultdict(lambda: [0] * len(COUNTERS))
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            ActivitySummaryService.add_transaction(deltas, *_transaction_values(obj, False))
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            ActivitySummaryService.add_transaction(deltas, *_transaction_values(obj, True), sign=-1)
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction):
+            continue
+        state = sa_inspect(obj)
+        if not any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS):
+            continue
+        ActivitySummaryService.add_transaction(deltas, *_transaction_values(obj, True), sign=-1)
+        ActivitySummaryService.add_transaction(deltas, *_transaction_values(obj, False))
+    if deltas:
+        ActivitySummaryService.apply(session.connection(), deltas)
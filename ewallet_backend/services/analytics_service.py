@@ -0,0 +1,134 @@
+"""
+Analytics Service
+Transaction aggregates computed by the database (GROUP BY bucket/type/status)
+and row streaming for exports, so no endpoint materializes a whole time window
+of ORM objects. Range filters ride on ix_transactions_created_at.
+"""
+import csv
+import io
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Transaction
+
+INTERVALS = ("hour", "day", "week")
+
+GROUP_COLUMNS = {
+    "type": Transaction.transaction_type,
+    "status": Transaction.status,
+}
+
+EXPORT_COLUMNS = (
+    Transaction.id, Transaction.created_at, Transaction.sender, Transaction.receiver,
+    Transaction.amount_minor, Transaction.currency, Transaction.transaction_type, Transaction.status,
+)
+EXPORT_BATCH = 2000
+
+
+def _key(value) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class AnalyticsService:
+    """Aggregate queries over transactions"""
+
+    @staticmethod
+    def bucket(column, interval: str, dialect: str):
+        """Truncate a timestamp column to the start of its hour/day/week (weeks start Monday)"""
+        if interval not in INTERVALS:
+            raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+        if dialect == "postgresql":
+            return func.date_trunc(interval, column)
+        if interval == "hour":
+            return func.strftime("%Y-%m-%d %H:00:00", column)
+        if interval == "week":
+            return func.date(column, "weekday 0", "-6 days")
+        return func.date(column)
+
+    @staticmethod
+    def _window(start: datetime, end: Optional[datetime]):
+        filters = [Transaction.created_at >= start]
+        if end:
+            filters.append(Transaction.created_at < end)
+        return filters
+
+    @staticmethod
+    async def series(
+        db: AsyncSession,
+        start: datetime,
+        end: Optional[datetime] = None,
+        interval: str = "day",
+        by: Optional[str] = None
+    ) -> List[Dict]:
+        """Count and volume per time bucket, optionally split by type or status"""
+        bucket = AnalyticsService.bucket(Transaction.created_at, interval, db.get_bind().dialect.name).label("bucket")
+        columns = [bucket]
+        if by:
+            columns.append(GROUP_COLUMNS[by].label("group"))
+        rows = (await db.execute(
+            select(*columns, func.count(Transaction.id), func.coalesce(func.sum(Transaction.amount_minor), 0))
+            .where(*AnalyticsService._window(start, end))
+            .group_by(*columns)
+            .order_by(*columns)
+        )).all()
+
+        result = []
+        for row in rows:
+            point = {"bucket": _key(row[0]), "count": row[-2], "volume_minor": row[-1]}
+            if by:
+                point[by] = row[1]
+            result.append(point)
+        return result
+
+    @staticmethod
+    async def breakdown(db: AsyncSession, by: str, start: datetime, end: Optional[datetime] = None) -> List[Dict]:
+        """Count, volume and average per transaction type or status"""
+        column = GROUP_COLUMNS[by]
+        rows = (await db.execute(
+            select(
+                column,
+                func.count(Transaction.id),
+                func.coalesce(func.sum(Transaction.amount_minor), 0),
+                func.avg(Transaction.amount_minor)
+            )
+            .where(*AnalyticsService._window(start, end))
+            .group_by(column)
+            .order_by(func.count(Transaction.id).desc())
+        )).all()
+        return [
+            {by: key, "count": count, "volume_minor": volume, "average_minor": round(average or 0)}
+            for key, count, volume, average in rows
+        ]
+
+    @staticmethod
+    async def export_csv(start: datetime, end: Optional[datetime] = None) -> AsyncIterator[str]:
+        """
+        CSV of every transaction in the window, streamed in EXPORT_BATCH-row chunks.
+        Opens its own session: the response body outlives the request's dependencies.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([column.key for column in EXPORT_COLUMNS])
+
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                select(*EXPORT_COLUMNS)
+                .where(*AnalyticsService._window(start, end))
+                .order_by(Transaction.created_at, Transaction.id)
+                .execution_options(yield_per=EXPORT_BATCH)
+            )
+            async for rows in result.partitions():
+                for row in rows:
+                    writer.writerow([_key(v) if v is not None else "" for v in row])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
@@ -0,0 +1,337 @@
+"""
+Anomaly Service
+Nightly batch rescoring of card_transactions and transactions into anomaly_flags.
+
+Rows are read in id order in fixed-size chunks (keyset on id) straight into
+NumPy columns - id, user id, amount in minor units, epoch seconds - so memory
+is bounded by the chunk size plus a handful of per-user arrays indexed by
+users.id, whatever the table size. Each source is read twice:
+
+1. Per-user statistics with np.bincount: count, mean and spread of
+   log(amount), first and last activity, share of round amounts.
+2. Each chunk is scored against those statistics, all vectorized:
+   - amount_zscore: log amount unusually high for the user
+   - velocity_spike: transactions in the trailing hour far above the user's
+     normal hourly rate (rows from the previous chunk's last hour are carried
+     over so windows span chunk boundaries)
+   - round_amount: large round amounts from a user who mostly moves round sums
+
+Flags are upserted on (source, source_id, reason) with the run's id; after a
+source finishes, its flags from older runs in the rescored id range are
+deleted, so the table always reflects the latest run. transactions rows are
+attributed to the sender, or to the receiver for money coming from outside.
+"""
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, extract, func, insert, select, update
+from sqlalchemy.orm import Session, aliased
+
+from models import AnomalyFlag, Transaction, User
+from models_cards import CardTransaction
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+flags = AnomalyFlag.__table__
+
+CHUNK_SIZE = 100_000  # ~70 MB peak while a chunk is in flight
+WRITE_BATCH = 5000
+
+ZSCORE_THRESHOLD = 4.0
+MIN_HISTORY = 10  # Rows a user needs before their own statistics are trusted
+MIN_LOG_STD = 0.25  # Floor for users who always move (almost) the same amount
+
+VELOCITY_WINDOW = 3600
+VELOCITY_FACTOR = 10.0  # Times the user's normal hourly rate
+VELOCITY_MIN_COUNT = 5
+BASELINE_MIN_HOURS = 24.0
+
+ROUND_UNIT_MINOR = 100_00  # Whole hundreds
+ROUND_MIN_MINOR = 500_00
+ROUND_SHARE = 0.5
+
+SOURCES = ("card_transaction", "transaction")
+
+
+def _card_transactions(after_id: int, since: Optional[datetime], limit: int):
+    stmt = (
+        select(
+            CardTransaction.id, CardTransaction.user_id,
+            CardTransaction.amount_minor, extract("epoch", CardTransaction.created_at)
+        )
+        .where(CardTransaction.id > after_id)
+        .order_by(CardTransaction.id)
+        .limit(limit)
+    )
+    if since:
+        stmt = stmt.where(CardTransaction.created_at >= since)
+    return stmt
+
+
+def _transactions(after_id: int, since: Optional[datetime], limit: int):
+    sender, receiver = aliased(User), aliased(User)
+    stmt = (
+        select(
+            Transaction.id, func.coalesce(sender.id, receiver.id),
+            Transaction.amount_minor, extract("epoch", Transaction.created_at)
+        )
+        .outerjoin(sender, sender.username == Transaction.sender)
+        .outerjoin(receiver, receiver.username == Transaction.receiver)
+        .where(Transaction.id > after_id)
+        .order_by(Transaction.id)
+        .limit(limit)
+    )
+    if since:
+        stmt = stmt.where(Transaction.created_at >= since)
+    return stmt
+
+
+STATEMENTS: Dict[str, Callable] = {
+    "card_transaction": _card_transactions,
+    "transaction": _transactions,
+}
+
+
+class Chunk:
+    """Columns of one chunk; rows without a user or timestamp are dropped"""
+
+    __slots__ = ("ids", "users", "amounts", "ts")
+
+    def __init__(self, rows: List[Tuple]):
+        ids, users, amounts, ts = zip(*rows)
+        self.ids = np.fromiter(ids, dtype=np.int64, count=len(rows))
+        self.users = np.fromiter((u if u is not None else -1 for u in users), dtype=np.int64, count=len(rows))
+        self.amounts = np.fromiter((a or 0 for a in amounts), dtype=np.int64, count=len(rows))
+        self.ts = np.fromiter((float(t) if t is not None else -1.0 for t in ts), dtype=np.float64, count=len(rows))
+        self.keep((self.users >= 0) & (self.ts >= 0))
+
+    def keep(self, mask: np.ndarray):
+        if not mask.all():
+            self.ids, self.users, self.amounts, self.ts = (
+                self.ids[mask], self.users[mask], self.amounts[mask], self.ts[mask]
+            )
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class UserStats:
+    """Per-user sufficient statistics, indexed by users.id"""
+
+    def __init__(self, size: int):
+        self.count = np.zeros(size, dtype=np.float64)
+        self.log_sum = np.zeros(size, dtype=np.float64)
+        self.log_sumsq = np.zeros(size, dtype=np.float64)
+        self.round_count = np.zeros(size, dtype=np.float64)
+        self.first_ts = np.full(size, np.inf)
+        self.last_ts = np.full(size, -np.inf)
+
+    def add(self, chunk: Chunk):
+        size = len(self.count)
+        logs = np.log1p(chunk.amounts / 100.0)
+        self.count += np.bincount(chunk.users, minlength=size)
+        self.log_sum += np.bincount(chunk.users, weights=logs, minlength=size)
+        self.log_sumsq += np.bincount(chunk.users, weights=logs * logs, minlength=size)
+        self.round_count += np.bincount(chunk.users, weights=_is_round(chunk.amounts), minlength=size)
+        np.minimum.at(self.first_ts, chunk.users, chunk.ts)
+        np.maximum.at(self.last_ts, chunk.users, chunk.ts)
+
+    def finish(self):
+        """Derive mean/std of log amount, hourly rate and round share"""
+        count = np.maximum(self.count, 1)
+        self.mean = self.log_sum / count
+        self.std = np.maximum(np.sqrt(np.maximum(self.log_sumsq / count - self.mean ** 2, 0)), MIN_LOG_STD)
+        hours = np.maximum((self.last_ts - self.first_ts) / 3600.0, BASELINE_MIN_HOURS)
+        self.hourly_rate = np.where(self.count > 0, self.count / hours, 0.0)
+        self.round_share = self.round_count / count
+
+
+def _is_round(amounts: np.ndarray) -> np.ndarray:
+    return ((amounts % ROUND_UNIT_MINOR == 0) & (amounts >= ROUND_MIN_MINOR)).astype(np.float64)
+
+
+def _trailing_counts(users: np.ndarray, ts: np.ndarray) -> np.ndarray:
+    """For every row, the user's rows in [ts - VELOCITY_WINDOW, ts] (itself included)"""
+    if not len(users):
+        return np.zeros(0, dtype=np.int64)
+    order = np.lexsort((ts, users))
+    base = ts.min()
+    span = ts.max() - base + VELOCITY_WINDOW + 1
+    # One sortable key per row: users are blocks, time runs inside a block
+    key = users[order].astype(np.float64) * span + (ts[order] - base)
+    start = np.searchsorted(key, key - VELOCITY_WINDOW, side="left")
+    counts = np.empty(len(users), dtype=np.int64)
+    counts[order] = np.arange(len(users)) - start + 1
+    return counts
+
+
+class AnomalyService:
+    """Batch rescoring into anomaly_flags"""
+
+    @staticmethod
+    def chunks(session_factory, source: str, since: Optional[datetime] = None,
+               chunk_size: int = CHUNK_SIZE, max_user_id: Optional[int] = None) -> Iterator[Tuple[Chunk, int, int]]:
+        """Yield (chunk, first id, last id) in id order; one short session per chunk"""
+        statement = STATEMENTS[source]
+        after_id = 0
+        while True:
+            db = session_factory()
+            try:
+                rows = db.execute(statement(after_id, since, chunk_size)).all()
+            finally:
+                db.close()
+            if not rows:
+                return
+            first_id, after_id = rows[0][0], rows[-1][0]
+            chunk = Chunk(rows)
+            if max_user_id is not None:
+                chunk.keep(chunk.users <= max_user_id)  # Users created since the run started
+            yield chunk, first_id, after_id
+            if len(rows) < chunk_size:
+                return
+
+    @staticmethod
+    def score(chunk: Chunk, stats: UserStats, carry: Tuple[np.ndarray, np.ndarray]):
+        """
+        Flags for one chunk as (row positions, reasons, scores), plus the
+        (users, ts) rows to carry into the next chunk's velocity windows
+        """
+        users, logs = chunk.users, np.log1p(chunk.amounts / 100.0)
+        trusted = stats.count[users] >= MIN_HISTORY
+        positions, reasons, scores = [], [], []
+
+        z = (logs - stats.mean[users]) / stats.std[users]
+        hit = np.flatnonzero(trusted & (z >= ZSCORE_THRESHOLD))
+        positions.append(hit)
+        reasons.append(np.full(len(hit), "amount_zscore", dtype=object))
+        scores.append(z[hit])
+
+        carry_users, carry_ts = carry
+        all_users = np.concatenate([carry_users, users])
+        all_ts = np.concatenate([carry_ts, chunk.ts])
+        counts = _trailing_counts(all_users, all_ts)[len(carry_users):]
+        expected = stats.hourly_rate[users] * (VELOCITY_WINDOW / 3600.0)
+        multiple = counts / np.maximum(expected, 1e-9)
+        hit = np.flatnonzero(trusted & (counts >= VELOCITY_MIN_COUNT) & (multiple >= VELOCITY_FACTOR))
+        positions.append(hit)
+        reasons.append(np.full(len(hit), "velocity_spike", dtype=object))
+        scores.append(multiple[hit])
+
+        share = stats.round_share[users]
+        hit = np.flatnonzero(trusted & (_is_round(chunk.amounts) > 0) & (share >= ROUND_SHARE))
+        positions.append(hit)
+        reasons.append(np.full(len(hit), "round_amount", dtype=object))
+        scores.append(share[hit])
+
+        recent = all_ts >= all_ts.max() - VELOCITY_WINDOW if len(all_ts) else np.zeros(0, dtype=bool)
+        return (
+            np.concatenate(positions), np.concatenate(reasons), np.concatenate(scores),
+            (all_users[recent], all_ts[recent])
+        )
+
+    @staticmethod
+    def _upsert_statement(dialect: str):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            return None
+        stmt = dialect_insert(flags)
+        return stmt.on_conflict_do_update(
+            index_elements=[flags.c.source, flags.c.source_id, flags.c.reason],
+            set_={name: stmt.excluded[name] for name in ("user_id", "score", "run_id", "flagged_at")}
+        )
+
+    @staticmethod
+    def write(db: Session, rows: List[Dict]):
+        """Upsert flag rows; the caller commits"""
+        upsert = AnomalyService._upsert_statement(db.get_bind().dialect.name)
+        for start in range(0, len(rows), WRITE_BATCH):
+            batch = rows[start:start + WRITE_BATCH]
+            if upsert is not None:
+                db.execute(upsert, batch)
+                continue
+            for row in batch:
+                updated = db.execute(
+                    update(flags)
+                    .where(flags.c.source == row["source"], flags.c.source_id == row["source_id"],
+                           flags.c.reason == row["reason"])
+                    .values(user_id=row["user_id"], score=row["score"], run_id=row["run_id"],
+                            flagged_at=row["flagged_at"])
+                )
+                if updated.rowcount == 0:
+                    db.execute(insert(flags), row)
+
+    @staticmethod
+    def rescore_source(session_factory, source: str, run_id: str, since: Optional[datetime] = None,
+                       chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+        """Two passes over one source; returns rows scored and flags by reason"""
+        db = session_factory()
+        try:
+            max_user_id = db.scalar(select(func.max(User.id))) or 0
+        finally:
+            db.close()
+
+        stats = UserStats(max_user_id + 1)
+        for chunk, _, _ in AnomalyService.chunks(session_factory, source, since, chunk_size, max_user_id):
+            stats.add(chunk)
+        stats.finish()
+
+        totals = {"rows": 0, "amount_zscore": 0, "velocity_spike": 0, "round_amount": 0}
+        carry = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64))
+        first_id = last_id = None
+        flagged_at = datetime.utcnow()
+        for chunk, chunk_first, chunk_last in AnomalyService.chunks(
+            session_factory, source, since, chunk_size, max_user_id
+        ):
+            first_id = chunk_first if first_id is None else first_id
+            last_id = chunk_last
+            totals["rows"] += len(chunk)
+            positions, reasons, scores, carry = AnomalyService.score(chunk, stats, carry)
+            if not len(positions):
+                continue
+            rows = [
+                {"source": source, "source_id": int(source_id), "user_id": int(user_id), "reason": reason,
+                 "score": round(float(score), 4), "run_id": run_id, "flagged_at": flagged_at}
+                for source_id, user_id, reason, score in zip(
+                    chunk.ids[positions], chunk.users[positions], reasons, scores
+                )
+            ]
+            for reason in reasons:
+                totals[reason] += 1
+            db = session_factory()
+            try:
+                AnomalyService.write(db, rows)
+                db.commit()
+            finally:
+                db.close()
+
+        if first_id is not None:
+            # Flags from earlier runs that this run no longer raises
+            db = session_factory()
+            try:
+                db.execute(
+                    delete(flags).where(
+                        flags.c.source == source, flags.c.run_id != run_id,
+                        flags.c.source_id.between(first_id, last_id)
+                    )
+                )
+                db.commit()
+            finally:
+                db.close()
+        return totals
+
+    @staticmethod
+    def run(session_factory, sources=SOURCES, since: Optional[datetime] = None,
+            chunk_size: int = CHUNK_SIZE) -> Dict[str, Dict[str, int]]:
+        """Rescore every source; returns totals per source"""
+        run_id = uuid.uuid4().hex
+        results = {}
+        for source in sources:
+            results[source] = AnomalyService.rescore_source(session_factory, source, run_id, since, chunk_size)
+            logger.info(f"Rescored {source}: {results[source]}")
+        return results
@@ -5,14 +5,24 @@ Handles card generation, authorization, and settlement
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 import secrets
-import hashlib
 import re
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, joinedload
 from models import User
+from money import Money
 from models_cards import (
     VirtualCard, CardTransaction, ATMTransaction, 
     POSTerminal, GiftCardVoucher, WalletInteroperability
 )
+from config import settings
+from services.card_spend_service import CardSpendService
+from services.card_vault import CardVault
+from services.ledger_service import LedgerService, InsufficientFunds
+from services.risk_engine import Authorization, get_risk_engine
+from logger import get_logger
+from utils.credentials import API_SECRET, PIN, hash_secret, verify_secret
+
+logger = get_logger(__name__)
 
 
 class CardService:
@@ -72,13 +82,21 @@ class CardService:
     
     @staticmethod
     def hash_pin(pin: str) -> str:
-        """Hash PIN for secure storage"""
-        return hashlib.sha256(pin.encode()).hexdigest()
+        """Salted KDF hash of a PIN for storage (PIN_HASH_SCHEME)"""
+        return hash_secret(PIN, pin)
     
     @staticmethod
     def verify_pin(pin: str, hashed_pin: str) -> bool:
         """Verify PIN against hash"""
-        return CardService.hash_pin(pin) == hashed_pin
+        return verify_secret(PIN, pin, hashed_pin)[0]
+    
+    @staticmethod
+    def verify_gift_card_pin(gift_card, pin: str) -> bool:
+        """Verify a gift card's PIN, rehashing it in place if stored under an outdated scheme"""
+        valid, new_hash = verify_secret(PIN, pin, gift_card.pin)
+        if valid and new_hash:
+            gift_card.pin = new_hash  # Saved with the caller's next commit
+        return valid
     
     @staticmethod
     def create_virtual_card(
@@ -97,11 +115,10 @@ class CardService:
         # Set expiry (5 years from now)
         expiry = datetime.utcnow() + timedelta(days=365 * 5)
         
-        # Create card
+        # Create card (PAN and CVV only ever stored encrypted)
         card = VirtualCard(
             user_id=user.id,
-            card_number=card_number,
-            cvv=cvv,  # In production, encrypt this!
+            **CardVault.seal_card(card_number, cvv),
             expiry_month=expiry.month,
             expiry_year=expiry.year,
             cardholder_name=user.username.upper(),
@@ -127,10 +144,12 @@ class CardService:
         entry_mode: str,
         cvv: Optional[str] = None,
         zip_code: Optional[str] = None,
-        db: Session = None
+        db: Session = None,
+        terminal: Optional[POSTerminal] = None
     ) -> Dict[str, Any]:
         """
         Authorize a card transaction (POS, online, ATM)
+        terminal, when known, feeds the terminal-hop and travel risk features.
         Returns authorization response
         """
         
@@ -152,42 +171,31 @@ class CardService:
                 "message": "Card has expired"
             }
         
-        # Check daily limit
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_transactions = db.query(CardTransaction).filter(
-            CardTransaction.card_id == card.id,
-            CardTransaction.created_at >= today_start,
-            CardTransaction.status == "approved"
-        ).all()
-        
-        today_total = sum(t.amount for t in today_transactions)
-        if today_total + amount > card.daily_limit:
-            return {
-                "approved": False,
-                "decline_reason": "daily_limit_exceeded",
-                "message": f"Daily limit of ${card.daily_limit} exceeded"
-            }
+        charge = Money.from_major(amount)
         
         # Check transaction limit
-        if amount > card.transaction_limit:
+        if charge.minor > card.transaction_limit_minor:
             return {
                 "approved": False,
                 "decline_reason": "transaction_limit_exceeded",
                 "message": f"Transaction limit of ${card.transaction_limit} exceeded"
             }
         
-        # Check user balance
-        if card.user.balance < amount:
-            return {
-                "approved": False,
-                "decline_reason": "insufficient_funds",
-                "message": "Insufficient wallet balance"
-            }
+        # Early decline when the last committed daily total (Redis) already rules it out
+        today = now.date()
+        cached_spent = CardSpendService.cached_total(card.id, today)
+        if cached_spent is not None and cached_spent + charge.minor > card.daily_limit_minor:
+            return CardService._daily_limit_declined(card)
+        
+        # Check user balance (card.user is eager-loaded by the callers; the
+        # conditional debit below is what actually guards the balance)
+        if card.user.balance_minor < charge.minor:
+            return CardService._insufficient_funds_declined()
         
         # Verify CVV if provided
         cvv_verified = False
         if cvv:
-            cvv_verified = (cvv == card.cvv)
+            cvv_verified = CardVault.verify_cvv(card, cvv)
             if not cvv_verified and entry_mode == "online":
                 return {
                     "approved": False,
@@ -200,19 +208,47 @@ class CardService:
         if zip_code:
             zip_verified = (zip_code == card.billing_zip)
         
-        # Calculate risk score (0-100)
-        risk_score = CardService._calculate_risk_score(
-            card, amount, merchant_category, entry_mode
+        # Calculate risk score (0-100): rules over the card, user and merchant's recent activity
+        risk_engine = get_risk_engine()
+        attempt = Authorization(
+            card_id=card.id,
+            user_id=card.user_id,
+            amount_minor=charge.minor,
+            merchant_name=merchant_name,
+            merchant_category=merchant_category,
+            entry_mode=entry_mode,
+            terminal_id=terminal.terminal_id if terminal else None,
+            latitude=terminal.latitude if terminal else None,
+            longitude=terminal.longitude if terminal else None,
+            international_enabled=bool(card.international_enabled),
+            first_use=card.last_used is None,
+            at=now
         )
+        risk = risk_engine.score(attempt)
+        risk_score = risk.score
         
         # Decline if high risk
-        if risk_score > 80:
+        if risk_score > settings.RISK_DECLINE_SCORE:
+            logger.info(f"Card {card.id} declined as high risk ({risk_score:g}): {', '.join(risk.reasons)}")
             return {
                 "approved": False,
                 "decline_reason": "high_risk",
                 "message": "Transaction flagged as high risk"
             }
         
+        # Check daily limit: one conditional upsert on the card's running total
+        spent_today = CardSpendService.reserve(db, card.id, charge.minor, card.daily_limit_minor, day=today)
+        if spent_today is None:
+            db.rollback()
+            return CardService._daily_limit_declined(card)
+        
+        # Deduct from user balance
+        try:
+            balance = LedgerService.debit(db, card.user_id, charge)
+        except InsufficientFunds:
+            db.rollback()
+            return CardService._insufficient_funds_declined()
+        
         # Generate authorization code
         auth_code = secrets.token_hex(4).upper()
         
@@ -220,7 +256,7 @@ class CardService:
         transaction = CardTransaction(
             card_id=card.id,
             user_id=card.user_id,
-            amount=amount,
+            amount_minor=charge.minor,
             merchant_name=merchant_name,
             merchant_category=merchant_category,
             transaction_type="purchase",
@@ -232,60 +268,77 @@ class CardService:
             risk_score=risk_score
         )
         
-        # Deduct from user balance
-        card.user.balance -= amount
-        card.total_spent += amount
-        card.last_used = datetime.utcnow()
+        card.total_spent_minor = VirtualCard.total_spent_minor + charge.minor
+        card.last_used = now
         
-        if db:
-            db.add(transaction)
-            db.commit()
+        db.add(transaction)
+        db.commit()
+        CardSpendService.remember(card.id, today, spent_today)
+        risk_engine.observe(attempt)
         
         return {
             "approved": True,
             "auth_code": auth_code,
             "transaction_id": transaction.id,
-            "remaining_balance": card.user.balance,
+            "remaining_balance": balance.to_float(),
             "message": "Transaction approved"
         }
     
     @staticmethod
-    def _calculate_risk_score(
-        card: VirtualCard,
-        amount: float,
-        merchant_category: str,
-        entry_mode: str
-    ) -> float:
-        """Calculate fraud risk score (0-100)"""
-        risk = 0.0
-        
-        # High-risk merchant categories
-        high_risk_mcc = ["5962", "5967", "7995"]  # Adult, gambling, betting
-        if merchant_category in high_risk_mcc:
-            risk += 30
-        
-        # Large transactions
-        if amount > 500:
-            risk += 20
-        if amount > 1000:
-            risk += 20
-        
-        # Entry mode risk
-        if entry_mode == "manual":
-            risk += 25
-        elif entry_mode == "online":
-            risk += 10
-        
-        # International transactions (if not enabled)
-        if not card.international_enabled:
-            # Check if merchant is international (simplified)
-            risk += 15
-        
-        # First transaction on card
-        if not card.last_used:
-            risk += 10
-        
-        return min(risk, 100.0)
+    def _daily_limit_declined(card: VirtualCard) -> Dict[str, Any]:
+        return {
+            "approved": False,
+            "decline_reason": "daily_limit_exceeded",
+            "message": f"Daily limit of ${card.daily_limit} exceeded"
+        }
+    
+    @staticmethod
+    def _insufficient_funds_declined() -> Dict[str, Any]:
+        return {
+            "approved": False,
+            "decline_reason": "insufficient_funds",
+            "message": "Insufficient wallet balance"
+        }
+    
+    @staticmethod
+    def reverse_transaction(transaction_id: int, db: Session) -> Dict[str, Any]:
+        """
+        Reverse an approved purchase: refund the wallet and take the amount off
+        the card's daily total for the day it was approved
+        """
+        row = db.execute(
+            update(CardTransaction)
+            .where(
+                CardTransaction.id == transaction_id,
+                CardTransaction.status == "approved",
+                CardTransaction.transaction_type == "purchase"
+            )
+            .values(status="reversed")
+            .returning(CardTransaction.card_id, CardTransaction.user_id,
+                       CardTransaction.amount_minor, CardTransaction.created_at)
+        ).one_or_none()
+        if row is None:
+            return {"reversed": False, "message": "No approved purchase with that id"}
+        
+        card_id, user_id, amount_minor, created_at = row
+        refund = Money(amount_minor)
+        day = created_at.date()
+        CardSpendService.release(db, card_id, amount_minor, day)
+        balance = LedgerService.credit(db, user_id, refund)
+        db.execute(
+            update(VirtualCard)
+            .where(VirtualCard.id == card_id)
+            .values(total_spent_minor=VirtualCard.total_spent_minor - amount_minor)
+        )
+        db.commit()
+        CardSpendService.forget(card_id, day)
+        
+        return {
+            "reversed": True,
+            "transaction_id": transaction_id,
+            "remaining_balance": balance.to_float(),
+            "message": "Transaction reversed"
+        }
 
 
 class POSService:
@@ -307,7 +360,7 @@ class POSService:
         # Generate API credentials
         api_key = f"pk_live_{secrets.token_hex(16)}"
         api_secret = secrets.token_hex(32)
-        api_secret_hash = hashlib.sha256(api_secret.encode()).hexdigest()
+        api_secret_hash = hash_secret(API_SECRET, api_secret)
         
         terminal = POSTerminal(
             merchant_id=merchant_user.id,
@@ -339,11 +392,15 @@ class POSService:
     ) -> Dict[str, Any]:
         """Process a payment at POS terminal"""
         
-        # Find card
-        card = db.query(VirtualCard).filter(
-            VirtualCard.card_number == card_number,
-            VirtualCard.status == "active"
-        ).first()
+        # Find card (and its owner, in the same query)
+        card = db.scalar(
+            select(VirtualCard)
+            .options(joinedload(VirtualCard.user))
+            .where(
+                VirtualCard.card_number_fingerprint == CardVault.fingerprint(card_number),
+                VirtualCard.status == "active"
+            )
+        )
         
         if not card:
             return {
@@ -360,12 +417,17 @@ class POSService:
             merchant_category="5999",  # Misc retail
             entry_mode=entry_mode,
             cvv=cvv,
-            db=db
+            db=db,
+            terminal=terminal
         )
         
         # Update terminal
         if result["approved"]:
-            terminal.last_transaction = datetime.utcnow()
+            db.execute(
+                update(POSTerminal)
+                .where(POSTerminal.id == terminal.id)
+                .values(last_transaction=datetime.utcnow())
+            )
             db.commit()
         
         return result
@@ -386,10 +448,12 @@ class ATMService:
     ) -> Dict[str, Any]:
         """Process ATM withdrawal"""
         
-        # Find card
-        card = db.query(VirtualCard).filter(
-            VirtualCard.card_number == card_number
-        ).first()
+        # Find card (and its owner, in the same query)
+        card = db.scalar(
+            select(VirtualCard)
+            .options(joinedload(VirtualCard.user))
+            .where(VirtualCard.card_number_fingerprint == CardVault.fingerprint(card_number))
+        )
         
         if not card:
             return {
@@ -411,11 +475,14 @@ class ATMService:
         pin_verified = True
         
         # Calculate ATM fee
-        atm_fee = 2.50  # Standard ATM fee
-        total_amount = amount + atm_fee
+        withdrawal = Money.from_major(amount)
+        fee = Money.from_major("2.50")  # Standard ATM fee
+        total = withdrawal + fee
+        atm_fee = fee.to_float()
+        total_amount = total.to_float()
         
         # Check balance
-        if card.user.balance < total_amount:
+        if card.user.balance_minor < total.minor:
             return {
                 "approved": False,
                 "decline_reason": "insufficient_funds",
@@ -432,8 +499,8 @@ class ATMService:
             atm_id=atm_id,
             atm_location=atm_location,
             atm_network=atm_network,
-            amount=amount,
-            fee=atm_fee,
+            amount_minor=withdrawal.minor,
+            fee_minor=fee.minor,
             auth_code=auth_code,
             pin_verified=pin_verified,
             chip_used=True,
@@ -444,7 +511,7 @@ class ATMService:
         card_txn = CardTransaction(
             card_id=card.id,
             user_id=card.user_id,
-            amount=amount,
+            amount_minor=withdrawal.minor,
             merchant_name=f"ATM - {atm_location}",
             merchant_category="6011",  # ATM MCC
             transaction_type="atm_withdrawal",
@@ -453,14 +520,28 @@ class ATMService:
             auth_code=auth_code
         )
         
+        # Withdrawals count toward the card's daily total (no limit applied
+        # here); taken before the balance, in the same order as purchases
+        today = datetime.utcnow().date()
+        spent_today = CardSpendService.reserve(db, card.id, withdrawal.minor, day=today)
+        
         # Deduct from balance
-        card.user.balance -= total_amount
-        card.total_spent += total_amount
+        try:
+            balance = LedgerService.debit(db, card.user_id, total)
+        except InsufficientFunds:
+            db.rollback()
+            return {
+                "approved": False,
+                "decline_reason": "insufficient_funds",
+                "message": f"Insufficient funds (need ${total_amount} including fee)"
+            }
+        card.total_spent_minor = VirtualCard.total_spent_minor + total.minor
         card.last_used = datetime.utcnow()
         
         db.add(atm_txn)
         db.add(card_txn)
         db.commit()
+        CardSpendService.remember(card.id, today, spent_today)
         
         return {
             "approved": True,
@@ -468,7 +549,7 @@ class ATMService:
             "amount": amount,
             "fee": atm_fee,
             "total": total_amount,
-            "remaining_balance": card.user.balance,
+            "remaining_balance": balance.to_float(),
             "message": "Withdrawal approved"
         }
 
@@ -530,7 +611,7 @@ class GiftCardService:
             return {"success": False, "message": "Gift card not found"}
         
         # Verify PIN
-        if not CardService.verify_pin(pin, gift_card.pin):
+        if not CardService.verify_gift_card_pin(gift_card, pin):
             return {"success": False, "message": "Invalid PIN"}
         
         # Check status
@@ -581,7 +662,7 @@ class GiftCardService:
             return {"approved": False, "message": "Gift card not found"}
         
         # Verify PIN
-        if not CardService.verify_pin(pin, gift_card.pin):
+        if not CardService.verify_gift_card_pin(gift_card, pin):
             return {"approved": False, "message": "Invalid PIN"}
         
         # Check balance
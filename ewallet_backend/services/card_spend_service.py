@@ -0,0 +1,179 @@
+"""
+Card Spend Service
+Running per-card daily totals in card_daily_spend, used by card authorization.
+
+reserve() adds a charge to the card's (card, day) row with one conditional
+upsert that only applies while the total stays within the daily limit, so two
+terminals authorizing on the same card at once cannot both slip under it. The
+row is written in the caller's transaction: a declined or failed authorization
+rolls it back with everything else. release() takes a reversed charge back off.
+
+When Redis is enabled the committed total is also kept there for a few minutes
+so a card already over its limit is declined before touching the database.
+The table stays the source of truth; a missing or stale Redis value only means
+the database makes the call.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from cache import get_redis_client
+from config import settings
+from models_cards import CardDailySpend, CardTransaction
+from services.activity_summary_service import _as_date
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+spend = CardDailySpend.__table__
+
+
+def _redis_key(card_id: int, day: date) -> str:
+    return f"blackwallet:card_spend:{card_id}:{day.isoformat()}"
+
+
+class CardSpendService:
+    """Maintain and read card_daily_spend"""
+
+    @staticmethod
+    def _upsert_statement(dialect: str, limit_minor: Optional[int]):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            return None
+        stmt = dialect_insert(spend)
+        total = spend.c.spent_minor + stmt.excluded.spent_minor
+        return stmt.on_conflict_do_update(
+            index_elements=[spend.c.card_id, spend.c.day],
+            set_={
+                "spent_minor": total,
+                "transaction_count": spend.c.transaction_count + stmt.excluded.transaction_count,
+            },
+            where=(total <= limit_minor) if limit_minor is not None else None
+        ).returning(spend.c.spent_minor)
+
+    @staticmethod
+    def reserve(
+        db: Session,
+        card_id: int,
+        amount_minor: int,
+        limit_minor: Optional[int] = None,
+        day: Optional[date] = None
+    ) -> Optional[int]:
+        """
+        Add amount to the card's total for day (today, UTC) unless that would
+        take it past limit_minor. Returns the new total, or None when the limit
+        would be exceeded (nothing is written). The caller commits.
+        """
+        day = day or datetime.utcnow().date()
+        if limit_minor is not None and amount_minor > limit_minor:
+            return None
+        row = {"card_id": card_id, "day": day, "spent_minor": amount_minor, "transaction_count": 1}
+        upsert = CardSpendService._upsert_statement(db.get_bind().dialect.name, limit_minor)
+        if upsert is not None:
+            return db.execute(upsert, row).scalar_one_or_none()
+
+        conditions = [spend.c.card_id == card_id, spend.c.day == day]
+        guarded = conditions + ([spend.c.spent_minor + amount_minor <= limit_minor] if limit_minor is not None else [])
+        updated = db.execute(
+            update(spend)
+            .where(*guarded)
+            .values(spent_minor=spend.c.spent_minor + amount_minor,
+                    transaction_count=spend.c.transaction_count + 1)
+        )
+        if updated.rowcount == 0:
+            if db.scalar(select(spend.c.spent_minor).where(*conditions)) is not None:
+                return None
+            db.execute(insert(spend), row)
+        return db.scalar(select(spend.c.spent_minor).where(*conditions))
+
+    @staticmethod
+    def release(db: Session, card_id: int, amount_minor: int, day: date):
+        """Take a reversed charge off the day it was approved on; the caller commits"""
+        db.execute(
+            update(spend)
+            .where(spend.c.card_id == card_id, spend.c.day == day)
+            .values(spent_minor=spend.c.spent_minor - amount_minor,
+                    transaction_count=spend.c.transaction_count - 1)
+        )
+
+    @staticmethod
+    def spent(db: Session, card_id: int, day: Optional[date] = None) -> int:
+        """Approved spend on the card for day (today, UTC), in minor units"""
+        day = day or datetime.utcnow().date()
+        return db.scalar(
+            select(spend.c.spent_minor).where(spend.c.card_id == card_id, spend.c.day == day)
+        ) or 0
+
+    @staticmethod
+    def rebuild(db: Session, since: Optional[date] = None) -> int:
+        """
+        Recompute the table from approved card_transactions (all days, or
+        days >= since). Runs in the caller's transaction; returns rows written.
+        """
+        cleanup = delete(spend)
+        if since:
+            cleanup = cleanup.where(spend.c.day >= since)
+        db.execute(cleanup)
+
+        day = func.date(CardTransaction.created_at)
+        window = [CardTransaction.created_at >= datetime.combine(since, datetime.min.time())] if since else []
+        totals = defaultdict(lambda: [0, 0])
+        for card_id, bucket, amount, count in db.execute(
+            select(CardTransaction.card_id, day, func.sum(CardTransaction.amount_minor), func.count(CardTransaction.id))
+            .where(CardTransaction.status == "approved", *window)
+            .group_by(CardTransaction.card_id, day)
+        ):
+            row = totals[(card_id, _as_date(bucket))]
+            row[0] += amount or 0
+            row[1] += count
+
+        rows = [
+            {"card_id": card_id, "day": bucket, "spent_minor": amount, "transaction_count": count}
+            for (card_id, bucket), (amount, count) in sorted(totals.items())
+        ]
+        if rows:
+            db.execute(insert(spend), rows)
+        return len(rows)
+
+    # ============= REDIS ACCELERATOR =============
+
+    @staticmethod
+    def cached_total(card_id: int, day: date) -> Optional[int]:
+        """Last committed total seen for the card, or None (no Redis, or unknown)"""
+        client = get_redis_client()
+        if client is None:
+            return None
+        try:
+            raw = client.get(_redis_key(card_id, day))
+        except Exception as e:
+            logger.warning(f"Redis card spend get failed: {e}")
+            return None
+        return int(raw) if raw is not None else None
+
+    @staticmethod
+    def remember(card_id: int, day: date, spent_minor: int):
+        """Publish a committed total for the early-decline check"""
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            client.set(_redis_key(card_id, day), spent_minor, ex=settings.CARD_SPEND_REDIS_TTL)
+        except Exception as e:
+            logger.warning(f"Redis card spend set failed: {e}")
+
+    @staticmethod
+    def forget(card_id: int, day: date):
+        """Drop the Redis total after the card's spend went down (reversal)"""
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            client.delete(_redis_key(card_id, day))
+        except Exception as e:
+            logger.warning(f"Redis card spend delete failed: {e}")
@@ -0,0 +1,168 @@
+"""
+Card Vault
+Encryption and fingerprinting of virtual card numbers (PAN) and CVVs.
+
+PAN and CVV are stored AES-256-GCM encrypted as "v1.<key id>.<nonce+ciphertext>"
+(base64url), with the column name as associated data so a ciphertext cannot be
+moved to another field. Several keys can be configured (CARD_VAULT_KEYS) so old
+rows stay readable after a rotation; new values use CARD_VAULT_ACTIVE_KEY.
+
+Cards are found by fingerprint: an HMAC-SHA256 of the PAN under
+CARD_FINGERPRINT_KEY, stored in a unique indexed column. A POS or ATM lookup
+is one index probe on the fingerprint; nothing is decrypted to find a card.
+
+Key material is parsed once per process and the AESGCM / HMAC objects are kept,
+so encrypting, decrypting or fingerprinting costs microseconds. Without
+configured keys (development) both keys are derived from SECRET_KEY; the app
+refuses to start that way in production (CardVault.check_configuration).
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from config import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+FORMAT_VERSION = "v1"
+NONCE_BYTES = 12
+
+
+class CardVaultError(Exception):
+    """A value could not be decrypted (unknown key id, tampered or malformed)"""
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _derive(info: bytes) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(settings.SECRET_KEY.encode())
+
+
+class _Keyring:
+    """Decoded vault keys, built once per process"""
+
+    def __init__(self):
+        if settings.CARD_VAULT_KEYS:
+            keys = {}
+            for entry in settings.CARD_VAULT_KEYS.split(","):
+                key_id, _, encoded = entry.strip().partition(":")
+                key = _b64decode(encoded)
+                if len(key) != 32:
+                    raise ValueError(f"CARD_VAULT_KEYS entry {key_id!r} is not a base64 32-byte key")
+                keys[key_id] = key
+            active = settings.CARD_VAULT_ACTIVE_KEY or next(iter(keys))
+            if active not in keys:
+                raise ValueError(f"CARD_VAULT_ACTIVE_KEY {active!r} is not in CARD_VAULT_KEYS")
+        else:
+            logger.warning("CARD_VAULT_KEYS not set; deriving the card vault key from SECRET_KEY")
+            keys, active = {"dev": _derive(b"blackwallet card vault encryption")}, "dev"
+
+        if settings.CARD_FINGERPRINT_KEY:
+            fingerprint_key = _b64decode(settings.CARD_FINGERPRINT_KEY)
+        else:
+            fingerprint_key = _derive(b"blackwallet card vault fingerprint")
+
+        self.active = active
+        self.ciphers: Dict[str, AESGCM] = {key_id: AESGCM(key) for key_id, key in keys.items()}
+        self.fingerprint_mac = hmac.new(fingerprint_key, digestmod=hashlib.sha256)
+
+
+_keyring: Optional[_Keyring] = None
+_keyring_lock = threading.Lock()
+
+
+def _keys() -> _Keyring:
+    global _keyring
+    if _keyring is None:
+        with _keyring_lock:
+            if _keyring is None:
+                _keyring = _Keyring()
+    return _keyring
+
+
+class CardVault:
+    """Encrypt, decrypt and fingerprint card secrets"""
+
+    @staticmethod
+    def check_configuration():
+        """Fail startup on missing production keys or malformed key material"""
+        if settings.ENVIRONMENT == "production":
+            missing = [name for name in ("CARD_VAULT_KEYS", "CARD_FINGERPRINT_KEY") if not getattr(settings, name)]
+            if missing:
+                raise RuntimeError(
+                    f"{' and '.join(missing)} must be set in production; "
+                    "card data would otherwise be keyed from SECRET_KEY"
+                )
+        _keys()
+
+    @staticmethod
+    def encrypt(value: str, field: str) -> str:
+        """Ciphertext for value, bound to field (e.g. "card_number")"""
+        keys = _keys()
+        nonce = os.urandom(NONCE_BYTES)
+        sealed = keys.ciphers[keys.active].encrypt(nonce, value.encode(), field.encode())
+        token = base64.urlsafe_b64encode(nonce + sealed).rstrip(b"=").decode()
+        return f"{FORMAT_VERSION}.{keys.active}.{token}"
+
+    @staticmethod
+    def decrypt(ciphertext: str, field: str) -> str:
+        try:
+            version, key_id, token = ciphertext.split(".", 2)
+            if version != FORMAT_VERSION:
+                raise CardVaultError(f"Unsupported card vault format {version!r}")
+            cipher = _keys().ciphers.get(key_id)
+            if cipher is None:
+                raise CardVaultError(f"Unknown card vault key {key_id!r}")
+            raw = _b64decode(token)
+            return cipher.decrypt(raw[:NONCE_BYTES], raw[NONCE_BYTES:], field.encode()).decode()
+        except CardVaultError:
+            raise
+        except Exception as e:
+            raise CardVaultError(f"Cannot decrypt {field}: {type(e).__name__}") from e
+
+    @staticmethod
+    def needs_rotation(ciphertext: str) -> bool:
+        """True when ciphertext was sealed with a key other than the active one"""
+        return ciphertext.split(".", 2)[1] != _keys().active
+
+    @staticmethod
+    def fingerprint(card_number: str) -> str:
+        """Keyed HMAC-SHA256 of the PAN (digits only), the indexed lookup key"""
+        mac = _keys().fingerprint_mac.copy()
+        mac.update("".join(ch for ch in card_number if ch.isdigit()).encode())
+        return mac.hexdigest()
+
+    @staticmethod
+    def seal_card(card_number: str, cvv: str) -> Dict[str, str]:
+        """Column values for a new or re-keyed card"""
+        return {
+            "card_number_encrypted": CardVault.encrypt(card_number, "card_number"),
+            "card_number_fingerprint": CardVault.fingerprint(card_number),
+            "card_last4": card_number[-4:],
+            "cvv_encrypted": CardVault.encrypt(cvv, "cvv"),
+        }
+
+    @staticmethod
+    def reveal(card) -> Tuple[str, str]:
+        """(PAN, CVV) of a VirtualCard; only for showing the owner their card"""
+        return (
+            CardVault.decrypt(card.card_number_encrypted, "card_number"),
+            CardVault.decrypt(card.cvv_encrypted, "cvv"),
+        )
+
+    @staticmethod
+    def verify_cvv(card, cvv: str) -> bool:
+        """Constant-time comparison against the card's stored CVV"""
+        if not card.cvv_encrypted:
+            return False
+        return hmac.compare_digest(cvv.encode(), CardVault.decrypt(card.cvv_encrypted, "cvv").encode())
@@ -0,0 +1,190 @@
+"""
+Idempotency Service
+Claims, completes and replays Idempotency-Key records (idempotency_keys table).
+
+The unique (user_id, key) index makes the claim atomic across workers: the
+first request inserts an in_progress row and runs, retries find the row and
+either replay its stored response or are told the original is still running.
+Completed responses are also cached (Redis when enabled) so replays skip the
+database entirely.
+
+While a request runs its owner refreshes the claim's created_at every
+IDEMPOTENCY_HEARTBEAT_SECONDS. A retry takes over an unfinished claim only once
+that heartbeat has been silent for IDEMPOTENCY_LOCK_SECONDS, i.e. the worker
+that held it died; a slow request (a Stripe call in retry backoff) keeps its
+claim for as long as it runs.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from cache import build_cache
+from config import settings
+from database import AsyncSessionLocal
+from models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH = 5000
+
+replay_cache = build_cache(
+    "idempotency",
+    maxsize=10000,
+    ttl=settings.IDEMPOTENCY_TTL_HOURS * 3600
+)
+
+
+def _cache_key(user_id: int, key: str) -> str:
+    return f"{user_id}:{key}"
+
+
+def _snapshot(record: IdempotencyKey) -> Dict:
+    return {
+        "request_hash": record.request_hash,
+        "status": record.status,
+        "response_status": record.response_status,
+        "response_body": record.response_body,
+        "content_type": record.content_type,
+    }
+
+
+class IdempotencyService:
+    """Idempotency-Key bookkeeping for IdempotencyMiddleware"""
+
+    @staticmethod
+    def request_hash(method: str, path: str, body: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{method} {path}\n".encode())
+        digest.update(body)
+        return digest.hexdigest()
+
+    @staticmethod
+    async def claim(user_id: int, key: str, request_hash: str) -> Optional[Dict]:
+        """
+        Claim key for this request. Returns None when the caller owns the key and
+        should run the request, otherwise a snapshot of the existing record.
+        """
+        cached = await replay_cache.aget(_cache_key(user_id, key))
+        if cached is not None:
+            return cached
+
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            db.add(IdempotencyKey(
+                user_id=user_id,
+                key=key,
+                request_hash=request_hash,
+                status="in_progress",
+                created_at=now,
+                expires_at=now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+            ))
+            try:
+                await db.commit()
+                return None
+            except IntegrityError:
+                await db.rollback()
+
+            record = await db.scalar(
+                select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            )
+            if record is None:
+                # Purged between the insert and the lookup; let the retry claim it
+                return {"request_hash": request_hash, "status": "in_progress"}
+
+            stale_claim = (
+                record.status == "in_progress" and
+                record.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+            )
+            if record.expires_at <= now or stale_claim:
+                # Take over an expired key or a claim whose owner stopped
+                # heartbeating (its worker died); the created_at guard makes
+                # sure only one retry wins
+                taken = await db.execute(
+                    update(IdempotencyKey)
+                    .where(IdempotencyKey.id == record.id, IdempotencyKey.created_at == record.created_at)
+                    .values(
+                        request_hash=request_hash,
+                        status="in_progress",
+                        response_status=None,
+                        response_body=None,
+                        content_type=None,
+                        created_at=now,
+                        expires_at=now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+                    )
+                )
+                await db.commit()
+                if taken.rowcount == 1:
+                    return None
+
+            return _snapshot(record)
+
+    @staticmethod
+    async def keep_alive(user_id: int, key: str):
+        """Refresh an unfinished claim until cancelled so no retry mistakes it for a dead worker's"""
+        while True:
+            await asyncio.sleep(settings.IDEMPOTENCY_HEARTBEAT_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(IdempotencyKey)
+                        .where(
+                            IdempotencyKey.user_id == user_id,
+                            IdempotencyKey.key == key,
+                            IdempotencyKey.status == "in_progress"
+                        )
+                        .values(created_at=datetime.utcnow())
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Idempotency heartbeat for user {user_id} failed: {e}")
+
+    @staticmethod
+    async def complete(user_id: int, key: str, status_code: int, body: bytes, content_type: Optional[str]):
+        """Store the response for replay"""
+        response_body = body.decode("utf-8", errors="replace")
+        async with AsyncSessionLocal() as db:
+            record = await db.scalar(
+                select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            )
+            if record is None:
+                return
+            record.status = "completed"
+            record.response_status = status_code
+            record.response_body = response_body
+            record.content_type = content_type
+            await db.commit()
+            await replay_cache.aset(_cache_key(user_id, key), _snapshot(record))
+
+    @staticmethod
+    async def release(user_id: int, key: str):
+        """Drop an unfinished claim so the client can retry (server error, dropped request)"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.user_id == user_id,
+                    IdempotencyKey.key == key,
+                    IdempotencyKey.status == "in_progress"
+                )
+            )
+            await db.commit()
+
+    @staticmethod
+    def purge_expired(db: Session) -> int:
+        """Delete expired keys in batches; returns the number removed"""
+        now = datetime.utcnow()
+        removed = 0
+        while True:
+            ids = db.scalars(
+                select(IdempotencyKey.id).where(IdempotencyKey.expires_at <= now).limit(PURGE_BATCH)
+            ).all()
+            if not ids:
+                return removed
+            db.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+            db.commit()
+            removed += len(ids)
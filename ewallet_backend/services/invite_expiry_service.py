@@ -0,0 +1,168 @@
+"""
+Invite Expiry Service
+Refunds money invites that passed expires_at, in bounded chunks.
+
+- Each chunk is claimed with SELECT ... FOR UPDATE SKIP LOCKED on the
+  (status, expires_at) index, then closed with a conditional UPDATE (status
+  still open) before any refund. Accept and decline close the invite the
+  same way before moving money, so exactly one of them wins an invite.
+- Senders and original transactions are fetched with one IN query each,
+  refunds are credited with one UPDATE per chunk (LedgerService.credit_many),
+  and invites, original transactions and notifications are written with
+  executemany statements. One commit per chunk.
+- Refund Transaction rows go through the ORM (one batched INSERT) so the
+  activity summary and search hooks see them like any other ledger write.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import MoneyInvite, Notification, Transaction, User
+from money import MINOR_PER_MAJOR
+from services.ledger_service import LedgerService
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ("pending", "delivered", "opened")
+CHUNK_SIZE = 500
+
+invites = MoneyInvite.__table__
+transactions = Transaction.__table__
+
+
+class InviteExpiryService:
+    """Claim expired invites and refund their senders"""
+
+    @staticmethod
+    def claim(db: Session, now: datetime, limit: int = CHUNK_SIZE) -> List:
+        stmt = (
+            select(
+                invites.c.id, invites.c.sender_id, invites.c.amount_minor,
+                invites.c.transaction_id, invites.c.recipient_contact
+            )
+            .where(invites.c.status.in_(OPEN_STATUSES), invites.c.expires_at <= now)
+            .order_by(invites.c.expires_at, invites.c.id)
+            .limit(limit)
+        )
+        if db.get_bind().dialect.name != "sqlite":
+            stmt = stmt.with_for_update(skip_locked=True)
+        return db.execute(stmt).all()
+
+    @staticmethod
+    def expire_chunk(db: Session, claimed: List, now: datetime) -> Dict[str, int]:
+        """Refund a claimed chunk inside the caller's transaction; the caller commits"""
+        # Close the invites first, conditionally: anything an accept/decline closed
+        # since the claim (no row locks on SQLite) drops out and is not refunded
+        closed = set(db.execute(
+            update(invites)
+            .where(invites.c.id.in_([row.id for row in claimed]), invites.c.status.in_(OPEN_STATUSES))
+            .values(status="expired")
+            .returning(invites.c.id)
+        ).scalars())
+        claimed = [row for row in claimed if row.id in closed]
+        if not claimed:
+            return {"expired": 0, "orphaned": 0, "refunded_minor": 0}
+
+        sender_ids = {row.sender_id for row in claimed}
+        senders = dict(db.execute(
+            select(User.id, User.username).where(User.id.in_(sender_ids))
+        ).all())
+
+        refunds = defaultdict(int)
+        refund_rows = {}
+        orphaned = []
+        for row in claimed:
+            username = senders.get(row.sender_id)
+            if username is None:
+                # Nobody to refund; close the invite so it is not claimed forever
+                orphaned.append(row)
+                logger.error(f"Sender not found for invite {row.id}")
+                continue
+            refunds[row.sender_id] += row.amount_minor or 0
+            refund_rows[row.id] = Transaction(
+                sender="system",
+                receiver=username,
+                amount_minor=row.amount_minor,
+                transaction_type="money_invite",
+                status="completed",
+                processed_at=now,
+                extra_data={"reason": "invite_expired", "original_invite_id": row.id}
+            )
+
+        LedgerService.credit_many(db, refunds)
+        db.add_all(refund_rows.values())
+        db.flush()
+
+        invite_updates = [
+            {
+                "b_id": row.id,
+                "b_refunded_at": now if row.id in refund_rows else None,
+                "b_refund_transaction_id": refund_rows[row.id].id if row.id in refund_rows else None,
+            }
+            for row in claimed
+        ]
+        db.execute(
+            update(invites)
+            .where(invites.c.id == bindparam("b_id"))
+            .values(
+                status="expired",
+                refunded_at=bindparam("b_refunded_at"),
+                refund_transaction_id=bindparam("b_refund_transaction_id")
+            ),
+            invite_updates
+        )
+
+        original_ids = [row.transaction_id for row in claimed if row.transaction_id and row.id in refund_rows]
+        if original_ids:
+            db.execute(
+                update(transactions)
+                .where(transactions.c.id.in_(original_ids))
+                .values(status="refunded")
+            )
+
+        notifications = [
+            {
+                "user_id": row.sender_id,
+                "title": "⏰ Invite Expired",
+                "message": (
+                    f"Your ${(row.amount_minor or 0) / MINOR_PER_MAJOR:.2f} invite to "
+                    f"{row.recipient_contact} expired. Funds refunded."
+                ),
+                "notification_type": "transaction",
+                "is_read": False,
+                "sent_at": now,
+                "extra_data": {"invite_id": row.id, "refund_transaction_id": refund_rows[row.id].id},
+            }
+            for row in claimed if row.id in refund_rows
+        ]
+        if notifications:
+            db.execute(insert(Notification), notifications)
+
+        return {"expired": len(refund_rows), "orphaned": len(orphaned), "refunded_minor": sum(refunds.values())}
+
+    @staticmethod
+    def run(session_factory, now: Optional[datetime] = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+        """Expire everything due at `now`, one committed chunk at a time"""
+        now = now or datetime.utcnow()
+        totals = {"expired": 0, "orphaned": 0, "refunded_minor": 0}
+        while True:
+            db = session_factory()
+            try:
+                claimed = InviteExpiryService.claim(db, now, chunk_size)
+                if not claimed:
+                    break
+                outcome = InviteExpiryService.expire_chunk(db, claimed, now)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            for key in totals:
+                totals[key] += outcome[key]
+            logger.debug(f"Expired chunk of {len(claimed)} invites")
+        return totals
@@ -0,0 +1,358 @@
+"""
+Job Queue
+Durable background jobs for notifications and other side effects.
+
+Request handlers call JobQueue.enqueue(db, job) inside their own transaction
+and return; job_worker.py processes claim due jobs, run the registered handler
+and retry failures with exponential backoff. A job that keeps failing (or
+raises PermanentJobError) is dead-lettered for inspection.
+
+Backends (JOB_QUEUE_BACKEND):
+- database (default): background_jobs rows, added to the caller's session so
+  a job exists only if the request's writes commit. Claimed with
+  FOR UPDATE SKIP LOCKED; a claimed job's run_at becomes its lease expiry,
+  so a job whose worker died is picked up again once the lease runs out.
+- redis: a sorted set of job ids scored by run_at plus one hash per job,
+  pushed when the enqueuing session commits. Dead jobs go to a list.
+"""
+import asyncio
+import inspect
+import json
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, ClassVar, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from cache import get_redis_client
+from config import settings
+from database import SessionLocal
+from models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH = 5000
+
+
+class Job(BaseModel):
+    """Typed job payload; subclasses set kind and register a handler with @handles"""
+    kind: ClassVar[str]
+    max_attempts: ClassVar[int] = settings.JOB_MAX_ATTEMPTS
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help; the job is dead-lettered at once"""
+
+
+class ClaimedJob:
+    """A job leased to this worker"""
+
+    def __init__(self, id, kind: str, payload: Dict, attempts: int, max_attempts: int):
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+
+
+_HANDLERS: Dict[str, Tuple[Type[Job], Callable]] = {}
+
+
+def handles(job_type: Type[Job]):
+    """Register the handler for a job type (sync functions run in a thread)"""
+    def register(handler: Callable):
+        _HANDLERS[job_type.kind] = (job_type, handler)
+        return handler
+    return register
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff with jitter: base * 2^(attempts-1), capped"""
+    delay = min(settings.JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), settings.JOB_RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+# ============= DATABASE BACKEND =============
+
+class DatabaseJobBackend:
+    """background_jobs table"""
+
+    name = "database"
+
+    def enqueue(self, session: Session, job: Job, run_at: datetime):
+        session.add(BackgroundJob(
+            kind=job.kind,
+            payload=job.model_dump(mode="json"),
+            status="queued",
+            attempts=0,
+            max_attempts=job.max_attempts,
+            run_at=run_at
+        ))
+
+    def claim(self, worker_id: str, limit: int) -> List[ClaimedJob]:
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            stmt = (
+                select(BackgroundJob)
+                .where(BackgroundJob.status.in_(("queued", "running")), BackgroundJob.run_at <= now)
+                .order_by(BackgroundJob.run_at)
+                .limit(limit)
+            )
+            if db.get_bind().dialect.name != "sqlite":
+                stmt = stmt.with_for_update(skip_locked=True)
+            rows = db.scalars(stmt).all()
+            for row in rows:
+                row.status = "running"
+                row.attempts = (row.attempts or 0) + 1
+                row.run_at = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+                row.locked_by = worker_id
+            db.commit()
+            return [ClaimedJob(row.id, row.kind, row.payload, row.attempts, row.max_attempts) for row in rows]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _finish(self, job: ClaimedJob, **values):
+        db = SessionLocal()
+        try:
+            # The attempts guard ignores a worker whose lease was taken over
+            db.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job.id, BackgroundJob.attempts == job.attempts)
+                .values(**values)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def succeed(self, job: ClaimedJob):
+        self._finish(job, status="succeeded", finished_at=datetime.utcnow(), locked_by=None)
+
+    def retry(self, job: ClaimedJob, error: str, run_at: datetime):
+        self._finish(job, status="queued", run_at=run_at, last_error=error, locked_by=None)
+
+    def dead_letter(self, job: ClaimedJob, error: str):
+        self._finish(job, status="dead", finished_at=datetime.utcnow(), last_error=error, locked_by=None)
+
+    @staticmethod
+    def purge_succeeded(db: Session, older_than: timedelta = timedelta(days=7)) -> int:
+        """Delete succeeded jobs in batches; dead jobs stay for inspection"""
+        cutoff = datetime.utcnow() - older_than
+        removed = 0
+        while True:
+            ids = db.scalars(
+                select(BackgroundJob.id)
+                .where(BackgroundJob.status == "succeeded", BackgroundJob.finished_at <= cutoff)
+                .limit(PURGE_BATCH)
+            ).all()
+            if not ids:
+                return removed
+            db.execute(delete(BackgroundJob).where(BackgroundJob.id.in_(ids)))
+            db.commit()
+            removed += len(ids)
+
+
+# ============= REDIS BACKEND =============
+
+# Move due ids to their lease expiry and count the attempt, atomically
+CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, id in ipairs(ids) do
+    redis.call('ZADD', KEYS[1], ARGV[3], id)
+    redis.call('HINCRBY', ARGV[4] .. id, 'attempts', 1)
+end
+return ids
+"""
+
+
+class RedisJobBackend:
+    """Sorted set of ready job ids scored by run_at (epoch seconds)"""
+
+    name = "redis"
+
+    def __init__(self, client):
+        self._client = client
+        self._prefix = "blackwallet:jobs:"
+        self._ready = self._prefix + "ready"
+        self._dead = self._prefix + "dead"
+        self._claim = client.register_script(CLAIM_SCRIPT)
+
+    def _job_key(self, job_id) -> str:
+        return f"{self._prefix}job:{job_id}"
+
+    def enqueue(self, session: Session, job: Job, run_at: datetime):
+        # Pushed by _push_pending_jobs once the session commits
+        session.info.setdefault("pending_jobs", []).append((job, run_at))
+
+    def push(self, jobs: List[Tuple[Job, datetime]]):
+        pipe = self._client.pipeline()
+        for job, run_at in jobs:
+            job_id = uuid.uuid4().hex
+            pipe.hset(self._job_key(job_id), mapping={
+                "kind": job.kind,
+                "payload": job.model_dump_json(),
+                "attempts": 0,
+                "max_attempts": job.max_attempts,
+            })
+            pipe.zadd(self._ready, {job_id: run_at.timestamp()})
+        pipe.execute()
+
+    def claim(self, worker_id: str, limit: int) -> List[ClaimedJob]:
+        now = datetime.utcnow()
+        lease = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        ids = self._claim(
+            keys=[self._ready],
+            args=[now.timestamp(), limit, lease.timestamp(), self._prefix + "job:"]
+        )
+        if not ids:
+            return []
+        pipe = self._client.pipeline()
+        for job_id in ids:
+            pipe.hgetall(self._job_key(job_id.decode()))
+        claimed = []
+        for job_id, fields in zip(ids, pipe.execute()):
+            if not fields:
+                self._client.zrem(self._ready, job_id)
+                continue
+            claimed.append(ClaimedJob(
+                job_id.decode(),
+                fields[b"kind"].decode(),
+                json.loads(fields[b"payload"]),
+                int(fields[b"attempts"]),
+                int(fields[b"max_attempts"])
+            ))
+        return claimed
+
+    def succeed(self, job: ClaimedJob):
+        pipe = self._client.pipeline()
+        pipe.zrem(self._ready, job.id)
+        pipe.delete(self._job_key(job.id))
+        pipe.execute()
+
+    def retry(self, job: ClaimedJob, error: str, run_at: datetime):
+        pipe = self._client.pipeline()
+        pipe.hset(self._job_key(job.id), "last_error", error)
+        pipe.zadd(self._ready, {job.id: run_at.timestamp()})
+        pipe.execute()
+
+    def dead_letter(self, job: ClaimedJob, error: str):
+        pipe = self._client.pipeline()
+        pipe.zrem(self._ready, job.id)
+        pipe.delete(self._job_key(job.id))
+        pipe.rpush(self._dead, json.dumps({
+            "id": job.id, "kind": job.kind, "payload": job.payload,
+            "attempts": job.attempts, "error": error, "failed_at": datetime.utcnow().isoformat(),
+        }))
+        pipe.execute()
+
+
+_backend = None
+
+
+def get_backend():
+    """The configured backend; falls back to the database when Redis is unreachable"""
+    global _backend
+    if _backend is None:
+        client = get_redis_client() if settings.JOB_QUEUE_BACKEND == "redis" else None
+        if settings.JOB_QUEUE_BACKEND == "redis" and client is None:
+            logger.warning("Redis job queue unavailable, using the database backend")
+        _backend = RedisJobBackend(client) if client is not None else DatabaseJobBackend()
+    return _backend
+
+
+@event.listens_for(Session, "after_commit")
+def _push_pending_jobs(session):
+    jobs = session.info.pop("pending_jobs", None)
+    if not jobs:
+        return
+    try:
+        get_backend().push(jobs)
+    except Exception as e:
+        logger.error(f"Failed to push {len(jobs)} jobs to Redis: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_jobs(session):
+    session.info.pop("pending_jobs", None)
+
+
+class JobQueue:
+    """Enqueue typed jobs from request handlers"""
+
+    @staticmethod
+    def enqueue(db, job: Job, delay: Optional[timedelta] = None):
+        """
+        Queue job as part of db's transaction (Session or AsyncSession);
+        it becomes visible to workers when the caller commits.
+        """
+        if job.kind not in _HANDLERS:
+            raise ValueError(f"No handler registered for job kind '{job.kind}'")
+        session = getattr(db, "sync_session", db)
+        get_backend().enqueue(session, job, datetime.utcnow() + (delay or timedelta()))
+
+
+# ============= WORKER =============
+
+class JobWorker:
+    """Claim jobs and run their handlers, up to `concurrency` at a time"""
+
+    def __init__(self, concurrency: int = 10, poll_interval: float = 1.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.backend = get_backend()
+
+    async def _run(self, job: ClaimedJob) -> str:
+        registered = _HANDLERS.get(job.kind)
+        try:
+            if registered is None:
+                raise PermanentJobError(f"No handler registered for job kind '{job.kind}'")
+            job_type, handler = registered
+            payload = job_type.model_validate(job.payload)
+            if inspect.iscoroutinefunction(handler):
+                await handler(payload)
+            else:
+                await asyncio.to_thread(handler, payload)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+                await asyncio.to_thread(self.backend.dead_letter, job, error)
+                logger.error(f"☠️ Job {job.kind}#{job.id} dead-lettered after {job.attempts} attempts: {error}")
+                return "dead"
+            run_at = datetime.utcnow() + retry_delay(job.attempts)
+            await asyncio.to_thread(self.backend.retry, job, error, run_at)
+            logger.warning(f"Job {job.kind}#{job.id} failed (attempt {job.attempts}), retrying at {run_at}: {error}")
+            return "retried"
+        await asyncio.to_thread(self.backend.succeed, job)
+        return "succeeded"
+
+    async def run_once(self) -> Dict[str, int]:
+        """Run one claimed batch"""
+        jobs = await asyncio.to_thread(self.backend.claim, self.worker_id, self.concurrency)
+        totals = {"succeeded": 0, "retried": 0, "dead": 0}
+        for outcome in await asyncio.gather(*(self._run(job) for job in jobs)):
+            totals[outcome] += 1
+        return totals
+
+    async def run_forever(self):
+        logger.info(
+            f"🚀 Job worker {self.worker_id} started "
+            f"({self.backend.name} backend, concurrency {self.concurrency})"
+        )
+        while True:
+            try:
+                totals = await self.run_once()
+            except Exception as e:
+                logger.error(f"Job worker error: {e}")
+                totals = None
+            if not totals or not any(totals.values()):
+                await asyncio.sleep(self.poll_interval)
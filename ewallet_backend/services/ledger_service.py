@@ -0,0 +1,198 @@
+"""
+Ledger Service
+Atomic balance movements shared by transfers, scheduled payments and offline sync.
+
+Every debit is a single conditional UPDATE (balance_minor >= amount) so two
+workers can never both spend the same cents, and rows are locked in id order
+so concurrent transfers between the same pair of users cannot deadlock.
+"""
+from typing import Dict, Tuple
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import User
+from money import Money
+
+# Bookkeeping that must commit together with every ledger write registers its
+# session hooks on import
+import services.activity_summary_service  # noqa: F401
+import services.search_service  # noqa: F401
+
+users = User.__table__
+
+
+class InsufficientFunds(Exception):
+    """The conditional debit matched no row (balance too low)"""
+
+
+class AccountNotFound(Exception):
+    """The account to credit does not exist"""
+
+
+class LedgerService:
+    """Conditional-UPDATE debits and credits on users.balance_minor"""
+
+    @staticmethod
+    def _check_amount(amount: Money):
+        if amount.minor <= 0:
+            raise ValueError("Amount must be positive")
+
+    @staticmethod
+    def _lock_statement(*user_ids: int):
+        """SELECT ... FOR UPDATE in ascending id order (deterministic lock ordering)"""
+        return (
+            select(users.c.id)
+            .where(users.c.id.in_(sorted(set(user_ids))))
+            .order_by(users.c.id)
+            .with_for_update()
+        )
+
+    @staticmethod
+    def _balances_statement(*user_ids: int):
+        return (
+            select(users.c.id, users.c.balance_minor)
+            .where(users.c.id.in_(sorted(set(user_ids))))
+            .order_by(users.c.id)
+        )
+
+    @staticmethod
+    def _debit_statement(user_id: int, amount: Money):
+        return (
+            update(users)
+            .where(users.c.id == user_id, users.c.balance_minor >= amount.minor)
+            .values(balance_minor=users.c.balance_minor - amount.minor)
+            .returning(users.c.balance_minor)
+        )
+
+    @staticmethod
+    def _credit_statement(user_id: int, amount: Money):
+        return (
+            update(users)
+            .where(users.c.id == user_id)
+            .values(balance_minor=users.c.balance_minor + amount.minor)
+            .returning(users.c.balance_minor)
+        )
+
+    @staticmethod
+    def _needs_row_locks(session: Session) -> bool:
+        # SQLite has no FOR UPDATE; its single writer lock already serializes
+        # the UPDATEs, and an extra SELECT first would only invite SQLITE_BUSY
+        return session.get_bind().dialect.name != "sqlite"
+
+    @staticmethod
+    def _refresh_identity(session: Session, user_id: int, balance_minor: int):
+        """Keep any User already loaded in the session in step with the UPDATE"""
+        user = session.identity_map.get(identity_key(User, user_id))
+        if user is not None:
+            set_committed_value(user, "balance_minor", balance_minor)
+
+    # ============= SYNC API =============
+
+    @staticmethod
+    def debit(db: Session, user_id: int, amount: Money) -> Money:
+        """Take amount from a user; raises InsufficientFunds. Returns the new balance."""
+        LedgerService._check_amount(amount)
+        balance = db.execute(LedgerService._debit_statement(user_id, amount)).scalar_one_or_none()
+        if balance is None:
+            raise InsufficientFunds(f"User {user_id} cannot cover {amount}")
+        LedgerService._refresh_identity(db, user_id, balance)
+        return Money(balance, amount.currency)
+
+    @staticmethod
+    def credit(db: Session, user_id: int, amount: Money) -> Money:
+        """Give amount to a user; raises AccountNotFound. Returns the new balance."""
+        LedgerService._check_amount(amount)
+        balance = db.execute(LedgerService._credit_statement(user_id, amount)).scalar_one_or_none()
+        if balance is None:
+            raise AccountNotFound(f"User {user_id} not found")
+        LedgerService._refresh_identity(db, user_id, balance)
+        return Money(balance, amount.currency)
+
+    @staticmethod
+    def transfer(db: Session, sender_id: int, receiver_id: int, amount: Money) -> Tuple[Money, Money]:
+        """
+        Move amount between two users inside the caller's transaction.
+        The caller commits (together with its Transaction row) or rolls back.
+        Returns (sender_balance, receiver_balance).
+        """
+        if sender_id == receiver_id:
+            raise ValueError("Cannot transfer to yourself")
+        LedgerService._check_amount(amount)
+        if LedgerService._needs_row_locks(db):
+            db.execute(LedgerService._lock_statement(sender_id, receiver_id)).all()
+        sender_balance = LedgerService.debit(db, sender_id, amount)
+        receiver_balance = LedgerService.credit(db, receiver_id, amount)
+        return sender_balance, receiver_balance
+
+    @staticmethod
+    def lock_balances(db: Session, *user_ids: int) -> Dict[int, int]:
+        """
+        Lock the given users (ascending id order) and return {user_id: balance_minor}.
+        Lets a caller plan several movements in memory and then apply one
+        debit/credit per user inside the same transaction.
+        """
+        stmt = LedgerService._balances_statement(*user_ids)
+        if LedgerService._needs_row_locks(db):
+            stmt = stmt.with_for_update()
+        return dict(db.execute(stmt).all())
+
+    @staticmethod
+    def credit_many(db: Session, amounts: Dict[int, int]) -> Dict[int, int]:
+        """
+        Credit {user_id: amount_minor} with one UPDATE ... CASE statement.
+        Rows are locked in id order first, like transfer(). Returns the new
+        balances of the users that exist; missing ids are simply absent.
+        """
+        amounts = {user_id: minor for user_id, minor in amounts.items() if minor}
+        if not amounts:
+            return {}
+        if any(minor < 0 for minor in amounts.values()):
+            raise ValueError("Amount must be positive")
+        if LedgerService._needs_row_locks(db):
+            db.execute(LedgerService._lock_statement(*amounts)).all()
+        rows = db.execute(
+            update(users)
+            .where(users.c.id.in_(sorted(amounts)))
+            .values(balance_minor=users.c.balance_minor + case(amounts, value=users.c.id, else_=0))
+            .returning(users.c.id, users.c.balance_minor)
+        ).all()
+        balances = dict(rows)
+        for user_id, balance in balances.items():
+            LedgerService._refresh_identity(db, user_id, balance)
+        return balances
+
+    # ============= ASYNC API =============
+
+    @staticmethod
+    async def debit_async(db: AsyncSession, user_id: int, amount: Money) -> Money:
+        LedgerService._check_amount(amount)
+        balance = (await db.execute(LedgerService._debit_statement(user_id, amount))).scalar_one_or_none()
+        if balance is None:
+            raise InsufficientFunds(f"User {user_id} cannot cover {amount}")
+        LedgerService._refresh_identity(db.sync_session, user_id, balance)
+        return Money(balance, amount.currency)
+
+    @staticmethod
+    async def credit_async(db: AsyncSession, user_id: int, amount: Money) -> Money:
+        LedgerService._check_amount(amount)
+        balance = (await db.execute(LedgerService._credit_statement(user_id, amount))).scalar_one_or_none()
+        if balance is None:
+            raise AccountNotFound(f"User {user_id} not found")
+        LedgerService._refresh_identity(db.sync_session, user_id, balance)
+        return Money(balance, amount.currency)
+
+    @staticmethod
+    async def transfer_async(db: AsyncSession, sender_id: int, receiver_id: int, amount: Money) -> Tuple[Money, Money]:
+        """AsyncSession variant of transfer()"""
+        if sender_id == receiver_id:
+            raise ValueError("Cannot transfer to yourself")
+        LedgerService._check_amount(amount)
+        if LedgerService._needs_row_locks(db.sync_session):
+            (await db.execute(LedgerService._lock_statement(sender_id, receiver_id))).all()
+        sender_balance = await LedgerService.debit_async(db, sender_id, amount)
+        receiver_balance = await LedgerService.credit_async(db, receiver_id, amount)
+        return sender_balance, receiver_balance
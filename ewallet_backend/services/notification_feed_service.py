@@ -0,0 +1,208 @@
+"""
+Notification Feed Service
+Per-user notification feed merging direct notifications with broadcasts.
+
+A broadcast is a single notifications row with user_id NULL, so sending one
+costs one insert however many users there are. Broadcast read state is kept
+per user in notification_read_cursors (everything up to read_until, moved by
+"mark all as read") plus notification_receipts (broadcasts read one by one
+since then); direct notifications keep their is_read flag.
+
+The feed runs the same (sent_at, id) keyset over both sides, each an index
+range on ix_notifications_user_sent, and merges the two sorted pages.
+"""
+import heapq
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, exists, func, select, update, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Notification, NotificationReadCursor, NotificationReceipt, User
+from pagination import keyset, page
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _item(notification: Notification, is_read: bool) -> Dict:
+    return {
+        "id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.notification_type,
+        "is_read": is_read,
+        "broadcast": notification.user_id is None,
+        "sent_at": notification.sent_at.isoformat() if notification.sent_at else None,
+        "extra_data": notification.extra_data,
+    }
+
+
+class NotificationFeedService:
+    """Broadcast storage and the merged per-user feed"""
+
+    @staticmethod
+    def broadcast(db: AsyncSession, title: str, message: str, notification_type: str = "general") -> Notification:
+        """Store a broadcast once; the caller commits"""
+        notification = Notification(
+            user_id=None,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            is_read=False,
+            sent_at=datetime.utcnow()
+        )
+        db.add(notification)
+        return notification
+
+    @staticmethod
+    def _sees_broadcasts(user: User) -> bool:
+        # Broadcasts have always targeted non-admin users
+        return not user.is_admin
+
+    @staticmethod
+    def _broadcasts_for(user: User):
+        """Broadcasts sent since the user signed up, like the old per-user copies"""
+        return [Notification.user_id.is_(None), Notification.sent_at >= (user.account_created_at or EPOCH)]
+
+    @staticmethod
+    def _unread_broadcast(user: User, read_until: datetime):
+        receipt = exists().where(
+            NotificationReceipt.user_id == user.id,
+            NotificationReceipt.notification_id == Notification.id
+        )
+        return [Notification.sent_at > read_until, ~receipt]
+
+    @staticmethod
+    async def _read_until(db: AsyncSession, user: User) -> datetime:
+        return await db.scalar(
+            select(NotificationReadCursor.read_until).where(NotificationReadCursor.user_id == user.id)
+        ) or EPOCH
+
+    @staticmethod
+    async def feed(
+        db: AsyncSession,
+        user: User,
+        cursor: Optional[str],
+        limit: int,
+        unread_only: bool = False
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Newest-first page of the user's direct and broadcast notifications"""
+        read_until = await NotificationFeedService._read_until(db, user)
+
+        direct = select(Notification).where(Notification.user_id == user.id)
+        if unread_only:
+            direct = direct.where(Notification.is_read == False)
+        branches = [direct]
+        if NotificationFeedService._sees_broadcasts(user):
+            broadcasts = select(Notification).where(*NotificationFeedService._broadcasts_for(user))
+            if unread_only:
+                broadcasts = broadcasts.where(*NotificationFeedService._unread_broadcast(user, read_until))
+            branches.append(broadcasts)
+
+        pages = [
+            (await db.scalars(keyset(stmt, Notification.sent_at, Notification.id, cursor, limit))).all()
+            for stmt in branches
+        ]
+        merged = list(heapq.merge(*pages, key=lambda n: (n.sent_at, n.id), reverse=True))[:limit + 1]
+        notifications, next_cursor = page(merged, limit, "sent_at")
+
+        unread_ids = [n.id for n in notifications if n.user_id is None and n.sent_at > read_until]
+        receipts = set()
+        if unread_ids:
+            receipts = set((await db.scalars(
+                select(NotificationReceipt.notification_id).where(
+                    NotificationReceipt.user_id == user.id,
+                    NotificationReceipt.notification_id.in_(unread_ids)
+                )
+            )).all())
+
+        items = []
+        for n in notifications:
+            if n.user_id is None:
+                is_read = n.sent_at <= read_until or n.id in receipts
+            else:
+                is_read = bool(n.is_read)
+            items.append(_item(n, is_read))
+        return items, next_cursor
+
+    @staticmethod
+    async def unread_count(db: AsyncSession, user: User) -> int:
+        count = await db.scalar(
+            select(func.count(Notification.id))
+            .where(Notification.user_id == user.id, Notification.is_read == False)
+        ) or 0
+        if NotificationFeedService._sees_broadcasts(user):
+            read_until = await NotificationFeedService._read_until(db, user)
+            count += await db.scalar(
+                select(func.count(Notification.id)).where(
+                    *NotificationFeedService._broadcasts_for(user),
+                    *NotificationFeedService._unread_broadcast(user, read_until)
+                )
+            ) or 0
+        return count
+
+    @staticmethod
+    async def mark_read(db: AsyncSession, user: User, notification_ids: List[int]) -> int:
+        """Mark direct notifications and broadcasts read; the caller commits. Returns ids marked."""
+        ids = sorted(set(notification_ids))
+        direct = await db.execute(
+            update(Notification)
+            .where(Notification.user_id == user.id, Notification.id.in_(ids))
+            .values(is_read=True)
+        )
+        marked = direct.rowcount or 0
+
+        broadcast_ids = set((await db.scalars(
+            select(Notification.id).where(Notification.user_id.is_(None), Notification.id.in_(ids))
+        )).all())
+        if broadcast_ids:
+            already = set((await db.scalars(
+                select(NotificationReceipt.notification_id).where(
+                    NotificationReceipt.user_id == user.id,
+                    NotificationReceipt.notification_id.in_(broadcast_ids)
+                )
+            )).all())
+            now = datetime.utcnow()
+            rows = [
+                {"user_id": user.id, "notification_id": notification_id, "read_at": now}
+                for notification_id in sorted(broadcast_ids - already)
+            ]
+            if rows:
+                await db.execute(NotificationFeedService._insert_receipts(db.get_bind().dialect.name), rows)
+            marked += len(broadcast_ids)
+        return marked
+
+    @staticmethod
+    def _insert_receipts(dialect: str):
+        """INSERT that ignores a receipt a concurrent request just wrote"""
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            return insert(NotificationReceipt)
+        return dialect_insert(NotificationReceipt).on_conflict_do_nothing()
+
+    @staticmethod
+    async def mark_all_read(db: AsyncSession, user: User):
+        """Read everything up to now; the caller commits"""
+        now = datetime.utcnow()
+        await db.execute(
+            update(Notification)
+            .where(Notification.user_id == user.id, Notification.is_read == False)
+            .values(is_read=True)
+        )
+        read_cursor = await db.get(NotificationReadCursor, user.id)
+        if read_cursor is None:
+            db.add(NotificationReadCursor(user_id=user.id, read_until=now))
+        else:
+            read_cursor.read_until = now
+        # Receipts behind the cursor are redundant now
+        await db.execute(
+            delete(NotificationReceipt).where(
+                NotificationReceipt.user_id == user.id,
+                NotificationReceipt.notification_id.in_(
+                    select(Notification.id).where(Notification.user_id.is_(None), Notification.sent_at <= now)
+                )
+            )
+        )
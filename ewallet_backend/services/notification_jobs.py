@@ -0,0 +1,177 @@
+"""
+Notification Jobs
+Typed jobs for email, SMS and invite delivery, run by job_worker.py.
+
+Handlers raise on a failed send so the queue retries with backoff, and
+DeliverInvite records what it already delivered on the invite so a retry
+never sends the same notification twice.
+"""
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models import MoneyInvite, Notification, User
+from notification_service import notification_service
+from services.job_queue import Job, JobQueue, PermanentJobError, handles
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+OPEN_INVITE_STATUSES = ("pending", "delivered", "opened")
+BROADCAST_EMAIL_PAGE = 200  # Recipients per BroadcastEmail job (one pooled SMTP connection)
+RECIPIENT_COLUMNS = {
+    "username": User.username,
+    "email": User.email,
+    "phone": User.phone,
+}
+
+
+class SendPasswordResetCode(Job):
+    kind = "send_password_reset_code"
+    identifier: str
+    code: str
+    method: str  # sms or email
+
+
+class SendMoneyNotification(Job):
+    kind = "send_money_notification"
+    identifier: str
+    sender_name: str
+    amount: float
+    method: str  # sms or email
+
+
+class SendBulkEmail(Job):
+    kind = "send_bulk_email"
+    recipients: List[str]
+    subject: str
+    body: str
+    html: bool = False
+
+
+class BroadcastEmail(Job):
+    """Email a broadcast to every non-admin user, one page per job"""
+    kind = "broadcast_email"
+    notification_id: int
+    after_user_id: int = 0
+
+
+class DeliverInvite(Job):
+    kind = "deliver_invite"
+    invite_id: int
+
+
+def _require_sms(method: str):
+    if method == "sms" and not notification_service.sms_transport:
+        raise PermanentJobError("Twilio not configured")
+
+
+@handles(SendPasswordResetCode)
+async def send_password_reset_code(job: SendPasswordResetCode):
+    _require_sms(job.method)
+    if not await notification_service.send_password_reset_code(job.identifier, job.code, job.method):
+        raise RuntimeError(f"Reset code {job.method} to {job.identifier} not sent")
+
+
+@handles(SendMoneyNotification)
+async def send_money_notification(job: SendMoneyNotification):
+    _require_sms(job.method)
+    if not await notification_service.send_money_notification(
+        job.identifier, job.sender_name, job.amount, job.method
+    ):
+        raise RuntimeError(f"Money notification {job.method} to {job.identifier} not sent")
+
+
+@handles(SendBulkEmail)
+async def send_bulk_email(job: SendBulkEmail):
+    """One pooled connection for the whole batch; only undelivered addresses are retried"""
+    failed = await notification_service.send_bulk_email(job.recipients, job.subject, job.body, job.html)
+    if not failed:
+        return
+    if len(failed) == len(job.recipients):
+        raise RuntimeError(f"Bulk email '{job.subject}' not delivered to any of {len(failed)} recipients")
+    async with AsyncSessionLocal() as db:
+        JobQueue.enqueue(db, job.model_copy(update={"recipients": failed}))
+        await db.commit()
+
+
+@handles(BroadcastEmail)
+async def broadcast_email(job: BroadcastEmail):
+    """
+    Send one page of recipients and queue the next page in the same commit,
+    so a long broadcast resumes where it stopped instead of starting over.
+    """
+    async with AsyncSessionLocal() as db:
+        notification = await db.get(Notification, job.notification_id)
+        if notification is None:
+            return
+        rows = (await db.execute(
+            select(User.id, User.email)
+            .where(User.id > job.after_user_id, User.is_admin == False, User.email.isnot(None))
+            .order_by(User.id)
+            .limit(BROADCAST_EMAIL_PAGE)
+        )).all()
+        if not rows:
+            return
+        if len(rows) == BROADCAST_EMAIL_PAGE:
+            JobQueue.enqueue(db, job.model_copy(update={"after_user_id": rows[-1].id}))
+
+        failed = await notification_service.send_bulk_email(
+            [row.email for row in rows], notification.title, notification.message
+        )
+        if failed:
+            JobQueue.enqueue(db, SendBulkEmail(recipients=failed, subject=notification.title, body=notification.message))
+        await db.commit()
+
+
+@handles(DeliverInvite)
+async def deliver_invite(job: DeliverInvite):
+    """In-app notification for existing users, then email or SMS to the contact"""
+    async with AsyncSessionLocal() as db:
+        invite = await db.scalar(select(MoneyInvite).where(MoneyInvite.id == job.invite_id))
+        if invite is None or invite.status not in OPEN_INVITE_STATUSES:
+            return
+
+        if not invite.notification_sent:
+            column = RECIPIENT_COLUMNS.get(invite.recipient_method)
+            recipient_user = None
+            if column is not None:
+                recipient_user = await db.scalar(select(User).where(column == invite.recipient_contact))
+            if recipient_user:
+                db.add(Notification(
+                    user_id=recipient_user.id,
+                    title=f"💰 Money Invite from {invite.sender_username}",
+                    message=f"You've received ${invite.amount:.2f}! Tap to accept.",
+                    notification_type="transaction",
+                    extra_data={
+                        "invite_id": invite.id,
+                        "invite_token": invite.invite_token,
+                        "amount": invite.amount,
+                        "sender": invite.sender_username
+                    }
+                ))
+                invite.notification_sent = True
+                invite.delivered_at = datetime.utcnow()
+                if invite.status == "pending":
+                    invite.status = "delivered"
+                await db.commit()
+                logger.info(f"In-app notification sent for invite {invite.id} to user {recipient_user.id}")
+
+        if invite.recipient_method == "email" and not invite.email_sent:
+            if not await notification_service.send_money_notification(
+                invite.recipient_contact, invite.sender_username, invite.amount, "email"
+            ):
+                raise RuntimeError(f"Invite {invite.id} email not sent")
+            invite.email_sent = True
+            await db.commit()
+
+        if invite.recipient_method == "phone" and not invite.sms_sent:
+            _require_sms("sms")
+            if not await notification_service.send_money_notification(
+                invite.recipient_contact, invite.sender_username, invite.amount, "sms"
+            ):
+                raise RuntimeError(f"Invite {invite.id} SMS not sent")
+            invite.sms_sent = True
+            await db.commit()
@@ -2,12 +2,15 @@
 Services for Quick Win Features
 """
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import secrets
 import string
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, or_, func, select
 from models import User, Transaction
+from money import Money, to_minor
+from services.search_service import TransactionSearchIndex
+from pagination import DEFAULT_PAGE_SIZE, encode_cursor, keyset
 from models_quick_wins import (
     Favorite, ScheduledPayment, PaymentLink, 
     TransactionTag, SubWallet, QRPaymentLimit
@@ -110,80 +113,6 @@ class ScheduledPaymentService:
         db.refresh(payment)
         return payment
     
-    @staticmethod
-    def get_pending_payments(db: Session) -> List[ScheduledPayment]:
-        """Get payments ready to execute"""
-        now = datetime.utcnow()
-        return db.query(ScheduledPayment).filter(
-            ScheduledPayment.status == "pending",
-            ScheduledPayment.next_execution <= now
-        ).all()
-    
-    @staticmethod
-    def execute_payment(payment: ScheduledPayment, db: Session) -> Dict[str, Any]:
-        """Execute a scheduled payment"""
-        user = db.query(User).filter(User.id == payment.user_id).first()
-        
-        # Check balance
-        if user.balance < payment.amount:
-            payment.status = "failed"
-            db.commit()
-            return {"success": False, "error": "Insufficient funds"}
-        
-        # Find recipient
-        recipient = None
-        if payment.recipient_type == "username":
-            recipient = db.query(User).filter(
-                User.username == payment.recipient_identifier
-            ).first()
-        elif payment.recipient_type == "email":
-            recipient = db.query(User).filter(
-                User.email == payment.recipient_identifier
-            ).first()
-        elif payment.recipient_type == "phone":
-            recipient = db.query(User).filter(
-                User.phone == payment.recipient_identifier
-            ).first()
-        
-        if not recipient:
-            payment.status = "failed"
-            db.commit()
-            return {"success": False, "error": "Recipient not found"}
-        
-        # Execute transfer
-        user.balance -= payment.amount
-        recipient.balance += payment.amount
-        
-        # Create transaction record
-        transaction = Transaction(
-            sender=user.username,
-            receiver=recipient.username,
-            amount=payment.amount,
-            transaction_type="scheduled",
-            status="completed"
-        )
-        db.add(transaction)
-        
-        # Update scheduled payment
-        payment.execution_count += 1
-        payment.last_execution = datetime.utcnow()
-        
-        if payment.is_recurring:
-            # Calculate next execution
-            if payment.schedule_type == "daily":
-                payment.next_execution = datetime.utcnow() + timedelta(days=1)
-            elif payment.schedule_type == "weekly":
-                payment.next_execution = datetime.utcnow() + timedelta(weeks=1)
-            elif payment.schedule_type == "biweekly":
-                payment.next_execution = datetime.utcnow() + timedelta(weeks=2)
-            elif payment.schedule_type == "monthly":
-                payment.next_execution = datetime.utcnow() + timedelta(days=30)
-        else:
-            payment.status = "completed"
-        
-        db.commit()
-        return {"success": True, "transaction_id": transaction.id}
-    
     @staticmethod
     def cancel_payment(user: User, payment_id: int, db: Session) -> bool:
         """Cancel a scheduled payment"""
@@ -328,60 +257,64 @@ class TransactionSearchService:
         end_date: datetime = None,
         transaction_type: str = None,
         tags: List[str] = None,
+        cursor: str = None,
+        limit: int = DEFAULT_PAGE_SIZE,
         db: Session = None
-    ) -> List[Transaction]:
-        """Search transactions with filters"""
+    ) -> Tuple[List[Transaction], Optional[str]]:
+        """
+        Search transactions with filters, one page at a time.
+        Text queries are ranked by relevance, otherwise newest first.
+        Returns (transactions, next_cursor).
+        """
         
         # Base query - user's transactions
-        filters = [
+        stmt = select(Transaction).where(
             or_(
                 Transaction.sender == user.username,
                 Transaction.receiver == user.username
             )
-        ]
-        
-        # Text search (recipient/sender name)
-        if query:
-            filters.append(
-                or_(
-                    Transaction.sender.ilike(f"%{query}%"),
-                    Transaction.receiver.ilike(f"%{query}%")
-                )
-            )
+        )
         
         # Amount filters
         if min_amount is not None:
-            filters.append(Transaction.amount >= min_amount)
+            stmt = stmt.where(Transaction.amount_minor >= to_minor(min_amount))
         if max_amount is not None:
-            filters.append(Transaction.amount <= max_amount)
+            stmt = stmt.where(Transaction.amount_minor <= to_minor(max_amount))
         
         # Date filters
         if start_date:
-            filters.append(Transaction.created_at >= start_date)
+            stmt = stmt.where(Transaction.created_at >= start_date)
         if end_date:
-            filters.append(Transaction.created_at <= end_date)
+            stmt = stmt.where(Transaction.created_at <= end_date)
         
         # Type filter
         if transaction_type:
-            filters.append(Transaction.transaction_type == transaction_type)
+            stmt = stmt.where(Transaction.transaction_type == transaction_type)
         
-        results = db.query(Transaction).filter(
-            and_(*filters)
-        ).order_by(Transaction.created_at.desc()).all()
-        
-        # Tag filter (post-query since it's a join)
+        # Tag filter (any of the given tags)
         if tags:
-            filtered_results = []
-            for txn in results:
-                txn_tags = db.query(TransactionTag).filter(
-                    TransactionTag.transaction_id == txn.id
-                ).all()
-                txn_tag_names = [t.tag for t in txn_tags]
-                if any(tag in txn_tag_names for tag in tags):
-                    filtered_results.append(txn)
-            return filtered_results
-        
-        return results
+            stmt = stmt.where(
+                select(TransactionTag.id).where(
+                    TransactionTag.transaction_id == Transaction.id,
+                    TransactionTag.tag.in_(tags)
+                ).exists()
+            )
+        
+        # Text search over counterparties, names, tags and memo
+        if query and query.strip():
+            stmt, sort_key = TransactionSearchIndex.match(db, stmt, query.strip())
+        else:
+            sort_key = Transaction.created_at
+        
+        rows = db.execute(
+            keyset(stmt.add_columns(sort_key.label("sort_key")), sort_key, Transaction.id, cursor, limit)
+        ).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].sort_key, rows[-1].Transaction.id)
+        return [row.Transaction for row in rows], next_cursor
 
 
 class SubWalletService:
@@ -439,11 +372,12 @@ class SubWalletService:
         if not from_wallet or not to_wallet:
             return {"success": False, "error": "Wallet not found"}
         
-        if from_wallet.balance < amount:
+        moved = Money.from_major(amount)
+        if from_wallet.balance_minor < moved.minor:
             return {"success": False, "error": "Insufficient funds"}
         
-        from_wallet.balance -= amount
-        to_wallet.balance += amount
+        from_wallet.balance_minor -= moved.minor
+        to_wallet.balance_minor += moved.minor
         
         db.commit()
         
@@ -0,0 +1,534 @@
+"""
+Risk Engine
+Rule-based fraud scoring for card authorizations, with velocity features.
+
+For every card, user and merchant the engine keeps sliding-window counts and
+sums over the last minute, hour and day in fixed-size ring buffers (one slot
+per second, minute or quarter hour), plus the merchants, terminal and
+location it was last seen at. Buffers keep running totals and only clear the
+slots that expired since their last use, so reading or updating a window is
+O(1) in the common case and an entity costs a few hundred bytes.
+
+An authorization is scored by building a flat feature dict (the request plus
+the history of its card, user and merchant *before* this authorization) and
+adding up the scores of the rules that match, capped at 100. Rules are data:
+{"name", "feature", "op", "value", "score"}, the defaults below or a JSON list
+in RISK_RULES_FILE, so thresholds can be tuned with replay_risk.py against
+past card_transactions and shipped without a code change.
+
+Feature stores (RISK_FEATURE_BACKEND):
+- memory: windows in process memory. Each worker sees the authorizations it
+  handled itself plus what warm() loaded from card_transactions at startup,
+  so with several workers every one of them undercounts; run one worker.
+- redis: the same ring buffers as Redis hashes (one field per slot, updated by
+  a Lua script) plus each card's last-seen state, shared by every worker and
+  kept across restarts. One round trip to score, one to observe.
+auto (default) picks redis whenever Redis is enabled and reachable.
+"""
+import json
+import math
+import operator
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from cache import get_redis_client
+from config import settings
+from money import MINOR_PER_MAJOR
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# (feature suffix, span in seconds, slots)
+WINDOWS = (("1m", 60, 60), ("1h", 3600, 60), ("24h", 86400, 96))
+MERCHANT_HISTORY = 32  # Recent merchants remembered per card
+EARTH_RADIUS_KM = 6371.0
+
+DEFAULT_RULES = [
+    # Static checks (the original score)
+    {"name": "high_risk_mcc", "feature": "merchant_category", "op": "in", "value": ["5962", "5967", "7995"], "score": 30},
+    {"name": "amount_over_500", "feature": "amount", "op": ">", "value": 500, "score": 20},
+    {"name": "amount_over_1000", "feature": "amount", "op": ">", "value": 1000, "score": 20},
+    {"name": "manual_entry", "feature": "entry_mode", "op": "==", "value": "manual", "score": 25},
+    {"name": "online_entry", "feature": "entry_mode", "op": "==", "value": "online", "score": 10},
+    {"name": "international_disabled", "feature": "international_enabled", "op": "==", "value": False, "score": 15},
+    {"name": "first_use", "feature": "first_use", "op": "==", "value": True, "score": 10},
+    # Velocity
+    {"name": "card_burst_1m", "feature": "card_count_1m", "op": ">=", "value": 3, "score": 25},
+    {"name": "card_velocity_1h", "feature": "card_count_1h", "op": ">=", "value": 10, "score": 20},
+    {"name": "card_spend_1h", "feature": "card_sum_1h", "op": ">=", "value": 500, "score": 15},
+    {"name": "card_many_merchants_1h", "feature": "card_distinct_merchants_1h", "op": ">=", "value": 5, "score": 20},
+    {"name": "card_terminal_hop", "feature": "card_terminal_changed_10m", "op": "==", "value": True, "score": 15},
+    {"name": "impossible_travel", "feature": "card_travel_kmh", "op": ">", "value": 900, "score": 40},
+    {"name": "user_velocity_24h", "feature": "user_count_24h", "op": ">=", "value": 50, "score": 15},
+]
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "in": lambda feature, value: feature in value,
+    "not in": lambda feature, value: feature not in value,
+}
+
+
+class RingWindow:
+    """Count and sum of events in the last span seconds, in slots of span/slots seconds"""
+
+    __slots__ = ("width", "size", "counts", "sums", "head", "count", "total")
+
+    def __init__(self, span: int, slots: int):
+        self.width = span / slots
+        self.size = slots
+        self.counts = array("l", [0]) * slots
+        self.sums = array("q", [0]) * slots
+        self.head = None  # Index of the newest slot in use
+        self.count = 0
+        self.total = 0
+
+    def _advance(self, index: int):
+        if self.head is None:
+            self.head = index
+            return
+        if index <= self.head:
+            return
+        for step in range(1, min(index - self.head, self.size) + 1):
+            slot = (self.head + step) % self.size
+            self.count -= self.counts[slot]
+            self.total -= self.sums[slot]
+            self.counts[slot] = 0
+            self.sums[slot] = 0
+        self.head = index
+
+    def add(self, ts: float, amount: int):
+        index = int(ts // self.width)
+        self._advance(index)
+        if index <= self.head - self.size:
+            return  # Older than the window
+        slot = index % self.size
+        self.counts[slot] += 1
+        self.sums[slot] += amount
+        self.count += 1
+        self.total += amount
+
+    def totals(self, ts: float) -> Tuple[int, int]:
+        self._advance(int(ts // self.width))
+        return self.count, self.total
+
+
+class EntityFeatures:
+    """Windows and last-seen state for one card, user or merchant"""
+
+    __slots__ = ("windows", "merchants", "last_seen", "last_terminal", "last_location")
+
+    def __init__(self):
+        self.windows = [RingWindow(span, slots) for _, span, slots in WINDOWS]
+        self.merchants: "OrderedDict[str, float]" = OrderedDict()
+        self.last_seen: Optional[float] = None
+        self.last_terminal: Optional[str] = None
+        self.last_location: Optional[Tuple[float, float]] = None
+
+    def observe(self, ts: float, amount_minor: int, merchant: Optional[str],
+                terminal: Optional[str], location: Optional[Tuple[float, float]]):
+        for window in self.windows:
+            window.add(ts, amount_minor)
+        if merchant:
+            self.merchants[merchant] = ts
+            self.merchants.move_to_end(merchant)
+            while len(self.merchants) > MERCHANT_HISTORY:
+                self.merchants.popitem(last=False)
+        if self.last_seen is None or ts >= self.last_seen:
+            self.last_seen = ts
+            self.last_terminal = terminal or self.last_terminal
+            self.last_location = location or self.last_location
+
+    def distinct_merchants(self, ts: float, span: int) -> int:
+        cutoff = ts - span
+        return sum(1 for seen in self.merchants.values() if seen > cutoff)
+
+
+class FeatureStore:
+    """Bounded LRU of EntityFeatures keyed like "card:42", "user:7", "merchant:Acme" """
+
+    shared = False
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entities: "OrderedDict[str, EntityFeatures]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[EntityFeatures]:
+        entity = self._entities.get(key)
+        if entity is not None:
+            self._entities.move_to_end(key)
+        return entity
+
+    def get_or_create(self, key: str) -> EntityFeatures:
+        entity = self.get(key)
+        if entity is None:
+            entity = self._entities[key] = EntityFeatures()
+            while len(self._entities) > self.maxsize:
+                self._entities.popitem(last=False)
+        return entity
+
+    def history(self, auth: "Authorization") -> Dict[str, Any]:
+        """Velocity and last-seen features of the card, user and merchant before auth"""
+        ts = auth.ts
+        features = {}
+        with self.lock:
+            for scope, key in _scopes(auth):
+                entity = self.get(f"{scope}:{key}") if key is not None else None
+                for index, (suffix, _, _) in enumerate(WINDOWS):
+                    count, total = entity.windows[index].totals(ts) if entity else (0, 0)
+                    features[f"{scope}_count_{suffix}"] = count
+                    features[f"{scope}_sum_{suffix}"] = total / MINOR_PER_MAJOR
+
+            card = self.get(f"card:{auth.card_id}")
+            if card is not None and card.last_seen is not None:
+                features.update(_card_state_features(
+                    auth, card.last_seen, card.last_terminal, card.last_location,
+                    card.distinct_merchants(ts, 3600)
+                ))
+            else:
+                features["card_distinct_merchants_1h"] = 0
+                features["card_terminal_changed_10m"] = False
+        return features
+
+    def record(self, auth: "Authorization"):
+        ts = auth.ts
+        with self.lock:
+            for scope, key in _scopes(auth):
+                if key is None:
+                    continue
+                self.get_or_create(f"{scope}:{key}").observe(
+                    ts, auth.amount_minor,
+                    auth.merchant_name if scope != "merchant" else None,
+                    auth.terminal_id, auth.location
+                )
+
+    def clear(self):
+        with self.lock:
+            self._entities.clear()
+
+    def __len__(self):
+        return len(self._entities)
+
+
+# Fold one authorization into an entity's windows (and, for cards, last-seen
+# state and recent merchants). Each window hash maps slot -> "index:count:sum";
+# a slot holding an older index is reset first, like RingWindow._advance.
+OBSERVE_SCRIPT = """
+local ts = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+for i = 1, #KEYS - 2 do
+    local width = tonumber(ARGV[3 + 2 * i - 1])
+    local size = tonumber(ARGV[3 + 2 * i])
+    local index = math.floor(ts / width)
+    local slot = index % size
+    local count, total = 0, 0
+    local current = redis.call('HGET', KEYS[i], slot)
+    local stale = false
+    if current then
+        local idx, c, t = string.match(current, '^(-?%d+):(%d+):(-?%d+)$')
+        idx = tonumber(idx)
+        if idx == index then
+            count, total = tonumber(c), tonumber(t)
+        elseif idx > index then
+            stale = true
+        end
+    end
+    if not stale then
+        redis.call('HSET', KEYS[i], slot, string.format('%d:%d:%d', index, count + 1, total + amount))
+        redis.call('EXPIRE', KEYS[i], ttl)
+    end
+end
+if ARGV[10] == '1' then
+    if ARGV[11] ~= '' then
+        redis.call('ZADD', KEYS[5], ts, ARGV[11])
+        redis.call('ZREMRANGEBYRANK', KEYS[5], 0, -(tonumber(ARGV[15]) + 1))
+        redis.call('EXPIRE', KEYS[5], ttl)
+    end
+    local last = redis.call('HGET', KEYS[4], 'last_seen')
+    if not last or ts >= tonumber(last) then
+        redis.call('HSET', KEYS[4], 'last_seen', ARGV[1])
+        if ARGV[12] ~= '' then redis.call('HSET', KEYS[4], 'terminal', ARGV[12]) end
+        if ARGV[13] ~= '' then redis.call('HSET', KEYS[4], 'lat', ARGV[13], 'lon', ARGV[14]) end
+    end
+    redis.call('EXPIRE', KEYS[4], ttl)
+end
+"""
+
+
+class RedisFeatureStore:
+    """FeatureStore kept in Redis so every worker scores against the same windows"""
+
+    shared = True
+
+    def __init__(self, client):
+        self._client = client
+        self._prefix = "blackwallet:risk:"
+        self._observe = client.register_script(OBSERVE_SCRIPT)
+        self._ttl = max(span for _, span, _ in WINDOWS) + 3600
+
+    def _keys(self, entity: str) -> List[str]:
+        base = f"{self._prefix}{entity}:"
+        return [base + suffix for suffix, _, _ in WINDOWS] + [base + "state", base + "merchants"]
+
+    @staticmethod
+    def _window_totals(fields: Dict[bytes, bytes], ts: float, span: int, slots: int) -> Tuple[int, int]:
+        oldest = int(ts // (span / slots)) - slots
+        count = total = 0
+        for raw in fields.values():
+            index, slot_count, slot_total = (int(part) for part in raw.split(b":"))
+            if index > oldest:
+                count += slot_count
+                total += slot_total
+        return count, total
+
+    def history(self, auth: "Authorization") -> Dict[str, Any]:
+        ts = auth.ts
+        scopes = _scopes(auth)
+        pipe = self._client.pipeline(transaction=False)
+        for scope, key in scopes:
+            if key is not None:
+                for window_key in self._keys(f"{scope}:{key}")[:len(WINDOWS)]:
+                    pipe.hgetall(window_key)
+        card_keys = self._keys(f"card:{auth.card_id}")
+        pipe.hgetall(card_keys[len(WINDOWS)])
+        pipe.zcount(card_keys[len(WINDOWS) + 1], f"({ts - 3600}", "+inf")
+        results = iter(pipe.execute())
+
+        features = {}
+        for scope, key in scopes:
+            for suffix, span, slots in WINDOWS:
+                fields = next(results) if key is not None else {}
+                count, total = self._window_totals(fields, ts, span, slots)
+                features[f"{scope}_count_{suffix}"] = count
+                features[f"{scope}_sum_{suffix}"] = total / MINOR_PER_MAJOR
+
+        state, distinct_merchants = next(results), next(results)
+        if state.get(b"last_seen") is not None:
+            location = None
+            if state.get(b"lat") is not None:
+                location = (float(state[b"lat"]), float(state[b"lon"]))
+            terminal = state.get(b"terminal")
+            features.update(_card_state_features(
+                auth, float(state[b"last_seen"]), terminal.decode() if terminal else None,
+                location, distinct_merchants
+            ))
+        else:
+            features["card_distinct_merchants_1h"] = 0
+            features["card_terminal_changed_10m"] = False
+        return features
+
+    def record(self, auth: "Authorization"):
+        windows = [str(part) for _, span, slots in WINDOWS for part in (span / slots, slots)]
+        location = auth.location
+        pipe = self._client.pipeline(transaction=False)
+        for scope, key in _scopes(auth):
+            if key is None:
+                continue
+            card = scope == "card"
+            self._observe(keys=self._keys(f"{scope}:{key}"), args=[
+                repr(auth.ts), auth.amount_minor, self._ttl, *windows,
+                "1" if card else "0",
+                (auth.merchant_name or "") if card else "",
+                auth.terminal_id or "",
+                repr(location[0]) if location else "",
+                repr(location[1]) if location else "",
+                MERCHANT_HISTORY,
+            ], client=pipe)
+        pipe.execute()
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self._prefix + "*"):
+            self._client.delete(key)
+
+
+@dataclass
+class Authorization:
+    """What the engine needs to know about one authorization attempt"""
+    card_id: int
+    user_id: int
+    amount_minor: int
+    merchant_name: Optional[str] = None
+    merchant_category: Optional[str] = None
+    entry_mode: Optional[str] = None
+    terminal_id: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    international_enabled: bool = False
+    first_use: bool = False
+    at: datetime = field(default_factory=datetime.utcnow)
+
+    @property
+    def ts(self) -> float:
+        return (self.at - datetime(1970, 1, 1)).total_seconds()
+
+    @property
+    def location(self) -> Optional[Tuple[float, float]]:
+        if self.latitude is None or self.longitude is None:
+            return None
+        return (self.latitude, self.longitude)
+
+
+@dataclass
+class RiskResult:
+    score: float
+    reasons: List[str]
+
+
+@dataclass
+class Rule:
+    name: str
+    feature: str
+    op: str
+    value: Any
+    score: float
+
+    def __post_init__(self):
+        if self.op not in OPERATORS:
+            raise ValueError(f"Rule {self.name}: unknown operator {self.op!r}")
+        self._compare: Callable[[Any, Any], bool] = OPERATORS[self.op]
+
+    def matches(self, features: Dict[str, Any]) -> bool:
+        feature = features.get(self.feature)
+        if feature is None:
+            return False
+        try:
+            return bool(self._compare(feature, self.value))
+        except TypeError:
+            return False
+
+
+def _distance_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def _scopes(auth: Authorization) -> Tuple[Tuple[str, Any], ...]:
+    return (("card", auth.card_id), ("user", auth.user_id), ("merchant", auth.merchant_name))
+
+
+def _card_state_features(auth: Authorization, last_seen: float, last_terminal: Optional[str],
+                         last_location: Optional[Tuple[float, float]], distinct_merchants: int) -> Dict[str, Any]:
+    since_last = max(auth.ts - last_seen, 0.0)
+    features = {
+        "card_seconds_since_last": since_last,
+        "card_distinct_merchants_1h": distinct_merchants,
+        "card_terminal_changed_10m": bool(
+            auth.terminal_id and last_terminal
+            and auth.terminal_id != last_terminal and since_last < 600
+        ),
+    }
+    if auth.location and last_location:
+        distance = _distance_km(last_location, auth.location)
+        features["card_distance_km"] = distance
+        features["card_travel_kmh"] = distance / max(since_last / 3600, 1 / 60)
+    return features
+
+
+def load_rules(path: Optional[str] = None) -> List[Rule]:
+    """Rules from a JSON list (RISK_RULES_FILE by default), else DEFAULT_RULES"""
+    path = path or settings.RISK_RULES_FILE
+    specs = DEFAULT_RULES
+    if path:
+        with open(path) as f:
+            specs = json.load(f)
+    return [Rule(**spec) for spec in specs]
+
+
+class RiskEngine:
+    """Score authorizations against a rule set using per-entity velocity features"""
+
+    def __init__(self, rules: Optional[Iterable[Rule]] = None, maxsize: Optional[int] = None, store=None):
+        self.rules = list(rules) if rules is not None else load_rules()
+        self.store = store if store is not None else FeatureStore(maxsize or settings.RISK_FEATURE_STORE_SIZE)
+
+    def features(self, auth: Authorization) -> Dict[str, Any]:
+        """The request plus its card, user and merchant history before this authorization"""
+        features = {
+            "amount": auth.amount_minor / MINOR_PER_MAJOR,
+            "merchant_category": auth.merchant_category,
+            "entry_mode": auth.entry_mode,
+            "international_enabled": auth.international_enabled,
+            "first_use": auth.first_use,
+        }
+        features.update(self.store.history(auth))
+        return features
+
+    def evaluate(self, features: Dict[str, Any]) -> RiskResult:
+        score = 0.0
+        reasons = []
+        for rule in self.rules:
+            if rule.matches(features):
+                score += rule.score
+                reasons.append(rule.name)
+        return RiskResult(min(score, 100.0), reasons)
+
+    def score(self, auth: Authorization) -> RiskResult:
+        return self.evaluate(self.features(auth))
+
+    def observe(self, auth: Authorization):
+        """Fold an approved authorization into its card, user and merchant windows"""
+        self.store.record(auth)
+
+    def warm(self, db: Session, hours: int = 24) -> int:
+        """Replay the last hours of approved card_transactions into the windows"""
+        from models_cards import CardTransaction
+
+        if self.store.shared:
+            return 0  # Shared windows outlive the process; replaying would count twice
+
+        since = datetime.utcnow() - timedelta(hours=hours)
+        rows = db.execute(
+            select(
+                CardTransaction.card_id, CardTransaction.user_id, CardTransaction.amount_minor,
+                CardTransaction.merchant_name, CardTransaction.created_at
+            )
+            .where(CardTransaction.status == "approved", CardTransaction.created_at >= since)
+            .order_by(CardTransaction.created_at)
+        )
+        loaded = 0
+        for card_id, user_id, amount_minor, merchant_name, created_at in rows:
+            self.observe(Authorization(
+                card_id=card_id, user_id=user_id, amount_minor=amount_minor or 0,
+                merchant_name=merchant_name, at=created_at
+            ))
+            loaded += 1
+        return loaded
+
+
+_engine: Optional[RiskEngine] = None
+_engine_lock = threading.Lock()
+
+
+def _configured_store():
+    backend = settings.RISK_FEATURE_BACKEND
+    client = get_redis_client() if backend in ("auto", "redis") else None
+    if client is not None:
+        return RedisFeatureStore(client)
+    if backend == "redis":
+        logger.warning("Redis risk feature store unavailable, using per-process windows")
+    return FeatureStore(settings.RISK_FEATURE_STORE_SIZE)
+
+
+def get_risk_engine() -> RiskEngine:
+    """Process-wide engine with the configured rules and feature store"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RiskEngine(store=_configured_store())
+    return _engine
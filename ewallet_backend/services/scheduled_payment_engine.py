@@ -0,0 +1,243 @@
+"""
+Scheduled Payment Engine
+Executes due ScheduledPayment rows in batches.
+
+- Due work is tracked in an in-memory min-heap of (next_execution, id), loaded
+  from the (status, next_execution) index, so a worker sleeps until the next
+  payment is actually due instead of polling on a fixed interval.
+- Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+  worker processes can drain the same backlog without double execution.
+- A claimed batch shares one recipient lookup per identifier type and one
+  commit; a declined payment (or one whose recipient vanished) is marked
+  failed inside its own savepoint without undoing the others.
+- Recurrence is computed from the original scheduled_date: monthly payments
+  keep their day of month (clamped to the month's last day).
+"""
+import calendar
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import User, Transaction
+from models_quick_wins import ScheduledPayment
+from money import Money
+from services.ledger_service import LedgerService, InsufficientFunds, AccountNotFound
+
+logger = logging.getLogger(__name__)
+
+FIXED_PERIODS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "biweekly": timedelta(weeks=2),
+}
+RECIPIENT_COLUMNS = {
+    "username": User.username,
+    "email": User.email,
+    "phone": User.phone,
+}
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    """Same day of month `months` later, clamped to the last day (Jan 31 -> Feb 28/29)"""
+    month_index = moment.month - 1 + months
+    year = moment.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def occurrence(schedule_type: str, anchor: datetime, n: int) -> Optional[datetime]:
+    """The n-th occurrence (0 = anchor) of a schedule"""
+    if schedule_type == "monthly":
+        return add_months(anchor, n)
+    period = FIXED_PERIODS.get(schedule_type)
+    return anchor + period * n if period else None
+
+
+def next_occurrence(schedule_type: str, anchor: datetime, after: datetime) -> Optional[datetime]:
+    """
+    First occurrence strictly after `after`. Occurrences missed while no worker
+    was running are skipped rather than executed back to back.
+    """
+    if schedule_type == "monthly":
+        n = max(0, (after.year - anchor.year) * 12 + after.month - anchor.month)
+    elif schedule_type in FIXED_PERIODS:
+        n = max(0, int((after - anchor) / FIXED_PERIODS[schedule_type]))
+    else:
+        return None
+    candidate = occurrence(schedule_type, anchor, n)
+    while candidate <= after:
+        n += 1
+        candidate = occurrence(schedule_type, anchor, n)
+    return candidate
+
+
+class ScheduledPaymentEngine:
+    """Claim and execute due scheduled payments"""
+
+    def __init__(self, session_factory, batch_size: int = 200, horizon: timedelta = timedelta(minutes=10),
+                 max_sleep: float = 30.0):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.horizon = horizon
+        self.max_sleep = max_sleep
+        self._heap: List[Tuple[datetime, int]] = []
+        self._loaded_until: Optional[datetime] = None
+
+    # ============= DUE QUEUE =============
+
+    def refresh(self, now: datetime):
+        """Reload the heap with everything due before now + horizon"""
+        until = now + self.horizon
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                select(ScheduledPayment.next_execution, ScheduledPayment.id)
+                .where(ScheduledPayment.status == "pending", ScheduledPayment.next_execution <= until)
+                .order_by(ScheduledPayment.next_execution)
+                .limit(self.batch_size * 50)
+            ).all()
+        finally:
+            db.close()
+        self._heap = [tuple(row) for row in rows]
+        heapq.heapify(self._heap)
+        self._loaded_until = until
+
+    def seconds_until_due(self, now: datetime) -> float:
+        if self._loaded_until is None or now >= self._loaded_until:
+            self.refresh(now)
+        if not self._heap:
+            return self.max_sleep
+        due_at = self._heap[0][0]
+        return min(max((due_at - now).total_seconds(), 0.0), self.max_sleep)
+
+    def _pop_due(self, now: datetime):
+        while self._heap and self._heap[0][0] <= now:
+            heapq.heappop(self._heap)
+
+    # ============= EXECUTION =============
+
+    def claim(self, db: Session, now: datetime) -> List[ScheduledPayment]:
+        stmt = (
+            select(ScheduledPayment)
+            .where(ScheduledPayment.status == "pending", ScheduledPayment.next_execution <= now)
+            .order_by(ScheduledPayment.next_execution)
+            .limit(self.batch_size)
+        )
+        if db.get_bind().dialect.name != "sqlite":
+            stmt = stmt.with_for_update(skip_locked=True)
+        return list(db.scalars(stmt).all())
+
+    @staticmethod
+    def _load_parties(db: Session, payments: List[ScheduledPayment]) -> Tuple[Dict, Dict]:
+        """Payers by id and recipients by (type, identifier), one query per kind"""
+        payer_ids = {p.user_id for p in payments}
+        payers = {u.id: u for u in db.scalars(select(User).where(User.id.in_(payer_ids)))}
+
+        recipients = {}
+        for recipient_type, column in RECIPIENT_COLUMNS.items():
+            identifiers = {p.recipient_identifier for p in payments if p.recipient_type == recipient_type}
+            if not identifiers:
+                continue
+            for user in db.scalars(select(User).where(column.in_(identifiers))):
+                recipients[(recipient_type, getattr(user, column.key))] = user
+        return payers, recipients
+
+    @staticmethod
+    def _advance(payment: ScheduledPayment, now: datetime):
+        if payment.is_recurring:
+            following = next_occurrence(
+                payment.schedule_type, payment.scheduled_date or payment.next_execution, now
+            )
+            if following is not None:
+                payment.next_execution = following
+                return
+        payment.status = "completed"
+
+    def execute(self, db: Session, payments: List[ScheduledPayment], now: datetime) -> Dict[str, int]:
+        """Run a claimed batch; the caller commits"""
+        payers, recipients = self._load_parties(db, payments)
+        outcome = {"executed": 0, "failed": 0}
+
+        for payment in payments:
+            payer = payers.get(payment.user_id)
+            recipient = recipients.get((payment.recipient_type, payment.recipient_identifier))
+            if payer is None or recipient is None:
+                payment.status = "failed"
+                outcome["failed"] += 1
+                logger.error(f"❌ Scheduled payment {payment.id} failed: recipient not found")
+                continue
+
+            # A savepoint per payment: the recipient can disappear after
+            # _load_parties, and its failed credit must not keep the payer's
+            # debit or take the rest of the batch down with it
+            try:
+                with db.begin_nested():
+                    LedgerService.transfer(db, payer.id, recipient.id, Money(payment.amount_minor))
+            except (InsufficientFunds, AccountNotFound, ValueError) as e:
+                payment.status = "failed"
+                outcome["failed"] += 1
+                logger.error(f"❌ Scheduled payment {payment.id} failed: {e}")
+                continue
+
+            db.add(Transaction(
+                sender=payer.username,
+                receiver=recipient.username,
+                amount_minor=payment.amount_minor,
+                transaction_type="scheduled",
+                status="completed",
+                extra_data={"scheduled_payment_id": payment.id, "note": payment.note} if payment.note
+                else {"scheduled_payment_id": payment.id}
+            ))
+
+            payment.execution_count = (payment.execution_count or 0) + 1
+            payment.last_execution = now
+            self._advance(payment, now)
+            outcome["executed"] += 1
+
+        return outcome
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Claim and execute batches until nothing is due"""
+        now = now or datetime.utcnow()
+        totals = {"executed": 0, "failed": 0}
+        while True:
+            db = self.session_factory()
+            try:
+                payments = self.claim(db, now)
+                if not payments:
+                    break
+                outcome = self.execute(db, payments, now)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            for key in totals:
+                totals[key] += outcome[key]
+            logger.info(f"Batch of {len(payments)}: {outcome['executed']} executed, {outcome['failed']} failed")
+        self._pop_due(now)
+        return totals
+
+    def run_forever(self):
+        logger.info(f"🚀 Scheduled payment engine started (batch size {self.batch_size})")
+        while True:
+            now = datetime.utcnow()
+            wait = self.seconds_until_due(now)
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            totals = self.run_once()
+            if totals["executed"] or totals["failed"]:
+                logger.info(f"✅ Executed {totals['executed']} scheduled payments, {totals['failed']} failed")
+            else:
+                # Due rows are locked by another worker; give it time to commit
+                time.sleep(1.0)
+            # Rows changed underneath the heap (new next_execution values)
+            self._loaded_until = None
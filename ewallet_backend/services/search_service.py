@@ -0,0 +1,189 @@
+"""
+Transaction Search Index
+Keeps one search document per transaction (counterparty usernames and names,
+tags, memo) and matches it with the database's native text search:
+
+- PostgreSQL: to_tsvector('simple') GIN index for ranked word matches plus a
+  pg_trgm GIN index so ILIKE '%fragment%' stays an index scan
+- SQLite: an FTS5 table (transaction_search_fts) kept in sync by triggers,
+  ranked with bm25 and matched by word prefix
+
+Without the migration (no FTS5 table) it falls back to LIKE on the document.
+Documents are rebuilt on commit for every transaction whose row or tags changed;
+see migrate_transaction_search.py for the indexes and backfill.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Tuple
+
+from sqlalchemy import Float, Integer, delete, event, func, insert, literal, literal_column, or_, select, text
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from models import User, Transaction
+from models_quick_wins import TransactionTag, TransactionSearchDocument
+
+documents = TransactionSearchDocument.__table__
+
+FTS_TABLE = "transaction_search_fts"
+MEMO_KEYS = ("memo", "message", "note", "description", "contact")
+REINDEX_CHUNK = 500
+
+# Must match the expression index in migrate_transaction_search.py exactly
+TS_CONFIG = literal_column("'simple'::regconfig")
+
+
+class TransactionSearchIndex:
+    """Build, store and match transaction search documents"""
+
+    @staticmethod
+    def build_document(txn, names: dict, tags: Iterable[str]) -> str:
+        parts = [txn.sender, names.get(txn.sender), txn.receiver, names.get(txn.receiver)]
+        parts.extend(tags)
+        extra = txn.extra_data if isinstance(txn.extra_data, dict) else {}
+        parts.extend(str(extra[key]) for key in MEMO_KEYS if extra.get(key))
+        return " ".join(part for part in parts if part)
+
+    @staticmethod
+    def reindex(db: Session, transaction_ids: Iterable[int]):
+        """Rebuild the documents for transaction_ids inside the caller's transaction"""
+        ids = sorted({tid for tid in transaction_ids if tid is not None})
+        for start in range(0, len(ids), REINDEX_CHUNK):
+            chunk = ids[start:start + REINDEX_CHUNK]
+            txns = db.execute(
+                select(Transaction.id, Transaction.sender, Transaction.receiver, Transaction.extra_data)
+                .where(Transaction.id.in_(chunk))
+            ).all()
+
+            tags = defaultdict(list)
+            for transaction_id, tag in db.execute(
+                select(TransactionTag.transaction_id, TransactionTag.tag)
+                .where(TransactionTag.transaction_id.in_(chunk))
+            ):
+                tags[transaction_id].append(tag)
+
+            usernames = {t.sender for t in txns} | {t.receiver for t in txns}
+            names = dict(db.execute(
+                select(User.username, User.full_name).where(User.username.in_(usernames))
+            ).all()) if usernames else {}
+
+            now = datetime.utcnow()
+            db.execute(delete(documents).where(documents.c.transaction_id.in_(chunk)))
+            if txns:
+                db.execute(insert(documents), [
+                    {
+                        "transaction_id": t.id,
+                        "document": TransactionSearchIndex.build_document(t, names, tags[t.id]),
+                        "updated_at": now,
+                    }
+                    for t in txns
+                ])
+
+    @staticmethod
+    def _has_fts(db: Session) -> bool:
+        return db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first() is not None
+
+    @staticmethod
+    def fts_query(query: str) -> str:
+        """User input -> FTS5 query: every word must match as a prefix"""
+        words = re.findall(r"\w+", query)
+        return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+    @staticmethod
+    def contains_pattern(query: str) -> str:
+        """LIKE pattern for a literal substring (escape character is backslash)"""
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"%{escaped}%"
+
+    @staticmethod
+    def match(db: Session, stmt, query: str) -> Tuple[object, object]:
+        """
+        Restrict a select(Transaction) to rows whose document matches query.
+        Returns (stmt, rank) where a higher rank is a better match.
+        """
+        dialect = db.get_bind().dialect.name
+
+        if dialect == "postgresql":
+            vector = func.to_tsvector(TS_CONFIG, documents.c.document)
+            tsquery = func.plainto_tsquery(TS_CONFIG, query)
+            stmt = stmt.join(documents, documents.c.transaction_id == Transaction.id).where(or_(
+                vector.op("@@")(tsquery),
+                documents.c.document.ilike(TransactionSearchIndex.contains_pattern(query), escape="\\")
+            ))
+            return stmt, func.ts_rank(vector, tsquery).cast(Float)
+
+        if dialect == "sqlite" and TransactionSearchIndex._has_fts(db):
+            fts_query = TransactionSearchIndex.fts_query(query)
+            if not fts_query:
+                return stmt, literal(0.0)
+            matches = text(
+                f"SELECT rowid AS transaction_id, -bm25({FTS_TABLE}) AS rank "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query"
+            ).bindparams(fts_query=fts_query).columns(
+                transaction_id=Integer, rank=Float
+            ).subquery("search_matches")
+            stmt = stmt.join(matches, matches.c.transaction_id == Transaction.id)
+            return stmt, matches.c.rank
+
+        stmt = stmt.join(documents, documents.c.transaction_id == Transaction.id).where(
+            documents.c.document.ilike(TransactionSearchIndex.contains_pattern(query), escape="\\")
+        )
+        return stmt, literal(0.0)
+
+
+# ============= INDEX MAINTENANCE =============
+# New or edited transactions and tag changes are collected at flush time and
+# their documents rebuilt just before the transaction commits.
+
+SEARCH_FIELDS = ("sender", "receiver", "extra_data")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_search_changes(session, flush_context):
+    pending = session.info.setdefault("search_reindex", set())
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            pending.add(obj.id)
+        elif isinstance(obj, TransactionTag):
+            pending.add(obj.transaction_id)
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and any(
+            sa_inspect(obj).attrs[field].history.has_changes() for field in SEARCH_FIELDS
+        ):
+            pending.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, TransactionTag):
+            pending.add(obj.transaction_id)
+
+
+def _has_unflushed_search_changes(session) -> bool:
+    for obj in session.new:
+        if isinstance(obj, (Transaction, TransactionTag)):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, Transaction):
+            return True
+    for obj in session.deleted:
+        if isinstance(obj, TransactionTag):
+            return True
+    return False
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_search_changes(session):
+    # before_commit runs ahead of the final flush; flush early only when that
+    # flush carries transactions or tags, so other commits pay nothing
+    if _has_unflushed_search_changes(session):
+        session.flush()
+    ids = session.info.pop("search_reindex", None)
+    if ids:
+        TransactionSearchIndex.reindex(session, ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_search_changes(session):
+    session.info.pop("search_reindex", None)
@@ -0,0 +1,57 @@
+"""
+Stripe Lookup Cache
+Read-through caches for the Stripe lookups the app makes on every open:
+connected account status, balance and the list of linked bank accounts.
+
+Entries are keyed by connected account id and hold the plain dicts the
+endpoints return (not Stripe objects), so they fit the Redis backend too.
+The webhooks that report a change drop the affected entries, and so do our
+own writes (adding a bank account, paying out), so the TTLs only bound how
+stale an entry can get when a webhook is missed.
+"""
+from typing import Dict, Optional
+
+from cache import build_cache
+from config import settings
+
+account_cache = build_cache("stripe_account", ttl=settings.STRIPE_ACCOUNT_CACHE_TTL)
+balance_cache = build_cache("stripe_balance", ttl=settings.STRIPE_BALANCE_CACHE_TTL)
+bank_accounts_cache = build_cache("stripe_bank_accounts", ttl=settings.STRIPE_BANK_ACCOUNTS_CACHE_TTL)
+
+
+class StripeCache:
+    """Invalidation for the Stripe lookup caches"""
+
+    @staticmethod
+    def invalidate_account(stripe_account_id: Optional[str]):
+        if stripe_account_id:
+            account_cache.delete(stripe_account_id)
+
+    @staticmethod
+    def invalidate_balance(stripe_account_id: Optional[str]):
+        if stripe_account_id:
+            balance_cache.delete(stripe_account_id)
+
+    @staticmethod
+    def invalidate_bank_accounts(stripe_account_id: Optional[str]):
+        if stripe_account_id:
+            bank_accounts_cache.delete(stripe_account_id)
+
+    @staticmethod
+    def invalidate_for_event(event: Dict):
+        """
+        Drop whatever a webhook event makes stale. Connect events name the
+        connected account in event["account"]; platform events have none.
+        """
+        event_type = event["type"]
+        data = event["data"]["object"]
+        account_id = event.get("account")
+
+        if event_type == "account.updated":
+            StripeCache.invalidate_account(data.get("id") or account_id)
+        elif event_type.startswith("account.external_account."):
+            StripeCache.invalidate_bank_accounts(account_id or data.get("account"))
+        elif event_type.startswith("payout.") or event_type == "balance.available":
+            StripeCache.invalidate_balance(account_id)
+        elif event_type.startswith("transfer."):
+            StripeCache.invalidate_balance(data.get("destination"))
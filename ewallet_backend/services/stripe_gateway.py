@@ -0,0 +1,151 @@
+"""
+Stripe Gateway
+Shared, non-blocking access to the Stripe API.
+
+One StripeClient per process on the library's HTTPX transport: async routes
+await Stripe over a keep-alive connection pool instead of blocking the event
+loop for the whole round trip. Each attempt is bounded by
+STRIPE_TIMEOUT_SECONDS and the library retries network failures and 409/5xx
+responses up to STRIPE_MAX_NETWORK_RETRIES times, reusing the request's
+Idempotency-Key so a retried charge or payout is only executed once. Callers
+that retry on their own (a client resending with the same Idempotency-Key, a
+job retry) pass a stable idempotency_key for the same guarantee.
+
+Without httpx the same calls run on the library's requests transport in a
+bounded thread pool, so the event loop still never waits on Stripe.
+
+STRIPE_API_BASE points the client at stripe_stub.py (or stripe-mock) for tests.
+"""
+import asyncio
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import stripe
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Read-only service methods; everything else is a POST and carries an Idempotency-Key
+READ_PREFIXES = ("retrieve", "list", "search")
+
+
+def _api_key() -> str:
+    if settings.STRIPE_MODE.lower() == "live":
+        key = settings.STRIPE_LIVE_SECRET_KEY
+    else:
+        key = settings.STRIPE_SECRET_KEY
+    if not key and settings.STRIPE_API_BASE:
+        key = "sk_test_stub"  # The stub accepts any key
+    if not key:
+        raise ValueError(f"Stripe secret key is not configured for STRIPE_MODE={settings.STRIPE_MODE}")
+    return key
+
+
+class StripeGateway:
+    """StripeClient wrapper adding per-call deadlines and idempotency keys"""
+
+    def __init__(
+        self,
+        api_key: str,
+        api_base: Optional[str] = None,
+        timeout: float = 10.0,
+        max_network_retries: int = 2,
+        max_concurrency: int = 16
+    ):
+        self.timeout = timeout
+        self.max_network_retries = max_network_retries
+        self._executor: Optional[ThreadPoolExecutor] = None
+        try:
+            http_client = stripe.HTTPXClient(timeout=timeout)
+        except ImportError:
+            logger.warning("httpx not installed; Stripe calls will run in a thread pool")
+            http_client = stripe.RequestsClient(timeout=timeout)
+            self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="stripe")
+        self.client = stripe.StripeClient(
+            api_key,
+            http_client=http_client,
+            max_network_retries=max_network_retries,
+            base_addresses={"api": api_base} if api_base else {}
+        )
+
+    def deadline(self) -> float:
+        """Default budget for one call: every attempt timing out, plus retry backoff"""
+        return self.timeout * (self.max_network_retries + 1) + 2.0 * self.max_network_retries
+
+    async def call(
+        self,
+        method: Callable[..., Awaitable[Any]],
+        *args,
+        params: Optional[Dict] = None,
+        idempotency_key: Optional[str] = None,
+        stripe_account: Optional[str] = None,
+        stripe_version: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """
+        Await a StripeClient *_async service method, e.g.
+        call(gateway.client.payouts.create_async, params={...}, stripe_account=acct).
+
+        Raises stripe.error.APIConnectionError when the call overruns its deadline.
+        """
+        name = method.__name__
+        options: Dict[str, Any] = {}
+        if stripe_account:
+            options["stripe_account"] = stripe_account
+        if stripe_version:
+            options["stripe_version"] = stripe_version
+        if not name.startswith(READ_PREFIXES):
+            options["idempotency_key"] = idempotency_key or str(uuid.uuid4())
+
+        if self._executor is None:
+            request = method(*args, params=params or {}, options=options)
+        else:
+            sync_method = getattr(method.__self__, name[:-len("_async")])
+            request = asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(sync_method, *args, params=params or {}, options=options)
+            )
+
+        budget = timeout or self.deadline()
+        try:
+            return await asyncio.wait_for(request, budget)
+        except asyncio.TimeoutError:
+            key = options.get("idempotency_key")
+            logger.error(f"Stripe {name} timed out after {budget:g}s (idempotency key {key})")
+            raise stripe.error.APIConnectionError(
+                f"Stripe did not respond within {budget:g}s", should_retry=True
+            )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+_gateway: Optional[StripeGateway] = None
+
+
+def get_stripe_gateway() -> StripeGateway:
+    """Process-wide gateway, created on first use"""
+    global _gateway
+    if _gateway is None:
+        _gateway = StripeGateway(
+            _api_key(),
+            api_base=settings.STRIPE_API_BASE,
+            timeout=settings.STRIPE_TIMEOUT_SECONDS,
+            max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+            max_concurrency=settings.STRIPE_MAX_CONCURRENCY
+        )
+    return _gateway
+
+
+def scoped_key(user_id: int, operation: str, client_key: Optional[str]) -> Optional[str]:
+    """
+    Stripe idempotency key for a request carrying the client's Idempotency-Key
+    header; scoped by user and operation so two users' keys never collide.
+    """
+    if not client_key:
+        return None
+    return f"{operation}:{user_id}:{client_key}"
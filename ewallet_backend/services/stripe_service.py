@@ -2,10 +2,13 @@
 Stripe Connect Integration for Real Money Transfers
 Enables users to link bank accounts and make real transactions
 """
+import asyncio
 import stripe
 from typing import Dict, Optional
 import logging
 from config import settings
+from services.stripe_gateway import get_stripe_gateway
+from services.stripe_cache import StripeCache, account_cache, balance_cache, bank_accounts_cache
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +27,10 @@ else:
 
 
 class StripePaymentService:
-    """Handle real money transactions via Stripe Connect"""
+    """
+    Handle real money transactions via Stripe Connect.
+    Calls go through the shared StripeGateway, so they never block the event loop.
+    """
     
     @staticmethod
     async def create_connected_account(user_id: int, email: str, country: str = "US") -> Dict:
@@ -33,17 +39,18 @@ class StripePaymentService:
         This allows them to receive payments
         """
         try:
-            account = stripe.Account.create(
-                type="express",  # or "standard" for more control
-                country=country,
-                email=email,
-                capabilities={
+            gateway = get_stripe_gateway()
+            account = await gateway.call(gateway.client.accounts.create_async, params={
+                "type": "express",  # or "standard" for more control
+                "country": country,
+                "email": email,
+                "capabilities": {
                     "card_payments": {"requested": True},
                     "transfers": {"requested": True},
                 },
-                business_type="individual",
-                metadata={"user_id": str(user_id)}
-            )
+                "business_type": "individual",
+                "metadata": {"user_id": str(user_id)}
+            })
             
             logger.info(f"Created Stripe account for user {user_id}: {account.id}")
             return {
@@ -61,12 +68,13 @@ class StripePaymentService:
         User needs to provide business info, bank account, etc.
         """
         try:
-            account_link = stripe.AccountLink.create(
-                account=stripe_account_id,
-                refresh_url=refresh_url,
-                return_url=return_url,
-                type="account_onboarding",
-            )
+            gateway = get_stripe_gateway()
+            account_link = await gateway.call(gateway.client.account_links.create_async, params={
+                "account": stripe_account_id,
+                "refresh_url": refresh_url,
+                "return_url": return_url,
+                "type": "account_onboarding",
+            })
             return account_link.url
         except stripe.error.StripeError as e:
             logger.error(f"Account link creation failed: {e}")
@@ -80,11 +88,14 @@ class StripePaymentService:
         """
         try:
             # Create external account (bank account)
-            account = stripe.Account.create_external_account(
+            gateway = get_stripe_gateway()
+            account = await gateway.call(
+                gateway.client.accounts.external_accounts.create_async,
                 stripe_account_id,
-                external_account=bank_token,
+                params={"external_account": bank_token}
             )
             
+            StripeCache.invalidate_bank_accounts(stripe_account_id)
             logger.info(f"Added bank account for user {user_id}")
             return {
                 "bank_id": account.id,
@@ -102,7 +113,8 @@ class StripePaymentService:
         recipient_stripe_account: str,
         amount: float,
         currency: str = "usd",
-        description: str = ""
+        description: str = "",
+        idempotency_key: Optional[str] = None
     ) -> Dict:
         """
         Transfer real money from platform to user's connected account
@@ -111,14 +123,16 @@ class StripePaymentService:
         try:
             amount_cents = int(amount * 100)  # Convert to cents
             
-            transfer = stripe.Transfer.create(
-                amount=amount_cents,
-                currency=currency,
-                destination=recipient_stripe_account,
-                description=description,
-                metadata={"sender_id": str(sender_id)}
-            )
+            gateway = get_stripe_gateway()
+            transfer = await gateway.call(gateway.client.transfers.create_async, params={
+                "amount": amount_cents,
+                "currency": currency,
+                "destination": recipient_stripe_account,
+                "description": description,
+                "metadata": {"sender_id": str(sender_id)}
+            }, idempotency_key=idempotency_key)
             
+            StripeCache.invalidate_balance(recipient_stripe_account)
             logger.info(f"Transfer created: {transfer.id} for ${amount}")
             return {
                 "transfer_id": transfer.id,
@@ -135,7 +149,8 @@ class StripePaymentService:
         user_id: int,
         amount: float,
         currency: str = "usd",
-        payment_method: Optional[str] = None
+        payment_method: Optional[str] = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict:
         """
         Create a payment intent for user to add money to their wallet
@@ -144,13 +159,18 @@ class StripePaymentService:
         try:
             amount_cents = int(amount * 100)
             
-            intent = stripe.PaymentIntent.create(
-                amount=amount_cents,
-                currency=currency,
-                payment_method=payment_method,
-                confirmation_method="automatic",
-                confirm=True if payment_method else False,
-                metadata={"user_id": str(user_id), "type": "wallet_topup"}
+            params = {
+                "amount": amount_cents,
+                "currency": currency,
+                "confirmation_method": "automatic",
+                "confirm": bool(payment_method),
+                "metadata": {"user_id": str(user_id), "type": "wallet_topup"}
+            }
+            if payment_method:
+                params["payment_method"] = payment_method
+            gateway = get_stripe_gateway()
+            intent = await gateway.call(
+                gateway.client.payment_intents.create_async, params=params, idempotency_key=idempotency_key
             )
             
             logger.info(f"Payment intent created for user {user_id}: ${amount}")
@@ -165,19 +185,27 @@ class StripePaymentService:
             raise Exception(f"Payment failed: {str(e)}")
     
     @staticmethod
-    async def create_payout(stripe_account_id: str, amount: float, currency: str = "usd") -> Dict:
+    async def create_payout(
+        stripe_account_id: str,
+        amount: float,
+        currency: str = "usd",
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
         """
         Withdraw money from user's Stripe balance to their bank account
         """
         try:
             amount_cents = int(amount * 100)
             
-            payout = stripe.Payout.create(
-                amount=amount_cents,
-                currency=currency,
-                stripe_account=stripe_account_id
+            gateway = get_stripe_gateway()
+            payout = await gateway.call(
+                gateway.client.payouts.create_async,
+                params={"amount": amount_cents, "currency": currency},
+                stripe_account=stripe_account_id,
+                idempotency_key=idempotency_key
             )
             
+            StripeCache.invalidate_balance(stripe_account_id)
             logger.info(f"Payout created: {payout.id} for ${amount}")
             return {
                 "payout_id": payout.id,
@@ -189,20 +217,42 @@ class StripePaymentService:
             logger.error(f"Payout failed: {e}")
             raise Exception(f"Payout failed: {str(e)}")
     
+    @staticmethod
+    async def _account_snapshot(stripe_account_id: str) -> Dict:
+        """Account fields the status endpoints show, read through account_cache"""
+        cached = await account_cache.aget(stripe_account_id)
+        if cached is not None:
+            return cached
+        
+        gateway = get_stripe_gateway()
+        account = await gateway.call(gateway.client.accounts.retrieve_async, stripe_account_id)
+        requirements = account.requirements
+        snapshot = {
+            "id": account.id,
+            "charges_enabled": account.charges_enabled,
+            "payouts_enabled": account.payouts_enabled,
+            "details_submitted": account.details_submitted,
+            "currently_due": list(requirements.currently_due or []) if requirements else [],
+            "eventually_due": list(requirements.eventually_due or []) if requirements else [],
+            "disabled_reason": requirements.disabled_reason if requirements else None
+        }
+        await account_cache.aset(stripe_account_id, snapshot)
+        return snapshot
+    
     @staticmethod
     async def verify_account_status(stripe_account_id: str) -> Dict:
         """
         Check if user has completed onboarding and can receive payments
         """
         try:
-            account = stripe.Account.retrieve(stripe_account_id)
+            account = await StripePaymentService._account_snapshot(stripe_account_id)
             
             return {
-                "account_id": account.id,
-                "charges_enabled": account.charges_enabled,
-                "payouts_enabled": account.payouts_enabled,
-                "details_submitted": account.details_submitted,
-                "requirements": account.requirements.currently_due if account.requirements else []
+                "account_id": account["id"],
+                "charges_enabled": account["charges_enabled"],
+                "payouts_enabled": account["payouts_enabled"],
+                "details_submitted": account["details_submitted"],
+                "requirements": account["currently_due"]
             }
         except stripe.error.StripeError as e:
             logger.error(f"Account verification failed: {e}")
@@ -213,19 +263,23 @@ class StripePaymentService:
         """
         Get user's Stripe balance (pending and available)
         """
+        cached = await balance_cache.aget(stripe_account_id)
+        if cached is not None:
+            return cached
         try:
-            balance = stripe.Balance.retrieve(
-                stripe_account=stripe_account_id
-            )
+            gateway = get_stripe_gateway()
+            balance = await gateway.call(gateway.client.balance.retrieve_async, stripe_account=stripe_account_id)
             
             available = sum([b.amount for b in balance.available]) / 100
             pending = sum([b.amount for b in balance.pending]) / 100
             
-            return {
+            result = {
                 "available": available,
                 "pending": pending,
                 "currency": balance.available[0].currency if balance.available else "usd"
             }
+            await balance_cache.aset(stripe_account_id, result)
+            return result
         except stripe.error.StripeError as e:
             logger.error(f"Balance retrieval failed: {e}")
             raise Exception(f"Failed to get balance: {str(e)}")
@@ -236,15 +290,15 @@ class StripePaymentService:
         Get comprehensive account status for dashboard display
         """
         try:
-            account = stripe.Account.retrieve(stripe_account_id)
+            account = await StripePaymentService._account_snapshot(stripe_account_id)
             
             return {
-                "onboarding_complete": account.details_submitted,
-                "charges_enabled": account.charges_enabled,
-                "payouts_enabled": account.payouts_enabled,
-                "requirements_due": account.requirements.currently_due if account.requirements else [],
-                "requirements_eventually_due": account.requirements.eventually_due if account.requirements else [],
-                "disabled_reason": account.requirements.disabled_reason if account.requirements else None
+                "onboarding_complete": account["details_submitted"],
+                "charges_enabled": account["charges_enabled"],
+                "payouts_enabled": account["payouts_enabled"],
+                "requirements_due": account["currently_due"],
+                "requirements_eventually_due": account["eventually_due"],
+                "disabled_reason": account["disabled_reason"]
             }
         except stripe.error.StripeError as e:
             logger.error(f"Failed to get account status: {e}")
@@ -255,15 +309,18 @@ class StripePaymentService:
         """
         List all bank accounts connected to user's Stripe account
         """
+        cached = await bank_accounts_cache.aget(stripe_account_id)
+        if cached is not None:
+            return cached
         try:
-            account = stripe.Account.retrieve(stripe_account_id)
-            external_accounts = stripe.Account.list_external_accounts(
+            gateway = get_stripe_gateway()
+            external_accounts = await gateway.call(
+                gateway.client.accounts.external_accounts.list_async,
                 stripe_account_id,
-                object="bank_account",
-                limit=10
+                params={"object": "bank_account", "limit": 10}
             )
             
-            return [
+            bank_accounts = [
                 {
                     "id": ba.id,
                     "bank_name": ba.bank_name,
@@ -274,12 +331,20 @@ class StripePaymentService:
                 }
                 for ba in external_accounts.data
             ]
+            await bank_accounts_cache.aset(stripe_account_id, bank_accounts)
+            return bank_accounts
         except stripe.error.StripeError as e:
             logger.error(f"Failed to list bank accounts: {e}")
             raise Exception(f"Failed to list bank accounts: {str(e)}")
     
     @staticmethod
-    async def process_deposit(user_id: int, amount: float, payment_method_id: str, stripe_account_id: str) -> Dict:
+    async def process_deposit(
+        user_id: int,
+        amount: float,
+        payment_method_id: str,
+        stripe_account_id: str,
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
         """
         Process a deposit: charge user's payment method and add to wallet
         """
@@ -287,18 +352,19 @@ class StripePaymentService:
             amount_cents = int(amount * 100)
             
             # Create payment intent to charge the user
-            payment_intent = stripe.PaymentIntent.create(
-                amount=amount_cents,
-                currency="usd",
-                payment_method=payment_method_id,
-                confirmation_method="automatic",
-                confirm=True,
-                metadata={
+            gateway = get_stripe_gateway()
+            payment_intent = await gateway.call(gateway.client.payment_intents.create_async, params={
+                "amount": amount_cents,
+                "currency": "usd",
+                "payment_method": payment_method_id,
+                "confirmation_method": "automatic",
+                "confirm": True,
+                "metadata": {
                     "user_id": str(user_id),
                     "type": "wallet_deposit",
                     "stripe_account_id": stripe_account_id
                 }
-            )
+            }, idempotency_key=idempotency_key)
             
             logger.info(f"Deposit processed for user {user_id}: ${amount}")
             
@@ -312,7 +378,12 @@ class StripePaymentService:
             raise Exception(f"Deposit failed: {str(e)}")
     
     @staticmethod
-    async def process_withdrawal(user_id: int, amount: float, stripe_account_id: str) -> Dict:
+    async def process_withdrawal(
+        user_id: int,
+        amount: float,
+        stripe_account_id: str,
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
         """
         Process a withdrawal: transfer from platform to user's bank account
         """
@@ -320,16 +391,17 @@ class StripePaymentService:
             amount_cents = int(amount * 100)
             
             # Create a payout to user's bank account
-            payout = stripe.Payout.create(
-                amount=amount_cents,
-                currency="usd",
-                stripe_account=stripe_account_id,
-                metadata={
+            gateway = get_stripe_gateway()
+            payout = await gateway.call(gateway.client.payouts.create_async, params={
+                "amount": amount_cents,
+                "currency": "usd",
+                "metadata": {
                     "user_id": str(user_id),
                     "type": "wallet_withdrawal"
                 }
-            )
+            }, stripe_account=stripe_account_id, idempotency_key=idempotency_key)
             
+            StripeCache.invalidate_balance(stripe_account_id)
             logger.info(f"Withdrawal processed for user {user_id}: ${amount}")
             
             return {
@@ -347,16 +419,11 @@ class StripePaymentService:
         Get recent transactions (charges and payouts) for the account
         """
         try:
-            # Get charges (deposits)
-            charges = stripe.Charge.list(
-                limit=limit,
-                stripe_account=stripe_account_id
-            )
-            
-            # Get payouts (withdrawals)
-            payouts = stripe.Payout.list(
-                limit=limit,
-                stripe_account=stripe_account_id
+            # Charges (deposits) and payouts (withdrawals), fetched concurrently
+            gateway = get_stripe_gateway()
+            charges, payouts = await asyncio.gather(
+                gateway.call(gateway.client.charges.list_async, params={"limit": limit}, stripe_account=stripe_account_id),
+                gateway.call(gateway.client.payouts.list_async, params={"limit": limit}, stripe_account=stripe_account_id)
             )
             
             transactions = []
@@ -0,0 +1,177 @@
+"""
+Terminal Session Service
+POS terminals trade their API key and secret for a short-lived session token
+(POST /api/pos/session) and send it as a Bearer token with each payment.
+
+A token is an HS256 JWT naming the terminal, a session id and the terminal's
+credential generation (a digest of its API key and secret hash). Checking one
+is an HMAC and two cache lookups, no database and no KDF:
+
+- the revocation list, revoked session ids each kept for the rest of its
+  token's lifetime;
+- the terminal registry, a cache of terminal rows dropped whenever a terminal
+  changes through the ORM. A deactivated terminal or rotated credentials
+  therefore reject every outstanding token as soon as the entry reloads.
+
+Both are Redis-backed when REDIS_ENABLED, like the principal cache, so a
+revocation holds on every worker. Without Redis they live in each process;
+run a single worker or enable Redis.
+"""
+import hashlib
+import hmac
+import time
+import uuid
+from typing import Optional, Tuple
+
+import jwt
+from sqlalchemy import event, inspect as sa_inspect, select
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from cache import build_cache
+from config import settings
+from models_cards import POSTerminal
+
+TOKEN_TYPE = "pos_terminal"
+ALGORITHM = "HS256"
+
+# Credentials never enter the registry; the generation digest stands in for them
+SECRET_FIELDS = {"api_key", "api_secret", "last_transaction"}
+REGISTRY_FIELDS = [
+    attr.key for attr in sa_inspect(POSTerminal).column_attrs if attr.key not in SECRET_FIELDS
+]
+
+terminal_registry = build_cache(
+    "terminal_registry",
+    maxsize=settings.TERMINAL_REGISTRY_SIZE,
+    ttl=settings.TERMINAL_REGISTRY_TTL
+)
+revoked_sessions = build_cache(
+    "terminal_revocations",
+    maxsize=settings.TERMINAL_REVOCATION_CACHE_SIZE,
+    ttl=settings.TERMINAL_SESSION_TTL
+)
+
+
+class TerminalSessionError(Exception):
+    """The session token is missing, invalid, expired or revoked"""
+
+
+_signing_key: Optional[bytes] = None
+
+
+def _key() -> bytes:
+    global _signing_key
+    if _signing_key is None:
+        if settings.TERMINAL_SESSION_SECRET:
+            _signing_key = settings.TERMINAL_SESSION_SECRET.encode()
+        else:
+            _signing_key = hmac.new(
+                settings.SECRET_KEY.encode(), b"blackwallet pos terminal sessions", hashlib.sha256
+            ).digest()
+    return _signing_key
+
+
+def _generation(terminal: POSTerminal) -> str:
+    return hashlib.sha256(f"{terminal.api_key}\0{terminal.api_secret}".encode()).hexdigest()[:16]
+
+
+def _snapshot(terminal: POSTerminal) -> dict:
+    data = {field: getattr(terminal, field) for field in REGISTRY_FIELDS}
+    data["generation"] = _generation(terminal)
+    return data
+
+
+def _from_snapshot(data: dict) -> POSTerminal:
+    """Detached POSTerminal carrying the cached columns"""
+    terminal = POSTerminal(**{field: data[field] for field in REGISTRY_FIELDS})
+    make_transient_to_detached(terminal)
+    return terminal
+
+
+class TerminalSessionService:
+    """Issue and check POS terminal session tokens"""
+
+    @staticmethod
+    def issue(terminal: POSTerminal) -> Tuple[str, int]:
+        """(token, lifetime in seconds) for a terminal whose credentials were just verified"""
+        now = int(time.time())
+        ttl = settings.TERMINAL_SESSION_TTL
+        token = jwt.encode({
+            "typ": TOKEN_TYPE,
+            "sub": terminal.terminal_id,
+            "tid": terminal.id,
+            "sid": uuid.uuid4().hex,
+            "gen": _generation(terminal),
+            "iat": now,
+            "exp": now + ttl,
+        }, _key(), algorithm=ALGORITHM)
+        terminal_registry.set(str(terminal.id), _snapshot(terminal))
+        return token, ttl
+
+    @staticmethod
+    def decode(token: str) -> dict:
+        try:
+            claims = jwt.decode(token, _key(), algorithms=[ALGORITHM], options={"require": ["exp", "sid", "tid"]})
+        except jwt.ExpiredSignatureError:
+            raise TerminalSessionError("Terminal session expired")
+        except jwt.InvalidTokenError:
+            raise TerminalSessionError("Invalid terminal session")
+        if claims.get("typ") != TOKEN_TYPE:
+            raise TerminalSessionError("Invalid terminal session")
+        return claims
+
+    @staticmethod
+    def authenticate(token: str, db: Session) -> POSTerminal:
+        """The active terminal a session token belongs to, usually without touching the database"""
+        claims = TerminalSessionService.decode(token)
+        if revoked_sessions.get(claims["sid"]):
+            raise TerminalSessionError("Terminal session revoked")
+
+        key = str(claims["tid"])
+        data = terminal_registry.get(key)
+        if data is None:
+            terminal = db.scalar(select(POSTerminal).where(POSTerminal.id == claims["tid"]))
+            if terminal is None:
+                raise TerminalSessionError("Terminal not found")
+            data = _snapshot(terminal)
+            terminal_registry.set(key, data)
+
+        if data["status"] != "active":
+            raise TerminalSessionError("Terminal is not active")
+        if data["generation"] != claims.get("gen"):
+            raise TerminalSessionError("Terminal credentials changed; start a new session")
+        return _from_snapshot(data)
+
+    @staticmethod
+    def revoke(token: str):
+        """Reject this token on every worker for the rest of its lifetime"""
+        claims = TerminalSessionService.decode(token)
+        remaining = int(claims["exp"] - time.time())
+        if remaining > 0:
+            revoked_sessions.set(claims["sid"], True, ttl=remaining)
+
+
+# ============= REGISTRY INVALIDATION =============
+# Any flushed change to a terminal (status, credentials, location) drops its
+# registry entry once the transaction commits.
+
+@event.listens_for(Session, "after_flush")
+def _collect_terminal_changes(session, flush_context):
+    changed = [
+        obj.id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, POSTerminal) and obj.id is not None
+    ]
+    if changed:
+        session.info.setdefault("terminal_invalidations", set()).update(str(tid) for tid in changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_terminal_invalidations(session):
+    keys = session.info.pop("terminal_invalidations", None)
+    if keys:
+        terminal_registry.delete(*keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_terminal_invalidations(session):
+    session.info.pop("terminal_invalidations", None)
@@ -0,0 +1,370 @@
+"""
+Webhook Handlers
+Registry of Stripe event handlers run by the webhook inbox worker
+(services/webhook_inbox.py), one handler per event type.
+
+Handlers receive the event's data.object and a Session and may commit. An
+exception leaves the event failed in the inbox and is retried; an event type
+without a handler is recorded as processed and otherwise ignored.
+"""
+from typing import Callable, Dict
+
+from sqlalchemy.orm import Session
+
+from models import User, Transaction, PaymentMethod, Notification
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+WEBHOOK_HANDLERS: Dict[str, Callable[[dict, Session], object]] = {}
+
+
+def on(*event_types: str):
+    """Register a handler for one or more Stripe event types"""
+    def register(handler: Callable):
+        for event_type in event_types:
+            WEBHOOK_HANDLERS[event_type] = handler
+        return handler
+    return register
+
+
+def dispatch(event: Dict, db: Session) -> bool:
+    """Run the handler registered for event's type; False when there is none"""
+    handler = WEBHOOK_HANDLERS.get(event["type"])
+    if handler is None:
+        logger.info(f"Unhandled webhook event type: {event['type']}")
+        return False
+    handler(event["data"]["object"], db)
+    return True
+
+
+# ============= STRIPE EVENT HANDLERS =============
+
+@on("payment_intent.succeeded")
+def handle_payment_intent_succeeded(event_data: dict, db: Session):
+    """Handle successful payment intent"""
+    payment_intent_id = event_data['id']
+    amount = event_data['amount'] / 100  # Convert from cents
+    currency = event_data['currency']
+    metadata = event_data.get('metadata', {})
+    
+    logger.info(f"Payment intent succeeded: {payment_intent_id}, Amount: {amount} {currency}")
+    
+    # Get user from metadata
+    user_id = metadata.get('user_id')
+    transaction_id = metadata.get('transaction_id')
+    
+    if user_id and transaction_id:
+        # Update transaction status
+        transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+        if transaction:
+            transaction.status = "completed"
+            transaction.stripe_payment_intent_id = payment_intent_id
+            db.commit()
+            
+            # Create notification
+            notification = Notification(
+                user_id=int(user_id),
+                title="Payment Successful",
+                message=f"Your payment of ${amount:.2f} was successful",
+                type="payment_success"
+            )
+            db.add(notification)
+            db.commit()
+            
+            logger.info(f"Updated transaction {transaction_id} to completed")
+    
+    return True
+
+
+@on("payment_intent.payment_failed")
+def handle_payment_intent_failed(event_data: dict, db: Session):
+    """Handle failed payment intent"""
+    payment_intent_id = event_data['id']
+    amount = event_data['amount'] / 100
+    metadata = event_data.get('metadata', {})
+    error = event_data.get('last_payment_error', {})
+    
+    logger.warning(f"Payment intent failed: {payment_intent_id}, Error: {error.get('message')}")
+    
+    user_id = metadata.get('user_id')
+    transaction_id = metadata.get('transaction_id')
+    
+    if user_id and transaction_id:
+        transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+        if transaction:
+            transaction.status = "failed"
+            transaction.stripe_payment_intent_id = payment_intent_id
+            db.commit()
+            
+            # Create notification
+            notification = Notification(
+                user_id=int(user_id),
+                title="Payment Failed",
+                message=f"Your payment of ${amount:.2f} failed: {error.get('message', 'Unknown error')}",
+                type="payment_failed"
+            )
+            db.add(notification)
+            db.commit()
+    
+    return True
+
+
+@on("charge.succeeded")
+def handle_charge_succeeded(event_data: dict, db: Session):
+    """Handle successful charge"""
+    charge_id = event_data['id']
+    amount = event_data['amount'] / 100
+    customer_id = event_data.get('customer')
+    
+    logger.info(f"Charge succeeded: {charge_id}, Amount: ${amount}")
+    
+    # Update user balance if this is a deposit
+    metadata = event_data.get('metadata', {})
+    user_id = metadata.get('user_id')
+    
+    if user_id:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            user.balance += amount
+            db.commit()
+            logger.info(f"Added ${amount} to user {user_id} balance")
+    
+    return True
+
+
+@on("charge.failed")
+def handle_charge_failed(event_data: dict, db: Session):
+    """Handle failed charge"""
+    charge_id = event_data['id']
+    failure_message = event_data.get('failure_message', 'Unknown error')
+    
+    logger.warning(f"Charge failed: {charge_id}, Reason: {failure_message}")
+    
+    metadata = event_data.get('metadata', {})
+    user_id = metadata.get('user_id')
+    
+    if user_id:
+        notification = Notification(
+            user_id=int(user_id),
+            title="Charge Failed",
+            message=f"Payment charge failed: {failure_message}",
+            type="payment_failed"
+        )
+        db.add(notification)
+        db.commit()
+    
+    return True
+
+
+@on("charge.refunded")
+def handle_charge_refunded(event_data: dict, db: Session):
+    """Handle charge refund"""
+    charge_id = event_data['id']
+    amount_refunded = event_data['amount_refunded'] / 100
+    
+    logger.info(f"Charge refunded: {charge_id}, Amount: ${amount_refunded}")
+    
+    metadata = event_data.get('metadata', {})
+    user_id = metadata.get('user_id')
+    transaction_id = metadata.get('transaction_id')
+    
+    if user_id:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            user.balance += amount_refunded
+            db.commit()
+        
+        if transaction_id:
+            transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+            if transaction:
+                transaction.status = "refunded"
+                db.commit()
+        
+        notification = Notification(
+            user_id=int(user_id),
+            title="Refund Processed",
+            message=f"${amount_refunded:.2f} has been refunded to your account",
+            type="refund"
+        )
+        db.add(notification)
+        db.commit()
+    
+    return True
+
+
+@on("charge.dispute.created")
+def handle_dispute_created(event_data: dict, db: Session):
+    """Handle payment dispute"""
+    dispute_id = event_data['id']
+    amount = event_data['amount'] / 100
+    reason = event_data.get('reason', 'unknown')
+    
+    logger.warning(f"Dispute created: {dispute_id}, Amount: ${amount}, Reason: {reason}")
+    
+    # Notify admin
+    admin_users = db.query(User).filter(User.is_admin == True).all()
+    for admin in admin_users:
+        notification = Notification(
+            user_id=admin.id,
+            title="Payment Dispute",
+            message=f"Dispute created: ${amount:.2f} - Reason: {reason}",
+            type="dispute"
+        )
+        db.add(notification)
+    db.commit()
+    
+    return True
+
+
+@on("customer.created")
+def handle_customer_created(event_data: dict, db: Session):
+    """Handle Stripe customer creation"""
+    customer_id = event_data['id']
+    email = event_data.get('email')
+    
+    logger.info(f"Stripe customer created: {customer_id}, Email: {email}")
+    
+    # Update user with customer_id
+    if email:
+        user = db.query(User).filter(User.email == email).first()
+        if user:
+            user.stripe_customer_id = customer_id
+            db.commit()
+    
+    return True
+
+
+@on("customer.updated")
+def handle_customer_updated(event_data: dict, db: Session):
+    """Handle Stripe customer update"""
+    customer_id = event_data['id']
+    logger.info(f"Stripe customer updated: {customer_id}")
+    return True
+
+
+@on("customer.deleted")
+def handle_customer_deleted(event_data: dict, db: Session):
+    """Handle Stripe customer deletion"""
+    customer_id = event_data['id']
+    logger.info(f"Stripe customer deleted: {customer_id}")
+    
+    # Remove customer_id from user
+    user = db.query(User).filter(User.stripe_customer_id == customer_id).first()
+    if user:
+        user.stripe_customer_id = None
+        db.commit()
+    
+    return True
+
+
+@on("payment_method.attached")
+def handle_payment_method_attached(event_data: dict, db: Session):
+    """Handle payment method attached to customer"""
+    payment_method_id = event_data['id']
+    customer_id = event_data.get('customer')
+    
+    logger.info(f"Payment method attached: {payment_method_id} to customer {customer_id}")
+    
+    # Update payment method record if exists
+    payment_method = db.query(PaymentMethod).filter(PaymentMethod.stripe_payment_method_id == payment_method_id).first()
+    if payment_method:
+        payment_method.is_active = True
+        db.commit()
+    
+    return True
+
+
+@on("payment_method.detached")
+def handle_payment_method_detached(event_data: dict, db: Session):
+    """Handle payment method detached from customer"""
+    payment_method_id = event_data['id']
+    
+    logger.info(f"Payment method detached: {payment_method_id}")
+    
+    # Update payment method record
+    payment_method = db.query(PaymentMethod).filter(PaymentMethod.stripe_payment_method_id == payment_method_id).first()
+    if payment_method:
+        payment_method.is_active = False
+        db.commit()
+    
+    return True
+
+
+@on("account.updated")
+def handle_account_updated(event_data: dict, db: Session):
+    """Handle Stripe Connect account update"""
+    account_id = event_data['id']
+    charges_enabled = event_data.get('charges_enabled', False)
+    payouts_enabled = event_data.get('payouts_enabled', False)
+    
+    logger.info(f"Stripe account updated: {account_id}, Charges: {charges_enabled}, Payouts: {payouts_enabled}")
+    
+    # Update user with account status
+    user = db.query(User).filter(User.stripe_account_id == account_id).first()
+    if user:
+        user.stripe_charges_enabled = charges_enabled
+        user.stripe_payouts_enabled = payouts_enabled
+        db.commit()
+    
+    return True
+
+
+@on("payout.paid")
+def handle_payout_paid(event_data: dict, db: Session):
+    """Handle successful payout"""
+    payout_id = event_data['id']
+    amount = event_data['amount'] / 100
+    
+    logger.info(f"Payout paid: {payout_id}, Amount: ${amount}")
+    
+    # Create transaction record
+    metadata = event_data.get('metadata', {})
+    user_id = metadata.get('user_id')
+    
+    if user_id:
+        notification = Notification(
+            user_id=int(user_id),
+            title="Payout Complete",
+            message=f"${amount:.2f} has been transferred to your bank account",
+            type="payout_success"
+        )
+        db.add(notification)
+        db.commit()
+    
+    return True
+
+
+@on("payout.failed")
+def handle_payout_failed(event_data: dict, db: Session):
+    """Handle failed payout"""
+    payout_id = event_data['id']
+    amount = event_data['amount'] / 100
+    failure_message = event_data.get('failure_message', 'Unknown error')
+    
+    logger.warning(f"Payout failed: {payout_id}, Amount: ${amount}, Reason: {failure_message}")
+    
+    metadata = event_data.get('metadata', {})
+    user_id = metadata.get('user_id')
+    
+    if user_id:
+        notification = Notification(
+            user_id=int(user_id),
+            title="Payout Failed",
+            message=f"Payout of ${amount:.2f} failed: {failure_message}",
+            type="payout_failed"
+        )
+        db.add(notification)
+        db.commit()
+    
+    return True
+
+
+@on("transfer.created")
+def handle_transfer_created(event_data: dict, db: Session):
+    """Handle transfer creation"""
+    transfer_id = event_data['id']
+    amount = event_data['amount'] / 100
+    
+    logger.info(f"Transfer created: {transfer_id}, Amount: ${amount}")
+    return True
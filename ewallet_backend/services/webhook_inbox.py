@@ -0,0 +1,236 @@
+"""
+Webhook Inbox
+Durable intake for Stripe webhook events.
+
+The webhook route only verifies the signature, records the event in
+webhook_events and queues a ProcessWebhookEvents job for the event's object
+in the same commit, then answers 200. A redelivered event id is dropped by
+the unique index, so a replay storm costs one insert attempt per delivery.
+job_worker.py (or the in-process worker, JOB_WORKER_IN_PROCESS) runs the
+handlers registered in services/webhook_handlers.py.
+
+Events for one object (a payment intent, a payout, an account) are applied in
+arrival order: a drain job holds a lock on the object id and works through its
+pending events oldest first, stopping at the first failure so a later event
+never overtakes an earlier one. A drain that finds the lock taken requeues
+itself shortly after. An event that fails WEBHOOK_MAX_ATTEMPTS times is marked
+dead and skipped; replay_webhooks.py puts it back.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import ClassVar, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal, leader_lock
+from models import WebhookEvent
+from services.job_queue import Job, JobQueue, handles
+from services.webhook_handlers import dispatch
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+PENDING_STATUSES = ("received", "failed")
+DRAIN_BATCH = 100
+LOCK_RETRY = timedelta(seconds=2)
+PURGE_BATCH = 5000
+
+# Objects being drained in this process; the advisory lock is a no-op on SQLite
+_draining = set()
+_draining_lock = threading.Lock()
+
+
+class ProcessWebhookEvents(Job):
+    """Drain one object's pending events"""
+    kind = "process_webhook_events"
+    max_attempts: ClassVar[int] = settings.WEBHOOK_MAX_ATTEMPTS
+    object_id: str
+
+
+def _insert_ignore(dialect: str):
+    """INSERT that skips an event id already in the inbox (PostgreSQL and SQLite)"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(WebhookEvent.__table__).on_conflict_do_nothing(index_elements=["event_id"])
+
+
+def _requeue(job: ProcessWebhookEvents):
+    """Another drain holds the object; look again shortly for what it may have missed"""
+    db = SessionLocal()
+    try:
+        JobQueue.enqueue(db, job, delay=LOCK_RETRY)
+        db.commit()
+    finally:
+        db.close()
+
+
+class WebhookInbox:
+    """Record, drain, replay and purge inbox events"""
+
+    @staticmethod
+    def record(db: Session, event: Dict) -> bool:
+        """
+        Add event and its drain job to db's transaction; the caller commits.
+        Returns False for an event id that was already recorded.
+        """
+        data = event["data"]["object"]
+        row = {
+            "event_id": event["id"],
+            "event_type": event["type"],
+            "object_id": data.get("id") or event["id"],
+            "account": event.get("account"),
+            "payload": event,
+            "status": "received",
+            "attempts": 0,
+            "received_at": datetime.utcnow(),
+        }
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            if db.execute(_insert_ignore(dialect), row).rowcount == 0:
+                return False
+        else:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(WebhookEvent.__table__), row)
+            except IntegrityError:
+                return False
+        JobQueue.enqueue(db, ProcessWebhookEvents(object_id=row["object_id"]))
+        return True
+
+    @staticmethod
+    def drain(object_id: str, session_factory=SessionLocal) -> int:
+        """
+        Process the object's pending events in arrival order; returns how many
+        were processed. Raises when an event fails so the job retries with backoff.
+        """
+        db = session_factory()
+        processed = 0
+        try:
+            while True:
+                events = db.scalars(
+                    select(WebhookEvent)
+                    .where(WebhookEvent.object_id == object_id, WebhookEvent.status.in_(PENDING_STATUSES))
+                    .order_by(WebhookEvent.id)
+                    .limit(DRAIN_BATCH)
+                ).all()
+                if not events:
+                    return processed
+                for event in events:
+                    WebhookInbox._process(db, event)
+                    processed += 1
+        finally:
+            db.close()
+
+    @staticmethod
+    def _process(db: Session, event: WebhookEvent):
+        event_pk, event_id = event.id, event.event_id
+        try:
+            dispatch(event.payload, db)
+        except Exception as e:
+            db.rollback()
+            event = db.get(WebhookEvent, event_pk)
+            event.attempts = (event.attempts or 0) + 1
+            event.last_error = f"{type(e).__name__}: {e}"
+            event.status = "dead" if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS else "failed"
+            db.commit()
+            if event.status == "dead":
+                # Skipped from now on so the object's later events can proceed
+                logger.error(f"Webhook {event_id} ({event.event_type}) dead after {event.attempts} attempts: {e}")
+                return
+            raise RuntimeError(f"Webhook {event_id} ({event.event_type}) failed: {e}") from e
+        event.status = "processed"
+        event.attempts = (event.attempts or 0) + 1
+        event.last_error = None
+        event.processed_at = datetime.utcnow()
+        db.commit()
+
+    @staticmethod
+    def replay(
+        db: Session,
+        event_ids: Optional[Iterable[str]] = None,
+        object_id: Optional[str] = None,
+        statuses: Iterable[str] = ("dead",),
+        since: Optional[datetime] = None
+    ) -> List[str]:
+        """
+        Reset matching events to received and queue a drain for each object;
+        the caller commits. Returns the object ids queued.
+        """
+        conditions = []
+        if event_ids:
+            conditions.append(WebhookEvent.event_id.in_(list(event_ids)))
+        else:
+            conditions.append(WebhookEvent.status.in_(list(statuses)))
+        if object_id:
+            conditions.append(WebhookEvent.object_id == object_id)
+        if since:
+            conditions.append(WebhookEvent.received_at >= since)
+
+        object_ids = db.scalars(select(WebhookEvent.object_id).where(*conditions).distinct()).all()
+        db.execute(
+            update(WebhookEvent)
+            .where(*conditions)
+            .values(status="received", attempts=0, last_error=None, processed_at=None)
+        )
+        for object_id in object_ids:
+            JobQueue.enqueue(db, ProcessWebhookEvents(object_id=object_id))
+        return object_ids
+
+    @staticmethod
+    def requeue_stale(db: Session) -> int:
+        """
+        Queue a drain for objects with events still pending WEBHOOK_STALE_SECONDS
+        after arrival: jobs lost with a Redis queue, or a failing event whose
+        drain job was dead-lettered. The caller commits.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.WEBHOOK_STALE_SECONDS)
+        object_ids = db.scalars(
+            select(WebhookEvent.object_id)
+            .where(WebhookEvent.status.in_(PENDING_STATUSES), WebhookEvent.received_at < cutoff)
+            .distinct()
+        ).all()
+        for object_id in object_ids:
+            JobQueue.enqueue(db, ProcessWebhookEvents(object_id=object_id))
+        return len(object_ids)
+
+    @staticmethod
+    def purge_processed(db: Session) -> int:
+        """Delete processed events past WEBHOOK_RETENTION_DAYS in batches; returns rows removed"""
+        cutoff = datetime.utcnow() - timedelta(days=settings.WEBHOOK_RETENTION_DAYS)
+        removed = 0
+        while True:
+            ids = db.scalars(
+                select(WebhookEvent.id)
+                .where(WebhookEvent.status == "processed", WebhookEvent.received_at < cutoff)
+                .limit(PURGE_BATCH)
+            ).all()
+            if not ids:
+                return removed
+            db.execute(delete(WebhookEvent).where(WebhookEvent.id.in_(ids)))
+            db.commit()
+            removed += len(ids)
+
+
+@handles(ProcessWebhookEvents)
+def process_webhook_events(job: ProcessWebhookEvents):
+    with _draining_lock:
+        busy = job.object_id in _draining
+        if not busy:
+            _draining.add(job.object_id)
+    if busy:
+        _requeue(job)
+        return
+    try:
+        with leader_lock(f"webhook:{job.object_id}") as owner:
+            if not owner:
+                _requeue(job)
+                return
+            WebhookInbox.drain(job.object_id)
+    finally:
+        with _draining_lock:
+            _draining.discard(job.object_id)
@@ -0,0 +1,198 @@
+"""
+Local Stripe stub
+A small threaded HTTP server answering the Stripe endpoints BlackWallet uses
+with canned objects, so the Stripe gateway can be exercised without network
+access or test keys.
+
+- Idempotency-Key is honoured: a repeated key replays the first response and
+  is not counted as a new operation (`executed` vs `requests`).
+- `latency` delays every response, to show slow Stripe calls no longer block
+  other requests; `fail_first` answers the first attempt of each idempotency
+  key with a retryable 500, to exercise the gateway's retries.
+
+Usage:
+    python stripe_stub.py --port 12111 --latency 0.3
+    STRIPE_API_BASE=http://127.0.0.1:12111 uvicorn main:app
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+PREFIXES = {
+    "accounts": "acct",
+    "account_links": "link",
+    "external_accounts": "ba",
+    "transfers": "tr",
+    "payment_intents": "pi",
+    "payouts": "po",
+    "customers": "cus",
+    "setup_intents": "seti",
+    "ephemeral_keys": "ephkey",
+    "tokens": "btok",
+    "payment_methods": "pm",
+    "sources": "ba",
+}
+
+
+def _list(path: str):
+    return {"object": "list", "data": [], "has_more": False, "url": path}
+
+
+class _StripeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like api.stripe.com
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, body: dict, retry: bool = False):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Request-Id", f"req_{uuid.uuid4().hex[:14]}")
+        if retry:
+            self.send_header("Stripe-Should-Retry", "true")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.count_request()
+        time.sleep(self.server.latency)
+        path = urlsplit(self.path).path
+        parts = path.strip("/").split("/")[1:]  # Drop "v1"
+        if parts == ["balance"]:
+            money = [{"amount": 0, "currency": "usd"}]
+            return self.reply(200, {"object": "balance", "available": money, "pending": money})
+        if len(parts) == 2 and parts[0] == "accounts":
+            return self.reply(200, self.server.account(parts[1]))
+        return self.reply(200, _list(path))
+
+    def do_POST(self):
+        self.server.count_request()
+        length = int(self.headers.get("Content-Length") or 0)
+        params = dict(parse_qsl(self.rfile.read(length).decode()))
+        key = self.headers.get("Idempotency-Key")
+
+        replay, first_attempt = self.server.lookup(key)
+        time.sleep(self.server.latency)
+        if replay is not None:
+            return self.reply(200, replay)
+        if first_attempt and self.server.fail_first:
+            return self.reply(500, {"error": {"type": "api_error", "message": "Injected failure"}}, retry=True)
+
+        body = self.server.create(urlsplit(self.path).path, params)
+        self.server.store(key, body)
+        self.reply(200, body)
+
+
+class StripeStubServer(ThreadingHTTPServer):
+    """Threaded Stripe stub; counts requests and operations actually executed"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_first: bool = False):
+        super().__init__((host, port), _StripeHandler)
+        self.latency = latency
+        self.fail_first = fail_first
+        self._lock = threading.Lock()
+        self._responses = {}
+        self._attempted = set()
+        self.requests = 0
+        self.executed = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def lookup(self, key):
+        """(stored response, whether this is the key's first attempt)"""
+        if not key:
+            return None, True
+        with self._lock:
+            first = key not in self._attempted
+            self._attempted.add(key)
+            return self._responses.get(key), first
+
+    def store(self, key, body):
+        with self._lock:
+            self.executed += 1
+            if key:
+                self._responses[key] = body
+
+    def account(self, account_id: str):
+        return {
+            "id": account_id,
+            "object": "account",
+            "charges_enabled": True,
+            "payouts_enabled": True,
+            "details_submitted": True,
+            "requirements": {"currently_due": [], "eventually_due": [], "disabled_reason": None},
+        }
+
+    def create(self, path: str, params: dict):
+        parts = path.strip("/").split("/")[1:]
+        if parts[-1] in ("attach", "detach", "verify"):
+            # /payment_methods/{id}/attach, /customers/{c}/sources/{id}/verify
+            resource, object_id = parts[-3], parts[-2]
+        else:
+            resource = parts[-1]
+            object_id = f"{PREFIXES.get(resource, 'obj')}_{uuid.uuid4().hex[:14]}"
+        now = int(time.time())
+        body = {"id": object_id, "object": resource.rstrip("s"), "created": now, "livemode": False}
+        body.update({k: v for k, v in params.items() if "[" not in k})
+        if "amount" in body:
+            body["amount"] = int(body["amount"])
+
+        if resource == "payment_intents":
+            body["status"] = "succeeded" if str(params.get("confirm")).lower() == "true" else "requires_payment_method"
+            body["client_secret"] = f"{object_id}_secret_stub"
+            body.setdefault("payment_method", None)
+        elif resource == "setup_intents":
+            body["client_secret"] = f"{object_id}_secret_stub"
+        elif resource == "payouts":
+            body.update(status="pending", arrival_date=now + 2 * 86400)
+        elif resource == "account_links":
+            body["url"] = f"https://connect.stripe.test/setup/{object_id}"
+        elif resource == "ephemeral_keys":
+            body["secret"] = f"ek_test_{uuid.uuid4().hex}"
+        elif resource in ("external_accounts", "sources"):
+            body.update(object="bank_account", last4="6789", bank_name="STRIPE TEST BANK", status="new")
+        elif resource == "payment_methods":
+            body.update(
+                type="card",
+                card={"brand": "visa", "last4": "4242", "exp_month": 12, "exp_year": 2030},
+            )
+        return body
+
+    def start(self) -> "StripeStubServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Stripe API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--fail-first", action="store_true", help="Fail each idempotency key's first attempt")
+    args = parser.parse_args()
+
+    server = StripeStubServer(args.host, args.port, args.latency, args.fail_first)
+    print(f"Stripe stub listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{server.requests} requests, {server.executed} operations executed")
+
+
+if __name__ == "__main__":
+    main()
@@ -144,6 +144,7 @@ def main():
         terminal_data = pos_response.json()["terminal"]
         terminal_id = terminal_data["terminal_id"]
         api_key = terminal_data["api_key"]
+        api_secret = terminal_data["api_secret"]
         print_result(True, "POS terminal registered", {
             "terminal_id": terminal_id,
             "api_key": api_key[:20] + "...",
@@ -160,11 +161,15 @@ def main():
     print_step(6, "Process payment at POS terminal")
     
     if terminal_id and api_key:
+        session_response = requests.post(
+            f"{BASE_URL}/api/pos/session",
+            headers={"X-Terminal-Id": terminal_id, "X-Api-Key": api_key, "X-Api-Secret": api_secret}
+        )
+        session_token = session_response.json().get("session_token")
         payment_response = requests.post(
             f"{BASE_URL}/api/pos/process-payment",
+            headers={"Authorization": f"Bearer {session_token}"},
             json={
-                "terminal_id": terminal_id,
-                "api_key": api_key,
                 "card_number": card_number,
                 "amount": 45.99,
                 "entry_mode": "contactless",
@@ -0,0 +1,114 @@
+"""
+Concurrency stress test for LedgerService.transfer
+Hammers 1000 parallel transfers between a small set of users and checks
+that no money is created or destroyed and no balance goes negative.
+
+Runs against a throwaway SQLite database by default; point DATABASE_URL at
+a PostgreSQL database to exercise the FOR UPDATE lock ordering as well.
+"""
+import os
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+_tmpdir = tempfile.mkdtemp(prefix="ledger_stress_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'stress.db')}")
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from database import Base, engine, SessionLocal
+from models import User, Transaction, UserActivitySummary
+from models_quick_wins import TransactionSearchDocument, TransactionTag
+from money import Money
+from services.ledger_service import LedgerService, InsufficientFunds
+
+USERS = 10
+STARTING_BALANCE = Money.from_major(100)
+TRANSFERS = 1000
+WORKERS = 32
+
+
+# The search index hook reads and writes these on every commit that touches a transaction
+TABLES = [
+    User.__table__, Transaction.__table__,
+    UserActivitySummary.__table__, TransactionSearchDocument.__table__, TransactionTag.__table__,
+]
+
+
+def setup_users():
+    Base.metadata.drop_all(bind=engine, tables=TABLES)
+    Base.metadata.create_all(bind=engine, tables=TABLES)
+    db = SessionLocal()
+    try:
+        ids = []
+        for i in range(USERS):
+            user = User(username=f"stress_{i}", password="x", balance_minor=STARTING_BALANCE.minor)
+            db.add(user)
+            db.flush()
+            ids.append(user.id)
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+def is_lock_contention(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database table is locked" in message
+
+
+def one_transfer(user_ids, seed):
+    rng = random.Random(seed)
+    sender_id, receiver_id = rng.sample(user_ids, 2)
+    amount = Money(rng.randint(1, 5000))  # $0.01 - $50.00
+    db = SessionLocal()
+    try:
+        LedgerService.transfer(db, sender_id, receiver_id, amount)
+        db.add(Transaction(sender=str(sender_id), receiver=str(receiver_id), amount_minor=amount.minor))
+        db.commit()
+        return "ok"
+    except InsufficientFunds:
+        db.rollback()
+        return "insufficient"
+    except OperationalError as e:
+        db.rollback()
+        # Only SQLite lock contention counts as busy; anything else is a real failure
+        if not is_lock_contention(e):
+            raise
+        return "busy"
+    finally:
+        db.close()
+
+
+def test_parallel_transfers_conserve_money():
+    user_ids = setup_users()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        outcomes = list(pool.map(lambda seed: one_transfer(user_ids, seed), range(TRANSFERS)))
+
+    db = SessionLocal()
+    try:
+        total = db.query(func.sum(User.balance_minor)).scalar()
+        lowest = db.query(func.min(User.balance_minor)).scalar()
+        ledger_rows = db.query(func.count(Transaction.id)).scalar()
+        summary_sent = db.query(func.sum(UserActivitySummary.sent_count)).scalar() or 0
+    finally:
+        db.close()
+
+    completed = outcomes.count("ok")
+    print(
+        f"transfers: {completed} ok, {outcomes.count('insufficient')} insufficient, "
+        f"{outcomes.count('busy')} busy"
+    )
+
+    assert total == USERS * STARTING_BALANCE.minor, "money was created or destroyed"
+    assert lowest >= 0, "a balance went negative"
+    assert ledger_rows == completed, "ledger rows do not match committed transfers"
+    assert summary_sent == completed, "activity summary drifted from the ledger"
+    assert completed > 0
+
+
+if __name__ == "__main__":
+    test_parallel_transfers_conserve_money()
+    print("✅ Total money conserved across parallel transfers")
@@ -0,0 +1,152 @@
+"""
+Credential hashing
+Salted, tunable KDF hashes for user passwords, gift card PINs and POS terminal
+API secrets. Each kind has its own scheme (PASSWORD_HASH_SCHEME,
+PIN_HASH_SCHEME, API_SECRET_HASH_SCHEME: argon2, scrypt or bcrypt) and every
+scheme its own cost settings.
+
+Hashes made under another scheme or an older cost - including the unsalted
+SHA-256 PINs and terminal secrets stored before this module - still verify,
+and verify_secret returns a replacement hash for the caller to store.
+
+KDFs are deliberately slow, so async callers use the *_async helpers, which
+run on a dedicated pool (CREDENTIAL_HASH_POOL, CREDENTIAL_HASH_WORKERS) instead
+of the event loop or the request thread pool. Verified terminal secrets are
+remembered for TERMINAL_SECRET_CACHE_TTL seconds so busy terminals don't pay
+the KDF on every payment.
+"""
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from cache import TTLCache
+from config import settings
+
+PASSWORD = "password"
+PIN = "pin"
+API_SECRET = "api_secret"
+
+SCHEMES = ("argon2", "scrypt", "bcrypt")
+# Unsalted SHA-256 hex digests written before salted hashing; verify-only
+LEGACY_SCHEMES = {PASSWORD: (), PIN: ("hex_sha256",), API_SECRET: ("hex_sha256",)}
+
+
+def _scheme_for(kind: str) -> str:
+    scheme = {
+        PASSWORD: settings.PASSWORD_HASH_SCHEME,
+        PIN: settings.PIN_HASH_SCHEME,
+        API_SECRET: settings.API_SECRET_HASH_SCHEME,
+    }[kind]
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unsupported {kind} hash scheme {scheme!r}; use one of {', '.join(SCHEMES)}")
+    return scheme
+
+
+def _build_context(kind: str) -> CryptContext:
+    active = _scheme_for(kind)
+    return CryptContext(
+        schemes=[active] + [scheme for scheme in SCHEMES if scheme != active] + list(LEGACY_SCHEMES[kind]),
+        default=active,
+        deprecated="auto",  # Everything but the active scheme gets rehashed on the next successful verify
+        bcrypt__rounds=settings.BCRYPT_ROUNDS,
+        scrypt__rounds=settings.SCRYPT_ROUNDS,
+        argon2__rounds=settings.ARGON2_TIME_COST,
+        argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+        argon2__parallelism=settings.ARGON2_PARALLELISM,
+    )
+
+
+_contexts: Dict[str, CryptContext] = {}
+_contexts_lock = threading.Lock()
+
+
+def _context(kind: str) -> CryptContext:
+    context = _contexts.get(kind)
+    if context is None:
+        with _contexts_lock:
+            context = _contexts.setdefault(kind, _build_context(kind))
+    return context
+
+
+def hash_secret(kind: str, secret: str) -> str:
+    """Salted hash of secret under the active scheme for kind"""
+    return _context(kind).hash(secret)
+
+
+def verify_secret(kind: str, secret: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    (matches, replacement hash). The replacement is set when hashed used a
+    deprecated scheme or cost and should be stored in its place.
+    """
+    if not hashed or not secret:
+        return False, None
+    try:
+        return _context(kind).verify_and_update(secret, hashed)
+    except ValueError:
+        return False, None  # Unrecognized or malformed stored hash
+
+
+# ============= HASHING POOL =============
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> Executor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = settings.CREDENTIAL_HASH_WORKERS
+                if settings.CREDENTIAL_HASH_POOL == "process":
+                    _executor = ProcessPoolExecutor(max_workers=workers)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="credentials")
+    return _executor
+
+
+async def hash_secret_async(kind: str, secret: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_pool(), hash_secret, kind, secret)
+
+
+async def verify_secret_async(kind: str, secret: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    return await asyncio.get_running_loop().run_in_executor(_pool(), verify_secret, kind, secret, hashed)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+# ============= TERMINAL SECRETS =============
+# In-process only: entries are keyed by a digest of the stored hash and the
+# presented secret, so rotating the secret (a new stored hash) retires them.
+
+terminal_secret_cache = TTLCache(
+    "terminal_secret",
+    maxsize=settings.TERMINAL_SECRET_CACHE_SIZE,
+    ttl=settings.TERMINAL_SECRET_CACHE_TTL
+)
+
+
+def _terminal_key(hashed: str, secret: str) -> str:
+    return hashlib.sha256(f"{hashed}\0{secret}".encode()).hexdigest()
+
+
+async def verify_terminal_secret(secret: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """verify_secret_async for POS terminal API secrets, skipping the KDF for recently verified ones"""
+    if not hashed or not secret:
+        return False, None
+    key = _terminal_key(hashed, secret)
+    if terminal_secret_cache.get(key):
+        return True, None
+    matches, replacement = await verify_secret_async(API_SECRET, secret, hashed)
+    if matches and replacement is None:
+        terminal_secret_cache.set(key, True)
+    return matches, replacement
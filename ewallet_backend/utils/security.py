@@ -1,14 +1,21 @@
-from passlib.context import CryptContext
 import jwt
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from utils.credentials import PASSWORD, hash_secret, hash_secret_async, verify_secret, verify_secret_async
+
 SECRET_KEY = "your-secret-key"
 
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    return hash_secret(PASSWORD, password)
 
 def verify_password(plain, hashed):
-    return pwd_context.verify(plain, hashed)
+    return verify_secret(PASSWORD, plain, hashed)[0]
+
+async def hash_password_async(password: str):
+    return await hash_secret_async(PASSWORD, password)
+
+async def verify_password_async(plain, hashed):
+    """(matches, replacement hash to store when the stored one is outdated)"""
+    return await verify_secret_async(PASSWORD, plain, hashed)
 
 def create_token(data: dict):
     return jwt.encode(data, SECRET_KEY, algorithm="HS256")
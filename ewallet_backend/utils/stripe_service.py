@@ -1,6 +1,8 @@
 import stripe
 import os
+from typing import Optional
 from dotenv import load_dotenv
+from services.stripe_gateway import get_stripe_gateway
 
 load_dotenv()
 
@@ -26,17 +28,17 @@ else:
 __all__ = ['StripeService', 'STRIPE_PUBLISHABLE_KEY', 'STRIPE_MODE']
 
 class StripeService:
-    """Service for handling Stripe operations"""
+    """Service for handling Stripe operations (awaited through the shared StripeGateway)"""
     
     @staticmethod
     async def create_customer(username: str, email: str = None):
         """Create a Stripe customer for a user"""
         try:
-            customer = stripe.Customer.create(
-                name=username,
-                email=email,
-                metadata={"username": username}
-            )
+            gateway = get_stripe_gateway()
+            params = {"name": username, "metadata": {"username": username}}
+            if email:
+                params["email"] = email
+            customer = await gateway.call(gateway.client.customers.create_async, params=params)
             return customer.id
         except Exception as e:
             print(f"Error creating Stripe customer: {e}")
@@ -46,9 +48,11 @@ class StripeService:
     async def attach_payment_method(customer_id: str, payment_method_id: str):
         """Attach a payment method to a customer"""
         try:
-            payment_method = stripe.PaymentMethod.attach(
+            gateway = get_stripe_gateway()
+            payment_method = await gateway.call(
+                gateway.client.payment_methods.attach_async,
                 payment_method_id,
-                customer=customer_id,
+                params={"customer": customer_id}
             )
             return payment_method
         except Exception as e:
@@ -56,29 +60,36 @@ class StripeService:
             return None
     
     @staticmethod
-    async def create_payment_intent(amount: int, customer_id: str, payment_method_id: str):
+    async def create_payment_intent(
+        amount: int,
+        customer_id: str,
+        payment_method_id: str,
+        idempotency_key: Optional[str] = None
+    ):
         """Create a payment intent for depositing money
         
         Args:
             amount: Amount in cents (e.g., 1000 = $10.00)
             customer_id: Stripe customer ID
             payment_method_id: Stripe payment method ID
+            idempotency_key: Reuse to make a retried deposit charge only once
         """
         try:
-            payment_intent = stripe.PaymentIntent.create(
-                amount=amount,
-                currency="usd",
-                customer=customer_id,
-                payment_method=payment_method_id,
-                confirm=True,
-                automatic_payment_methods={
+            gateway = get_stripe_gateway()
+            payment_intent = await gateway.call(gateway.client.payment_intents.create_async, params={
+                "amount": amount,
+                "currency": "usd",
+                "customer": customer_id,
+                "payment_method": payment_method_id,
+                "confirm": True,
+                "automatic_payment_methods": {
                     'enabled': True,
                     'allow_redirects': 'never'
                 },
-                metadata={
+                "metadata": {
                     "transaction_type": "deposit",
                 }
-            )
+            }, idempotency_key=idempotency_key)
             return payment_intent
         except Exception as e:
             print(f"Error creating payment intent: {e}")
@@ -88,8 +99,9 @@ class StripeService:
     async def create_bank_account_token(account_number: str, routing_number: str):
         """Create a bank account token for ACH transfers"""
         try:
-            token = stripe.Token.create(
-                bank_account={
+            gateway = get_stripe_gateway()
+            token = await gateway.call(gateway.client.tokens.create_async, params={
+                "bank_account": {
                     "country": "US",
                     "currency": "usd",
                     "account_holder_name": "Account Holder",
@@ -97,30 +109,32 @@ class StripeService:
                     "routing_number": routing_number,
                     "account_number": account_number,
                 }
-            )
+            })
             return token.id
         except Exception as e:
             print(f"Error creating bank account token: {e}")
             return None
     
     @staticmethod
-    async def create_payout(amount: int, bank_account_id: str):
+    async def create_payout(amount: int, bank_account_id: str, idempotency_key: Optional[str] = None):
         """Create a payout to a bank account (withdrawal)
         
         Args:
             amount: Amount in cents (e.g., 1000 = $10.00)
             bank_account_id: Stripe bank account ID
+            idempotency_key: Reuse to make a retried withdrawal pay out only once
         """
         try:
             # For ACH transfers, use Transfers API
-            transfer = stripe.Transfer.create(
-                amount=amount,
-                currency="usd",
-                destination=bank_account_id,
-                metadata={
+            gateway = get_stripe_gateway()
+            transfer = await gateway.call(gateway.client.transfers.create_async, params={
+                "amount": amount,
+                "currency": "usd",
+                "destination": bank_account_id,
+                "metadata": {
                     "transaction_type": "withdrawal"
                 }
-            )
+            }, idempotency_key=idempotency_key)
             return transfer
         except Exception as e:
             print(f"Error creating payout: {e}")
@@ -130,9 +144,10 @@ class StripeService:
     async def get_payment_methods(customer_id: str):
         """Get all payment methods for a customer"""
         try:
-            payment_methods = stripe.PaymentMethod.list(
-                customer=customer_id,
-                type="card"
+            gateway = get_stripe_gateway()
+            payment_methods = await gateway.call(
+                gateway.client.payment_methods.list_async,
+                params={"customer": customer_id, "type": "card"}
             )
             return payment_methods.data
         except Exception as e:
@@ -143,19 +158,23 @@ class StripeService:
     async def detach_payment_method(payment_method_id: str):
         """Remove a payment method"""
         try:
-            payment_method = stripe.PaymentMethod.detach(payment_method_id)
+            gateway = get_stripe_gateway()
+            payment_method = await gateway.call(gateway.client.payment_methods.detach_async, payment_method_id)
             return payment_method
         except Exception as e:
             print(f"Error detaching payment method: {e}")
             return None
     
     @staticmethod
-    async def verify_bank_account(bank_account_id: str, amounts: list):
-        """Verify a bank account with micro-deposits"""
+    async def verify_bank_account(customer_id: str, bank_account_id: str, amounts: list):
+        """Verify a customer's bank account with micro-deposits"""
         try:
-            bank_account = stripe.Customer.verify_source(
+            gateway = get_stripe_gateway()
+            bank_account = await gateway.call(
+                gateway.client.customers.payment_sources.verify_async,
+                customer_id,
                 bank_account_id,
-                amounts=amounts,
+                params={"amounts": amounts}
             )
             return bank_account
         except Exception as e: